@@ -812,7 +812,7 @@ async def trigger_free_cleanup():
         return {"error": "WAHA monitoring not available"}
     
     try:
-        free_session_manager.cleanup_inactive_sessions()
+        await free_session_manager.cleanup_inactive_sessions()
         return {
             "success": True,
             "message": "Cleanup triggered successfully",
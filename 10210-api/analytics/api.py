@@ -10,12 +10,15 @@ from typing import Dict, List, Any, Optional
 from datetime import datetime, timedelta
 from fastapi import APIRouter, HTTPException, Query, Response
 from pydantic import BaseModel
+from sqlalchemy import func, case, or_
 
 # Import database models and connection
 from database.connection import get_db
 from database.models import Campaign, Delivery  # Contact doesn't exist
 from warmer.models import WarmerSession, WarmerConversation, MessageType
 from waha_functions import WAHAClient
+from async_waha_client import get_async_waha_client
+from session_health_cache import session_health_cache
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -33,9 +36,11 @@ class ResponseRateTracker:
     def __init__(self, waha_client = None):
         try:
             self.waha = waha_client if waha_client else WAHAClient()
+            self.async_waha = get_async_waha_client(self.waha.base_url)
         except Exception as e:
             logger.warning(f"Could not initialize WAHA client: {e}")
             self.waha = None
+            self.async_waha = None
         self.logger = logger
         
     async def calculate_response_rate(self, session_name: str, phone_number: str, campaign_id: Optional[int] = None) -> Dict[str, Any]:
@@ -45,9 +50,9 @@ class ResponseRateTracker:
             chat_id = f"{phone_number}@c.us" if "@" not in phone_number else phone_number
             
             try:
-                if not self.waha:
+                if not self.async_waha:
                     raise Exception("WAHA client not available")
-                messages = self.waha.get_messages(session_name, chat_id, limit=100)
+                messages = await self.async_waha.get_chat_messages(session_name, chat_id, limit=100)
                 
                 # Count sent and received messages
                 sent_count = 0
@@ -92,33 +97,33 @@ class ResponseRateTracker:
     def _get_cached_response_rate(self, phone_number: str, session_name: str, campaign_id: Optional[int] = None) -> Dict[str, Any]:
         """Get cached response rate from database"""
         with get_db() as db:
-            # Query deliveries for this phone number
-            query = db.query(Delivery).filter(
+            # Count deliveries and responses for this phone number in SQL
+            query = db.query(
+                func.count(Delivery.id),
+                func.sum(case((Delivery.response_received == True, 1), else_=0))
+            ).filter(
                 Delivery.phone_number == phone_number
             )
             
             if campaign_id:
                 query = query.filter(Delivery.campaign_id == campaign_id)
             
-            deliveries = query.all()
+            sent_count, responded_count = query.one()
             
-            if deliveries:
-                sent_count = len(deliveries)
-                responded_count = len([d for d in deliveries if d.response_received])
+            if sent_count:
+                responded_count = responded_count or 0
                 response_rate = (responded_count / sent_count * 100) if sent_count > 0 else 0
                 
                 # Try to get the session's phone number
                 session_phone = None
                 try:
                     if self.waha and session_name:
-                        sessions = self.waha.get_sessions()
-                        for session in sessions:
-                            if session.get('name') == session_name:
-                                # Get the phone number from the session's 'me' field
-                                me_info = session.get('me', {})
-                                if me_info:
-                                    session_phone = me_info.get('id', '').replace('@c.us', '')
-                                break
+                        session = session_health_cache.peek_session(session_name, self.waha.base_url)
+                        if session:
+                            # Get the phone number from the session's 'me' field
+                            me_info = session.get('me', {})
+                            if me_info:
+                                session_phone = me_info.get('id', '').replace('@c.us', '')
                 except:
                     pass
                 
@@ -141,6 +146,34 @@ class ResponseRateTracker:
 # Initialize response tracker
 response_tracker = ResponseRateTracker()
 
+def _delivery_totals(db, campaign_filters: List) -> Dict[str, int]:
+    """Delivery outcome totals for the campaigns matching campaign_filters
+    
+    Counted in SQL per (campaign, status) - the deliveries(campaign_id, status, ...)
+    index covers the whole aggregate, so no delivery row is loaded into Python.
+    """
+    rows = db.query(
+        Delivery.status,
+        func.count(Delivery.id),
+        func.count(Delivery.read_at),
+        func.sum(case((Delivery.response_received == True, 1), else_=0))
+    ).join(
+        Campaign, Delivery.campaign_id == Campaign.id
+    ).filter(
+        *campaign_filters
+    ).group_by(Delivery.campaign_id, Delivery.status).all()
+    
+    totals = {"sent": 0, "delivered": 0, "failed": 0, "read": 0, "responded": 0}
+    for status, count, read, responded in rows:
+        totals["sent"] += count
+        if status == "sent":
+            totals["delivered"] += count
+        elif status == "failed":
+            totals["failed"] += count
+        totals["read"] += read or 0
+        totals["responded"] += responded or 0
+    return totals
+
 @router.get("/analytics/campaign/overview")
 async def get_campaign_overview(
     start_date: Optional[datetime] = Query(None),
@@ -177,45 +210,25 @@ async def get_campaign_overview(
                     }
             
             # Fallback to calculating from current campaigns
-            # Base query
-            query = db.query(Campaign)
+            campaign_filters = []
             
             # Filter by user_id if provided
             if user_id:
-                query = query.filter(Campaign.user_id == user_id)
+                campaign_filters.append(Campaign.user_id == user_id)
             
             if start_date:
-                query = query.filter(Campaign.created_at >= start_date)
+                campaign_filters.append(Campaign.created_at >= start_date)
             if end_date:
-                query = query.filter(Campaign.created_at <= end_date)
-            
-            campaigns = query.all()
+                campaign_filters.append(Campaign.created_at <= end_date)
             
             # Calculate overall metrics
-            total_campaigns = len(campaigns)
-            total_sent = 0
-            total_delivered = 0
-            total_failed = 0
-            total_read = 0
-            total_responded = 0
-            
-            for campaign in campaigns:
-                deliveries = db.query(Delivery).filter(
-                    Delivery.campaign_id == campaign.id
-                ).all()
-                
-                for delivery in deliveries:
-                    total_sent += 1
-                    if delivery.status == "sent":
-                        total_delivered += 1
-                    elif delivery.status == "failed":
-                        total_failed += 1
-                    
-                    # Check for optional fields that may not exist yet
-                    if hasattr(delivery, 'read_at') and delivery.read_at:
-                        total_read += 1
-                    if hasattr(delivery, 'response_received') and delivery.response_received:
-                        total_responded += 1
+            total_campaigns = db.query(func.count(Campaign.id)).filter(*campaign_filters).scalar() or 0
+            totals = _delivery_totals(db, campaign_filters)
+            total_sent = totals["sent"]
+            total_delivered = totals["delivered"]
+            total_failed = totals["failed"]
+            total_read = totals["read"]
+            total_responded = totals["responded"]
             
             # Calculate rates
             delivery_rate = (total_delivered / total_sent * 100) if total_sent > 0 else 0
@@ -266,6 +279,7 @@ async def get_campaign_detailed(
                 Delivery.sent_at,
                 Delivery.delivered_at,
                 Campaign.id.label("campaign_id"),
+                Campaign.session_name.label("session_name"),
                 Campaign.user_id
             ).join(Campaign)
             
@@ -277,15 +291,11 @@ async def get_campaign_detailed(
                 query = query.filter(Campaign.id == campaign_id)
             
             if search:
-                # Simple search filter without SQLAlchemy or_
-                deliveries = []
-                all_deliveries = query.all()
-                for d in all_deliveries:
-                    if (search in (d.phone_number or '') or 
-                        search in (d.recipient_name or '') or 
-                        search in (d.campaign_name or '')):
-                        deliveries.append(d)
-                query = deliveries
+                query = query.filter(or_(
+                    Delivery.phone_number.contains(search, autoescape=True),
+                    Delivery.recipient_name.contains(search, autoescape=True),
+                    Campaign.name.contains(search, autoescape=True)
+                ))
             
             # Get total count
             total_count = query.count()
@@ -298,12 +308,8 @@ async def get_campaign_detailed(
             detailed_items = []
             for item in items:
                 # Get response rate for this phone number
-                session_name = db.query(Campaign).filter(
-                    Campaign.id == item.campaign_id
-                ).first().session_name
-                
                 response_data = await response_tracker.calculate_response_rate(
-                    session_name,
+                    item.session_name,
                     item.phone_number,
                     item.campaign_id
                 )
@@ -438,6 +444,30 @@ async def get_warmer_overview(user_id: Optional[str] = Query(None)):
             failed_messages = 0
             total_duration_minutes = 0
             total_sessions = 0
+            warmer_ids = [warmer.id for warmer in warmers]
+            
+            # Distinct groups and messages per sending session, one grouped query each
+            groups_by_warmer = {}
+            sent_by_session = {}
+            if warmer_ids:
+                groups_by_warmer = dict(db.query(
+                    WarmerConversation.warmer_session_id,
+                    func.count(func.distinct(WarmerConversation.group_id))
+                ).filter(
+                    WarmerConversation.warmer_session_id.in_(warmer_ids),
+                    WarmerConversation.group_id.isnot(None)
+                ).group_by(WarmerConversation.warmer_session_id).all())
+                
+                sent_by_session = {
+                    (warmer_id, session): count
+                    for warmer_id, session, count in db.query(
+                        WarmerConversation.warmer_session_id,
+                        WarmerConversation.sender_session,
+                        func.count(WarmerConversation.id)
+                    ).filter(
+                        WarmerConversation.warmer_session_id.in_(warmer_ids)
+                    ).group_by(WarmerConversation.warmer_session_id, WarmerConversation.sender_session).all()
+                }
             
             for warmer in warmers:
                 total_messages += warmer.total_messages_sent
@@ -455,11 +485,7 @@ async def get_warmer_overview(user_id: Optional[str] = Query(None)):
                     total_sessions += 1  # At least one session per warmer
                 
                 # Count active groups
-                group_conversations = db.query(WarmerConversation.group_id).filter(
-                    WarmerConversation.warmer_session_id == warmer.id,
-                    WarmerConversation.group_id.isnot(None)
-                ).distinct().all()
-                active_groups += len(group_conversations)
+                active_groups += groups_by_warmer.get(warmer.id, 0)
             
             # Get messages per session
             session_stats = []
@@ -468,10 +494,7 @@ async def get_warmer_overview(user_id: Optional[str] = Query(None)):
                     sessions = warmer.all_sessions if hasattr(warmer, 'all_sessions') else []
                     for session in sessions:
                         # Count messages sent by this session
-                        sent_count = db.query(WarmerConversation).filter(
-                            WarmerConversation.warmer_session_id == warmer.id,
-                            WarmerConversation.sender_session == session
-                        ).count()
+                        sent_count = sent_by_session.get((warmer.id, session), 0)
                         
                         session_stats.append({
                             "session": session,
@@ -5,7 +5,7 @@ Provides analytics filtered by user_id
 
 from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Optional
-from sqlalchemy import func, and_, or_
+from sqlalchemy import func, and_, or_, case
 from sqlalchemy.orm import Session
 from database.models import Campaign
 from database.subscription_models import UserSubscription
@@ -36,28 +36,29 @@ class UserAnalytics:
                     "user_id": user_id
                 }
             
-            # Get user's sessions
-            sessions = self.db.query(UserWhatsAppSession).filter(
+            # Session totals, counted in SQL
+            total_sessions, active_sessions, total_messages_sent = self.db.query(
+                func.count(UserWhatsAppSession.id),
+                func.sum(case((UserWhatsAppSession.status == 'active', 1), else_=0)),
+                func.sum(UserWhatsAppSession.messages_sent)
+            ).filter(
                 UserWhatsAppSession.user_id == user_id
-            ).all()
+            ).one()
             
-            # Get user's campaigns
-            campaigns = self.db.query(Campaign).filter(
-                Campaign.user_id == user_id
-            ).all()
+            primary_session = self.db.query(UserWhatsAppSession.session_name).filter(
+                UserWhatsAppSession.user_id == user_id,
+                UserWhatsAppSession.is_primary == True
+            ).first()
             
             # Calculate campaign statistics
-            active_campaigns = [c for c in campaigns if c.status in ['running', 'scheduled', 'queued']]
-            completed_campaigns = [c for c in campaigns if c.status == 'completed']
+            campaigns_by_status = self._count_campaigns_by_status(user_id)
+            active_campaigns = sum(campaigns_by_status.get(status, 0) for status in ['running', 'scheduled', 'queued'])
             
             # Get contacts count
             contacts_count = self.db.query(WarmerContact).filter(
                 WarmerContact.user_id == user_id
             ).count()
             
-            # Calculate messages sent
-            total_messages_sent = sum(s.messages_sent for s in sessions)
-            
             # Get recent activity
             recent_activity = self.db.query(UserSessionActivity).filter(
                 UserSessionActivity.user_id == user_id
@@ -75,22 +76,22 @@ class UserAnalytics:
                     "sessions_used": subscription.current_sessions
                 },
                 "sessions": {
-                    "total": len(sessions),
-                    "active": len([s for s in sessions if s.status == 'active']),
-                    "primary": next((s.session_name for s in sessions if s.is_primary), None)
+                    "total": total_sessions,
+                    "active": active_sessions or 0,
+                    "primary": primary_session[0] if primary_session else None
                 },
                 "campaigns": {
-                    "total": len(campaigns),
-                    "active": len(active_campaigns),
-                    "completed": len(completed_campaigns),
-                    "success_rate": self._calculate_success_rate(campaigns)
+                    "total": sum(campaigns_by_status.values()),
+                    "active": active_campaigns,
+                    "completed": campaigns_by_status.get('completed', 0),
+                    "success_rate": self._calculate_success_rate(user_id)
                 },
                 "contacts": {
                     "total": contacts_count,
                     "imported_today": self._get_contacts_imported_today(user_id)
                 },
                 "messages": {
-                    "total_sent": total_messages_sent,
+                    "total_sent": total_messages_sent or 0,
                     "sent_today": self._get_messages_sent_today(user_id),
                     "sent_this_month": subscription.messages_sent_this_month
                 },
@@ -119,36 +120,29 @@ class UserAnalytics:
             else:  # month
                 start_date = datetime.now(timezone.utc) - timedelta(days=30)
             
-            # Get campaigns in period
-            campaigns = self.db.query(Campaign).filter(
-                and_(
-                    Campaign.user_id == user_id,
-                    Campaign.created_at >= start_date
-                )
-            ).all()
+            # Campaigns in period
+            period_filter = and_(
+                Campaign.user_id == user_id,
+                Campaign.created_at >= start_date
+            )
             
             # Group by status
-            campaigns_by_status = {}
-            for campaign in campaigns:
-                status = campaign.status
-                if status not in campaigns_by_status:
-                    campaigns_by_status[status] = 0
-                campaigns_by_status[status] += 1
+            campaigns_by_status = self._count_campaigns_by_status(user_id, period_filter)
             
             # Calculate daily distribution
-            daily_distribution = self._calculate_daily_distribution(campaigns, start_date)
+            daily_distribution = self._calculate_daily_distribution(period_filter, start_date)
             
-            # Get top performing campaigns
-            top_campaigns = sorted(
-                campaigns,
-                key=lambda c: c.messages_sent if hasattr(c, 'messages_sent') else 0,
-                reverse=True
-            )[:5]
+            # Get top performing campaigns (most messages sent)
+            top_campaigns = self.db.query(
+                Campaign.id, Campaign.name, Campaign.status, Campaign.success_count, Campaign.created_at
+            ).filter(period_filter).order_by(
+                Campaign.success_count.desc()
+            ).limit(5).all()
             
             return {
                 "user_id": user_id,
                 "period": period,
-                "total_campaigns": len(campaigns),
+                "total_campaigns": sum(campaigns_by_status.values()),
                 "campaigns_by_status": campaigns_by_status,
                 "daily_distribution": daily_distribution,
                 "top_campaigns": [
@@ -156,11 +150,11 @@ class UserAnalytics:
                         "id": c.id,
                         "name": c.name,
                         "status": c.status,
-                        "messages_sent": getattr(c, 'messages_sent', 0),
+                        "messages_sent": c.success_count or 0,
                         "created_at": c.created_at.isoformat() if c.created_at else None
                     } for c in top_campaigns
                 ],
-                "average_messages_per_campaign": self._calculate_average_messages(campaigns)
+                "average_messages_per_campaign": self._calculate_average_messages(period_filter)
             }
         except Exception as e:
             logger.error(f"Error getting campaign analytics: {e}")
@@ -173,15 +167,17 @@ class UserAnalytics:
                 UserWhatsAppSession.user_id == user_id
             ).all()
             
-            # Get activity for each session
+            # Activity per session, one grouped query
+            activity_counts = dict(self.db.query(
+                UserSessionActivity.session_name,
+                func.count(UserSessionActivity.id)
+            ).filter(
+                UserSessionActivity.user_id == user_id
+            ).group_by(UserSessionActivity.session_name).all())
+            
             session_analytics = []
             for session in sessions:
-                activity_count = self.db.query(UserSessionActivity).filter(
-                    and_(
-                        UserSessionActivity.user_id == user_id,
-                        UserSessionActivity.session_name == session.session_name
-                    )
-                ).count()
+                activity_count = activity_counts.get(session.session_name, 0)
                 
                 session_analytics.append({
                     "session_name": session.session_name,
@@ -206,25 +202,29 @@ class UserAnalytics:
             logger.error(f"Error getting session analytics: {e}")
             return {"error": str(e)}
     
-    def _calculate_success_rate(self, campaigns: List) -> float:
+    def _count_campaigns_by_status(self, user_id: str, *filters) -> Dict[str, int]:
+        """Number of the user's campaigns per status, counted in SQL"""
+        return dict(self.db.query(
+            Campaign.status, func.count(Campaign.id)
+        ).filter(
+            Campaign.user_id == user_id, *filters
+        ).group_by(Campaign.status).all())
+    
+    def _calculate_success_rate(self, user_id: str) -> float:
         """Calculate campaign success rate"""
-        if not campaigns:
-            return 0.0
-        
-        completed = [c for c in campaigns if c.status == 'completed']
-        if not completed:
-            return 0.0
-        
         # Consider a campaign successful if it sent at least 80% of planned messages
-        successful = 0
-        for campaign in completed:
-            if hasattr(campaign, 'messages_sent') and hasattr(campaign, 'total_contacts'):
-                if campaign.total_contacts > 0:
-                    rate = campaign.messages_sent / campaign.total_contacts
-                    if rate >= 0.8:
-                        successful += 1
+        completed, successful = self.db.query(
+            func.count(Campaign.id),
+            func.sum(case((and_(
+                Campaign.total_rows > 0,
+                Campaign.success_count >= Campaign.total_rows * 0.8
+            ), 1), else_=0))
+        ).filter(
+            Campaign.user_id == user_id,
+            Campaign.status == 'completed'
+        ).one()
         
-        return round((successful / len(completed)) * 100, 2) if completed else 0.0
+        return round(((successful or 0) / completed) * 100, 2) if completed else 0.0
     
     def _get_contacts_imported_today(self, user_id: str) -> int:
         """Get number of contacts imported today"""
@@ -241,26 +241,23 @@ class UserAnalytics:
         """Get number of messages sent today"""
         today_start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
         
-        activities = self.db.query(UserSessionActivity).filter(
+        return self.db.query(UserSessionActivity).filter(
             and_(
                 UserSessionActivity.user_id == user_id,
                 UserSessionActivity.activity_type == 'send_message',
                 UserSessionActivity.created_at >= today_start
             )
-        ).all()
-        
-        return len(activities)
+        ).count()
     
-    def _calculate_daily_distribution(self, campaigns: List, start_date: datetime) -> List[Dict]:
+    def _calculate_daily_distribution(self, period_filter, start_date: datetime) -> List[Dict]:
         """Calculate daily distribution of campaigns"""
-        distribution = {}
-        
-        for campaign in campaigns:
-            if campaign.created_at:
-                date_key = campaign.created_at.date().isoformat()
-                if date_key not in distribution:
-                    distribution[date_key] = 0
-                distribution[date_key] += 1
+        day = func.date(Campaign.created_at)
+        distribution = {
+            str(date_key): count
+            for date_key, count in self.db.query(day, func.count(Campaign.id)).filter(
+                period_filter, Campaign.created_at.isnot(None)
+            ).group_by(day).all()
+        }
         
         # Fill in missing dates
         current_date = start_date.date()
@@ -277,13 +274,10 @@ class UserAnalytics:
         
         return result
     
-    def _calculate_average_messages(self, campaigns: List) -> float:
+    def _calculate_average_messages(self, period_filter) -> float:
         """Calculate average messages per campaign"""
-        if not campaigns:
-            return 0.0
-        
-        total_messages = sum(
-            getattr(c, 'messages_sent', 0) for c in campaigns
-        )
+        average = self.db.query(
+            func.avg(func.coalesce(Campaign.success_count, 0))
+        ).filter(period_filter).scalar()
         
-        return round(total_messages / len(campaigns), 2) if campaigns else 0.0
\ No newline at end of file
+        return round(average, 2) if average else 0.0
@@ -5,6 +5,7 @@ User Metrics API - Proper implementation with admin support
 from fastapi import APIRouter, Query, HTTPException
 from typing import Optional, Dict
 from datetime import datetime, timedelta
+from sqlalchemy import func
 from database.connection import get_db
 from database.models import Campaign, Delivery
 from warmer.models import WarmerSession, WarmerConversation, MessageType
@@ -37,18 +38,23 @@ async def get_campaign_metrics(user_id: str = Query(..., description="User ID or
             
             # Get message metrics from UserMetrics table (persists even after campaign deletion)
             if user_id == "admin":
-                # Get metrics for ALL users
-                all_user_metrics = db.query(UserMetrics).all()
-                
-                # Sum up all user metrics
-                total_messages_sent = sum(m.total_messages_sent for m in all_user_metrics)
-                total_messages_delivered = sum(m.total_messages_delivered for m in all_user_metrics)
-                total_messages_read = sum(m.total_messages_read for m in all_user_metrics)
-                total_messages_responded = sum(m.total_messages_responded for m in all_user_metrics)
-                total_messages_failed = sum(m.total_messages_failed for m in all_user_metrics)
+                # Sum up all user metrics in SQL
+                totals = db.query(
+                    func.sum(UserMetrics.total_messages_sent),
+                    func.sum(UserMetrics.total_messages_delivered),
+                    func.sum(UserMetrics.total_messages_read),
+                    func.sum(UserMetrics.total_messages_responded),
+                    func.sum(UserMetrics.total_messages_failed)
+                ).one()
+
+                total_messages_sent = totals[0] or 0
+                total_messages_delivered = totals[1] or 0
+                total_messages_read = totals[2] or 0
+                total_messages_responded = totals[3] or 0
+                total_messages_failed = totals[4] or 0
                 
-                # Get ALL campaigns from ALL users for campaign counts
-                all_campaigns = db.query(Campaign).all()
+                # Campaign counts across ALL users
+                campaign_query = db.query(Campaign.status, func.count(Campaign.id))
             else:
                 # Get metrics for specific user from UserMetrics
                 user_metrics = UserMetrics.get_or_create(db, user_id)
@@ -59,13 +65,13 @@ async def get_campaign_metrics(user_id: str = Query(..., description="User ID or
                 total_messages_responded = user_metrics.total_messages_responded
                 total_messages_failed = user_metrics.total_messages_failed
                 
-                # Get campaigns for specific user
-                all_campaigns = db.query(Campaign).filter(
+                # Campaign counts for specific user
+                campaign_query = db.query(Campaign.status, func.count(Campaign.id)).filter(
                     Campaign.user_id == user_id
-                ).all()
+                )
             
-            # Count active campaigns (running status)
-            active_campaigns = [c for c in all_campaigns if c.status == 'running']
+            # Campaigns per status (running ones are active)
+            campaigns_by_status = dict(campaign_query.group_by(Campaign.status).all())
             
             # Calculate response rate
             avg_response_rate = 0.0
@@ -81,8 +87,8 @@ async def get_campaign_metrics(user_id: str = Query(..., description="User ID or
                 "user_context": user_id,
                 "is_admin": user_id == "admin",
                 "metrics": {
-                    "total_campaigns_created": len(all_campaigns),
-                    "total_active_campaigns": len(active_campaigns),
+                    "total_campaigns_created": sum(campaigns_by_status.values()),
+                    "total_active_campaigns": campaigns_by_status.get('running', 0),
                     "total_messages_sent": total_messages_sent,
                     "total_messages_delivered": total_messages_delivered,
                     "total_messages_read": total_messages_read,
@@ -113,35 +119,24 @@ async def get_warmer_metrics(user_id: str = Query(..., description="User ID or '
     """
     try:
         with get_db() as db:
-            # Build query based on user_id
-            if user_id == "admin":
-                # Get ALL warmer sessions from ALL users
-                warmer_sessions = db.query(WarmerSession).all()
-            else:
-                # Get warmer sessions for specific user
-                warmer_sessions = db.query(WarmerSession).filter(
-                    WarmerSession.user_id == user_id
-                ).all()
-            
-            # Calculate total warmer minutes from database
-            total_minutes = 0.0
-            for session in warmer_sessions:
-                if hasattr(session, 'total_duration_minutes') and session.total_duration_minutes:
-                    total_minutes += session.total_duration_minutes
+            # Build filters based on user_id (admin sees ALL warmer sessions from ALL users)
+            warmer_filters = [] if user_id == "admin" else [WarmerSession.user_id == user_id]
             
-            # Get warmer conversations for counting messages
-            warmer_ids = [w.id for w in warmer_sessions]
+            # Total warmer minutes, summed in SQL
+            total_minutes = db.query(
+                func.sum(WarmerSession.total_duration_minutes)
+            ).filter(*warmer_filters).scalar() or 0.0
             
-            if warmer_ids:
-                conversations = db.query(WarmerConversation).filter(
-                    WarmerConversation.warmer_session_id.in_(warmer_ids)
-                ).all()
-            else:
-                conversations = []
+            # Count message types with one grouped query
+            messages_by_type = dict(db.query(
+                WarmerConversation.message_type,
+                func.count(WarmerConversation.id)
+            ).join(
+                WarmerSession, WarmerConversation.warmer_session_id == WarmerSession.id
+            ).filter(*warmer_filters).group_by(WarmerConversation.message_type).all())
             
-            # Count message types from database
-            total_group_messages = len([c for c in conversations if c.message_type == MessageType.GROUP])
-            total_dm_messages = len([c for c in conversations if c.message_type == MessageType.DIRECT])
+            total_group_messages = messages_by_type.get(MessageType.GROUP.value, 0)
+            total_dm_messages = messages_by_type.get(MessageType.DIRECT.value, 0)
             
             return {
                 "user_context": user_id,
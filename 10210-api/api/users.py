@@ -9,6 +9,7 @@ import logging
 from datetime import datetime, timedelta
 from database.connection import get_db
 from database.subscription_models import UserSubscription, PlanType, SubscriptionStatus
+from quota_ledger import quota_ledger
 
 logger = logging.getLogger(__name__)
 
@@ -300,6 +301,7 @@ async def track_resource_usage(
                 raise HTTPException(status_code=400, detail="Invalid resource type")
             
             db.commit()
+            quota_ledger.invalidate(user_id)
             
             return {
                 "success": True,
@@ -424,6 +426,7 @@ async def handle_payment_success(request: PaymentSuccessRequest):
                     subscription.next_billing_date = datetime.utcnow() + timedelta(days=30)
                     
                     db.commit()
+                    quota_ledger.invalidate(request.user_id)
                     
                     logger.info(f"Successfully updated user {request.user_id} from {old_plan.value if old_plan else 'new'} to {request.plan_type}")
                     
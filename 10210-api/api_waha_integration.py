@@ -24,7 +24,7 @@ async def create_session(
 ):
     """Create a new WhatsApp session with automatic instance assignment"""
     try:
-        result = waha_session_manager.create_session(user_id, session_name, config)
+        result = await waha_session_manager.create_session(user_id, session_name, config)
         return {
             "success": True,
             "session_name": session_name,
@@ -43,7 +43,7 @@ async def send_text_message(
 ):
     """Send text message using the correct WAHA instance"""
     try:
-        result = waha_session_manager.send_text(user_id, session_name, chat_id, text)
+        result = await waha_session_manager.send_text(user_id, session_name, chat_id, text)
         return {
             "success": True,
             "result": result
@@ -59,7 +59,7 @@ async def get_session_info(
 ):
     """Get session info from the correct WAHA instance"""
     try:
-        result = waha_session_manager.get_session_info(user_id, session_name)
+        result = await waha_session_manager.get_session_info(user_id, session_name)
         return {
             "success": True,
             "session": result
@@ -75,7 +75,7 @@ async def delete_session(
 ):
     """Delete session from WAHA and database"""
     try:
-        waha_session_manager.delete_session(user_id, session_name)
+        await waha_session_manager.delete_session(user_id, session_name)
         return {
             "success": True,
             "message": f"Session {session_name} deleted"
@@ -106,7 +106,7 @@ async def get_free_user_stats():
 async def trigger_free_user_cleanup():
     """Manually trigger cleanup of inactive free user sessions"""
     try:
-        free_session_manager.cleanup_inactive_sessions()
+        await free_session_manager.cleanup_inactive_sessions()
         return {
             "success": True,
             "message": "Cleanup triggered"
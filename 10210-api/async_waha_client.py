@@ -0,0 +1,784 @@
+"""
+Async WAHA client with pooled keep-alive connections
+Same method surface as waha_functions.WAHAClient, but non-blocking and sharing
+one aiohttp connection pool per WAHA base URL
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import AsyncIterator, Callable, List, Dict, Optional, Any
+
+import aiohttp
+import requests
+
+from waha_functions import WAHAClient
+from waha_webhooks import session_config
+
+logger = logging.getLogger(__name__)
+
+# Pool settings (per WAHA base URL)
+WAHA_TIMEOUT = float(os.getenv("WAHA_TIMEOUT", "30"))
+WAHA_CONNECT_TIMEOUT = float(os.getenv("WAHA_CONNECT_TIMEOUT", "10"))
+WAHA_MAX_CONNECTIONS = int(os.getenv("WAHA_MAX_CONNECTIONS", "100"))
+WAHA_MAX_CONNECTIONS_PER_HOST = int(os.getenv("WAHA_MAX_CONNECTIONS_PER_HOST", "20"))
+WAHA_KEEPALIVE_TIMEOUT = float(os.getenv("WAHA_KEEPALIVE_TIMEOUT", "30"))
+
+# Group participant enrichment (per WAHA base URL)
+WAHA_ENRICH_CONCURRENCY = int(os.getenv("WAHA_ENRICH_CONCURRENCY", "10"))
+WAHA_ENRICH_TIMEOUT = float(os.getenv("WAHA_ENRICH_TIMEOUT", "10"))
+
+
+class AsyncWAHAResponse:
+    """Fully read WAHA response, mirroring the parts of requests.Response callers use"""
+
+    def __init__(self, status_code: int, headers: Dict[str, str], content: bytes, url: str):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.url = url
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+
+class AsyncWAHAClient:
+    """Non-blocking WAHA client; use get_async_waha_client() to share the pool"""
+
+    def __init__(self, base_url: str = None, api_key: Optional[str] = None):
+        if base_url is None:
+            base_url = os.getenv("WAHA_BASE_URL", "http://localhost:4500")
+        self.base_url = base_url.rstrip('/')
+        self.headers = {"X-API-KEY": api_key} if api_key else {}
+        self.headers["Content-Type"] = "application/json"
+
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop = None
+        self._enrich_semaphore: Optional[asyncio.Semaphore] = None
+        self._enrich_loop = None
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Get or create the pooled HTTP session for this base URL"""
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            connector = aiohttp.TCPConnector(
+                limit=WAHA_MAX_CONNECTIONS,
+                limit_per_host=WAHA_MAX_CONNECTIONS_PER_HOST,
+                keepalive_timeout=WAHA_KEEPALIVE_TIMEOUT
+            )
+            timeout = aiohttp.ClientTimeout(total=WAHA_TIMEOUT, connect=WAHA_CONNECT_TIMEOUT)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout, headers=self.headers)
+            self._session_loop = loop
+            logger.info(f"Opened pooled WAHA connection pool for {self.base_url}")
+        return self._session
+
+    async def _make_request(self, method: str, endpoint: str, **kwargs) -> AsyncWAHAResponse:
+        """Make HTTP request with error handling.
+
+        Errors are raised as requests exceptions so existing handlers
+        (``except requests.exceptions.RequestException``, ``"404" in str(e)``) keep working.
+        """
+        url = f"{self.base_url}{endpoint}"
+        try:
+            session = await self._get_session()
+            async with session.request(method, url, **kwargs) as response:
+                content = await response.read()
+                result = AsyncWAHAResponse(
+                    response.status, requests.structures.CaseInsensitiveDict(response.headers), content, url
+                )
+
+            if result.status_code >= 400:
+                kind = "Client" if result.status_code < 500 else "Server"
+                raise requests.exceptions.HTTPError(
+                    f"{result.status_code} {kind} Error: {response.reason} for url: {url}"
+                )
+            return result
+        except requests.exceptions.RequestException as e:
+            logger.error(f"API request failed: {method} {url} - {str(e)}")
+            raise
+        except asyncio.TimeoutError:
+            logger.error(f"API request failed: {method} {url} - timed out")
+            raise requests.exceptions.Timeout(f"Request timed out: {method} {url}")
+        except aiohttp.ClientError as e:
+            logger.error(f"API request failed: {method} {url} - {str(e)}")
+            raise requests.exceptions.ConnectionError(str(e))
+
+    def _get_enrich_semaphore(self) -> asyncio.Semaphore:
+        """Limit on concurrent per-participant lookups against this WAHA instance"""
+        loop = asyncio.get_running_loop()
+        if self._enrich_semaphore is None or self._enrich_loop is not loop:
+            self._enrich_semaphore = asyncio.Semaphore(WAHA_ENRICH_CONCURRENCY)
+            self._enrich_loop = loop
+        return self._enrich_semaphore
+
+    async def close(self):
+        """Close the pooled HTTP session"""
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    # ==================== SESSION MANAGEMENT ====================
+
+    async def get_sessions(self) -> List[Dict]:
+        """Get all active WhatsApp sessions"""
+        response = await self._make_request("GET", "/api/sessions")
+        return response.json()
+
+    async def create_session(self, session_name: str, config: Optional[Dict] = None) -> Dict:
+        """Create new WhatsApp session"""
+        config = session_config(self.base_url, config)
+
+        payload = {
+            "name": session_name,
+            "config": config
+        }
+        response = await self._make_request("POST", "/api/sessions", json=payload)
+        return response.json()
+
+    async def get_session_info(self, session_name: str) -> Dict:
+        """Get session information"""
+        response = await self._make_request("GET", f"/api/sessions/{session_name}")
+        return response.json()
+
+    async def start_session(self, session_name: str) -> Dict:
+        """Start session"""
+        response = await self._make_request("POST", f"/api/sessions/{session_name}/start")
+        return response.json()
+
+    async def stop_session(self, session_name: str) -> Dict:
+        """Stop session"""
+        response = await self._make_request("POST", f"/api/sessions/{session_name}/stop")
+        return response.json()
+
+    async def restart_session(self, session_name: str) -> Dict:
+        """Restart session"""
+        response = await self._make_request("POST", f"/api/sessions/{session_name}/restart")
+        return response.json()
+
+    async def logout_session(self, session_name: str) -> Dict:
+        """Logout session"""
+        response = await self._make_request("POST", f"/api/sessions/{session_name}/logout")
+        return response.json()
+
+    async def delete_session(self, session_name: str) -> Dict:
+        """Delete session"""
+        response = await self._make_request("DELETE", f"/api/sessions/{session_name}")
+        try:
+            return response.json()
+        except:
+            return {"status": "deleted"}
+
+    # ==================== AUTHENTICATION ====================
+
+    async def get_qr_code(self, session_name: str, max_wait_seconds: int = 60) -> bytes:
+        """Get QR code for session authentication, starting the session and waiting for QR-ready state if needed"""
+
+        async def get_session_status_internal():
+            try:
+                response = await self._make_request("GET", f"/api/sessions/{session_name}")
+                session_info = response.json()
+                status = session_info.get('status', 'UNKNOWN')
+                logger.info(f"Session {session_name} status: {status}")
+                return status
+            except requests.exceptions.RequestException as e:
+                if "404" in str(e):
+                    logger.info(f"Session {session_name} doesn't exist")
+                    return "NOT_EXISTS"
+                raise
+
+        async def wait_for_qr_ready_state_internal():
+            logger.info(f"Waiting for session {session_name} to be ready for QR code...")
+            start_time = time.monotonic()
+            while time.monotonic() - start_time < max_wait_seconds:
+                status = await get_session_status_internal()
+                if status == "SCAN_QR_CODE":
+                    logger.info(f"Session {session_name} is ready for QR code!")
+                    return
+                if status not in ["STARTING", "WORKING"]:
+                    logger.warning(f"Session {session_name} in unexpected state: {status}")
+                await asyncio.sleep(2)
+
+            raise requests.exceptions.RequestException(f"Session did not reach QR-ready state within {max_wait_seconds} seconds")
+
+        try:
+            logger.info(f"Getting QR code for session '{session_name}'...")
+            status = await get_session_status_internal()
+
+            if status == "SCAN_QR_CODE":
+                logger.info("Session already in QR scan mode!")
+            elif status == "STARTING":
+                await wait_for_qr_ready_state_internal()
+            elif status == "NOT_EXISTS":
+                logger.error(f"Session {session_name} doesn't exist! Cannot get QR code for non-existent session.")
+                raise ValueError(f"Session {session_name} not found. Please create the session first.")
+            else:
+                logger.info(f"Session is {status}, starting session...")
+                await self._make_request("POST", f"/api/sessions/{session_name}/start")
+                await wait_for_qr_ready_state_internal()
+
+            response = await self._make_request("GET", f"/api/{session_name}/auth/qr?format=image")
+            if response.headers.get('content-type') != 'image/png':
+                logger.warning(f"Unexpected content type: {response.headers.get('content-type')}")
+
+            logger.info(f"QR code fetched successfully ({len(response.content)} bytes)")
+            return response.content
+
+        except Exception as e:
+            logger.error(f"Failed to get QR code: {e}")
+            raise
+
+    async def request_auth_code(self, session_name: str, phone_number: str) -> Dict:
+        """Request authentication code via SMS"""
+        payload = {"phoneNumber": phone_number}
+        response = await self._make_request("POST", f"/api/{session_name}/auth/request-code", json=payload)
+        return response.json()
+
+    # ==================== MESSAGING ====================
+
+    async def send_text(self, session: str, chat_id: str, text: str) -> Dict:
+        """Send text message"""
+        payload = {
+            "chatId": chat_id,
+            "text": text,
+            "session": session
+        }
+        response = await self._make_request("POST", "/api/sendText", json=payload)
+        return response.json()
+
+    async def send_image(self, session: str, chat_id: str, file_data: Dict, caption: str = "") -> Dict:
+        """Send image message"""
+        payload = {
+            "chatId": chat_id,
+            "file": file_data,
+            "caption": caption,
+            "session": session
+        }
+        response = await self._make_request("POST", "/api/sendImage", json=payload)
+        return response.json()
+
+    async def send_file(self, session: str, chat_id: str, file_data: Dict) -> Dict:
+        """Send file"""
+        payload = {
+            "chatId": chat_id,
+            "file": file_data,
+            "session": session
+        }
+        response = await self._make_request("POST", "/api/sendFile", json=payload)
+        return response.json()
+
+    async def send_voice(self, session: str, chat_id: str, file_data: Dict) -> Dict:
+        """Send voice message"""
+        payload = {
+            "chatId": chat_id,
+            "file": file_data,
+            "session": session
+        }
+        response = await self._make_request("POST", "/api/sendVoice", json=payload)
+        return response.json()
+
+    async def send_video(self, session: str, chat_id: str, file_data: Dict, caption: str = "") -> Dict:
+        """Send video message"""
+        payload = {
+            "chatId": chat_id,
+            "file": file_data,
+            "caption": caption,
+            "session": session
+        }
+        response = await self._make_request("POST", "/api/sendVideo", json=payload)
+        return response.json()
+
+    async def send_location(self, session: str, chat_id: str, latitude: float, longitude: float, title: str = "") -> Dict:
+        """Send location"""
+        payload = {
+            "chatId": chat_id,
+            "latitude": latitude,
+            "longitude": longitude,
+            "title": title,
+            "session": session
+        }
+        response = await self._make_request("POST", "/api/sendLocation", json=payload)
+        return response.json()
+
+    async def send_contact_vcard(self, session: str, chat_id: str, contact_data: Dict) -> Dict:
+        """Send contact VCard"""
+        payload = {
+            "chatId": chat_id,
+            "session": session,
+            **contact_data
+        }
+        response = await self._make_request("POST", "/api/sendContactVcard", json=payload)
+        return response.json()
+
+    async def mark_as_seen(self, session: str, chat_id: str, message_id: str) -> Dict:
+        """Mark message as seen"""
+        payload = {
+            "chatId": chat_id,
+            "messageId": message_id,
+            "session": session
+        }
+        response = await self._make_request("POST", "/api/sendSeen", json=payload)
+        return response.json()
+
+    async def start_typing(self, session: str, chat_id: str) -> Dict:
+        """Start typing indicator"""
+        payload = {
+            "chatId": chat_id,
+            "session": session
+        }
+        response = await self._make_request("POST", "/api/startTyping", json=payload)
+        return response.json()
+
+    async def stop_typing(self, session: str, chat_id: str) -> Dict:
+        """Stop typing indicator"""
+        payload = {
+            "chatId": chat_id,
+            "session": session
+        }
+        response = await self._make_request("POST", "/api/stopTyping", json=payload)
+        return response.json()
+
+    async def react_to_message(self, session: str, message_id: str, reaction: str) -> Dict:
+        """React to message"""
+        payload = {
+            "messageId": message_id,
+            "reaction": reaction,
+            "session": session
+        }
+        response = await self._make_request("PUT", "/api/reaction", json=payload)
+        return response.json()
+
+    async def star_message(self, session: str, message_id: str, star: bool = True) -> Dict:
+        """Star/unstar message"""
+        payload = {
+            "messageId": message_id,
+            "star": star,
+            "session": session
+        }
+        response = await self._make_request("PUT", "/api/star", json=payload)
+        return response.json()
+
+    # ==================== CHATS ====================
+
+    async def get_chats(self, session: str) -> List[Dict]:
+        """Get all chats"""
+        response = await self._make_request("GET", f"/api/{session}/chats")
+        return response.json()
+
+    async def get_chat_messages(self, session: str, chat_id: str, limit: int = 50) -> List[Dict]:
+        """Get chat messages"""
+        response = await self._make_request("GET", f"/api/{session}/chats/{chat_id}/messages?limit={limit}")
+        return response.json()
+
+    async def delete_chat(self, session: str, chat_id: str) -> Dict:
+        """Delete chat"""
+        response = await self._make_request("DELETE", f"/api/{session}/chats/{chat_id}")
+        return response.json()
+
+    async def mark_chat_as_read(self, session: str, chat_id: str) -> Dict:
+        """Mark chat messages as read"""
+        response = await self._make_request("POST", f"/api/{session}/chats/{chat_id}/messages/read")
+        return response.json()
+
+    async def clear_chat_messages(self, session: str, chat_id: str) -> Dict:
+        """Clear all messages in chat"""
+        response = await self._make_request("DELETE", f"/api/{session}/chats/{chat_id}/messages")
+        return response.json()
+
+    async def archive_chat(self, session: str, chat_id: str) -> Dict:
+        """Archive chat"""
+        response = await self._make_request("POST", f"/api/{session}/chats/{chat_id}/archive")
+        return response.json()
+
+    async def unarchive_chat(self, session: str, chat_id: str) -> Dict:
+        """Unarchive chat"""
+        response = await self._make_request("POST", f"/api/{session}/chats/{chat_id}/unarchive")
+        return response.json()
+
+    # ==================== CONTACTS ====================
+
+    async def get_all_contacts(self, session: str) -> List[Dict]:
+        """Get all contacts"""
+        response = await self._make_request("GET", f"/api/contacts/all?session={session}")
+        return response.json()
+
+    async def create_or_update_contact(self, session: str, chat_id: str, name: str) -> Dict:
+        """Create or update contact"""
+        payload = {
+            "name": name
+        }
+        response = await self._make_request("PUT", f"/api/{session}/contacts/{chat_id}", json=payload)
+        return response.json()
+
+    async def check_number_exists(self, session: str, phone: str) -> Dict:
+        """Check if number exists on WhatsApp"""
+        response = await self._make_request("GET", f"/api/contacts/check-exists?session={session}&phone={phone}")
+        return response.json()
+
+    async def get_contact_info(self, session: str, contact_id: str) -> Dict:
+        """Get contact info"""
+        response = await self._make_request("GET", f"/api/contacts?session={session}&contactId={contact_id}")
+        return response.json()
+
+    async def block_contact(self, session: str, contact_id: str) -> Dict:
+        """Block contact"""
+        payload = {
+            "contactId": contact_id,
+            "session": session
+        }
+        response = await self._make_request("POST", "/api/contacts/block", json=payload)
+        return response.json()
+
+    async def unblock_contact(self, session: str, contact_id: str) -> Dict:
+        """Unblock contact"""
+        payload = {
+            "contactId": contact_id,
+            "session": session
+        }
+        response = await self._make_request("POST", "/api/contacts/unblock", json=payload)
+        return response.json()
+
+    # ==================== GROUPS ====================
+
+    async def get_groups(self, session: str) -> List[Dict]:
+        """Get all groups"""
+        response = await self._make_request("GET", f"/api/{session}/groups")
+        return response.json()
+
+    async def create_group(self, session: str, name: str, participants: List[str]) -> Dict:
+        """Create group"""
+        # Format participants as objects with id field (ensure @c.us suffix)
+        formatted_participants = [{"id": p if "@" in p else f"{p}@c.us"} for p in participants]
+
+        payload = {
+            "name": name,
+            "participants": formatted_participants
+        }
+        logger.info(f"Creating group with payload: {payload}")
+
+        response = await self._make_request("POST", f"/api/{session}/groups", json=payload)
+        return response.json()
+
+    async def get_group_info(self, session: str, group_id: str) -> Dict:
+        """Get group info"""
+        response = await self._make_request("GET", f"/api/{session}/groups/{group_id}")
+        return response.json()
+
+    async def delete_group(self, session: str, group_id: str) -> Dict:
+        """Delete group"""
+        response = await self._make_request("DELETE", f"/api/{session}/groups/{group_id}")
+        return response.json()
+
+    async def leave_group(self, session: str, group_id: str) -> Dict:
+        """Leave group"""
+        response = await self._make_request("POST", f"/api/{session}/groups/{group_id}/leave")
+        return response.json()
+
+    async def join_group_by_link(self, session: str, invite_link: str) -> Dict:
+        """Join group using invite link"""
+        payload = {
+            "code": invite_link
+        }
+        response = await self._make_request("POST", f"/api/{session}/groups/join", json=payload)
+        return response.json()
+
+    async def update_group_description(self, session: str, group_id: str, description: str) -> Dict:
+        """Update group description"""
+        payload = {"description": description}
+        response = await self._make_request("PUT", f"/api/{session}/groups/{group_id}/description", json=payload)
+        return response.json()
+
+    async def update_group_name(self, session: str, group_id: str, name: str) -> Dict:
+        """Update group name"""
+        payload = {"subject": name}
+        response = await self._make_request("PUT", f"/api/{session}/groups/{group_id}/subject", json=payload)
+        return response.json()
+
+    async def add_group_participants(self, session: str, group_id: str, participants: List[str]) -> Dict:
+        """Add participants to group"""
+        payload = {"participants": participants}
+        response = await self._make_request("POST", f"/api/{session}/groups/{group_id}/participants/add", json=payload)
+        return response.json()
+
+    async def remove_group_participants(self, session: str, group_id: str, participants: List[str]) -> Dict:
+        """Remove participants from group"""
+        payload = {"participants": participants}
+        response = await self._make_request("POST", f"/api/{session}/groups/{group_id}/participants/remove", json=payload)
+        return response.json()
+
+    async def promote_group_admin(self, session: str, group_id: str, participants: List[str]) -> Dict:
+        """Promote participants to admin"""
+        payload = {"participants": participants}
+        response = await self._make_request("POST", f"/api/{session}/groups/{group_id}/admin/promote", json=payload)
+        return response.json()
+
+    async def demote_group_admin(self, session: str, group_id: str, participants: List[str]) -> Dict:
+        """Demote admin participants"""
+        payload = {"participants": participants}
+        response = await self._make_request("POST", f"/api/{session}/groups/{group_id}/admin/demote", json=payload)
+        return response.json()
+
+    # ==================== PRESENCE ====================
+
+    async def set_presence(self, session: str, presence: str, chat_id: Optional[str] = None) -> Dict:
+        """Set presence status"""
+        payload = {
+            "presence": presence,  # available, unavailable, composing, recording
+            "session": session
+        }
+        if chat_id:
+            payload["chatId"] = chat_id
+        response = await self._make_request("POST", f"/api/{session}/presence", json=payload)
+        return response.json()
+
+    async def get_presence(self, session: str, chat_id: str) -> Dict:
+        """Get presence status"""
+        response = await self._make_request("GET", f"/api/{session}/presence/{chat_id}")
+        return response.json()
+
+    # ==================== STATUS (STORIES) ====================
+
+    async def send_text_status(self, session: str, text: str, background_color: str = "#000000") -> Dict:
+        """Send text status"""
+        payload = {
+            "text": text,
+            "backgroundColor": background_color
+        }
+        response = await self._make_request("POST", f"/api/{session}/status/text", json=payload)
+        return response.json()
+
+    async def send_image_status(self, session: str, file_data: Dict, caption: str = "") -> Dict:
+        """Send image status"""
+        payload = {
+            "file": file_data,
+            "caption": caption
+        }
+        response = await self._make_request("POST", f"/api/{session}/status/image", json=payload)
+        return response.json()
+
+    async def send_video_status(self, session: str, file_data: Dict, caption: str = "") -> Dict:
+        """Send video status"""
+        payload = {
+            "file": file_data,
+            "caption": caption
+        }
+        response = await self._make_request("POST", f"/api/{session}/status/video", json=payload)
+        return response.json()
+
+    # ==================== SERVER INFO ====================
+
+    async def get_server_version(self) -> Dict:
+        """Get server version"""
+        response = await self._make_request("GET", "/api/server/version")
+        return response.json()
+
+    async def get_server_environment(self) -> Dict:
+        """Get server environment info"""
+        response = await self._make_request("GET", "/api/server/environment")
+        return response.json()
+
+    async def get_server_status(self) -> Dict:
+        """Get server status"""
+        response = await self._make_request("GET", "/api/server/status")
+        return response.json()
+
+    async def ping_server(self) -> str:
+        """Ping server"""
+        response = await self._make_request("GET", "/ping")
+        return response.text
+
+    async def health_check(self) -> Dict:
+        """Health check"""
+        response = await self._make_request("GET", "/health")
+        return response.json()
+
+    # ==================== UTILITY FUNCTIONS ====================
+
+    async def get_screenshot(self, session: str) -> bytes:
+        """Get screenshot"""
+        response = await self._make_request("GET", f"/api/screenshot?session={session}")
+        return response.content
+
+    # Pure helpers are shared with the sync client
+    encode_file_to_base64 = WAHAClient.encode_file_to_base64
+    _extract_country_code = WAHAClient._extract_country_code
+    _get_country_name = WAHAClient._get_country_name
+    _format_phone_number = WAHAClient._format_phone_number
+
+    # ==================== ENHANCED GROUP FUNCTIONS ====================
+
+    async def get_group_participants_details(
+        self, session: str, group_id: str, include_last_message: bool = True,
+        progress: Optional[Callable[[int, int], None]] = None
+    ) -> List[Dict]:
+        """Get detailed information for all participants in a group (contact info and last message)
+
+        Last-message lookups run concurrently, at most WAHA_ENRICH_CONCURRENCY at a
+        time per WAHA instance; participants keep the group's order.
+        progress(done, total) is called as each participant finishes.
+        """
+        try:
+            participants, all_contacts = await self._load_group_participants(session, group_id)
+            total = len(participants)
+            done = 0
+
+            async def details(participant: Dict) -> Optional[Dict]:
+                nonlocal done
+                result = await self._participant_details(session, participant, all_contacts, include_last_message)
+                done += 1
+                if progress:
+                    progress(done, total)
+                return result
+
+            results = await asyncio.gather(*(details(participant) for participant in participants))
+            return [participant for participant in results if participant]
+
+        except Exception as e:
+            logger.error(f"Failed to get detailed participants for group {group_id}: {str(e)}")
+            raise
+
+    async def iter_group_participants_details(
+        self, session: str, group_id: str, include_last_message: bool = True
+    ) -> AsyncIterator[Dict]:
+        """Yield detailed participants as soon as each one is enriched (completion order)"""
+        participants, all_contacts = await self._load_group_participants(session, group_id)
+        tasks = [
+            asyncio.create_task(self._participant_details(session, participant, all_contacts, include_last_message))
+            for participant in participants
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                participant = await next_done
+                if participant:
+                    yield participant
+        finally:
+            # The consumer may stop early
+            for task in tasks:
+                task.cancel()
+
+    async def _load_group_participants(self, session: str, group_id: str):
+        """Group participants and the session's contacts by ID (fetched once)"""
+        group_id_clean = group_id if '@g.us' in group_id else f"{group_id}@g.us"
+
+        group_info = await self.get_group_info(session, group_id_clean)
+
+        # Handle WAHA response structure - participants are in groupMetadata.participants
+        if isinstance(group_info, dict) and 'groupMetadata' in group_info:
+            participants = group_info['groupMetadata'].get('participants', [])
+        else:
+            participants = group_info.get('participants', [])
+
+        all_contacts = {}
+
+        # Get all contacts once to avoid multiple API calls (shared session snapshot)
+        try:
+            from session_directory_cache import session_directory_cache
+            for contact in await session_directory_cache.get_contacts(session, self.base_url):
+                contact_id = contact.get('id')
+                if isinstance(contact_id, dict) and '_serialized' in contact_id:
+                    all_contacts[contact_id['_serialized']] = contact
+                elif isinstance(contact_id, str):
+                    all_contacts[contact_id] = contact
+        except Exception as e:
+            logger.warning(f"Could not fetch all contacts: {e}")
+
+        return participants, all_contacts
+
+    async def _participant_details(
+        self, session: str, participant: Dict, all_contacts: Dict[str, Dict], include_last_message: bool
+    ) -> Optional[Dict]:
+        """Build one participant's 16-column record (None if it has no usable ID)"""
+        try:
+            participant_id = None
+            phone_number = None
+
+            if isinstance(participant, dict) and 'id' in participant:
+                if isinstance(participant['id'], dict):
+                    participant_id = participant['id'].get('_serialized', '')
+                    phone_number = participant['id'].get('user', '')
+                elif isinstance(participant['id'], str):
+                    participant_id = participant['id']
+                    phone_number = participant['id'].replace('@c.us', '')
+
+            if not participant_id:
+                return None
+
+            contact_info = all_contacts.get(participant_id, {})
+
+            last_msg_text = ''
+            last_msg_date = ''
+            last_msg_type = ''
+            last_msg_status = ''
+
+            if include_last_message:
+                try:
+                    async with self._get_enrich_semaphore():
+                        chat_messages = await asyncio.wait_for(
+                            self.get_chat_messages(session, participant_id, limit=1), WAHA_ENRICH_TIMEOUT
+                        )
+                    if chat_messages:
+                        last_msg = chat_messages[0]
+                        last_msg_text = last_msg.get('body', '') or '[Media]'
+                        last_msg_date = datetime.fromtimestamp(last_msg.get('timestamp', 0)).strftime('%Y-%m-%d %H:%M:%S') if last_msg.get('timestamp') else ''
+                        last_msg_type = last_msg.get('type', '')
+                        last_msg_status = 'sent' if last_msg.get('fromMe') else 'received'
+                except Exception as e:
+                    logger.debug(f"Could not get messages for {participant_id}: {e}")
+
+            labels = contact_info.get('labels', [])
+
+            return {
+                'phone_number': phone_number or participant_id.replace('@c.us', ''),
+                'formatted_phone': self._format_phone_number(phone_number) if phone_number else participant_id,
+                'country_code': self._extract_country_code(phone_number) if phone_number else '',
+                'country_name': self._get_country_name(phone_number) if phone_number else 'Unknown',
+                'saved_name': contact_info.get('name', ''),
+                'public_name': contact_info.get('pushname', '') or participant.get('pushname', ''),
+                'is_admin': participant.get('isAdmin', False),
+                'is_super_admin': participant.get('isSuperAdmin', False),
+                'is_my_contact': contact_info.get('isMyContact', False),
+                'is_business': contact_info.get('isBusiness', False),
+                'is_blocked': contact_info.get('isBlocked', False),
+                'labels': ', '.join(labels) if labels else '',
+                'last_msg_text': last_msg_text[:100] if last_msg_text else '',  # Limit to 100 chars
+                'last_msg_date': last_msg_date,
+                'last_msg_type': last_msg_type,
+                'last_msg_status': last_msg_status
+            }
+
+        except Exception as e:
+            logger.warning(f"Error processing participant {participant}: {e}")
+            return None
+
+
+# Shared clients, one pooled client per WAHA base URL
+_async_waha_clients: Dict[str, AsyncWAHAClient] = {}
+
+
+def get_async_waha_client(base_url: str = None) -> AsyncWAHAClient:
+    """Get the shared async WAHA client for a base URL (campaigns, warmers and API handlers share it)"""
+    if base_url is None:
+        base_url = os.getenv("WAHA_BASE_URL", "http://localhost:4500")
+    key = base_url.rstrip('/')
+
+    client = _async_waha_clients.get(key)
+    if client is None:
+        client = AsyncWAHAClient(base_url=key, api_key=os.getenv("WAHA_API_KEY"))
+        _async_waha_clients[key] = client
+    return client
+
+
+async def close_async_waha_clients():
+    """Close all pooled WAHA connections (application shutdown)"""
+    for client in list(_async_waha_clients.values()):
+        try:
+            await client.close()
+        except Exception as e:
+            logger.error(f"Error closing WAHA client {client.base_url}: {str(e)}")
+    _async_waha_clients.clear()
@@ -26,6 +26,7 @@ class SessionMiddleware(BaseHTTPMiddleware):
             "/api/auth/newsletter/subscribe",
             "/api/auth/waitlist/join",
             "/api/payments/webhook",
+            "/api/webhooks/waha",  # signed by WAHA (HMAC), verified in the handler
             "/docs",
             "/openapi.json",
             "/swagger.yaml",
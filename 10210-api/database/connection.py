@@ -4,37 +4,86 @@ Database connection and session management
 
 import os
 import logging
+import sqlite3
 from sqlalchemy import create_engine, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import QueuePool
 from contextlib import contextmanager
-from typing import Generator
+from typing import Generator, Optional
 
 logger = logging.getLogger(__name__)
 
 # Database configuration
 DATABASE_DIR = "data"
 DATABASE_FILE = "wagent.db"
-DATABASE_PATH = os.path.join(DATABASE_DIR, DATABASE_FILE)
+DATABASE_PATH = os.getenv("DATABASE_PATH", os.path.join(DATABASE_DIR, DATABASE_FILE))
 DATABASE_URL = f"sqlite:///{DATABASE_PATH}"
 
+# SQLite tuning (applied to every connection, ORM and raw)
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "30000"))
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+# Connection pool
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+
 # SQLAlchemy setup
 engine = None
 SessionLocal = None
 Base = declarative_base()
 
+def apply_sqlite_pragmas(connection: sqlite3.Connection):
+    """WAL journaling plus the per-connection tuning pragmas"""
+    cursor = connection.cursor()
+    try:
+        # WAL lets readers run alongside the single writer (persisted in the file once set)
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+    finally:
+        cursor.close()
+
+def connect_sqlite(db_path: str = DATABASE_PATH) -> sqlite3.Connection:
+    """Open a tuned SQLite connection (the one factory behind the ORM pool and raw SQL)"""
+    directory = os.path.dirname(db_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    connection = sqlite3.connect(
+        db_path,
+        timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+        check_same_thread=False  # pooled connections move between threads
+    )
+    apply_sqlite_pragmas(connection)
+    return connection
+
 def init_database():
     """Initialize database connection and create tables"""
     global engine, SessionLocal
     
     try:
+        # Resolve the file now so pooled connections opened later do not
+        # follow a changed working directory
+        db_path = os.path.abspath(DATABASE_PATH)
+        
         # Create data directory if it doesn't exist
-        os.makedirs(DATABASE_DIR, exist_ok=True)
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
         
-        # Create SQLite engine
+        # Create SQLite engine on a pool of tuned connections
         engine = create_engine(
-            DATABASE_URL,
-            connect_args={"check_same_thread": False},  # SQLite specific
+            f"sqlite:///{db_path}",
+            creator=lambda: connect_sqlite(db_path),
+            poolclass=QueuePool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_pre_ping=True,
             echo=False  # Set to True for SQL debugging
         )
         
@@ -62,6 +111,23 @@ def get_session() -> Session:
         init_database()
     return SessionLocal()
 
+def get_raw_connection(db_path: Optional[str] = None):
+    """DB-API connection for raw-SQL modules, borrowed from the engine's pool.
+
+    close() hands it back to the pool. A different database file gets a
+    tuned standalone connection instead.
+    """
+    if engine is None:
+        init_database()
+    # Compare with the file the engine is bound to, not the current directory
+    bound_path = engine.url.database if engine is not None else os.path.abspath(DATABASE_PATH)
+    if db_path and os.path.abspath(db_path) != bound_path:
+        return connect_sqlite(db_path)
+    if engine is None:
+        # Engine could not be created; still hand out a tuned connection
+        return connect_sqlite(DATABASE_PATH)
+    return engine.raw_connection()
+
 @contextmanager
 def get_db() -> Generator[Session, None, None]:
     """Database session context manager"""
@@ -80,6 +80,30 @@ class DatabaseMigration:
                 "name": "add_subscription_tables",
                 "description": "Add subscription and payment tables",
                 "sql": self._migration_010_subscription_tables()
+            },
+            {
+                "version": "011",
+                "name": "add_campaign_cursor",
+                "description": "Add resume cursor fields to campaigns",
+                "sql": self._migration_011_campaign_cursor()
+            },
+            {
+                "version": "012",
+                "name": "add_session_fanout",
+                "description": "Add multi-session fan-out to campaigns and the sending session to deliveries",
+                "sql": self._migration_012_session_fanout()
+            },
+            {
+                "version": "013",
+                "name": "add_session_send_counts",
+                "description": "Store per-session daily send counts for the rate limiter",
+                "sql": self._migration_013_session_send_counts()
+            },
+            {
+                "version": "014",
+                "name": "add_analytics_indexes",
+                "description": "Add covering indexes for SQL-aggregated campaign and warmer analytics",
+                "sql": self._migration_014_analytics_indexes()
             }
         ]
     
@@ -396,6 +420,45 @@ class DatabaseMigration:
         CREATE INDEX IF NOT EXISTS idx_webhook_events_processed ON webhook_events(processed);
         """
     
+    def _migration_011_campaign_cursor(self) -> str:
+        """Migration 011: Add resume cursor fields to campaigns"""
+        return """
+        -- Last row with a durable delivery record and rows whose send outcome is unknown
+        ALTER TABLE campaigns ADD COLUMN cursor_row INTEGER DEFAULT 0;
+        ALTER TABLE campaigns ADD COLUMN cursor_in_flight TEXT;
+        """
+    
+    def _migration_012_session_fanout(self) -> str:
+        """Migration 012: Add multi-session fan-out"""
+        return """
+        -- Sessions a campaign deals its rows across, and the session each delivery went out on
+        ALTER TABLE campaigns ADD COLUMN fanout_sessions TEXT;
+        ALTER TABLE deliveries ADD COLUMN session_name VARCHAR(100);
+        
+        CREATE INDEX IF NOT EXISTS idx_deliveries_session ON deliveries(session_name);
+        """
+    
+    def _migration_013_session_send_counts(self) -> str:
+        """Migration 013: Create the session_send_counts table"""
+        return """
+        CREATE TABLE IF NOT EXISTS session_send_counts (
+            session_name VARCHAR(100) NOT NULL,
+            day VARCHAR(10) NOT NULL,
+            sent INTEGER NOT NULL DEFAULT 0,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (session_name, day)
+        );
+        """
+    
+    def _migration_014_analytics_indexes(self) -> str:
+        """Migration 014: Add covering indexes for analytics aggregates"""
+        return """
+        -- Delivery totals per campaign and status (with read/response sums) come from the index alone
+        CREATE INDEX IF NOT EXISTS idx_deliveries_campaign_status ON deliveries(campaign_id, status, read_at, response_received);
+        CREATE INDEX IF NOT EXISTS idx_campaigns_user_created ON campaigns(user_id, created_at, status);
+        CREATE INDEX IF NOT EXISTS idx_warmer_conversations_session_type ON warmer_conversations(warmer_session_id, message_type);
+        """
+    
     def get_current_version(self) -> str:
         """Get current database schema version"""
         try:
@@ -4,7 +4,7 @@ SQLAlchemy ORM models for campaign management
 
 import json
 from datetime import datetime, timedelta
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, Float, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.hybrid import hybrid_property
 from .connection import Base
@@ -25,6 +25,10 @@ except ImportError:
 class Campaign(Base):
     """Campaign model for managing bulk message campaigns"""
     __tablename__ = "campaigns"
+    __table_args__ = (
+        # Per-user campaign analytics (migration 014)
+        Index("idx_campaigns_user_created", "user_id", "created_at", "status"),
+    )
     
     # Primary key
     id = Column(Integer, primary_key=True, index=True)
@@ -33,6 +37,7 @@ class Campaign(Base):
     name = Column(String(255), nullable=False, index=True)
     session_name = Column(String(100), nullable=False)  # Display name for UI
     waha_session_name = Column(String(100))  # Actual WAHA session name (UUID)
+    _fanout_sessions = Column("fanout_sessions", Text)  # JSON array of WAHA session names to deal rows across
     user_id = Column(String(255), index=True)  # Associated user ID for tracking
     status = Column(String(50), default="created", index=True)  # created, running, paused, completed, failed
     
@@ -70,6 +75,10 @@ class Campaign(Base):
     error_count = Column(Integer, default=0)
     error_details = Column(Text)  # Store detailed error messages
     
+    # Resume cursor (written in the same transaction as delivery records)
+    cursor_row = Column(Integer, default=0)  # Every row up to here has a durable delivery record
+    cursor_in_flight = Column(Text)  # JSON list of rows handed to the sender whose outcome is not yet durable
+    
     # Timestamps
     created_at = Column(DateTime, default=datetime.utcnow)
     started_at = Column(DateTime)
@@ -116,6 +125,42 @@ class Campaign(Base):
         else:
             self._message_samples = None
     
+    @hybrid_property
+    def fanout_sessions(self) -> List[str]:
+        """Get fan-out WAHA session names as list"""
+        if self._fanout_sessions:
+            try:
+                return json.loads(self._fanout_sessions)
+            except (json.JSONDecodeError, TypeError):
+                return []
+        return []
+    
+    @fanout_sessions.setter
+    def fanout_sessions(self, value: List[str]):
+        """Set fan-out WAHA session names from list"""
+        if value:
+            self._fanout_sessions = json.dumps(value)
+        else:
+            self._fanout_sessions = None
+    
+    @hybrid_property
+    def cursor_in_flight_rows(self) -> List[int]:
+        """Get in-flight cursor rows as list"""
+        if self.cursor_in_flight:
+            try:
+                return json.loads(self.cursor_in_flight)
+            except (json.JSONDecodeError, TypeError):
+                return []
+        return []
+    
+    @cursor_in_flight_rows.setter
+    def cursor_in_flight_rows(self, value: List[int]):
+        """Set in-flight cursor rows from list"""
+        if value:
+            self.cursor_in_flight = json.dumps(sorted(value))
+        else:
+            self.cursor_in_flight = None
+    
     @property
     def progress_percentage(self) -> float:
         """Calculate progress percentage"""
@@ -153,6 +198,7 @@ class Campaign(Base):
             "id": self.id,
             "name": self.name,
             "session_name": self.session_name,
+            "fanout_sessions": self.fanout_sessions,
             "status": self.status,
             "file_path": self.file_path,
             "column_mapping": self.column_mapping_dict,
@@ -176,6 +222,7 @@ class Campaign(Base):
             "progress_percentage": self.progress_percentage,
             "success_rate": self.success_rate,
             "error_details": self.error_details,
+            "cursor_row": self.cursor_row,
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "started_at": self.started_at.isoformat() if self.started_at else None,
             "completed_at": self.completed_at.isoformat() if self.completed_at else None,
@@ -185,6 +232,11 @@ class Campaign(Base):
 class Delivery(Base):
     """Delivery model for tracking individual message deliveries"""
     __tablename__ = "deliveries"
+    __table_args__ = (
+        Index("idx_deliveries_session", "session_name"),  # migration 012
+        # Covers the per-campaign status/read/response aggregates (migration 014)
+        Index("idx_deliveries_campaign_status", "campaign_id", "status", "read_at", "response_received"),
+    )
     
     # Primary key
     id = Column(Integer, primary_key=True, index=True)
@@ -197,6 +249,9 @@ class Delivery(Base):
     phone_number = Column(String(20), nullable=False, index=True)
     recipient_name = Column(String(255))
     
+    # WAHA session the message went out on
+    session_name = Column(String(100))
+    
     # Sample selection tracking
     selected_sample_index = Column(Integer)
     selected_sample_text = Column(Text)
@@ -252,6 +307,7 @@ class Delivery(Base):
             "row_number": self.row_number,
             "phone_number": self.phone_number,
             "recipient_name": self.recipient_name,
+            "session_name": self.session_name,
             "selected_sample_index": self.selected_sample_index,
             "selected_sample_text": self.selected_sample_text,
             "final_message_content": self.final_message_content,
@@ -331,3 +387,12 @@ class CampaignAnalytics(Base):
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None
         }
+
+class SessionSendCount(Base):
+    """Messages sent per WAHA session per day (campaigns, warmers and the API), for the daily cap"""
+    __tablename__ = "session_send_counts"
+    
+    session_name = Column(String(100), primary_key=True)
+    day = Column(String(10), primary_key=True)  # UTC date, YYYY-MM-DD
+    sent = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
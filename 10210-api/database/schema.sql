@@ -11,6 +11,7 @@ CREATE TABLE IF NOT EXISTS campaigns (
     -- Basic information
     name VARCHAR(255) NOT NULL,
     session_name VARCHAR(100) NOT NULL,
+    fanout_sessions TEXT,                       -- JSON array of WAHA sessions for multi-session campaigns
     status VARCHAR(50) DEFAULT 'created',  -- created, running, paused, completed, failed
     
     -- File information
@@ -40,6 +41,10 @@ CREATE TABLE IF NOT EXISTS campaigns (
     error_count INTEGER DEFAULT 0,
     error_details TEXT,
     
+    -- Resume cursor
+    cursor_row INTEGER DEFAULT 0,
+    cursor_in_flight TEXT,
+    
     -- Timestamps
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     started_at TIMESTAMP,
@@ -58,6 +63,7 @@ CREATE TABLE IF NOT EXISTS deliveries (
     -- Contact information
     phone_number VARCHAR(20) NOT NULL,
     recipient_name VARCHAR(255),
+    session_name VARCHAR(100),                  -- WAHA session the message went out on
     
     -- Sample selection tracking
     selected_sample_index INTEGER,
@@ -160,6 +160,10 @@ class UserSubscription(Base):
         self.max_contacts_export = limits[2]
         self.max_campaigns = limits[3]
         self.warmer_duration_hours = limits[4]
+        
+        # Cached limits in the quota ledger are out of date now
+        from quota_ledger import quota_ledger
+        quota_ledger.invalidate(self.user_id)
 
 class Payment(Base):
     """Payment transaction model"""
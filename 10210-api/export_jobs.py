@@ -0,0 +1,227 @@
+"""
+Export Jobs - run contact/group exports off the request path
+A submit returns a job id at once; a small worker pool runs the export, pushes
+progress to WebSocket subscribers, and keeps the finished files in static/exports
+for download. The same export requested again within the artifact TTL reuses the
+running or finished job instead of fetching and writing everything again
+
+Jobs belong to the user who submitted them and are only shown to that user.
+The job registry lives in this process's memory: with several API workers, a
+status poll or download that reaches another worker than the one that took the
+job gets a 404, so run export jobs on a single worker (or with sticky routing)
+"""
+
+import asyncio
+import logging
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Callable, Awaitable, Tuple
+
+from websocket_manager import notify_export_progress
+
+logger = logging.getLogger(__name__)
+
+EXPORT_DIR = os.getenv("EXPORT_DIR", os.path.join("static", "exports"))
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+class ExportJobManager:
+    """Export job queue, worker pool and finished-artifact registry"""
+
+    def __init__(self, workers: Optional[int] = None, artifact_ttl: Optional[float] = None,
+                 retention: Optional[float] = None):
+        self.workers = workers or int(os.getenv("EXPORT_JOB_WORKERS", "2"))
+        self.artifact_ttl = artifact_ttl or float(os.getenv("EXPORT_JOB_ARTIFACT_TTL_SECONDS", "600"))
+        self.retention = retention or float(os.getenv("EXPORT_JOB_RETENTION_SECONDS", "3600"))
+
+        self._jobs: Dict[str, Dict[str, Any]] = {}     # job id -> job
+        self._by_key: Dict[Tuple, str] = {}             # de-dup key -> latest job id
+        self._runners: Dict[str, Callable] = {}         # job id -> export coroutine factory
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_tasks: List[asyncio.Task] = []
+
+    # ==================== SUBMIT / LOOKUP ====================
+
+    def _dedup_key(self, kind: str, params: Dict[str, Any]) -> Tuple:
+        return (kind,) + tuple(
+            (name, tuple(value) if isinstance(value, list) else value)
+            for name, value in sorted(params.items())
+        )
+
+    def _reusable(self, job: Dict[str, Any]) -> bool:
+        """A queued/running job, or a finished one whose files are recent and still on disk"""
+        if job["status"] in (QUEUED, RUNNING):
+            return True
+        if job["status"] != COMPLETED or time.time() - job["finished_at"] > self.artifact_ttl:
+            return False
+        return all(os.path.exists(path) for path in job["files"].values())
+
+    def submit(
+        self,
+        kind: str,
+        params: Dict[str, Any],
+        run: Callable[[Dict[str, Any], Callable], Awaitable[Dict[str, Any]]],
+        owner: Optional[str] = None
+    ) -> Tuple[Dict[str, Any], bool]:
+        """Queue an export for owner. run(job, report) does the work and returns the export result.
+
+        Returns (job, reused) - reused is True when the owner's identical export was
+        already running or finished within the artifact TTL.
+        """
+        self._prune()
+        key = (owner,) + self._dedup_key(kind, params)
+
+        existing = self._jobs.get(self._by_key.get(key))
+        if existing and self._reusable(existing):
+            logger.info(f"Export job {existing['id']} reused for {kind} export")
+            return existing, True
+
+        job = {
+            "id": uuid.uuid4().hex,
+            "kind": kind,
+            "owner": owner,
+            "params": params,
+            "status": QUEUED,
+            "progress": {"stage": QUEUED, "processed": 0, "total": None},
+            "result": None,
+            "error": None,
+            "files": {},
+            "created_at": time.time(),
+            "finished_at": None
+        }
+        self._jobs[job["id"]] = job
+        self._by_key[key] = job["id"]
+        self._runners[job["id"]] = run
+
+        self.start()
+        self._queue.put_nowait(job["id"])
+        logger.info(f"Export job {job['id']} queued ({kind})")
+        return job, False
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job by id"""
+        return self._jobs.get(job_id)
+
+    def get_owned(self, job_id: str, user_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Get a job by id if it belongs to user_id (None otherwise)"""
+        job = self._jobs.get(job_id)
+        return job if job and job["owner"] == user_id else None
+
+    def to_dict(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """Job as returned by the API"""
+        return {
+            "job_id": job["id"],
+            "kind": job["kind"],
+            "status": job["status"],
+            "progress": job["progress"],
+            "result": job["result"],
+            "error": job["error"],
+            "formats": list(job["files"].keys()),
+            "created_at": datetime.fromtimestamp(job["created_at"]).isoformat(),
+            "finished_at": datetime.fromtimestamp(job["finished_at"]).isoformat() if job["finished_at"] else None
+        }
+
+    def artifact_path(self, job: Dict[str, Any], fmt: str) -> Optional[str]:
+        """Path of a finished job's file in one format (None if missing)"""
+        path = job["files"].get(fmt)
+        return path if path and os.path.exists(path) else None
+
+    # ==================== PROGRESS ====================
+
+    def _reporter(self, job: Dict[str, Any]) -> Callable:
+        """Progress callback for a job; pushes to WebSocket subscribers when the stage or percentage changes"""
+        last_sent = {"stage": None, "percent": None}
+
+        def report(stage: str, processed: int = 0, total: Optional[int] = None):
+            job["progress"] = {"stage": stage, "processed": processed, "total": total}
+            percent = int(processed * 100 / total) if total else None
+            if stage == last_sent["stage"] and percent == last_sent["percent"]:
+                return
+            last_sent.update(stage=stage, percent=percent)
+            self._publish(job)
+
+        return report
+
+    def _publish(self, job: Dict[str, Any]):
+        try:
+            asyncio.get_running_loop().create_task(notify_export_progress(job["id"], self.to_dict(job)))
+        except RuntimeError:
+            # No running loop (called from a worker thread) - status stays available by polling
+            pass
+
+    # ==================== WORKERS ====================
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str):
+        job = self._jobs.get(job_id)
+        run = self._runners.pop(job_id, None)
+        if not job or not run:
+            return
+
+        job["status"] = RUNNING
+        report = self._reporter(job)
+        report("starting")
+        try:
+            result = await run(job, report)
+            job["result"] = result
+            job["files"] = {
+                fmt: os.path.join(EXPORT_DIR, os.path.basename(result[f"{fmt}_url"]))
+                for fmt in result.get("formats", [])
+                if result.get(f"{fmt}_url")
+            }
+            job["status"] = COMPLETED
+            report(COMPLETED, job["progress"]["processed"], job["progress"]["total"])
+            logger.info(f"✅ Export job {job_id} completed")
+        except Exception as e:
+            # HTTPException carries its message in detail
+            job["error"] = getattr(e, "detail", None) or str(e)
+            job["status"] = FAILED
+            report(FAILED, job["progress"]["processed"], job["progress"]["total"])
+            logger.error(f"❌ Export job {job_id} failed: {job['error']}")
+        finally:
+            job["finished_at"] = time.time()
+
+    def _prune(self):
+        """Forget finished jobs past the retention period"""
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            if job["finished_at"] and now - job["finished_at"] > self.retention:
+                del self._jobs[job_id]
+        self._by_key = {key: job_id for key, job_id in self._by_key.items() if job_id in self._jobs}
+
+    def start(self):
+        """Start the worker pool (idempotent)"""
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        self._worker_tasks = [task for task in self._worker_tasks if not task.done()]
+        while len(self._worker_tasks) < self.workers:
+            self._worker_tasks.append(asyncio.create_task(self._worker()))
+
+    async def stop(self):
+        """Stop the worker pool (queued jobs are dropped)"""
+        for task in self._worker_tasks:
+            task.cancel()
+        for task in self._worker_tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._worker_tasks = []
+
+
+# Global export job manager
+export_job_manager = ExportJobManager()
@@ -6,10 +6,10 @@ Tracks activity and auto-deletes inactive free user sessions after 30 minutes
 
 import asyncio
 import logging
-import sqlite3
 from datetime import datetime, timedelta
 from typing import Dict, Optional
-from waha_functions import WAHAClient
+from async_waha_client import get_async_waha_client
+from database.connection import get_raw_connection
 
 logger = logging.getLogger(__name__)
 
@@ -22,8 +22,8 @@ class FreeUserSessionManager:
         self.running = False
         
     def get_db_connection(self):
-        """Get database connection"""
-        return sqlite3.connect(self.db_path)
+        """Get database connection (pooled, WAL-tuned; close() returns it to the pool)"""
+        return get_raw_connection(self.db_path)
     
     def record_activity(self, user_id: str, session_name: str):
         """Record user activity to reset the 30-minute timer"""
@@ -71,7 +71,7 @@ class FreeUserSessionManager:
         finally:
             conn.close()
     
-    def cleanup_inactive_sessions(self):
+    async def cleanup_inactive_sessions(self):
         """Check and cleanup inactive free user sessions"""
         conn = self.get_db_connection()
         cursor = conn.cursor()
@@ -97,7 +97,7 @@ class FreeUserSessionManager:
             logger.info(f"Found {len(inactive_sessions)} inactive free sessions to cleanup")
             
             # Initialize WAHA client for free instance
-            waha_client = WAHAClient(base_url=self.free_instance_url)
+            waha_client = get_async_waha_client(self.free_instance_url)
             
             for user_id, session_name, last_active in inactive_sessions:
                 try:
@@ -110,14 +110,14 @@ class FreeUserSessionManager:
                     
                     # Try to logout from WhatsApp
                     try:
-                        waha_client.logout_session(session_name)
+                        await waha_client.logout_session(session_name)
                         logger.info(f"Logged out session {session_name}")
                     except Exception as e:
                         logger.warning(f"Failed to logout {session_name}: {e}")
                     
                     # Try to delete from WAHA
                     try:
-                        waha_client.delete_session(session_name)
+                        await waha_client.delete_session(session_name)
                         logger.info(f"Deleted session {session_name} from WAHA")
                     except Exception as e:
                         logger.warning(f"Failed to delete {session_name} from WAHA: {e}")
@@ -149,7 +149,7 @@ class FreeUserSessionManager:
         
         while self.running:
             try:
-                self.cleanup_inactive_sessions()
+                await self.cleanup_inactive_sessions()
             except Exception as e:
                 logger.error(f"Error in cleanup loop: {e}")
             
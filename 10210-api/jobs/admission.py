@@ -0,0 +1,145 @@
+"""
+Campaign Admission Control - decides which queued campaigns may run now
+Concurrency is limited per WhatsApp session, per user and per WAHA instance
+instead of one running campaign for the whole database. Waiting campaigns are
+ordered fair-share across users, weighted by plan, so one tenant's backlog
+cannot starve the others; queue positions come from that same order
+"""
+
+import logging
+import os
+from collections import defaultdict
+from typing import Dict, List, Optional, Any, Tuple
+
+from database.models import Campaign
+from quota_ledger import quota_ledger
+
+logger = logging.getLogger(__name__)
+
+# Relative share of the instance per plan (unknown plans and users without a subscription get 1)
+DEFAULT_PLAN_WEIGHTS = "free=1,starter=2,hobby=3,pro=5,premium=8,admin=10"
+
+
+def _parse_weights(spec: str) -> Dict[str, float]:
+    weights = {}
+    for item in spec.split(","):
+        name, _, value = item.partition("=")
+        try:
+            weights[name.strip().lower()] = max(float(value), 0.1)
+        except ValueError:
+            logger.warning(f"Ignoring invalid plan weight: {item}")
+    return weights
+
+
+class AdmissionController:
+    """Slot limits and weighted fair-share ordering for campaign starts"""
+
+    def __init__(self, per_session: Optional[int] = None, per_user: Optional[int] = None,
+                 per_instance: Optional[int] = None, plan_weights: Optional[Dict[str, float]] = None):
+        self.per_session = per_session or int(os.getenv("ADMISSION_SLOTS_PER_SESSION", "1"))
+        self.per_user = per_user or int(os.getenv("ADMISSION_SLOTS_PER_USER", "3"))
+        self.per_instance = per_instance or int(os.getenv("ADMISSION_SLOTS_PER_INSTANCE", "50"))
+        self.plan_weights = plan_weights or _parse_weights(os.getenv("ADMISSION_PLAN_WEIGHTS", DEFAULT_PLAN_WEIGHTS))
+
+        self._last_plan: Dict[str, Any] = {"admitted": 0, "waiting": 0, "blocked": {}}
+
+    # ==================== CAMPAIGN KEYS ====================
+
+    def _sessions(self, campaign: Campaign) -> List[str]:
+        """Every WAHA session a campaign sends from"""
+        return campaign.fanout_sessions or [campaign.waha_session_name or campaign.session_name]
+
+    def _user(self, campaign: Campaign) -> str:
+        return campaign.user_id or "anonymous"
+
+    def plan_weight(self, user_id: str) -> float:
+        """Fair-share weight of a user's plan (from the cached quota ledger, never a DB read)"""
+        usage = quota_ledger.cached_usage(user_id, "messages") if user_id != "anonymous" else None
+        plan = usage["plan_type"] if usage else None
+        plan = getattr(plan, "value", plan)
+        return self.plan_weights.get(str(plan).lower(), 1.0) if plan else 1.0
+
+    # ==================== ADMISSION ====================
+
+    def _usage(self, running: List[Campaign], instance_url: str) -> Dict[str, Dict[str, int]]:
+        usage = {"session": defaultdict(int), "user": defaultdict(int), "instance": defaultdict(int)}
+        for campaign in running:
+            self._take(usage, campaign, instance_url)
+        return usage
+
+    def _take(self, usage: Dict[str, Dict[str, int]], campaign: Campaign, instance_url: str):
+        for session in self._sessions(campaign):
+            usage["session"][session] += 1
+        usage["user"][self._user(campaign)] += 1
+        usage["instance"][instance_url] += 1
+
+    def _blocked_by(self, usage: Dict[str, Dict[str, int]], campaign: Campaign, instance_url: str) -> Optional[str]:
+        """The limit that keeps a campaign waiting (None if it may start)"""
+        if usage["instance"][instance_url] >= self.per_instance:
+            return "instance"
+        if usage["user"][self._user(campaign)] >= self.per_user:
+            return "user"
+        if any(usage["session"][session] >= self.per_session for session in self._sessions(campaign)):
+            return "session"
+        return None
+
+    def fair_order(self, running: List[Campaign], waiting: List[Campaign]) -> List[Campaign]:
+        """Weighted fair-share order of waiting campaigns.
+
+        Each user's campaigns keep their own order (queue position, then id); the
+        k-th one of a user gets the virtual finish tag (running + k) / weight, and
+        campaigns start in tag order - heavier plans get proportionally more turns.
+        """
+        running_by_user = defaultdict(int)
+        for campaign in running:
+            running_by_user[self._user(campaign)] += 1
+
+        by_user: Dict[str, List[Campaign]] = defaultdict(list)
+        for campaign in waiting:
+            by_user[self._user(campaign)].append(campaign)
+
+        tagged: List[Tuple[float, int, Campaign]] = []
+        for user_id, campaigns in by_user.items():
+            weight = self.plan_weight(user_id)
+            campaigns.sort(key=lambda c: (c.queue_position is None, c.queue_position or 0, c.id))
+            for k, campaign in enumerate(campaigns, 1):
+                tagged.append(((running_by_user[user_id] + k) / weight, campaign.id, campaign))
+
+        tagged.sort(key=lambda item: item[:2])
+        return [campaign for _, _, campaign in tagged]
+
+    def plan(self, running: List[Campaign], waiting: List[Campaign],
+             instance_url: str) -> Tuple[List[Campaign], List[Campaign]]:
+        """Split waiting campaigns into (start now, still waiting), both in fair-share order.
+
+        Every campaign is charged to instance_url - the WAHA instance the processor sends through.
+        """
+        usage = self._usage(running, instance_url)
+        admitted, still_waiting = [], []
+        blocked = defaultdict(int)
+
+        for campaign in self.fair_order(running, waiting):
+            reason = self._blocked_by(usage, campaign, instance_url)
+            if reason:
+                blocked[reason] += 1
+                still_waiting.append(campaign)
+            else:
+                self._take(usage, campaign, instance_url)
+                admitted.append(campaign)
+
+        self._last_plan = {"admitted": len(admitted), "waiting": len(still_waiting), "blocked": dict(blocked)}
+        return admitted, still_waiting
+
+    def get_status(self) -> Dict[str, Any]:
+        """Configured limits and the outcome of the last admission pass"""
+        return {
+            "slots_per_session": self.per_session,
+            "slots_per_user": self.per_user,
+            "slots_per_instance": self.per_instance,
+            "plan_weights": self.plan_weights,
+            "last_pass": self._last_plan
+        }
+
+
+# Global admission controller
+admission_controller = AdmissionController()
@@ -0,0 +1,54 @@
+"""
+Campaign Events - in-process campaign lifecycle notifications
+The manager and processor emit an event whenever a campaign is created,
+changed, queued, started, paused, stopped, completed or failed, or its processing
+task ends; the scheduler listens so it reacts at once instead of polling
+"""
+
+import logging
+from typing import Callable, List
+
+logger = logging.getLogger(__name__)
+
+# Event names
+CAMPAIGN_CREATED = "created"
+CAMPAIGN_UPDATED = "updated"          # schedule or settings may have changed
+CAMPAIGN_QUEUED = "queued"            # waiting for admission control to give it a slot
+CAMPAIGN_STARTED = "started"          # status set to RUNNING, waiting for a processor task
+CAMPAIGN_PAUSED = "paused"
+CAMPAIGN_CANCELLED = "cancelled"
+CAMPAIGN_COMPLETED = "completed"
+CAMPAIGN_FAILED = "failed"
+CAMPAIGN_FINISHED = "finished"        # a processing task ended (its slot is free)
+
+# Events after which another campaign may be able to run
+SLOT_FREED_EVENTS = {CAMPAIGN_PAUSED, CAMPAIGN_CANCELLED, CAMPAIGN_COMPLETED, CAMPAIGN_FAILED, CAMPAIGN_FINISHED}
+
+
+class CampaignEvents:
+    """Synchronous publish/subscribe for campaign lifecycle events"""
+
+    def __init__(self):
+        self._listeners: List[Callable[[str, int], None]] = []
+
+    def subscribe(self, listener: Callable[[str, int], None]):
+        """Call listener(event, campaign_id) on every event (idempotent)"""
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Callable[[str, int], None]):
+        """Stop calling listener"""
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def emit(self, event: str, campaign_id: int):
+        """Notify every listener; a failing listener never breaks the caller"""
+        for listener in list(self._listeners):
+            try:
+                listener(event, campaign_id)
+            except Exception as e:
+                logger.error(f"Campaign event listener failed ({event}, {campaign_id}): {str(e)}")
+
+
+# Global campaign event hub
+campaign_events = CampaignEvents()
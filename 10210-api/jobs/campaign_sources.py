@@ -39,6 +39,7 @@ class WhatsAppGroupSource(ContactSource):
     group_ids: List[str] = Field(..., min_items=1, description="List of group IDs")
     delivery_method: GroupDeliveryMethod = Field(..., description="How to send messages")
     auto_join: bool = Field(True, description="Auto-join groups if not member")
+    include_last_message: bool = Field(True, description="Look up each member's last message (slower for large groups)")
     
     @validator('group_ids')
     def validate_group_ids(cls, v):
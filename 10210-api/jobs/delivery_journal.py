@@ -0,0 +1,460 @@
+"""
+Delivery Journal - Batched write-behind for campaign delivery bookkeeping
+Buffers delivery inserts, status transitions, sample analytics and user metrics
+in memory and writes them in a single transaction, together with each running
+campaign's resume cursor (subscription quota is kept by quota_ledger).
+Writes run on a single journal thread so the event loop never waits on SQLite
+and batches reach the database in the order they were taken. A failed batch is
+retried with the next flush; after max_attempts failures in a row it is written
+to a dead-letter log instead
+"""
+
+import asyncio
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Iterable
+
+from database.connection import get_db
+from database.models import Campaign, Delivery, CampaignAnalytics
+from jobs.models import DeliveryStatus
+
+logger = logging.getLogger(__name__)
+
+
+class DeliveryJournal:
+    """In-memory journal of delivery writes, flushed every N rows or T milliseconds"""
+
+    def __init__(self, flush_rows: Optional[int] = None, flush_interval_ms: Optional[int] = None):
+        self.flush_rows = flush_rows or int(os.getenv("DELIVERY_JOURNAL_FLUSH_ROWS", "25"))
+        self.flush_interval_ms = flush_interval_ms or int(os.getenv("DELIVERY_JOURNAL_FLUSH_MS", "2000"))
+        self.max_attempts = int(os.getenv("DELIVERY_JOURNAL_MAX_ATTEMPTS", "5"))
+        self.dead_letter_path = os.getenv(
+            "DELIVERY_JOURNAL_DEAD_LETTER", os.path.join("data", "dead_letters", "delivery_journal.ndjson")
+        )
+
+        self._reset_buffers()
+        self._rows_since_flush = 0
+        self._flush_task = None
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="delivery-journal")
+        self._batches_writing = 0
+        self._failed_attempts = 0  # failed flushes in a row
+        
+        # campaign_id -> {"row": last contiguous finished row, "done": finished rows above it,
+        #                 "in_flight": rows with a pending delivery}
+        self._cursors: Dict[int, Dict[str, Any]] = {}
+        self._requeued_cursors: Dict[int, tuple] = {}  # cursor snapshots of a failed flush
+
+    def _reset_buffers(self):
+        """Start a fresh set of buffers"""
+        self._inserts: List[Dict[str, Any]] = []          # delivery entries not yet in the DB
+        self._updates: Dict[int, Dict[str, Any]] = {}     # id(entry) -> entry with a pending status change
+        self._deletes: List[Dict[str, Any]] = []          # entries to drop (prepared, never sent)
+        self._sample_deltas: Dict[tuple, List[int]] = {}  # (campaign_id, sample_index) -> [usage, success, error]
+        self._metric_deltas: Dict[str, Dict[str, int]] = {}  # user_id -> {"sent": n, "failed": n}
+        self._dirty_cursors = set()                       # campaign ids whose cursor moved
+
+    # ==================== RECORDING ====================
+
+    def add_delivery(self, **values) -> Dict[str, Any]:
+        """Queue a delivery insert and return its journal entry (the entry gets an id once flushed)"""
+        entry = {"id": None, "values": values, "discarded": False, "writing": False}
+        self._inserts.append(entry)
+        
+        if values.get("status") == DeliveryStatus.PENDING.value:
+            self._cursor_start(entry)
+        else:
+            self._cursor_finish(entry)
+        return entry
+
+    def add_error(self, campaign_id: int, row_number: int, error_message: str) -> Dict[str, Any]:
+        """Queue a failed delivery for a row that never reached the sender"""
+        return self.add_delivery(
+            campaign_id=campaign_id,
+            row_number=row_number,
+            phone_number="",
+            status=DeliveryStatus.FAILED.value,
+            error_message=error_message
+        )
+
+    def update_status(
+        self,
+        entry: Dict[str, Any],
+        status: DeliveryStatus,
+        error_message: Optional[str] = None,
+        whatsapp_message_id: Optional[str] = None
+    ):
+        """Queue a delivery status transition"""
+        values = entry["values"]
+        values["status"] = status.value
+        values["error_message"] = error_message
+        values["whatsapp_message_id"] = whatsapp_message_id
+
+        if status == DeliveryStatus.SENT:
+            values["sent_at"] = datetime.utcnow()
+        elif status == DeliveryStatus.DELIVERED:
+            values["delivered_at"] = datetime.utcnow()
+
+        # Not-yet-inserted entries are written with their latest values at flush time;
+        # an entry whose insert is being written gets its update in the next batch
+        if entry["id"] is not None or entry["writing"]:
+            self._updates[id(entry)] = entry
+        
+        if status in (DeliveryStatus.SENT, DeliveryStatus.DELIVERED, DeliveryStatus.FAILED):
+            self._cursor_finish(entry)
+
+    def discard(self, entries: List[Dict[str, Any]]):
+        """Drop prepared deliveries that were never sent"""
+        for entry in entries:
+            entry["discarded"] = True
+            if entry["id"] is not None or entry["writing"]:
+                self._updates.pop(id(entry), None)
+                self._deletes.append(entry)
+            self._cursor_release(entry)
+
+    def record_sample_result(self, campaign_id: int, sample_index: Optional[int], success: bool):
+        """Queue a sample analytics counter delta"""
+        if sample_index is None:
+            return
+
+        delta = self._sample_deltas.setdefault((campaign_id, sample_index), [0, 0, 0])
+        delta[0] += 1
+        delta[1 if success else 2] += 1
+
+    def record_user_messages(self, user_id: str, sent: int = 0, failed: int = 0):
+        """Queue a lifetime user metrics delta"""
+        delta = self._metric_deltas.setdefault(user_id, {"sent": 0, "failed": 0})
+        delta["sent"] += sent
+        delta["failed"] += failed
+
+    async def note_row(self) -> bool:
+        """Count a finished row; flush when flush_rows is reached. Returns True if a flush happened"""
+        self._rows_since_flush += 1
+        if self._rows_since_flush >= self.flush_rows:
+            return await self.flush_async()
+        return False
+
+    # ==================== RESUME CURSORS ====================
+    
+    def open_cursor(self, campaign_id: int, cursor_row: int, done_rows: Iterable[int] = ()):
+        """Start tracking a campaign's resume cursor from its last committed row"""
+        self._cursors[campaign_id] = {"row": cursor_row, "done": set(done_rows), "in_flight": set()}
+        self._advance_cursor(campaign_id)
+    
+    def close_cursor(self, campaign_id: int):
+        """Stop tracking a campaign's cursor (after its final flush)"""
+        self._cursors.pop(campaign_id, None)
+        self._dirty_cursors.discard(campaign_id)
+    
+    def is_durable(self, entry: Dict[str, Any]) -> bool:
+        """Check whether a delivery (and so its in-flight cursor mark) has been written"""
+        return entry["id"] is not None
+    
+    def _cursor_start(self, entry: Dict[str, Any]):
+        """A row was handed towards the sender"""
+        cursor = self._cursors.get(entry["values"].get("campaign_id"))
+        if cursor is not None:
+            cursor["in_flight"].add(entry["values"]["row_number"])
+            self._dirty_cursors.add(entry["values"]["campaign_id"])
+    
+    def _cursor_finish(self, entry: Dict[str, Any]):
+        """A row reached a final outcome"""
+        campaign_id = entry["values"].get("campaign_id")
+        cursor = self._cursors.get(campaign_id)
+        if cursor is not None:
+            row_number = entry["values"]["row_number"]
+            cursor["in_flight"].discard(row_number)
+            if row_number > cursor["row"]:
+                cursor["done"].add(row_number)
+                self._advance_cursor(campaign_id)
+            self._dirty_cursors.add(campaign_id)
+    
+    def _cursor_release(self, entry: Dict[str, Any]):
+        """A prepared row was dropped unsent; the cursor stays in front of it"""
+        cursor = self._cursors.get(entry["values"].get("campaign_id"))
+        if cursor is not None:
+            cursor["in_flight"].discard(entry["values"]["row_number"])
+            self._dirty_cursors.add(entry["values"]["campaign_id"])
+    
+    def _advance_cursor(self, campaign_id: int):
+        """Move the committed row over every contiguous finished row"""
+        cursor = self._cursors[campaign_id]
+        while cursor["row"] + 1 in cursor["done"]:
+            cursor["row"] += 1
+            cursor["done"].discard(cursor["row"])
+    
+    # ==================== FLUSHING ====================
+
+    def has_pending(self) -> bool:
+        """Check whether anything is waiting to be written"""
+        return bool(
+            self._inserts or self._updates or self._deletes or
+            self._sample_deltas or self._metric_deltas or
+            self._dirty_cursors or self._requeued_cursors
+        )
+
+    def _take_batch(self) -> Optional[Dict[str, Any]]:
+        """Swap out everything buffered so far (on the caller's thread); None if nothing is pending"""
+        self._rows_since_flush = 0
+        if not self.has_pending():
+            return None
+
+        # Snapshot cursors now so they match exactly the records in this batch
+        cursor_updates = dict(self._requeued_cursors)
+        for campaign_id in self._dirty_cursors:
+            cursor = self._cursors.get(campaign_id)
+            if cursor is not None:
+                cursor_updates[campaign_id] = (cursor["row"], sorted(cursor["in_flight"]))
+
+        inserts = [entry for entry in self._inserts if not entry["discarded"]]
+        # Changes to entries still being inserted by an earlier batch wait for their id
+        # (other entries without an id are inserted with their latest values, or never)
+        updates = [entry for entry in self._updates.values() if entry["id"] is not None]
+        deletes = [entry for entry in self._deletes if entry["id"] is not None]
+        waiting_updates = {key: entry for key, entry in self._updates.items() if entry["writing"]}
+        waiting_deletes = [entry for entry in self._deletes if entry["writing"]]
+
+        batch = {
+            "inserts": inserts,
+            "insert_values": [dict(entry["values"]) for entry in inserts],
+            "updates": updates,
+            "update_values": [{"id": entry["id"], **self._status_values(entry)} for entry in updates],
+            "deletes": deletes,
+            "delete_ids": [entry["id"] for entry in deletes],
+            "sample_deltas": self._sample_deltas,
+            "metric_deltas": self._metric_deltas,
+            "cursor_updates": cursor_updates
+        }
+        for entry in inserts:
+            entry["writing"] = True
+
+        # Records added from here on go to the next batch
+        self._requeued_cursors = {}
+        self._reset_buffers()
+        self._updates.update(waiting_updates)
+        self._deletes.extend(waiting_deletes)
+        return batch
+
+    def _write_batch(self, batch: Dict[str, Any]) -> List[int]:
+        """Write a batch in a single transaction (journal thread); returns the new delivery ids"""
+        with get_db() as db:
+            ids = []
+            if batch["insert_values"]:
+                deliveries = [Delivery(**values) for values in batch["insert_values"]]
+                db.add_all(deliveries)
+                db.flush()
+                ids = [delivery.id for delivery in deliveries]
+
+            if batch["update_values"]:
+                now = datetime.utcnow()
+                db.bulk_update_mappings(Delivery, [
+                    {"updated_at": now, **values} for values in batch["update_values"]
+                ])
+
+            if batch["delete_ids"]:
+                db.query(Delivery).filter(
+                    Delivery.id.in_(batch["delete_ids"]),
+                    Delivery.status == DeliveryStatus.PENDING.value
+                ).delete(synchronize_session=False)
+
+            for (campaign_id, sample_index), (usage, success, error) in batch["sample_deltas"].items():
+                db.query(CampaignAnalytics).filter(
+                    CampaignAnalytics.campaign_id == campaign_id,
+                    CampaignAnalytics.sample_index == sample_index
+                ).update({
+                    CampaignAnalytics.usage_count: CampaignAnalytics.usage_count + usage,
+                    CampaignAnalytics.success_count: CampaignAnalytics.success_count + success,
+                    CampaignAnalytics.error_count: CampaignAnalytics.error_count + error
+                }, synchronize_session=False)
+
+            if batch["metric_deltas"]:
+                from database.user_metrics import UserMetrics
+                for user_id, delta in batch["metric_deltas"].items():
+                    # Not UserMetrics.get_or_create: it commits, and the batch is one transaction
+                    metrics = db.query(UserMetrics).filter(UserMetrics.user_id == user_id).first()
+                    if metrics is None:
+                        metrics = UserMetrics(user_id=user_id, total_messages_sent=0, total_messages_failed=0)
+                        db.add(metrics)
+                        db.flush()
+                    metrics.total_messages_sent += delta["sent"]
+                    metrics.total_messages_failed += delta["failed"]
+                    if delta["sent"] > 0:
+                        metrics.last_message_date = datetime.utcnow()
+                    metrics.updated_at = datetime.utcnow()
+
+            for campaign_id, (cursor_row, in_flight) in batch["cursor_updates"].items():
+                db.query(Campaign).filter(Campaign.id == campaign_id).update({
+                    Campaign.cursor_row: cursor_row,
+                    Campaign.cursor_in_flight: json.dumps(in_flight) if in_flight else None
+                }, synchronize_session=False)
+
+            db.commit()
+            return ids
+
+    def _finish_batch(self, batch: Dict[str, Any], ids: Optional[List[int]], error: Optional[Exception] = None) -> bool:
+        """Hand out the ids of a written batch, or put a failed one back (on the caller's thread)"""
+        for entry in batch["inserts"]:
+            entry["writing"] = False
+
+        if error is not None:
+            self._failed_attempts += 1
+            if self._failed_attempts >= self.max_attempts:
+                logger.error(f"Delivery journal flush failed {self._failed_attempts} times, giving up on the batch: {str(error)}")
+                self._failed_attempts = 0
+                self._dead_letter(batch)
+            else:
+                logger.error(f"Delivery journal flush failed: {str(error)}")
+                self._requeue(batch)
+            return False
+
+        self._failed_attempts = 0
+
+        for entry, delivery_id in zip(batch["inserts"], ids):
+            entry["id"] = delivery_id
+            if entry["discarded"]:
+                # Dropped while its insert was being written
+                self._updates.pop(id(entry), None)
+
+        logger.debug(
+            f"Delivery journal flushed: {len(batch['inserts'])} inserts, {len(batch['updates'])} updates, "
+            f"{len(batch['deletes'])} deletes"
+        )
+        return True
+
+    def flush(self) -> bool:
+        """Write everything buffered so far and wait for it (blocking; for shutdown and sync callers)"""
+        batch = self._take_batch()
+        if batch is None:
+            return False
+        try:
+            ids = self._writer.submit(self._write_batch, batch).result()
+        except Exception as e:
+            return self._finish_batch(batch, None, e)
+        return self._finish_batch(batch, ids)
+
+    async def flush_async(self) -> bool:
+        """Write everything buffered so far on the journal thread without blocking the event loop.
+
+        Returns once every record made before the call has been written (or failed),
+        including batches an earlier flush is still writing.
+        """
+        loop = asyncio.get_running_loop()
+        batch = self._take_batch()
+        if batch is None:
+            if self._batches_writing:
+                # The journal thread runs in order: this completes after the earlier batches
+                await loop.run_in_executor(self._writer, lambda: None)
+            return False
+
+        self._batches_writing += 1
+        future = loop.run_in_executor(self._writer, self._write_batch, batch)
+        try:
+            await asyncio.wait([future])
+        except asyncio.CancelledError:
+            # Settle the batch before letting the cancellation through, so no entry is left half-written
+            await asyncio.wait([future])
+            self._settle(batch, future)
+            raise
+        return self._settle(batch, future)
+
+    def _settle(self, batch: Dict[str, Any], future: asyncio.Future) -> bool:
+        self._batches_writing -= 1
+        if future.exception() is not None:
+            return self._finish_batch(batch, None, future.exception())
+        return self._finish_batch(batch, future.result())
+
+    def _status_values(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """Columns a status transition may have changed"""
+        values = entry["values"]
+        return {
+            key: values[key]
+            for key in ("status", "error_message", "whatsapp_message_id", "sent_at", "delivered_at", "session_name")
+            if key in values
+        }
+
+    def _requeue(self, batch: Dict[str, Any]):
+        """Put a failed batch back in front of anything recorded since, so the next flush retries it"""
+        self._inserts = batch["inserts"] + self._inserts
+        for entry in batch["updates"]:
+            self._updates.setdefault(id(entry), entry)
+        self._deletes = batch["deletes"] + self._deletes
+
+        for key, (usage, success, error) in batch["sample_deltas"].items():
+            delta = self._sample_deltas.setdefault(key, [0, 0, 0])
+            delta[0] += usage
+            delta[1] += success
+            delta[2] += error
+        for user_id, delta in batch["metric_deltas"].items():
+            self.record_user_messages(user_id, sent=delta["sent"], failed=delta["failed"])
+
+        # Campaigns still tracked are re-snapshotted at the next flush (a later batch may
+        # already have written a newer cursor); closed ones retry their last snapshot
+        for campaign_id, snapshot in batch["cursor_updates"].items():
+            if campaign_id in self._cursors:
+                self._dirty_cursors.add(campaign_id)
+            else:
+                self._requeued_cursors.setdefault(campaign_id, snapshot)
+
+    def _dead_letter(self, batch: Dict[str, Any]):
+        """Append a batch that keeps failing to the dead-letter log instead of retrying it forever"""
+        record = {
+            "failed_at": datetime.utcnow(),
+            "inserts": batch["insert_values"],
+            "updates": batch["update_values"],
+            "delete_ids": batch["delete_ids"],
+            "sample_deltas": [list(key) + delta for key, delta in batch["sample_deltas"].items()],
+            "metric_deltas": batch["metric_deltas"],
+            "cursor_updates": {str(campaign_id): list(snapshot) for campaign_id, snapshot in batch["cursor_updates"].items()}
+        }
+        try:
+            os.makedirs(os.path.dirname(self.dead_letter_path) or ".", exist_ok=True)
+            with open(self.dead_letter_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, default=str) + "\n")
+        except OSError as e:
+            logger.error(f"Could not write delivery journal dead letter: {str(e)}")
+
+        # Inserts that were dropped are never written; later changes to them are ignored
+        for entry in batch["inserts"]:
+            entry["discarded"] = True
+        # Cursors still tracked are written again with the next batch
+        for campaign_id in batch["cursor_updates"]:
+            if campaign_id in self._cursors:
+                self._dirty_cursors.add(campaign_id)
+        logger.error(
+            f"Delivery journal batch dead-lettered to {self.dead_letter_path}: {len(batch['inserts'])} inserts, "
+            f"{len(batch['updates'])} updates, {len(batch['deletes'])} deletes"
+        )
+
+    # ==================== BACKGROUND FLUSHER ====================
+
+    def start(self):
+        """Start the periodic flusher (idempotent)"""
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Stop the periodic flusher and write whatever is left"""
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+        self._flush_task = None
+        await self.flush_async()
+
+    async def _flush_loop(self):
+        """Flush every flush_interval_ms while there is something to write"""
+        while True:
+            await asyncio.sleep(self.flush_interval_ms / 1000)
+            try:
+                if self.has_pending():
+                    await self.flush_async()
+            except Exception as e:
+                logger.error(f"Delivery journal flusher error: {str(e)}")
+
+
+# Global journal instance
+delivery_journal = DeliveryJournal()
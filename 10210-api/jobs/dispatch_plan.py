@@ -0,0 +1,278 @@
+"""
+Dispatch Plan - compile a campaign file into a send plan before the first message
+Maps, filters, validates and de-duplicates every row of the campaign's range in
+batches, and writes the accepted rows (row, chat_id, variables) and the rejected
+rows to disk so the send pipeline only reads the plan
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+from typing import Dict, List, Optional, Any, Callable, Iterable, Iterator, Tuple
+
+from phone_prefixes import phone_prefix_index
+from utils.validation import DataValidator
+
+logger = logging.getLogger(__name__)
+
+DISPATCH_PLAN_DIR = os.getenv("DISPATCH_PLAN_DIR", os.path.join("data", "dispatch_plans"))
+DISPATCH_PLAN_BATCH_ROWS = int(os.getenv("DISPATCH_PLAN_BATCH_ROWS", "5000"))
+DISPATCH_PLAN_INDEX_INTERVAL = int(os.getenv("DISPATCH_PLAN_INDEX_INTERVAL", "1000"))
+DISPATCH_PLAN_TTL_SECONDS = float(os.getenv("DISPATCH_PLAN_TTL_SECONDS", "86400"))  # kept after a campaign ends
+PLAN_VERSION = 1
+
+TRUTHY_VALUES = [True, "true", "True", "yes", "Yes", "1", 1]
+
+# Calling codes written with a space in recipient numbers and chat IDs ("+1 6176596898")
+SPACED_CALLING_CODES = ('1', '234', '91', '44')
+
+
+def format_phone_number(phone_number: str) -> str:
+    """Format phone number to match expected format (with space after country code)"""
+    # This handles both formats: "+16176596898" and "+1 6176596898"
+    if phone_number and phone_number.startswith('+') and not ' ' in phone_number:
+        # Add space after country code if missing
+        if phone_prefix_index.country_code(phone_number) in SPACED_CALLING_CODES:
+            phone_number = phone_prefix_index.format_phone(phone_number)
+    return phone_number
+
+
+def format_chat_id(phone_number: str) -> str:
+    """WAHA chat ID for a recipient"""
+    # Groups have IDs ending with @g.us or containing 'g.us'
+    if '@g.us' in phone_number or '-' in phone_number:
+        # It's already a group ID or looks like a group ID
+        if '@g.us' not in phone_number:
+            return f"{phone_number}@g.us"
+        return phone_number
+    # It's an individual user
+    return f"{phone_number}@c.us"
+
+
+class DispatchPlanCompiler:
+    """Builds, stores and reads per-campaign dispatch plans"""
+
+    def __init__(self, validator: DataValidator, map_row: Callable[[Dict[str, Any], Dict[str, str]], Dict[str, Any]]):
+        self.validator = validator
+        self.map_row = map_row
+
+    # ==================== STORAGE ====================
+
+    def _plan_dir(self, campaign_id: int) -> str:
+        return os.path.join(DISPATCH_PLAN_DIR, str(campaign_id))
+
+    def _fingerprint(self, campaign: Dict[str, Any], profile: Dict[str, Any]) -> str:
+        """Everything the plan depends on; a change means the plan must be compiled again"""
+        key = {
+            "version": PLAN_VERSION,
+            "file_path": profile.get("file_path"),
+            "file_size": profile.get("file_size"),
+            "mtime": profile.get("mtime"),
+            "first_row": campaign["first_row"],
+            "end_row": campaign.get("end_row"),
+            "column_mapping": campaign.get("column_mapping") or {},
+            "exclude_my_contacts": bool(campaign.get("exclude_my_contacts")),
+            "exclude_previous_conversations": bool(campaign.get("exclude_previous_conversations"))
+        }
+        return hashlib.sha1(json.dumps(key, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    def load(self, campaign: Dict[str, Any], profile: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Get a stored plan's summary if it matches the campaign and file as they are now"""
+        try:
+            with open(os.path.join(self._plan_dir(campaign["id"]), "meta.json"), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get("fingerprint") == self._fingerprint(campaign, profile):
+                return meta
+        except (OSError, ValueError):
+            pass
+        return None
+
+    def remove(self, campaign_id: int):
+        """Delete a campaign's plan"""
+        shutil.rmtree(self._plan_dir(campaign_id), ignore_errors=True)
+
+    def stored_campaign_ids(self) -> List[int]:
+        """Campaigns that have a plan on disk"""
+        try:
+            names = os.listdir(DISPATCH_PLAN_DIR)
+        except OSError:
+            return []
+        return [int(name) for name in names if name.isdigit()]
+
+    # ==================== COMPILING ====================
+
+    def get_plan(self, campaign: Dict[str, Any], rows: Callable[[], Iterable[Dict[str, Any]]], profile: Dict[str, Any]) -> Dict[str, Any]:
+        """Reuse the campaign's stored plan (resume) or compile one from rows()"""
+        meta = self.load(campaign, profile)
+        if meta is not None:
+            logger.info(f"Campaign {campaign['id']}: reusing dispatch plan ({meta['accepted']} rows to send)")
+            return meta
+        return self.compile(campaign, rows(), profile)
+
+    def compile(self, campaign: Dict[str, Any], rows: Iterable[Dict[str, Any]], profile: Dict[str, Any]) -> Dict[str, Any]:
+        """Compile the campaign's row range into a dispatch plan on disk"""
+        campaign_id = campaign["id"]
+        plan_dir = self._plan_dir(campaign_id)
+        tmp_dir = f"{plan_dir}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir, exist_ok=True)
+
+        meta = {
+            "fingerprint": self._fingerprint(campaign, profile),
+            "first_row": campaign["first_row"],
+            "rows": 0,
+            "accepted": 0,
+            "rejected": 0,
+            "duplicates": 0,
+            "index": []  # [row, byte offset] of every Nth accepted row in plan.ndjson
+        }
+        seen_recipients: Dict[str, int] = {}  # chat_id -> first row that sends to it
+
+        with open(os.path.join(tmp_dir, "plan.ndjson"), 'wb') as plan_file, \
+                open(os.path.join(tmp_dir, "rejected.ndjson"), 'wb') as rejected_file:
+            for batch in self._batches(rows, campaign["first_row"]):
+                for entry in self._compile_batch(campaign, batch, seen_recipients, meta):
+                    if "error" in entry:
+                        rejected_file.write(self._encode(entry))
+                        meta["rejected"] += 1
+                        continue
+
+                    if meta["accepted"] % DISPATCH_PLAN_INDEX_INTERVAL == 0:
+                        meta["index"].append([entry["row"], plan_file.tell()])
+                    plan_file.write(self._encode(entry))
+                    meta["accepted"] += 1
+
+        with open(os.path.join(tmp_dir, "meta.json"), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+
+        shutil.rmtree(plan_dir, ignore_errors=True)
+        os.replace(tmp_dir, plan_dir)
+
+        logger.info(
+            f"📋 Campaign {campaign_id}: dispatch plan compiled - {meta['rows']} rows, "
+            f"{meta['accepted']} to send, {meta['rejected']} rejected ({meta['duplicates']} duplicates)"
+        )
+        return meta
+
+    def _batches(self, rows: Iterable[Dict[str, Any]], first_row: int) -> Iterator[List[Tuple[int, Dict[str, Any]]]]:
+        """Number rows and group them into batches"""
+        batch = []
+        for i, row_data in enumerate(rows):
+            batch.append((first_row + i, row_data))
+            if len(batch) >= DISPATCH_PLAN_BATCH_ROWS:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _compile_batch(
+        self,
+        campaign: Dict[str, Any],
+        batch: List[Tuple[int, Dict[str, Any]]],
+        seen_recipients: Dict[str, int],
+        meta: Dict[str, Any]
+    ) -> List[Dict[str, Any]]:
+        """Map, filter and validate a batch of rows; each unique phone number is validated once"""
+        column_mapping = campaign.get("column_mapping", {})
+        mapped_rows = [(row_number, self.map_row(row_data, column_mapping)) for row_number, row_data in batch]
+        meta["rows"] += len(mapped_rows)
+
+        # Validate every distinct phone number of the batch in one pass
+        phones = list(dict.fromkeys(
+            str(mapped["phone_number"]) for _, mapped in mapped_rows
+            if mapped.get("phone_number") and not self.validator.is_group_recipient(mapped)
+        ))
+        phone_results = {
+            result["original"]: result
+            for result in self.validator.phone_validator.batch_validate_phones(phones)
+        }
+
+        entries = []
+        for row_number, mapped_data in mapped_rows:
+            error = self._exclusion_error(campaign, mapped_data)
+            if error:
+                entries.append({"row": row_number, "error": error})
+                continue
+
+            validation_result = self.validator.validate_row(mapped_data, row_number, phone_results)
+            if not validation_result["valid"]:
+                error_msg = "; ".join(validation_result["errors"])
+                entries.append({"row": row_number, "error": f"Validation failed: {error_msg}"})
+                continue
+
+            processed_data = validation_result["processed_data"]
+
+            # Check required fields
+            if 'phone_number' not in processed_data:
+                error_msg = f"Missing phone number in row. Available columns: {list(processed_data.keys())}"
+                entries.append({"row": row_number, "error": error_msg})
+                continue
+
+            phone_number = format_phone_number(processed_data['phone_number'])
+            chat_id = format_chat_id(phone_number)
+
+            # One message per recipient, even if the file lists them more than once
+            if chat_id in seen_recipients:
+                meta["duplicates"] += 1
+                entries.append({
+                    "row": row_number,
+                    "error": f"Skipped: Duplicate recipient (already sent from row {seen_recipients[chat_id]})"
+                })
+                continue
+            seen_recipients[chat_id] = row_number
+
+            entries.append({
+                "row": row_number,
+                "phone_number": phone_number,
+                "chat_id": chat_id,
+                "name": processed_data.get('name', ''),
+                "data": processed_data
+            })
+        return entries
+
+    def _exclusion_error(self, campaign: Dict[str, Any], mapped_data: Dict[str, Any]) -> Optional[str]:
+        """Reason the campaign's exclusion filters skip a row, if any"""
+        if campaign.get("exclude_my_contacts", False):
+            # Check if contact is saved in phone
+            if mapped_data.get("is_my_contact") in TRUTHY_VALUES:
+                return "Skipped: Contact is saved in phone"
+
+        if campaign.get("exclude_previous_conversations", False):
+            # Check if there's previous conversation (last_msg_status not empty)
+            if mapped_data.get("last_msg_status") and str(mapped_data.get("last_msg_status")).strip():
+                return "Skipped: Previous conversation exists"
+
+        return None
+
+    def _encode(self, entry: Dict[str, Any]) -> bytes:
+        return (json.dumps(entry, default=str) + "\n").encode('utf-8')
+
+    # ==================== READING ====================
+
+    def iter_entries(self, campaign_id: int, meta: Dict[str, Any], from_row: int) -> Iterator[Dict[str, Any]]:
+        """Stream accepted rows from from_row on, seeking via the plan's row index"""
+        offset = 0
+        for row_number, row_offset in meta.get("index", []):
+            if row_number > from_row:
+                break
+            offset = row_offset
+
+        with open(os.path.join(self._plan_dir(campaign_id), "plan.ndjson"), 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                entry = json.loads(line)
+                if entry["row"] >= from_row:
+                    yield entry
+
+    def rejected_rows(self, campaign_id: int, from_row: int, skip_rows: Iterable[int] = ()) -> List[Tuple[int, str]]:
+        """Rejected rows from from_row on that have not been recorded yet"""
+        skip_rows = set(skip_rows)
+        rejected = []
+        with open(os.path.join(self._plan_dir(campaign_id), "rejected.ndjson"), 'rb') as f:
+            for line in f:
+                entry = json.loads(line)
+                if entry["row"] >= from_row and entry["row"] not in skip_rows:
+                    rejected.append((entry["row"], entry["error"]))
+        return rejected
@@ -7,13 +7,17 @@ import os
 from datetime import datetime
 from typing import List, Optional, Dict, Any
 from sqlalchemy.orm import Session
-from sqlalchemy import desc, and_, or_, func
+from sqlalchemy import desc, and_, or_, func, select, literal
 
 from database.connection import get_db, get_session
 from database.models import Campaign, Delivery, CampaignAnalytics
 from .models import (
     CampaignCreate, CampaignUpdate, CampaignResponse, 
-    CampaignStatus, MessageMode, CampaignStats
+    CampaignStatus, DeliveryStatus, MessageMode, CampaignStats
+)
+from .campaign_events import (
+    campaign_events, CAMPAIGN_CREATED, CAMPAIGN_UPDATED, CAMPAIGN_QUEUED,
+    CAMPAIGN_PAUSED, CAMPAIGN_CANCELLED, CAMPAIGN_COMPLETED
 )
 
 logger = logging.getLogger(__name__)
@@ -39,6 +43,7 @@ class CampaignManager:
                     name=campaign_data.name,
                     session_name=campaign_data.session_name,  # Display name for UI
                     waha_session_name=getattr(campaign_data, 'waha_session_name', None),  # Actual WAHA name
+                    fanout_sessions=campaign_data.fanout_sessions,  # WAHA names, primary session first
                     user_id=campaign_data.user_id,  # Include user_id
                     file_path=campaign_data.file_path,
                     column_mapping_dict=campaign_data.column_mapping or {},
@@ -74,6 +79,7 @@ class CampaignManager:
                 db.commit()
                 
                 self.logger.info(f"Campaign '{campaign.name}' created with ID {campaign.id}")
+                campaign_events.emit(CAMPAIGN_CREATED, campaign.id)
                 return self._campaign_to_response(campaign)
                 
         except Exception as e:
@@ -145,6 +151,7 @@ class CampaignManager:
                 db.commit()
                 
                 self.logger.info(f"Campaign {campaign_id} updated")
+                campaign_events.emit(CAMPAIGN_UPDATED, campaign_id)
                 return self._campaign_to_response(campaign)
                 
         except Exception as e:
@@ -170,6 +177,10 @@ class CampaignManager:
                     except OSError:
                         pass  # File deletion failure shouldn't stop campaign deletion
                 
+                # The dispatch plan holds the campaign's processed recipient rows
+                from .processor import message_processor
+                message_processor.plan_compiler.remove(campaign_id)
+                
                 db.delete(campaign)
                 db.commit()
                 
@@ -180,8 +191,73 @@ class CampaignManager:
             self.logger.error(f"Failed to delete campaign {campaign_id}: {str(e)}")
             raise
     
+    async def copy_processed_rows(self, source_campaign_id: int, target_campaign_id: int) -> bool:
+        """Carry every row the source campaign already finished over to its restarted copy
+        
+        The source's journal is flushed and its in-flight rows settled first (marked
+        failed, never re-sent). The latest terminal delivery of each source row in the
+        target's row range is then copied to the target, so its cursor recovery skips
+        those rows and its progress counters include them.
+        """
+        from .delivery_journal import delivery_journal
+        from .processor import message_processor
+        
+        try:
+            if source_campaign_id in message_processor.active_campaigns:
+                raise ValueError(f"Campaign {source_campaign_id} is still stopping, try again shortly")
+            
+            await delivery_journal.flush_async()
+            if await message_processor.recover_campaign_cursor(source_campaign_id) is None:
+                raise ValueError(f"Could not settle the rows of campaign {source_campaign_id}")
+            
+            with get_db() as db:
+                source = db.query(Campaign).filter(Campaign.id == source_campaign_id).first()
+                target = db.query(Campaign).filter(Campaign.id == target_campaign_id).first()
+                if not source or not target:
+                    return False
+                
+                unfinished = [DeliveryStatus.PENDING.value, DeliveryStatus.SENDING.value]
+                rows = db.query(func.max(Delivery.id)).filter(
+                    Delivery.campaign_id == source_campaign_id,
+                    ~Delivery.status.in_(unfinished),
+                    Delivery.row_number >= max(1, target.start_row or 1),
+                    ~Delivery.row_number.in_(
+                        db.query(Delivery.row_number).filter(Delivery.campaign_id == target_campaign_id)
+                    )
+                )
+                if target.end_row:
+                    rows = rows.filter(Delivery.row_number <= target.end_row)
+                latest_ids = rows.group_by(Delivery.row_number)
+                
+                table = Delivery.__table__
+                columns = [column for column in table.c if column.name != "id"]
+                copied = db.execute(table.insert().from_select(
+                    [column.name for column in columns],
+                    select(*[
+                        literal(target_campaign_id).label("campaign_id") if column.name == "campaign_id" else column
+                        for column in columns
+                    ]).where(table.c.id.in_(latest_ids))
+                )).rowcount
+                
+                # Progress counters of the copy include the carried-over rows
+                by_status = dict(db.query(Delivery.status, func.count(Delivery.id)).filter(
+                    Delivery.campaign_id == target_campaign_id,
+                    ~Delivery.status.in_(unfinished)
+                ).group_by(Delivery.status).all())
+                target.processed_rows = sum(by_status.values())
+                target.success_count = by_status.get(DeliveryStatus.SENT.value, 0) + by_status.get(DeliveryStatus.DELIVERED.value, 0)
+                target.error_count = by_status.get(DeliveryStatus.FAILED.value, 0)
+                db.commit()
+                
+                self.logger.info(f"Campaign {target_campaign_id} carries over {copied} finished rows from campaign {source_campaign_id}")
+                return True
+                
+        except Exception as e:
+            self.logger.error(f"Failed to copy processed rows {source_campaign_id} -> {target_campaign_id}: {str(e)}")
+            raise
+    
     def start_campaign(self, campaign_id: int) -> bool:
-        """Start campaign processing"""
+        """Queue a campaign to start; the scheduler's admission control runs it once a slot is free"""
         try:
             with get_db() as db:
                 campaign = db.query(Campaign).filter(Campaign.id == campaign_id).first()
@@ -191,9 +267,9 @@ class CampaignManager:
                 if campaign.status not in [CampaignStatus.CREATED.value, CampaignStatus.SCHEDULED.value, CampaignStatus.PAUSED.value]:
                     raise ValueError(f"Cannot start campaign in status: {campaign.status}")
                 
-                campaign.status = CampaignStatus.RUNNING.value
-                if not campaign.started_at:
-                    campaign.started_at = datetime.utcnow()
+                # Same path as scheduled starts, so manual starts respect the slot limits
+                campaign.status = CampaignStatus.QUEUED.value
+                campaign.queue_position = None
                 
                 # Clear scheduling fields if starting a scheduled campaign
                 if campaign.is_scheduled:
@@ -202,7 +278,8 @@ class CampaignManager:
                 
                 db.commit()
                 
-                self.logger.info(f"Campaign {campaign_id} started")
+                self.logger.info(f"Campaign {campaign_id} queued to start")
+                campaign_events.emit(CAMPAIGN_QUEUED, campaign_id)
                 return True
                 
         except Exception as e:
@@ -224,6 +301,7 @@ class CampaignManager:
                 db.commit()
                 
                 self.logger.info(f"Campaign {campaign_id} paused")
+                campaign_events.emit(CAMPAIGN_PAUSED, campaign_id)
                 return True
                 
         except Exception as e:
@@ -244,6 +322,7 @@ class CampaignManager:
                     campaign.queue_position = None
                     db.commit()
                     self.logger.info(f"Campaign {campaign_id} removed from queue")
+                    campaign_events.emit(CAMPAIGN_CANCELLED, campaign_id)
                     return True
                 
                 if campaign.status not in [CampaignStatus.RUNNING.value, CampaignStatus.PAUSED.value]:
@@ -254,6 +333,7 @@ class CampaignManager:
                 db.commit()
                 
                 self.logger.info(f"Campaign {campaign_id} stopped")
+                campaign_events.emit(CAMPAIGN_CANCELLED, campaign_id)
                 return True
                 
         except Exception as e:
@@ -273,6 +353,7 @@ class CampaignManager:
                 db.commit()
                 
                 self.logger.info(f"Campaign {campaign_id} completed")
+                campaign_events.emit(CAMPAIGN_COMPLETED, campaign_id)
                 return True
                 
         except Exception as e:
@@ -362,6 +443,15 @@ class CampaignManager:
             self.logger.error(f"Failed to cleanup old campaigns: {str(e)}")
             raise
     
+    def _live_progress(self, campaign: Campaign) -> tuple:
+        """(processed, success, error) for a campaign, from the processor's in-memory
+        counters while it runs here (the stored ones lag behind the delivery journal)"""
+        from .processor import message_processor
+        counters = message_processor.progress_counters.get(campaign.id)
+        if counters:
+            return counters["processed"], counters["success"], counters["error"]
+        return campaign.processed_rows or 0, campaign.success_count or 0, campaign.error_count or 0
+    
     def _campaign_to_response(self, campaign: Campaign) -> CampaignResponse:
         """Convert Campaign model to response model"""
         # Get phone number for session display
@@ -377,11 +467,16 @@ class CampaignManager:
                 if user_session and user_session.phone_number:
                     session_display = f"{campaign.session_name} / {user_session.phone_number}"
         
+        processed_rows, success_count, error_count = self._live_progress(campaign)
+        progress_percentage = round(processed_rows / campaign.total_rows * 100, 2) if campaign.total_rows else 0.0
+        success_rate = round(success_count / processed_rows * 100, 2) if processed_rows else 0.0
+        
         return CampaignResponse(
             id=campaign.id,
             name=campaign.name,
             session_name=campaign.session_name,
             session_display=session_display,  # Add display name with phone
+            fanout_sessions=campaign.fanout_sessions,
             user_id=campaign.user_id,  # Include user_id in response
             status=CampaignStatus(campaign.status),
             file_path=campaign.file_path,
@@ -394,11 +489,11 @@ class CampaignManager:
             retry_attempts=campaign.retry_attempts,
             max_daily_messages=campaign.max_daily_messages,
             total_rows=campaign.total_rows,
-            processed_rows=campaign.processed_rows,
-            success_count=campaign.success_count,
-            error_count=campaign.error_count,
-            progress_percentage=campaign.progress_percentage,
-            success_rate=campaign.success_rate,
+            processed_rows=processed_rows,
+            success_count=success_count,
+            error_count=error_count,
+            progress_percentage=progress_percentage,
+            success_rate=success_rate,
             created_at=campaign.created_at,
             started_at=campaign.started_at,
             completed_at=campaign.completed_at,
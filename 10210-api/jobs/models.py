@@ -48,6 +48,7 @@ class CampaignCreate(BaseModel):
     name: str = Field(..., min_length=1, max_length=255, description="Campaign name")
     session_name: str = Field(..., min_length=1, max_length=100, description="WhatsApp session display name")
     waha_session_name: Optional[str] = Field(None, description="Actual WAHA session name (UUID)")
+    fanout_sessions: List[str] = Field(default=[], description="Extra sessions to deal rows across (multi-session campaigns)")
     user_id: Optional[str] = Field(None, description="User ID for tracking ownership")
     
     # File configuration
@@ -102,6 +103,7 @@ class CampaignResponse(BaseModel):
     name: str
     session_name: str
     session_display: Optional[str] = None  # Display name with phone number
+    fanout_sessions: List[str] = []  # WAHA sessions of a multi-session campaign
     user_id: Optional[str] = None  # Add user_id field
     status: CampaignStatus
     file_path: Optional[str]
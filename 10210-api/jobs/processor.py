@@ -4,24 +4,41 @@ Handles campaign execution, message sending with random samples, and progress tr
 """
 
 import asyncio
+import itertools
 import logging
 import random
 import os
+import time
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Any, Tuple
+from typing import List, Dict, Optional, Any, Tuple, Iterable
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 
 from database.connection import get_db
-from database.models import Campaign, Delivery, CampaignAnalytics
+from database.models import Campaign, Delivery
 from jobs.models import CampaignStatus, DeliveryStatus, MessageMode
 from utils.templates import MessageTemplateEngine
 import json
 from utils.file_handler import FileHandler
-from utils.validation import DataValidator
+from utils.validation import DataValidator, PhoneValidator
 from waha_functions import WAHAClient
+from async_waha_client import get_async_waha_client
+from jobs.delivery_journal import delivery_journal
+from jobs.session_fanout import SessionFanout
+from jobs.dispatch_plan import DispatchPlanCompiler, format_chat_id
+from jobs.campaign_events import (
+    campaign_events, CAMPAIGN_COMPLETED, CAMPAIGN_PAUSED, CAMPAIGN_FAILED, CAMPAIGN_FINISHED
+)
+from session_health_cache import session_health_cache
+from rate_limiter import send_rate_limiter, RateLimitExceeded
+from quota_ledger import quota_ledger
+from websocket_manager import campaign_progress
 
 logger = logging.getLogger(__name__)
 
+# Recorded for rows whose send may or may not have reached WhatsApp before a crash
+INTERRUPTED_SEND_ERROR = "Interrupted: delivery state unknown after a restart, not resent to avoid a duplicate"
+
 class MessageProcessor:
     """Background message processor for campaign execution"""
     
@@ -29,33 +46,31 @@ class MessageProcessor:
         # Default WAHA client (for backward compatibility)
         self.default_waha = waha_client or WAHAClient()
         
-        # Isolated WAHA clients for each campaign
-        self.campaign_waha_clients = {}  # campaign_id -> WAHAClient
+        # Shared pooled async client; one slow WAHA instance no longer blocks the event loop
+        self.waha = get_async_waha_client(self.default_waha.base_url)
         
         self.template_engine = MessageTemplateEngine()
         self.file_handler = FileHandler()
         self.validator = DataValidator()
+        self.plan_compiler = DispatchPlanCompiler(self.validator, self._apply_column_mapping)
         
         # Processing state
         self.active_campaigns = {}  # campaign_id -> processing_task
         self.stop_flags = {}        # campaign_id -> stop_flag
-        
+        self.progress_counters = {} # campaign_id -> {"processed", "success", "error"}
+        self.paused_campaigns = set()  # running campaigns a pause event arrived for
+        self._halt_checked_at = {}     # campaign_id -> when its status was last read from the DB
+
+        # Pauses made by another worker only show up in the database; re-read it this often
+        self.halt_check_seconds = float(os.getenv("CAMPAIGN_HALT_CHECK_SECONDS", "5"))
+        campaign_events.subscribe(self._on_campaign_event)
+
+        # How many prepared rows the producer may run ahead of the sender
+        self.pipeline_depth = int(os.getenv("CAMPAIGN_PIPELINE_DEPTH", "20"))
+
         # Lock for thread-safe operations
         self._lock = asyncio.Lock()
         
-    def _get_campaign_waha_client(self, campaign_id: int) -> WAHAClient:
-        """Get or create an isolated WAHA client for a campaign"""
-        if campaign_id not in self.campaign_waha_clients:
-            self.campaign_waha_clients[campaign_id] = WAHAClient()
-            logger.info(f"Created isolated WAHA client for campaign {campaign_id}")
-        return self.campaign_waha_clients[campaign_id]
-    
-    def _cleanup_campaign_waha_client(self, campaign_id: int):
-        """Clean up WAHA client for a campaign"""
-        if campaign_id in self.campaign_waha_clients:
-            del self.campaign_waha_clients[campaign_id]
-            logger.info(f"Cleaned up WAHA client for campaign {campaign_id}")
-    
     async def start_campaign_processing(self, campaign_id: int) -> bool:
         """Start processing a campaign in background"""
         try:
@@ -79,6 +94,11 @@ class MessageProcessor:
                 
                 # Create stop flag
                 self.stop_flags[campaign_id] = False
+                self.paused_campaigns.discard(campaign_id)
+                
+                # Make sure buffered delivery writes and quota usage are flushed periodically
+                delivery_journal.start()
+                quota_ledger.start()
                 
                 # Start background task
                 task = asyncio.create_task(self._process_campaign(campaign_id))
@@ -111,20 +131,42 @@ class MessageProcessor:
         try:
             logger.info(f"🚀 Starting campaign processing: {campaign_id}")
             
+            # Work out where an earlier run of this campaign stopped
+            cursor = await self.recover_campaign_cursor(campaign_id)
+            if cursor is None:
+                await self._mark_campaign_failed(campaign_id, "Failed to load campaign resume cursor")
+                return
+            
             # Load campaign and file data
-            campaign_data = await self._load_campaign_data(campaign_id)
+            campaign_data = await self._load_campaign_data(campaign_id, cursor)
             if not campaign_data:
                 await self._mark_campaign_failed(campaign_id, "Failed to load campaign data")
                 return
             
             campaign = campaign_data['campaign']
             file_data = campaign_data['file_data']
+            plan = campaign_data['plan']
+            
+            # Rows the dispatch plan rejected that have no failed delivery record yet
+            rejected_rows = self.plan_compiler.rejected_rows(
+                campaign_id, campaign["resume_row"], campaign["skip_rows"]
+            ) if plan else []
+            
+            # Seed in-memory progress counters from deliveries of any earlier run
+            await self.reconcile_campaign_progress(campaign_id)
+            self._publish_progress(campaign_id, status=CampaignStatus.RUNNING.value, total=campaign["total_rows"])
+            
+            # A resumed campaign whose remaining rows were all handled before the restart
+            if not file_data and not rejected_rows and campaign["resume_row"] > campaign["first_row"]:
+                logger.info(f"Campaign {campaign_id}: nothing left after row {cursor['cursor_row']}, completing")
+                await self._mark_campaign_completed(campaign_id)
+                return
             
             # Validate campaign before processing
             validation_errors = []
             
             # Check if we have data to process
-            if not file_data or len(file_data) == 0:
+            if not plan or plan["rows"] == 0:
                 validation_errors.append("No data found in file to process")
                 logger.error(f"Campaign {campaign_id}: No data rows found in file")
             
@@ -135,10 +177,14 @@ class MessageProcessor:
             else:
                 logger.info(f"Campaign {campaign_id}: Found {len(campaign['message_samples'])} message templates: {campaign['message_samples']}")
             
-            # Check session availability early (use WAHA session name)
+            # Check session availability early (use WAHA session name; any one will do for fan-out)
             waha_session_name = campaign.get('waha_session_name') or campaign.get('session_name', 'default')
             display_name = campaign.get('session_name', 'default')
-            if not await self._check_session_health(waha_session_name, campaign_id):
+            session_checks = [
+                await self._check_session_health(session, campaign_id)
+                for session in campaign["fanout_sessions"]
+            ]
+            if not any(session_checks):
                 validation_errors.append(f"WhatsApp session '{display_name}' is not available or not connected")
                 logger.error(f"Campaign {campaign_id}: Session '{display_name}' (WAHA: {waha_session_name}) health check failed")
             
@@ -148,37 +194,54 @@ class MessageProcessor:
                 await self._mark_campaign_failed(campaign_id, error_message)
                 return
             
-            # Process each row
-            for i, row_data in enumerate(file_data):
-                # Check stop flag
-                if self.stop_flags.get(campaign_id, False):
-                    logger.info(f"Campaign {campaign_id} processing stopped by user")
-                    break
-                
-                # Check if campaign was paused due to limits
-                with get_db() as db:
-                    current_campaign = db.query(Campaign).filter(Campaign.id == campaign_id).first()
-                    if current_campaign and current_campaign.status == CampaignStatus.PAUSED.value:
-                        logger.info(f"Campaign {campaign_id} is paused (likely due to message limits)")
-                        break
-                
+            # Compile the campaign's templates once so every row renders from the cache
+            self.template_engine.precompile(self._extract_sample_texts(campaign))
+            
+            # Run the campaign as a two-stage pipeline: the producer prepares planned
+            # rows (rendering, delivery record) ahead of time, the sender only sends
+            # on the campaign's WAHA session and paces
+            send_queue = asyncio.Queue(maxsize=self.pipeline_depth)
+            delivery_journal.open_cursor(campaign_id, cursor["cursor_row"], cursor["skip_rows"])
+            
+            # Report rows the plan rejected before the first message goes out
+            if rejected_rows:
+                await self._record_rejected_rows(campaign_id, rejected_rows)
+            
+            producer = asyncio.create_task(self._produce_rows(campaign, file_data, send_queue))
+            producer_error = None
+            try:
+                if len(campaign["fanout_sessions"]) > 1:
+                    await self._fanout_senders(campaign, send_queue)
+                else:
+                    await self._session_sender(campaign, send_queue)
+            except RateLimitExceeded as e:
+                # Daily cap hit: keep the campaign resumable instead of failing it
+                await self._pause_campaign(campaign_id, str(e))
+            finally:
+                if not producer.done():
+                    producer.cancel()
                 try:
-                    # Process single message
-                    await self._process_single_message(campaign, row_data, i + campaign["start_row"])
-                    
-                    # Update progress
-                    await self._update_campaign_progress(campaign_id)
-                    
-                    # Rate limiting delay
-                    await asyncio.sleep(campaign["delay_seconds"])
-                    
+                    await producer
+                except asyncio.CancelledError:
+                    pass
                 except Exception as e:
-                    logger.error(f"Error processing row {i} in campaign {campaign_id}: {str(e)}")
-                    await self._record_delivery_error(campaign_id, i + campaign["start_row"], str(e))
-                    # Continue processing other rows
-            
-            # Mark campaign as completed
-            await self._mark_campaign_completed(campaign_id)
+                    producer_error = e
+                await self._discard_unsent_rows(campaign_id, send_queue)
+                # Write out everything this campaign buffered (stop, pause or completion)
+                await delivery_journal.flush_async()
+                delivery_journal.close_cursor(campaign_id)
+
+            # Final progress sync (covers rows the producer rejected after the last send)
+            await self._update_campaign_progress(campaign_id)
+
+            if producer_error is not None:
+                # Rows after the failure were never read; keep the cursor and let the campaign be resumed
+                await self._pause_campaign(campaign_id, f"Reading campaign rows failed: {str(producer_error)}")
+                return
+
+            # Mark campaign as completed (unless it was paused or stopped part-way)
+            if not self._is_campaign_halted(campaign_id, recheck=True):
+                await self._mark_campaign_completed(campaign_id)
             
         except Exception as e:
             logger.error(f"Campaign processing failed {campaign_id}: {str(e)}")
@@ -190,14 +253,76 @@ class MessageProcessor:
                 del self.active_campaigns[campaign_id]
             if campaign_id in self.stop_flags:
                 del self.stop_flags[campaign_id]
-            
-            # Clean up isolated WAHA client
-            self._cleanup_campaign_waha_client(campaign_id)
+            self.progress_counters.pop(campaign_id, None)
+            self.paused_campaigns.discard(campaign_id)
+            self._halt_checked_at.pop(campaign_id, None)
+            campaign_progress.close(campaign_id)
             
             logger.info(f"✅ Campaign processing finished: {campaign_id}")
+            campaign_events.emit(CAMPAIGN_FINISHED, campaign_id)
+    
+    async def recover_campaign_cursor(self, campaign_id: int) -> Optional[Dict[str, Any]]:
+        """Settle rows a previous run left in flight and work out where to resume
+        
+        In-flight rows may or may not have reached WhatsApp before the process died,
+        so they are marked failed rather than sent twice.
+        """
+        try:
+            await delivery_journal.flush_async()
+            
+            with get_db() as db:
+                campaign = db.query(Campaign).filter(Campaign.id == campaign_id).first()
+                if not campaign:
+                    return None
+                
+                first_row = max(1, campaign.start_row or 1)
+                cursor_row = max(campaign.cursor_row or 0, first_row - 1)
+                unfinished = [DeliveryStatus.PENDING.value, DeliveryStatus.SENDING.value]
+                
+                in_flight = campaign.cursor_in_flight_rows
+                if in_flight:
+                    settled = db.query(Delivery).filter(
+                        Delivery.campaign_id == campaign_id,
+                        Delivery.row_number.in_(in_flight),
+                        Delivery.status.in_(unfinished)
+                    ).update({
+                        Delivery.status: DeliveryStatus.FAILED.value,
+                        Delivery.error_message: INTERRUPTED_SEND_ERROR,
+                        Delivery.updated_at: datetime.utcnow()
+                    }, synchronize_session=False)
+                    logger.warning(f"Campaign {campaign_id}: {settled} rows were in flight when the last run stopped, marked failed")
+                
+                # Rows past the cursor that already have an outcome (e.g. rows the producer rejected ahead of the sender)
+                done_rows = {
+                    row_number for (row_number,) in db.query(Delivery.row_number).filter(
+                        Delivery.campaign_id == campaign_id,
+                        Delivery.row_number > cursor_row,
+                        ~Delivery.status.in_(unfinished)
+                    ).all()
+                }
+                while cursor_row + 1 in done_rows:
+                    cursor_row += 1
+                    done_rows.discard(cursor_row)
+                
+                campaign.cursor_row = cursor_row
+                campaign.cursor_in_flight_rows = []
+                db.commit()
+            
+            if cursor_row >= first_row:
+                logger.info(f"🔁 Campaign {campaign_id}: resuming after row {cursor_row}")
+            
+            return {
+                "cursor_row": cursor_row,
+                "resume_row": cursor_row + 1,
+                "skip_rows": done_rows
+            }
+            
+        except Exception as e:
+            logger.error(f"Failed to recover cursor for campaign {campaign_id}: {str(e)}")
+            return None
     
-    async def _load_campaign_data(self, campaign_id: int) -> Optional[Dict[str, Any]]:
-        """Load campaign and associated file data"""
+    async def _load_campaign_data(self, campaign_id: int, cursor: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Load campaign and its dispatch plan, streaming planned rows from the resume cursor onwards"""
         try:
             with get_db() as db:
                 campaign = db.query(Campaign).filter(Campaign.id == campaign_id).first()
@@ -236,132 +361,329 @@ class MessageProcessor:
                     "exclude_my_contacts": campaign.exclude_my_contacts,
                     "exclude_previous_conversations": campaign.exclude_previous_conversations,
                     "save_contact_before_message": campaign.save_contact_before_message,
-                    "total_rows": campaign.total_rows
+                    "fanout_sessions": campaign.fanout_sessions or [waha_session_name],
+                    "total_rows": campaign.total_rows,
+                    "first_row": max(1, campaign.start_row or 1),
+                    "resume_row": cursor["resume_row"],
+                    "skip_rows": cursor["skip_rows"]
                 }
                 
-                # Load file data
-                if not campaign_dict["file_path"]:
-                    logger.warning(f"Campaign {campaign_id} has no file path configured")
-                    return {"campaign": campaign_dict, "file_data": []}
+            # Load file data
+            if not campaign_dict["file_path"]:
+                logger.warning(f"Campaign {campaign_id} has no file path configured")
+                return {"campaign": campaign_dict, "file_data": [], "plan": None}
+            
+            # Check if file exists
+            if not os.path.exists(campaign_dict["file_path"]):
+                logger.error(f"Campaign {campaign_id}: File not found: {campaign_dict['file_path']}")
+                return None
+            
+            try:
+                processor = self.file_handler.get_processor(campaign_dict["file_path"])
+                # Upload-time profile: cached encoding/delimiter/headers and a row-offset index
+                profile = self.file_handler.get_profile(campaign_dict["file_path"])
+                rows = lambda: processor.iter_rows(
+                    campaign_dict["file_path"],
+                    start_row=campaign_dict["first_row"],
+                    end_row=campaign_dict["end_row"],
+                    profile=profile
+                )
                 
-                # Check if file exists
-                if not os.path.exists(campaign_dict["file_path"]):
-                    logger.error(f"Campaign {campaign_id}: File not found: {campaign_dict['file_path']}")
-                    return None
+                # Compile the whole range once (validation, filters, de-dup); a resumed run reuses the plan
+                loop = asyncio.get_running_loop()
+                plan = await loop.run_in_executor(None, self.plan_compiler.get_plan, campaign_dict, rows, profile)
                 
-                try:
-                    processor = self.file_handler.get_processor(campaign_dict["file_path"])
-                    file_data = processor.read_data(
-                        campaign_dict["file_path"],
-                        start_row=campaign_dict["start_row"],
-                        end_row=campaign_dict["end_row"]
-                    )
-                    logger.info(f"Campaign {campaign_id}: Loaded {len(file_data)} rows from file")
-                except Exception as file_error:
-                    logger.error(f"Campaign {campaign_id}: Failed to read file: {str(file_error)}")
-                    return None
+                # Stream planned rows lazily from the resume row
+                entries = self.plan_compiler.iter_entries(campaign_id, plan, campaign_dict["resume_row"])
+                first_entry = next(entries, None)
+                file_data = itertools.chain([first_entry], entries) if first_entry is not None else []
                 
                 # Update total rows if not set
                 if campaign_dict["total_rows"] == 0:
-                    campaign.total_rows = len(file_data)
-                    campaign_dict["total_rows"] = len(file_data)
-                    db.commit()
+                    with get_db() as db:
+                        db.query(Campaign).filter(Campaign.id == campaign_id).update(
+                            {Campaign.total_rows: plan["rows"]}, synchronize_session=False
+                        )
+                        db.commit()
+                    campaign_dict["total_rows"] = plan["rows"]
                 
-                return {
-                    "campaign": campaign_dict,
-                    "file_data": file_data
-                }
+                logger.info(f"Campaign {campaign_id}: Streaming {plan['accepted']} of {campaign_dict['total_rows']} rows from dispatch plan")
+            except Exception as file_error:
+                logger.error(f"Campaign {campaign_id}: Failed to read file: {str(file_error)}")
+                return None
+            
+            return {
+                "campaign": campaign_dict,
+                "file_data": file_data,
+                "plan": plan
+            }
                 
         except Exception as e:
             logger.error(f"Failed to load campaign data {campaign_id}: {str(e)}")
             return None
     
-    async def _process_single_message(self, campaign: Dict[str, Any], row_data: Dict[str, Any], row_number: int):
-        """Process and send a single message"""
+    async def _produce_rows(self, campaign: Dict[str, Any], file_data: Iterable[Dict[str, Any]], send_queue: asyncio.Queue):
+        """Producer stage: prepare planned rows ahead of the sender and hand them over through the queue"""
+        campaign_id = campaign["id"]
         try:
-            # Apply column mapping to transform raw data
-            mapped_data = self._apply_column_mapping(row_data, campaign.get("column_mapping", {}))
-            
-            # Check conditions before processing
-            if campaign.get("exclude_my_contacts", False):
-                # Check if contact is saved in phone
-                if mapped_data.get("is_my_contact") in [True, "true", "True", "yes", "Yes", "1", 1]:
-                    logger.info(f"Skipping row {row_number}: Contact is saved in phone")
-                    await self._record_delivery_error(campaign["id"], row_number, "Skipped: Contact is saved in phone")
-                    return
+            for entry in file_data:
+                if self.stop_flags.get(campaign_id, False):
+                    break
+                
+                row_number = entry["row"]
+                if row_number in campaign["skip_rows"]:
+                    # Already handled by an earlier run
+                    continue
+                
+                try:
+                    prepared = await self._prepare_row(campaign, entry)
+                except Exception as e:
+                    logger.error(f"Error processing row {row_number} in campaign {campaign_id}: {str(e)}")
+                    await self._record_delivery_error(campaign_id, row_number, str(e))
+                    prepared = None
+                
+                if prepared:
+                    # Blocks once the producer is pipeline_depth rows ahead
+                    await send_queue.put(prepared)
+                else:
+                    # Rejected rows cost no send time; just let the sender run
+                    await asyncio.sleep(0)
+        except Exception as e:
+            logger.error(f"Campaign {campaign_id}: row producer failed: {str(e)}")
+            # End the stream so the sender stops, then hand the failure to the campaign
+            await send_queue.put(None)
+            raise
+        
+        # End of stream
+        await send_queue.put(None)
+    
+    async def _fanout_senders(self, campaign: Dict[str, Any], send_queue: asyncio.Queue):
+        """Sender stage for multi-session campaigns: one paced sender per session, fed by a dispatcher"""
+        fanout = SessionFanout(campaign, campaign["fanout_sessions"], self.waha.base_url)
+        logger.info(f"Campaign {campaign['id']}: fanning out over {len(fanout.sessions)} sessions")
+        
+        senders = [
+            asyncio.create_task(self._session_sender(campaign, fanout.lanes[session], session, fanout))
+            for session in fanout.sessions
+        ]
+        try:
+            await fanout.dispatch(send_queue)
+        except Exception:
+            fanout.halt()
+            raise
+        finally:
+            # dispatch() always ends each lane, so senders finish their current row and exit
+            results = await asyncio.gather(*senders, return_exceptions=True)
             
-            if campaign.get("exclude_previous_conversations", False):
-                # Check if there's previous conversation (last_msg_status not empty)
-                if mapped_data.get("last_msg_status") and str(mapped_data.get("last_msg_status")).strip():
-                    logger.info(f"Skipping row {row_number}: Previous conversation exists")
-                    await self._record_delivery_error(campaign["id"], row_number, "Skipped: Previous conversation exists")
-                    return
+            unsent = fanout.drain()
+            if unsent:
+                delivery_journal.discard([prepared["delivery"] for prepared in unsent])
+        
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+    
+    async def _session_sender(
+        self,
+        campaign: Dict[str, Any],
+        send_queue: asyncio.Queue,
+        waha_session_name: Optional[str] = None,
+        fanout: Optional[SessionFanout] = None
+    ):
+        """Sender stage: send prepared rows on one WAHA session, paced by delay_seconds"""
+        campaign_id = campaign["id"]
+        waha_session_name = waha_session_name or campaign.get("waha_session_name", campaign["session_name"])
+        loop = asyncio.get_running_loop()
+        next_send_at = loop.time()
+        
+        # The session bucket paces every sender on the session, so a shorter delay is not honoured
+        if campaign["delay_seconds"] < send_rate_limiter.session_interval:
+            logger.warning(
+                f"Campaign {campaign_id}: delay of {campaign['delay_seconds']}s is below the "
+                f"{send_rate_limiter.session_interval:.1f}s per-session rate limit; session "
+                f"{waha_session_name} will send every {send_rate_limiter.session_interval:.1f}s "
+                f"once its burst is spent (RATE_LIMIT_SESSION_PER_MINUTE)"
+            )
+        
+        while True:
+            prepared = await send_queue.get()
+            if prepared is None:
+                break
+            if fanout:
+                fanout.start_row(waha_session_name)
             
-            # Validate mapped data
-            validation_result = self.validator.validate_row(mapped_data, row_number)
-            if not validation_result["valid"]:
-                error_msg = "; ".join(validation_result["errors"])
-                await self._record_delivery_error(campaign["id"], row_number, f"Validation failed: {error_msg}")
-                return
+            # Pace on send start times so per-row bookkeeping overlaps the delay
+            wait = next_send_at - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
             
-            processed_data = validation_result["processed_data"]
+            # Draw from the session's and instance's buckets (shared with warmers and the API)
+            try:
+                await send_rate_limiter.acquire(
+                    waha_session_name, self.waha.base_url, daily_cap=campaign.get("max_daily_messages")
+                )
+            except RateLimitExceeded as e:
+                if not fanout:
+                    delivery_journal.discard([prepared["delivery"]])
+                    raise
+                # The dispatcher stops picking this session once its quota is gone
+                logger.info(f"Campaign {campaign_id}: {str(e)}")
+                fanout.hand_back(waha_session_name, prepared)
+                continue
             
-            # Check required fields
-            if 'phone_number' not in processed_data:
-                error_msg = f"Missing phone number in row. Available columns: {list(processed_data.keys())}"
-                logger.warning(f"Campaign {campaign['id']}, Row {row_number}: {error_msg}")
-                await self._record_delivery_error(campaign["id"], row_number, error_msg)
-                return
+            if (fanout and fanout.halted) or self._is_campaign_halted(campaign_id):
+                send_rate_limiter.refund(waha_session_name)
+                delivery_journal.discard([prepared["delivery"]])
+                if fanout:
+                    fanout.finish_row(waha_session_name)
+                    fanout.halt()
+                break
             
-            phone_number = processed_data['phone_number']
-            recipient_name = processed_data.get('name', '')
-            
-            # Format phone number to match expected format (with space after country code)
-            # This handles both formats: "+16176596898" and "+1 6176596898"
-            if phone_number and not ' ' in phone_number:
-                # Add space after country code if missing
-                if phone_number.startswith('+1') and len(phone_number) > 2:
-                    phone_number = f"+1 {phone_number[2:]}"
-                elif phone_number.startswith('+234') and len(phone_number) > 4:
-                    phone_number = f"+234 {phone_number[4:]}"
-                elif phone_number.startswith('+91') and len(phone_number) > 3:
-                    phone_number = f"+91 {phone_number[3:]}"
-                elif phone_number.startswith('+44') and len(phone_number) > 3:
-                    phone_number = f"+44 {phone_number[3:]}"
-                # Add more country codes as needed
-            
-            # Generate message content
-            message_result = await self._generate_message_content(campaign, processed_data)
-            if not message_result["success"]:
-                await self._record_delivery_error(campaign["id"], row_number, message_result["error"])
-                return
+            # Rebalance: a session that left WORKING gives its row to the others
+            if fanout and not await fanout.is_available(waha_session_name):
+                send_rate_limiter.refund(waha_session_name)
+                fanout.hand_back(waha_session_name, prepared)
+                await fanout.wait_until_available(waha_session_name)
+                continue
             
-            sample_index = message_result["sample_index"]
-            sample_text = message_result["sample_text"]
-            final_message = message_result["final_message"]
+            # The row must be recorded as in flight before it can reach WhatsApp;
+            # one flush covers every row the producer has prepared so far
+            if not delivery_journal.is_durable(prepared["delivery"]):
+                await delivery_journal.flush_async()
+                if not delivery_journal.is_durable(prepared["delivery"]):
+                    send_rate_limiter.refund(waha_session_name)
+                    delivery_journal.discard([prepared["delivery"]])
+                    if fanout:
+                        fanout.finish_row(waha_session_name)
+                        fanout.halt()
+                    raise RuntimeError("Could not persist campaign cursor before sending")
             
-            # Create delivery record
-            delivery_id = await self._create_delivery_record(
-                campaign["id"], row_number, phone_number, recipient_name,
-                sample_index, sample_text, final_message, processed_data
-            )
+            next_send_at = loop.time() + campaign["delay_seconds"]
+            if not await self._send_prepared_row(campaign, prepared, waha_session_name):
+                send_rate_limiter.refund(waha_session_name)
+            if fanout:
+                fanout.finish_row(waha_session_name)
             
+            # Update progress whenever the journal writes a batch
+            if await delivery_journal.note_row():
+                await self._update_campaign_progress(campaign_id)
+    
+    def _on_campaign_event(self, event: str, campaign_id: int):
+        """Note pauses of campaigns this worker is sending, so senders stop without a DB read"""
+        if event == CAMPAIGN_PAUSED and campaign_id in self.active_campaigns:
+            self.paused_campaigns.add(campaign_id)
+    
+    def _is_campaign_halted(self, campaign_id: int, recheck: bool = False) -> bool:
+        """Check whether the campaign was stopped by the user or paused (e.g. by message limits)
+        
+        Stop flags and pause events are checked on every row; the stored status only
+        every halt_check_seconds (or when recheck is set).
+        """
+        if self.stop_flags.get(campaign_id, False):
+            logger.info(f"Campaign {campaign_id} processing stopped by user")
+            return True
+        
+        if campaign_id in self.paused_campaigns:
+            logger.info(f"Campaign {campaign_id} is paused (likely due to message limits)")
+            return True
+        
+        now = time.monotonic()
+        if not recheck and now - self._halt_checked_at.get(campaign_id, 0) < self.halt_check_seconds:
+            return False
+        self._halt_checked_at[campaign_id] = now
+        
+        with get_db() as db:
+            status = db.query(Campaign.status).filter(Campaign.id == campaign_id).scalar()
+            if status == CampaignStatus.PAUSED.value:
+                self.paused_campaigns.add(campaign_id)
+                logger.info(f"Campaign {campaign_id} is paused (likely due to message limits)")
+                return True
+        
+        return False
+    
+    async def _discard_unsent_rows(self, campaign_id: int, send_queue: asyncio.Queue):
+        """Drop rows the producer prepared but the sender never sent, so a restart picks them up again"""
+        deliveries = []
+        while not send_queue.empty():
+            prepared = send_queue.get_nowait()
+            if prepared is not None:
+                deliveries.append(prepared["delivery"])
+        
+        if deliveries:
+            delivery_journal.discard(deliveries)
+            logger.info(f"Campaign {campaign_id}: discarded {len(deliveries)} prepared but unsent rows")
+    
+    async def _record_rejected_rows(self, campaign_id: int, rejected_rows: List[Tuple[int, str]]):
+        """Record a failed delivery for every row the dispatch plan rejected"""
+        for row_number, error_message in rejected_rows:
+            await self._record_delivery_error(campaign_id, row_number, error_message)
+        
+        await delivery_journal.flush_async()
+        await self._update_campaign_progress(campaign_id)
+        logger.info(f"🧹 Campaign {campaign_id}: {len(rejected_rows)} rows rejected before sending")
+    
+    async def _prepare_row(self, campaign: Dict[str, Any], entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Render a planned row and create its pending delivery record.
+        
+        Returns the prepared row for the sender, or None if no message could be
+        generated (recorded as a failed delivery).
+        """
+        row_number = entry["row"]
+        processed_data = entry["data"]
+        phone_number = entry["phone_number"]
+        recipient_name = entry["name"]
+        
+        # Generate message content
+        message_result = await self._generate_message_content(campaign, processed_data)
+        if not message_result["success"]:
+            await self._record_delivery_error(campaign["id"], row_number, message_result["error"])
+            return None
+        
+        sample_index = message_result["sample_index"]
+        sample_text = message_result["sample_text"]
+        final_message = message_result["final_message"]
+        
+        # Create delivery record (pending until the sender picks it up)
+        delivery = await self._create_delivery_record(
+            campaign["id"], row_number, phone_number, recipient_name,
+            sample_index, sample_text, final_message, processed_data
+        )
+        
+        return {
+            "delivery": delivery,
+            "row_number": row_number,
+            "row_data": processed_data,
+            "phone_number": phone_number,
+            "chat_id": entry["chat_id"],
+            "sample_index": sample_index,
+            "final_message": final_message
+        }
+    
+    async def _send_prepared_row(self, campaign: Dict[str, Any], prepared: Dict[str, Any], waha_session_name: str) -> bool:
+        """Send a prepared row on a WAHA session and record the outcome. Returns True if sent"""
+        delivery = prepared["delivery"]
+        phone_number = prepared["phone_number"]
+        sample_index = prepared["sample_index"]
+        delivery["values"]["session_name"] = waha_session_name
+        
+        try:
             # Check session health (use WAHA session name)
-            if not await self._check_session_health(campaign.get("waha_session_name", campaign["session_name"]), campaign["id"]):
-                await self._update_delivery_status(delivery_id, DeliveryStatus.FAILED, "Session not available")
-                return
+            if not await self._check_session_health(waha_session_name, campaign["id"]):
+                await self._update_delivery_status(delivery, DeliveryStatus.FAILED, "Session not available")
+                return False
             
             # Save contact if enabled (use WAHA session name)
             if campaign.get("save_contact_before_message", False):
                 contact_saved = await self._save_contact_before_send(
-                    campaign["id"], campaign.get("waha_session_name", campaign["session_name"]), phone_number, row_data
+                    campaign["id"], waha_session_name, phone_number, prepared["row_data"]
                 )
                 if not contact_saved:
                     logger.warning(f"Could not save contact {phone_number}, but continuing with message")
             
             # Send message (use WAHA session name)
             send_result = await self._send_whatsapp_message(
-                campaign["id"], campaign.get("waha_session_name", campaign["session_name"]), phone_number, final_message
+                campaign["id"], waha_session_name, phone_number, prepared["final_message"],
+                user_id=campaign.get("user_id"), chat_id=prepared["chat_id"]
             )
             
             if send_result["success"]:
@@ -372,7 +694,7 @@ class MessageProcessor:
                     message_id = str(message_id) if message_id else ""
                     
                 await self._update_delivery_status(
-                    delivery_id, 
+                    delivery, 
                     DeliveryStatus.SENT, 
                     None,
                     whatsapp_message_id=message_id
@@ -383,32 +705,27 @@ class MessageProcessor:
                 
                 # Update user metrics
                 if campaign.get("user_id"):
-                    from database.user_metrics import UserMetrics
-                    from database.connection import get_db
-                    with get_db() as db:
-                        metrics = UserMetrics.get_or_create(db, campaign["user_id"])
-                        metrics.add_messages(db, sent=1)
+                    delivery_journal.record_user_messages(campaign["user_id"], sent=1)
                 
                 logger.debug(f"Message sent successfully to {phone_number}")
+                return True
                 
             else:
                 # Update delivery as failed
-                await self._update_delivery_status(delivery_id, DeliveryStatus.FAILED, send_result["error"])
+                await self._update_delivery_status(delivery, DeliveryStatus.FAILED, send_result["error"])
                 await self._update_sample_analytics(campaign["id"], sample_index, success=False)
                 
                 # Update user metrics
                 if campaign.get("user_id"):
-                    from database.user_metrics import UserMetrics
-                    from database.connection import get_db
-                    with get_db() as db:
-                        metrics = UserMetrics.get_or_create(db, campaign["user_id"])
-                        metrics.add_messages(db, failed=1)
+                    delivery_journal.record_user_messages(campaign["user_id"], failed=1)
                 
                 logger.warning(f"Failed to send message to {phone_number}: {send_result['error']}")
+                return False
             
         except Exception as e:
-            logger.error(f"Error processing message for row {row_number}: {str(e)}")
-            await self._record_delivery_error(campaign["id"], row_number, f"Processing error: {str(e)}")
+            logger.error(f"Error processing message for row {prepared['row_number']}: {str(e)}")
+            await self._update_delivery_status(delivery, DeliveryStatus.FAILED, f"Processing error: {str(e)}")
+            return False
     
     async def _generate_message_content(self, campaign: Dict[str, Any], row_data: Dict[str, Any]) -> Dict[str, Any]:
         """Generate message content with random sample selection"""
@@ -420,13 +737,7 @@ class MessageProcessor:
             # Extract campaign samples for both SINGLE and MULTIPLE modes
             if campaign["message_samples"]:
                 # For both SINGLE and MULTIPLE modes, we need the samples
-                campaign_samples = []
-                for sample in campaign["message_samples"]:
-                    # Handle both dict format and direct string format
-                    if isinstance(sample, dict) and "text" in sample:
-                        campaign_samples.append(sample["text"])
-                    elif isinstance(sample, str):
-                        campaign_samples.append(sample)
+                campaign_samples = self._extract_sample_texts(campaign)
                 
                 # If no samples were extracted, log error
                 if not campaign_samples:
@@ -461,12 +772,20 @@ class MessageProcessor:
                 "final_message": None
             }
     
+    def _extract_sample_texts(self, campaign: Dict[str, Any]) -> List[str]:
+        """Get the campaign's message sample texts (samples may be dicts or plain strings)"""
+        sample_texts = []
+        for sample in campaign.get("message_samples") or []:
+            # Handle both dict format and direct string format
+            if isinstance(sample, dict) and "text" in sample:
+                sample_texts.append(sample["text"])
+            elif isinstance(sample, str):
+                sample_texts.append(sample)
+        return sample_texts
+    
     async def _save_contact_before_send(self, campaign_id: int, session_name: str, phone_number: str, row_data: Dict[str, Any]) -> bool:
         """Save contact to WhatsApp before sending message"""
         try:
-            # Get isolated WAHA client for this campaign
-            waha_client = self._get_campaign_waha_client(campaign_id)
-            
             # Extract contact name from row data
             contact_name = None
             # Try common name fields
@@ -488,7 +807,7 @@ class MessageProcessor:
                 chat_id = f"{clean_phone}@c.us"
                 
                 # Create/update contact using the correct endpoint
-                result = waha_client._make_request(
+                result = await self.waha._make_request(
                     "PUT",
                     f"/api/{session_name}/contacts/{chat_id}",
                     json={
@@ -508,74 +827,40 @@ class MessageProcessor:
             logger.error(f"Error in save_contact_before_send: {str(e)}")
             return False
     
-    async def _send_whatsapp_message(self, campaign_id: int, session_name: str, phone_number: str, message: str) -> Dict[str, Any]:
+    async def _send_whatsapp_message(self, campaign_id: int, session_name: str, phone_number: str, message: str,
+                                     user_id: Optional[str] = None, chat_id: Optional[str] = None) -> Dict[str, Any]:
         """Send WhatsApp message via WAHA with subscription limit enforcement"""
+        reserved = False
         try:
-            # CHECK MESSAGE LIMITS BEFORE SENDING
-            from database.subscription_models import UserSubscription
-            
-            with get_db() as db:
-                # Get campaign to find user_id
-                campaign = db.query(Campaign).filter(Campaign.id == campaign_id).first()
-                if campaign and campaign.user_id:
-                    # Get user subscription
-                    user_sub = db.query(UserSubscription).filter(
-                        UserSubscription.user_id == campaign.user_id
-                    ).first()
+            # CHECK MESSAGE LIMITS BEFORE SENDING (reserved from the in-memory quota ledger)
+            if user_id:
+                if not await quota_ledger.reserve(user_id, "messages"):
+                    usage = quota_ledger.cached_usage(user_id, "messages") or {}
+                    plan_type = usage.get("plan_type")
+                    plan = plan_type.value if hasattr(plan_type, "value") else str(plan_type)
+                    error_msg = f"Monthly message limit reached ({usage.get('used')}/{usage.get('limit')}). Upgrade to {self._get_next_plan(plan)} plan for more messages."
+                    logger.warning(f"Campaign {campaign_id} stopped: {error_msg}")
                     
-                    if user_sub:
-                        # Check if user has reached message limit
-                        if not user_sub.is_within_limits("messages"):
-                            error_msg = f"Monthly message limit reached ({user_sub.messages_sent_this_month}/{user_sub.max_messages_per_month}). Upgrade to {self._get_next_plan(user_sub.plan_type.value)} plan for more messages."
-                            logger.warning(f"Campaign {campaign_id} stopped: {error_msg}")
-                            
-                            # Stop the campaign and store error message
-                            campaign.status = CampaignStatus.PAUSED.value
-                            campaign.error_details = error_msg
-                            campaign.updated_at = datetime.utcnow()
-                            db.commit()
-                            
-                            return {
-                                "success": False,
-                                "error": error_msg,
-                                "message_id": None,
-                                "limit_reached": True
-                            }
-            
-            # Format chat ID based on whether it's a group or individual
-            # Groups have IDs ending with @g.us or containing 'g.us'
-            if '@g.us' in phone_number or '-' in phone_number:
-                # It's already a group ID or looks like a group ID
-                if '@g.us' not in phone_number:
-                    chat_id = f"{phone_number}@g.us"
-                else:
-                    chat_id = phone_number
-            else:
-                # It's an individual user
-                chat_id = f"{phone_number}@c.us"
+                    # Stop the campaign and store error message
+                    await self._pause_campaign(campaign_id, error_msg)
+                    
+                    return {
+                        "success": False,
+                        "error": error_msg,
+                        "message_id": None,
+                        "limit_reached": True
+                    }
+                reserved = True
             
-            # Get isolated WAHA client for this campaign
-            waha_client = self._get_campaign_waha_client(campaign_id)
+            # Format chat ID based on whether it's a group or individual (precomputed by the dispatch plan)
+            chat_id = chat_id or format_chat_id(phone_number)
             
             # Send message
-            result = waha_client.send_text(session_name, chat_id, message)
+            result = await self.waha.send_text(session_name, chat_id, message)
             
             # Extract just the ID string from the response
             message_id = result.get("id") if isinstance(result.get("id"), str) else str(result.get("id", ""))
             
-            # INCREMENT MESSAGE COUNTER AFTER SUCCESSFUL SEND
-            with get_db() as db:
-                campaign = db.query(Campaign).filter(Campaign.id == campaign_id).first()
-                if campaign and campaign.user_id:
-                    user_sub = db.query(UserSubscription).filter(
-                        UserSubscription.user_id == campaign.user_id
-                    ).first()
-                    
-                    if user_sub:
-                        user_sub.messages_sent_this_month += 1
-                        db.commit()
-                        logger.debug(f"User {campaign.user_id} message count: {user_sub.messages_sent_this_month}/{user_sub.max_messages_per_month}")
-            
             return {
                 "success": True,
                 "message_id": message_id,
@@ -584,6 +869,9 @@ class MessageProcessor:
             
         except Exception as e:
             logger.error(f"WAHA send error: {str(e)}")
+            # The message was not sent, give the reserved quota back
+            if reserved:
+                quota_ledger.release(user_id, "messages")
             return {
                 "success": False,
                 "error": str(e),
@@ -604,21 +892,15 @@ class MessageProcessor:
     async def _check_session_health(self, session_name: str, campaign_id: Optional[int] = None) -> bool:
         """Check if WhatsApp session is healthy and ready"""
         try:
-            # Use campaign-specific client if campaign_id provided, otherwise use default
-            waha_client = self._get_campaign_waha_client(campaign_id) if campaign_id else self.default_waha
-            sessions = waha_client.get_sessions()
-            logger.debug(f"Available sessions: {[s.get('name') for s in sessions]}")
-            
-            for session in sessions:
-                if session.get("name") == session_name:
-                    status = session.get("status")
-                    logger.info(f"Session '{session_name}' status: {status}")
-                    if status != "WORKING":
-                        logger.warning(f"Session '{session_name}' is not in WORKING state, current status: {status}")
-                    return status == "WORKING"
-            
-            logger.error(f"Session '{session_name}' not found in available sessions")
-            return False
+            status = await session_health_cache.get_status(session_name, self.waha.base_url)
+            if status is None:
+                logger.error(f"Session '{session_name}' not found in available sessions")
+                return False
+            
+            logger.debug(f"Session '{session_name}' status: {status}")
+            if status != "WORKING":
+                logger.warning(f"Session '{session_name}' is not in WORKING state, current status: {status}")
+            return status == "WORKING"
         except Exception as e:
             logger.error(f"Session health check failed: {str(e)}")
             return False
@@ -633,101 +915,116 @@ class MessageProcessor:
         sample_text: Optional[str],
         final_message: str,
         variable_data: Dict[str, Any]
-    ) -> int:
-        """Create delivery record in database"""
-        try:
-            with get_db() as db:
-                delivery = Delivery(
-                    campaign_id=campaign_id,
-                    row_number=row_number,
-                    phone_number=phone_number,
-                    recipient_name=recipient_name,
-                    selected_sample_index=sample_index,
-                    selected_sample_text=sample_text,
-                    final_message_content=final_message,
-                    variable_data=variable_data,
-                    status=DeliveryStatus.SENDING.value
-                )
-                
-                db.add(delivery)
-                db.flush()
-                delivery_id = delivery.id
-                db.commit()
-                
-                return delivery_id
-                
-        except Exception as e:
-            logger.error(f"Failed to create delivery record: {str(e)}")
-            raise
+    ) -> Dict[str, Any]:
+        """Queue a pending delivery record in the delivery journal"""
+        return delivery_journal.add_delivery(
+            campaign_id=campaign_id,
+            row_number=row_number,
+            phone_number=phone_number,
+            recipient_name=recipient_name,
+            selected_sample_index=sample_index,
+            selected_sample_text=sample_text,
+            final_message_content=final_message,
+            variable_data=variable_data,
+            status=DeliveryStatus.PENDING.value
+        )
     
     async def _update_delivery_status(
         self, 
-        delivery_id: int, 
+        delivery: Dict[str, Any], 
         status: DeliveryStatus, 
         error_message: Optional[str] = None,
         whatsapp_message_id: Optional[str] = None
     ):
         """Update delivery status"""
-        try:
-            with get_db() as db:
-                delivery = db.query(Delivery).filter(Delivery.id == delivery_id).first()
-                if delivery:
-                    delivery.status = status.value
-                    delivery.error_message = error_message
-                    delivery.whatsapp_message_id = whatsapp_message_id
-                    
-                    if status == DeliveryStatus.SENT:
-                        delivery.sent_at = datetime.utcnow()
-                    elif status == DeliveryStatus.DELIVERED:
-                        delivery.delivered_at = datetime.utcnow()
-                    
-                    db.commit()
-                    
-        except Exception as e:
-            logger.error(f"Failed to update delivery status: {str(e)}")
+        delivery_journal.update_status(delivery, status, error_message, whatsapp_message_id)
+        
+        if status in (DeliveryStatus.SENT, DeliveryStatus.DELIVERED, DeliveryStatus.FAILED):
+            values = delivery["values"]
+            # Row number and outcome only: deltas must not carry recipient data
+            self._count_outcome(values["campaign_id"], success=status != DeliveryStatus.FAILED, row={
+                "row": values.get("row_number"),
+                "status": status.value
+            })
     
     async def _record_delivery_error(self, campaign_id: int, row_number: int, error_message: str):
         """Record delivery error"""
+        delivery_journal.add_error(campaign_id, row_number, error_message)
+        self._count_outcome(campaign_id, success=False, row={
+            "row": row_number, "status": DeliveryStatus.FAILED.value
+        })
+    
+    def _count_outcome(self, campaign_id: int, success: bool, row: Optional[Dict[str, Any]] = None):
+        """Count a finished delivery in the campaign's in-memory progress counters"""
+        counters = self.progress_counters.get(campaign_id)
+        if counters is None:
+            return
+        
+        counters["processed"] += 1
+        if success:
+            counters["success"] += 1
+        else:
+            counters["error"] += 1
+        self._publish_progress(campaign_id, row=row)
+    
+    def _publish_progress(self, campaign_id: int, row: Optional[Dict[str, Any]] = None, **fields):
+        """Push the campaign's counters (and any extra fields) to WebSocket subscribers, coalesced"""
+        counters = self.progress_counters.get(campaign_id)
+        if counters:
+            fields.update(counters)
+        campaign_progress.publish(campaign_id, fields, row)
+    
+    async def reconcile_campaign_progress(self, campaign_id: int) -> Optional[Dict[str, int]]:
+        """Rebuild a campaign's progress counters from its delivery records and persist them
+        
+        Used when processing starts and after a crash, when the stored counters may be stale.
+        """
         try:
+            # Make buffered deliveries visible to the count
+            await delivery_journal.flush_async()
+            
             with get_db() as db:
-                delivery = Delivery(
-                    campaign_id=campaign_id,
-                    row_number=row_number,
-                    phone_number="",
-                    status=DeliveryStatus.FAILED.value,
-                    error_message=error_message
-                )
+                rows = db.query(Delivery.status, func.count(Delivery.id)).filter(
+                    Delivery.campaign_id == campaign_id
+                ).group_by(Delivery.status).all()
                 
-                db.add(delivery)
-                db.commit()
+                by_status = dict(rows)
+                success = by_status.get(DeliveryStatus.SENT.value, 0) + by_status.get(DeliveryStatus.DELIVERED.value, 0)
+                counters = {
+                    # Pending rows are prepared but not yet sent
+                    "processed": sum(count for status, count in rows if status != DeliveryStatus.PENDING.value),
+                    "success": success,
+                    "error": by_status.get(DeliveryStatus.FAILED.value, 0)
+                }
                 
+                db.query(Campaign).filter(Campaign.id == campaign_id).update({
+                    Campaign.processed_rows: counters["processed"],
+                    Campaign.success_count: counters["success"],
+                    Campaign.error_count: counters["error"]
+                }, synchronize_session=False)
+                db.commit()
+            
+            self.progress_counters[campaign_id] = counters
+            return counters
+            
         except Exception as e:
-            logger.error(f"Failed to record delivery error: {str(e)}")
+            logger.error(f"Failed to reconcile campaign progress {campaign_id}: {str(e)}")
+            return None
     
     async def _update_campaign_progress(self, campaign_id: int):
-        """Update campaign progress based on delivery records"""
+        """Persist the campaign's in-memory progress counters"""
+        counters = self.progress_counters.get(campaign_id)
+        if counters is None:
+            await self.reconcile_campaign_progress(campaign_id)
+            return
+        
         try:
             with get_db() as db:
-                campaign = db.query(Campaign).filter(Campaign.id == campaign_id).first()
-                if not campaign:
-                    return
-                
-                # Count deliveries
-                total_deliveries = db.query(Delivery).filter(Delivery.campaign_id == campaign_id).count()
-                successful_deliveries = db.query(Delivery).filter(
-                    Delivery.campaign_id == campaign_id,
-                    Delivery.status.in_([DeliveryStatus.SENT.value, DeliveryStatus.DELIVERED.value])
-                ).count()
-                failed_deliveries = db.query(Delivery).filter(
-                    Delivery.campaign_id == campaign_id,
-                    Delivery.status == DeliveryStatus.FAILED.value
-                ).count()
-                
-                # Update campaign
-                campaign.processed_rows = total_deliveries
-                campaign.success_count = successful_deliveries
-                campaign.error_count = failed_deliveries
-                
+                db.query(Campaign).filter(Campaign.id == campaign_id).update({
+                    Campaign.processed_rows: counters["processed"],
+                    Campaign.success_count: counters["success"],
+                    Campaign.error_count: counters["error"]
+                }, synchronize_session=False)
                 db.commit()
                 
         except Exception as e:
@@ -735,27 +1032,7 @@ class MessageProcessor:
     
     async def _update_sample_analytics(self, campaign_id: int, sample_index: Optional[int], success: bool):
         """Update sample analytics"""
-        if sample_index is None:
-            return
-        
-        try:
-            with get_db() as db:
-                analytics = db.query(CampaignAnalytics).filter(
-                    CampaignAnalytics.campaign_id == campaign_id,
-                    CampaignAnalytics.sample_index == sample_index
-                ).first()
-                
-                if analytics:
-                    analytics.usage_count += 1
-                    if success:
-                        analytics.success_count += 1
-                    else:
-                        analytics.error_count += 1
-                    
-                    db.commit()
-                    
-        except Exception as e:
-            logger.error(f"Failed to update sample analytics: {str(e)}")
+        delivery_journal.record_sample_result(campaign_id, sample_index, success)
     
     async def _mark_campaign_completed(self, campaign_id: int):
         """Mark campaign as completed"""
@@ -768,6 +1045,11 @@ class MessageProcessor:
                     db.commit()
                     
                     logger.info(f"Campaign {campaign_id} marked as completed")
+                    campaign_events.emit(CAMPAIGN_COMPLETED, campaign_id)
+                    self._publish_progress(campaign_id, status=CampaignStatus.COMPLETED.value)
+                    
+                    # The dispatch plan is only needed to resume
+                    self.plan_compiler.remove(campaign_id)
                     
                     # Resume any paused warmers
                     await self._resume_warmers_after_campaign(campaign)
@@ -775,6 +1057,24 @@ class MessageProcessor:
         except Exception as e:
             logger.error(f"Failed to mark campaign completed: {str(e)}")
     
+    async def _pause_campaign(self, campaign_id: int, reason: str):
+        """Pause a running campaign and record why"""
+        try:
+            with get_db() as db:
+                campaign = db.query(Campaign).filter(Campaign.id == campaign_id).first()
+                if campaign and campaign.status == CampaignStatus.RUNNING.value:
+                    campaign.status = CampaignStatus.PAUSED.value
+                    campaign.error_details = reason
+                    campaign.updated_at = datetime.utcnow()
+                    db.commit()
+                    
+                    logger.warning(f"⏸️ Campaign {campaign_id} paused: {reason}")
+                    campaign_events.emit(CAMPAIGN_PAUSED, campaign_id)
+                    self._publish_progress(campaign_id, status=CampaignStatus.PAUSED.value, reason=reason)
+                    
+        except Exception as e:
+            logger.error(f"Failed to pause campaign: {str(e)}")
+    
     async def _mark_campaign_failed(self, campaign_id: int, error_message: str):
         """Mark campaign as failed"""
         try:
@@ -787,6 +1087,10 @@ class MessageProcessor:
                     db.commit()
                     
                     logger.error(f"Campaign {campaign_id} marked as failed: {error_message}")
+                    campaign_events.emit(CAMPAIGN_FAILED, campaign_id)
+                    self._publish_progress(
+                        campaign_id, status=CampaignStatus.FAILED.value, error=error_message
+                    )
                     
                     # Resume any paused warmers
                     await self._resume_warmers_after_campaign(campaign)
@@ -876,6 +1180,9 @@ class MessageProcessor:
         return {
             "active_campaigns": list(self.active_campaigns.keys()),
             "total_active": len(self.active_campaigns),
+            "progress": {campaign_id: dict(counters) for campaign_id, counters in self.progress_counters.items()},
+            "template_cache": self.template_engine.get_cache_stats(),
+            "phone_cache": PhoneValidator.get_cache_stats(),
             "processor_health": "healthy"
         }
 
@@ -1,12 +1,17 @@
 """
 Campaign Scheduler - Background task management and automation
-Handles campaign scheduling, monitoring, and automated operations
+Handles campaign scheduling, monitoring, and automated operations.
+Event driven: scheduled starts sit in a timer heap and campaign lifecycle
+events wake the loop at once; full table scans only run as a safety net
 """
 
 import asyncio
+import heapq
 import logging
+import os
+import time
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 
@@ -14,6 +19,12 @@ from database.connection import get_db
 from database.models import Campaign, Delivery
 from jobs.models import CampaignStatus
 from jobs.processor import message_processor
+from jobs.admission import admission_controller
+from jobs import dispatch_plan
+from quota_ledger import quota_ledger
+from jobs.campaign_events import (
+    campaign_events, CAMPAIGN_CREATED, CAMPAIGN_UPDATED, CAMPAIGN_QUEUED, CAMPAIGN_STARTED, SLOT_FREED_EVENTS
+)
 import json
 
 logger = logging.getLogger(__name__)
@@ -24,7 +35,14 @@ class CampaignScheduler:
     def __init__(self):
         self.running = False
         self.scheduler_task = None
-        self.check_interval = 30  # seconds
+        self.check_interval = float(os.getenv("SCHEDULER_SAFETY_NET_SECONDS", "300"))  # full scan safety net
+        self.monitor_interval = float(os.getenv("SCHEDULER_MONITOR_SECONDS", "30"))     # active campaign health
+        self.cleanup_interval = float(os.getenv("SCHEDULER_CLEANUP_SECONDS", "3600"))   # old delivery cleanup
+        
+        self._timers: List[Tuple[datetime, int]] = []     # min-heap of (scheduled_start_time, campaign_id)
+        self._pending_events: List[Tuple[str, int]] = []  # lifecycle events not handled yet
+        self._wake: Optional[asyncio.Event] = None
+        self._loop = None
         
     async def start(self):
         """Start the scheduler"""
@@ -33,6 +51,14 @@ class CampaignScheduler:
             return
         
         self.running = True
+        self._wake = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        campaign_events.subscribe(self._on_campaign_event)
+        
+        # Cursors and counters may be stale if the process died mid-campaign;
+        # running campaigns are then resumed from their cursor by the scheduler loop
+        await self._reconcile_campaign_progress()
+        
         self.scheduler_task = asyncio.create_task(self._scheduler_loop())
         logger.info("🕒 Campaign scheduler started")
     
@@ -42,6 +68,7 @@ class CampaignScheduler:
             return
         
         self.running = False
+        campaign_events.unsubscribe(self._on_campaign_event)
         if self.scheduler_task:
             self.scheduler_task.cancel()
             try:
@@ -51,34 +78,168 @@ class CampaignScheduler:
         
         logger.info("🛑 Campaign scheduler stopped")
     
+    async def _reconcile_campaign_progress(self):
+        """Settle in-flight rows and rebuild progress counters of unfinished campaigns"""
+        try:
+            with get_db() as db:
+                campaign_ids = [row[0] for row in db.query(Campaign.id).filter(
+                    Campaign.status.in_([
+                        CampaignStatus.RUNNING.value,
+                        CampaignStatus.PAUSED.value
+                    ])
+                ).all()]
+            
+            for campaign_id in campaign_ids:
+                if campaign_id not in message_processor.active_campaigns:
+                    await message_processor.recover_campaign_cursor(campaign_id)
+                    await message_processor.reconcile_campaign_progress(campaign_id)
+            
+            if campaign_ids:
+                logger.info(f"🔁 Reconciled progress for {len(campaign_ids)} unfinished campaigns")
+                
+        except Exception as e:
+            logger.error(f"Error reconciling campaign progress: {str(e)}")
+    
+    # ==================== EVENTS AND TIMERS ====================
+    
+    def _on_campaign_event(self, event: str, campaign_id: int):
+        """Queue a lifecycle event and wake the scheduler loop"""
+        if not self.running or self._loop is None:
+            return
+        self._pending_events.append((event, campaign_id))
+        try:
+            in_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            in_loop = False
+        if in_loop:
+            self._wake.set()
+        else:
+            # Emitted from a worker thread
+            self._loop.call_soon_threadsafe(self._wake.set)
+    
+    def _load_timers(self):
+        """Rebuild the timer heap from every scheduled campaign"""
+        with get_db() as db:
+            rows = db.query(Campaign.scheduled_start_time, Campaign.id).filter(
+                Campaign.is_scheduled == True,
+                Campaign.scheduled_start_time != None,
+                Campaign.status.in_([CampaignStatus.CREATED.value, CampaignStatus.SCHEDULED.value])
+            ).all()
+        self._timers = [(start_time, campaign_id) for start_time, campaign_id in rows]
+        heapq.heapify(self._timers)
+    
+    def _schedule_campaign(self, campaign_id: int):
+        """Add a campaign's scheduled start to the timer heap (if it has one)"""
+        with get_db() as db:
+            row = db.query(Campaign.scheduled_start_time).filter(
+                Campaign.id == campaign_id,
+                Campaign.is_scheduled == True,
+                Campaign.status.in_([CampaignStatus.CREATED.value, CampaignStatus.SCHEDULED.value])
+            ).first()
+        if row and row[0]:
+            # A stale entry for an older start time only triggers a harmless extra check
+            heapq.heappush(self._timers, (row[0], campaign_id))
+            logger.info(f"⏰ Campaign {campaign_id} scheduled for {row[0]}")
+    
+    async def _handle_events(self):
+        """React to campaign lifecycle events since the last pass"""
+        events, self._pending_events = self._pending_events, []
+        if not events:
+            return
+        
+        for campaign_id in {campaign_id for event, campaign_id in events if event in (CAMPAIGN_CREATED, CAMPAIGN_UPDATED)}:
+            self._schedule_campaign(campaign_id)
+        
+        # A campaign was set to RUNNING: give it a processor task now. A finished task
+        # also counts, as a campaign resumed while its old task was stopping still needs one
+        if any(event == CAMPAIGN_STARTED or event in SLOT_FREED_EVENTS for event, _ in events):
+            await self._check_pending_campaigns()
+        
+        # A slot may have freed up, or a campaign was queued: admit what fits
+        if any(event in SLOT_FREED_EVENTS or event in (CAMPAIGN_UPDATED, CAMPAIGN_QUEUED) for event, _ in events):
+            await self._check_queued_campaigns()
+    
+    async def _fire_due_timers(self):
+        """Start (or queue) scheduled campaigns whose time has come"""
+        now = datetime.utcnow()
+        due = False
+        while self._timers and self._timers[0][0] <= now:
+            heapq.heappop(self._timers)
+            due = True
+        if due:
+            await self._check_scheduled_campaigns()
+    
+    def _seconds_until_next(self, last_full: float, last_monitor: float, last_cleanup: float) -> float:
+        """Sleep until the next timer, safety-net scan, monitor pass or cleanup"""
+        now = time.monotonic()
+        deadlines = [last_full + self.check_interval, last_cleanup + self.cleanup_interval]
+        if message_processor.active_campaigns:
+            deadlines.append(last_monitor + self.monitor_interval)
+        
+        wait = min(deadlines) - now
+        if self._timers:
+            wait = min(wait, (self._timers[0][0] - datetime.utcnow()).total_seconds())
+        return max(0.0, wait)
+    
+    async def _wait_for_work(self, timeout: float):
+        """Sleep until timeout or until a lifecycle event arrives"""
+        if self._pending_events:
+            return
+        self._wake.clear()
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+    
+    async def _run_safety_net(self):
+        """Full table-scan pass - catches anything no event or timer covered"""
+        # Check for scheduled campaigns to start
+        await self._check_scheduled_campaigns()
+        
+        # Check for campaigns to start
+        await self._check_pending_campaigns()
+        
+        # Check for queued campaigns (admission control)
+        await self._check_queued_campaigns()
+        
+        # Health checks
+        await self._perform_health_checks()
+        
+        # Resync the timer heap with the database
+        self._load_timers()
+    
     async def _scheduler_loop(self):
         """Main scheduler loop"""
+        last_full = last_monitor = last_cleanup = float("-inf")
         try:
             while self.running:
                 try:
-                    # Check for scheduled campaigns to start
-                    await self._check_scheduled_campaigns()
+                    now = time.monotonic()
                     
-                    # Check for campaigns to start
-                    await self._check_pending_campaigns()
-                    
-                    # Check for queued campaigns (sequential execution)
-                    await self._check_queued_campaigns()
+                    if now - last_full >= self.check_interval:
+                        last_full = now
+                        # The full pass covers everything queued so far
+                        self._pending_events.clear()
+                        await self._run_safety_net()
+                    else:
+                        await self._handle_events()
+                        await self._fire_due_timers()
                     
                     # Monitor active campaigns
-                    await self._monitor_active_campaigns()
+                    if message_processor.active_campaigns and now - last_monitor >= self.monitor_interval:
+                        last_monitor = now
+                        await self._monitor_active_campaigns()
                     
                     # Cleanup completed campaigns
-                    await self._cleanup_old_data()
-                    
-                    # Health checks
-                    await self._perform_health_checks()
+                    if now - last_cleanup >= self.cleanup_interval:
+                        last_cleanup = now
+                        await self._cleanup_old_data()
                     
                 except Exception as e:
                     logger.error(f"Scheduler loop error: {str(e)}")
                 
-                # Wait before next check
-                await asyncio.sleep(self.check_interval)
+                # Wait for the next timer, event or periodic pass
+                await self._wait_for_work(self._seconds_until_next(last_full, last_monitor, last_cleanup))
                 
         except asyncio.CancelledError:
             logger.info("Scheduler loop cancelled")
@@ -97,91 +258,71 @@ class CampaignScheduler:
                     Campaign.status.in_([CampaignStatus.CREATED.value, CampaignStatus.SCHEDULED.value])
                 ).all()
                 
-                # Check if any campaigns are currently running
-                running_campaigns = db.query(Campaign).filter(
-                    Campaign.status == CampaignStatus.RUNNING.value
-                ).count()
+                if not scheduled_campaigns:
+                    return
                 
-                for i, campaign in enumerate(scheduled_campaigns):
+                for campaign in scheduled_campaigns:
                     logger.info(f"Processing scheduled campaign: {campaign.id} - {campaign.name}")
                     
-                    # Clear scheduled flag since time has arrived
+                    # Clear scheduled flag since time has arrived; admission control decides when it runs
                     campaign.is_scheduled = False
                     campaign.scheduled_start_time = None
-                    
-                    if running_campaigns == 0 and i == 0:
-                        # No campaigns running, start the first scheduled one
-                        logger.info(f"Starting scheduled campaign: {campaign.id} - {campaign.name}")
-                        
-                        # DISABLED: Warmer pausing - better to keep warmers running for natural activity
-                        # await self._pause_warmers_for_campaign(campaign)
-                        logger.info(f"Starting scheduled campaign {campaign.id} - warmers continue running")
-                        
-                        # Update campaign status to running
-                        campaign.status = CampaignStatus.RUNNING.value
-                        campaign.started_at = datetime.utcnow()
-                        db.commit()
-                        
-                        # Start processing
-                        await message_processor.start_campaign_processing(campaign.id)
-                        
-                        # Mark that we now have a running campaign
-                        running_campaigns = 1
-                    else:
-                        # Campaign is running or this is not the first scheduled campaign, queue this one
-                        logger.info(f"Queueing scheduled campaign: {campaign.id} - {campaign.name}")
-                        
-                        # Calculate queue position
-                        queued_count = db.query(Campaign).filter(
-                            Campaign.status == CampaignStatus.QUEUED.value
-                        ).count()
-                        
-                        campaign.status = CampaignStatus.QUEUED.value
-                        campaign.queue_position = queued_count + 1
-                        db.commit()
+                    campaign.status = CampaignStatus.QUEUED.value
+                    campaign.queue_position = None
+                db.commit()
+            
+            # Start whatever fits in the free slots now
+            await self._check_queued_campaigns()
                     
         except Exception as e:
             logger.error(f"Error checking scheduled campaigns: {str(e)}")
     
     async def _check_queued_campaigns(self):
-        """Check for queued campaigns to start after current one completes"""
+        """Start queued campaigns that fit in free session/user/instance slots"""
         try:
             with get_db() as db:
-                # Check if any campaigns are currently running
                 running_campaigns = db.query(Campaign).filter(
                     Campaign.status == CampaignStatus.RUNNING.value
-                ).count()
+                ).all()
+                queued_campaigns = db.query(Campaign).filter(
+                    Campaign.status == CampaignStatus.QUEUED.value
+                ).all()
+                
+                if not queued_campaigns:
+                    return
+                
+                # Plan weights come from the quota ledger's cache; load waiting users' plans off the loop
+                for user_id in {campaign.user_id for campaign in queued_campaigns if campaign.user_id}:
+                    await quota_ledger.load(user_id)
+                
+                admitted, waiting = admission_controller.plan(
+                    running_campaigns, queued_campaigns, message_processor.waha.base_url
+                )
                 
-                # If no campaigns running, start the next queued one
-                if running_campaigns == 0:
-                    next_campaign = db.query(Campaign).filter(
-                        Campaign.status == CampaignStatus.QUEUED.value
-                    ).order_by(Campaign.queue_position, Campaign.id).first()  # Process by queue position, then ID
+                for campaign in admitted:
+                    logger.info(f"Starting queued campaign: {campaign.id} - {campaign.name}")
                     
-                    if next_campaign:
-                        logger.info(f"Starting queued campaign: {next_campaign.id} - {next_campaign.name}")
-                        
-                        # DISABLED: Warmer pausing - better to keep warmers running for natural activity
-                        # await self._pause_warmers_for_campaign(next_campaign)
-                        logger.info(f"Starting queued campaign {next_campaign.id} - warmers continue running")
-                        
-                        # Update campaign status
-                        next_campaign.status = CampaignStatus.RUNNING.value
-                        next_campaign.started_at = datetime.utcnow()
-                        next_campaign.queue_position = None  # Clear queue position
-                        db.commit()
-                        
-                        # Start processing
-                        await message_processor.start_campaign_processing(next_campaign.id)
-                        
-                        # Update queue positions for remaining queued campaigns
-                        remaining_queued = db.query(Campaign).filter(
-                            Campaign.status == CampaignStatus.QUEUED.value
-                        ).order_by(Campaign.queue_position, Campaign.id).all()
-                        
-                        for i, campaign in enumerate(remaining_queued, 1):
-                            campaign.queue_position = i
-                        db.commit()
+                    # DISABLED: Warmer pausing - better to keep warmers running for natural activity
+                    # await self._pause_warmers_for_campaign(campaign)
+                    
+                    campaign.status = CampaignStatus.RUNNING.value
+                    if not campaign.started_at:  # a resumed campaign keeps its first start time
+                        campaign.started_at = datetime.utcnow()
+                    campaign.queue_position = None  # Clear queue position
+                
+                # Queue positions follow the fair-share order
+                for i, campaign in enumerate(waiting, 1):
+                    campaign.queue_position = i
+                db.commit()
+                
+                admitted_ids = [campaign.id for campaign in admitted]
+            
+            # Start processing once the status change is committed
+            for campaign_id in admitted_ids:
+                await message_processor.start_campaign_processing(campaign_id)
+            
+            if admitted_ids:
+                logger.info(f"🚦 Admitted {len(admitted_ids)} campaigns, {len(waiting)} still queued")
                         
         except Exception as e:
             logger.error(f"Error checking queued campaigns: {str(e)}")
@@ -410,10 +551,41 @@ class CampaignScheduler:
                         logger.info(f"Cleaned up {old_deliveries} old delivery records from campaign {campaign.id}")
                 
                 db.commit()
+            
+            # Plans hold recipient rows; they go once their campaign can no longer be resumed
+            await asyncio.get_running_loop().run_in_executor(None, self._sweep_dispatch_plans)
                 
         except Exception as e:
             logger.error(f"Error during cleanup: {str(e)}")
     
+    def _sweep_dispatch_plans(self):
+        """Delete dispatch plans of deleted campaigns and of campaigns that ended over the plan TTL ago"""
+        plan_compiler = message_processor.plan_compiler
+        campaign_ids = plan_compiler.stored_campaign_ids()
+        if not campaign_ids:
+            return
+        
+        cutoff = datetime.utcnow() - timedelta(seconds=dispatch_plan.DISPATCH_PLAN_TTL_SECONDS)
+        terminal = [CampaignStatus.COMPLETED.value, CampaignStatus.FAILED.value, CampaignStatus.CANCELLED.value]
+        with get_db() as db:
+            campaigns = {
+                campaign.id: campaign for campaign in db.query(Campaign).filter(Campaign.id.in_(campaign_ids)).all()
+            }
+            expired = []
+            for campaign_id in campaign_ids:
+                campaign = campaigns.get(campaign_id)
+                if campaign is None:
+                    expired.append(campaign_id)  # campaign deleted
+                elif campaign.status in terminal:
+                    ended_at = campaign.completed_at or campaign.updated_at
+                    if ended_at is None or ended_at <= cutoff:
+                        expired.append(campaign_id)
+        
+        for campaign_id in expired:
+            plan_compiler.remove(campaign_id)
+        if expired:
+            logger.info(f"Removed {len(expired)} expired dispatch plans")
+    
     async def _perform_health_checks(self):
         """Perform system health checks"""
         try:
@@ -436,7 +608,11 @@ class CampaignScheduler:
         return {
             "running": self.running,
             "check_interval": self.check_interval,
+            "monitor_interval": self.monitor_interval,
+            "scheduled_timers": len(self._timers),
+            "next_scheduled_start": self._timers[0][0].isoformat() if self._timers else None,
             "active_campaigns": len(message_processor.active_campaigns),
+            "admission": admission_controller.get_status(),
             "processor_status": message_processor.get_processing_status()
         }
 
@@ -0,0 +1,190 @@
+"""
+Session Fan-out - Deal one campaign's rows across several WhatsApp sessions
+Each session gets its own lane and sender (with its own pacing); the dispatcher
+picks lanes by smooth weighted round-robin over healthy sessions, weighted by
+remaining daily quota (from the shared rate limiter), and takes rows back from
+sessions that stop WORKING or run out of quota
+"""
+
+import asyncio
+import logging
+import os
+from collections import deque
+from typing import Dict, List, Optional, Any
+
+from rate_limiter import send_rate_limiter, RateLimitExceeded
+from session_health_cache import session_health_cache
+
+logger = logging.getLogger(__name__)
+
+
+class SessionFanout:
+    """Dispatcher and per-session lanes for a multi-session campaign"""
+
+    def __init__(self, campaign: Dict[str, Any], sessions: List[str], base_url: Optional[str] = None):
+        self.campaign = campaign
+        self.sessions = list(dict.fromkeys(sessions))  # de-duplicated, order kept
+        self.base_url = base_url
+
+        # How long to wait for any session to come back before giving up
+        self.unavailable_timeout = float(os.getenv("FANOUT_UNAVAILABLE_TIMEOUT_SECONDS", "300"))
+        self.recheck_interval = float(os.getenv("FANOUT_SESSION_RECHECK_SECONDS", "15"))
+
+        self.lanes = {session: asyncio.Queue() for session in self.sessions}
+        self.busy = {session: False for session in self.sessions}
+        self.available = set(self.sessions)
+        self.daily_cap = campaign.get("max_daily_messages") or 1000
+        self.current_weight = {session: 0 for session in self.sessions}
+
+        self.handed_back = deque()  # rows a session gave up on, dispatched before new rows
+        self.outstanding = 0        # rows sitting in a lane or being sent
+        self.halted = False
+        self.finished = False
+        self._changed = asyncio.Event()
+
+    def _remaining(self, session: str) -> int:
+        """Sends a session has left today"""
+        return send_rate_limiter.remaining_today(session, self.daily_cap)
+
+    # ==================== DISPATCHER ====================
+
+    def _notify(self):
+        self._changed.set()
+
+    async def _wait_for_change(self, timeout: Optional[float] = None):
+        self._changed.clear()
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def _pick(self, eligible: List[str]) -> str:
+        """Smooth weighted round-robin (the nginx upstream algorithm) over eligible sessions"""
+        total = 0
+        best = None
+        for session in eligible:
+            weight = self._remaining(session)
+            self.current_weight[session] += weight
+            total += weight
+            if best is None or self.current_weight[session] > self.current_weight[best]:
+                best = session
+        self.current_weight[best] -= total
+        return best
+
+    async def _next_session(self) -> Optional[str]:
+        """Wait for a healthy session with quota and an idle lane"""
+        unavailable_since = None
+        while not self.halted:
+            usable = [s for s in self.sessions if s in self.available and self._remaining(s) > 0]
+            idle = [s for s in usable if not self.busy[s] and self.lanes[s].empty()]
+            if idle:
+                return self._pick(idle)
+
+            if usable:
+                unavailable_since = None
+                await self._wait_for_change()
+                continue
+
+            if not any(self._remaining(s) for s in self.sessions):
+                raise RateLimitExceeded("Daily message cap reached on every campaign session")
+
+            # Every session with quota is down; wait for one to come back
+            now = asyncio.get_running_loop().time()
+            unavailable_since = unavailable_since or now
+            if now - unavailable_since >= self.unavailable_timeout:
+                raise RuntimeError("No campaign session is in WORKING state")
+            await self._wait_for_change(self.recheck_interval)
+        return None
+
+    async def dispatch(self, send_queue: asyncio.Queue):
+        """Move prepared rows from the producer's queue into session lanes"""
+        for session in self.sessions:
+            # Session weights come from today's counts; seed them before the first pick
+            await send_rate_limiter.load_sent_today(session)
+
+        source_done = False
+        try:
+            while not self.halted:
+                if self.handed_back:
+                    prepared = self.handed_back.popleft()
+                elif not source_done:
+                    prepared = await send_queue.get()
+                    if prepared is None:
+                        source_done = True
+                        continue
+                elif self.outstanding:
+                    # A session may still hand its row back
+                    await self._wait_for_change()
+                    continue
+                else:
+                    break
+
+                try:
+                    session = await self._next_session()
+                except Exception:
+                    self.handed_back.appendleft(prepared)
+                    raise
+                if session is None:
+                    self.handed_back.appendleft(prepared)
+                    break
+
+                self.outstanding += 1
+                self.lanes[session].put_nowait(prepared)
+        finally:
+            self.finished = True
+            for lane in self.lanes.values():
+                lane.put_nowait(None)
+
+    # ==================== SENDER HOOKS ====================
+
+    def start_row(self, session: str):
+        """A lane's sender took a row"""
+        self.busy[session] = True
+
+    def finish_row(self, session: str):
+        """A lane's sender is done with a row"""
+        self.busy[session] = False
+        self.outstanding -= 1
+        self._notify()
+
+    async def is_available(self, session: str) -> bool:
+        """Check the session is WORKING (cached), marking it down if not"""
+        if await session_health_cache.is_working(session, self.base_url):
+            return True
+        if session in self.available:
+            logger.warning(f"Campaign {self.campaign['id']}: session '{session}' left WORKING, rebalancing its rows")
+            self.available.discard(session)
+        return False
+
+    def hand_back(self, session: str, prepared: Dict[str, Any]):
+        """Give a row back to the dispatcher so another session sends it"""
+        self.busy[session] = False
+        self.outstanding -= 1
+        self.handed_back.append(prepared)
+        self._notify()
+
+    async def wait_until_available(self, session: str):
+        """Poll a down session until it is WORKING again (or the campaign is over)"""
+        while not self.finished and not self.halted:
+            await asyncio.sleep(self.recheck_interval)
+            if await session_health_cache.is_working(session, self.base_url):
+                logger.info(f"Campaign {self.campaign['id']}: session '{session}' is WORKING again")
+                self.available.add(session)
+                self._notify()
+                return
+
+    def halt(self):
+        """Stop dispatching (stop flag, pause or limit reached)"""
+        self.halted = True
+        self._notify()
+
+    def drain(self) -> List[Dict[str, Any]]:
+        """Collect rows that were dispatched but never sent"""
+        rows = list(self.handed_back)
+        self.handed_back.clear()
+        for lane in self.lanes.values():
+            while not lane.empty():
+                prepared = lane.get_nowait()
+                if prepared is not None:
+                    rows.append(prepared)
+        return rows
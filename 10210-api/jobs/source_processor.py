@@ -10,6 +10,8 @@ from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 
 from waha_functions import WAHAClient
+from async_waha_client import get_async_waha_client
+from session_directory_cache import session_directory_cache
 from utils.file_handler import FileHandler
 from .campaign_sources import (
     SourceType, CSVSource, WhatsAppGroupSource, 
@@ -23,6 +25,8 @@ class SourceProcessor:
     
     def __init__(self):
         self.waha_client = WAHAClient()
+        # Non-blocking client for group lookups (participant enrichment runs concurrently)
+        self.async_waha = get_async_waha_client(self.waha_client.base_url)
         self.file_handler = FileHandler()
         self.logger = logger
     
@@ -118,17 +122,17 @@ class SourceProcessor:
             for group_id in source.group_ids:
                 # Get group info
                 self.logger.info(f"Getting group info for: '{group_id}' using session: '{session_name}'")
-                group_info = self.waha_client.get_group_info(session_name, group_id)
+                group_info = await self.async_waha.get_group_info(session_name, group_id)
                 group_name = group_info.get('groupMetadata', {}).get('subject', 'Unknown Group')
                 group_names.append(group_name)
                 
                 if source.delivery_method == GroupDeliveryMethod.INDIVIDUAL_DMS:
                     # Extract group members for individual DMs
-                    participants = self.waha_client.get_group_participants_details(
-                        session_name, group_id
+                    participants = self.async_waha.iter_group_participants_details(
+                        session_name, group_id, include_last_message=source.include_last_message
                     )
                     
-                    for participant in participants:
+                    async for participant in participants:
                         phone = participant.get('formatted_phone', '')
                         if phone and not phone.startswith('+'):
                             phone = f"+{phone}"
@@ -205,7 +209,7 @@ class SourceProcessor:
         """Process user contacts source"""
         try:
             # Get all contacts from session
-            all_contacts = self.waha_client.get_all_contacts(session_name)
+            all_contacts = await session_directory_cache.get_contacts(session_name, self.waha_client.base_url)
             
             contacts = []
             for contact in all_contacts:
@@ -305,10 +309,10 @@ class SourceProcessor:
         """Ensure the session is a member of the group"""
         try:
             # Check if already a member
-            group_info = self.waha_client.get_group_info(session_name, group_id)
+            group_info = await self.async_waha.get_group_info(session_name, group_id)
             
             # Get session's own ID
-            session_info = self.waha_client.get_session_info(session_name)
+            session_info = await self.async_waha.get_session_info(session_name)
             my_id = session_info.get('me', {}).get('id', '')
             
             # Check if we're in the participants list
@@ -1,6 +1,6 @@
 from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request, Query
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, Response, JSONResponse
+from fastapi.responses import HTMLResponse, Response, JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Dict, Optional, Union
@@ -9,7 +9,15 @@ import json
 import base64
 import os
 import logging
-from waha_functions import WAHAClient
+from async_waha_client import get_async_waha_client, close_async_waha_clients
+from session_health_cache import session_health_cache
+from session_directory_cache import session_directory_cache
+from waha_webhooks import known_waha_instances, verify_signature as verify_webhook_signature, SIGNATURE_HEADER as WEBHOOK_SIGNATURE_HEADER
+from rate_limiter import send_rate_limiter, RateLimitExceeded
+from quota_ledger import quota_ledger
+from export_jobs import export_job_manager
+from websocket_manager import websocket_endpoint, notify_session_status
+from pubsub import event_bus
 from utils.orphan_cleanup import orphan_cleaner
 
 # Load environment variables from .env file
@@ -110,6 +118,9 @@ except ImportError as e:
 # Serve static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
+# Real-time campaign and export job updates
+app.add_api_websocket_route("/ws", websocket_endpoint)
+
 # Serve Swagger spec
 from fastapi.responses import FileResponse
 
@@ -126,7 +137,10 @@ async def health_check():
 # Initialize WAHA client with correct base URL
 # Use environment variable or default to internal Docker service name
 WAHA_BASE_URL = os.getenv("WAHA_BASE_URL", "http://localhost:4500")
-waha = WAHAClient(base_url=WAHA_BASE_URL)
+# Shared pooled async client (same pool as campaigns and warmers)
+waha = get_async_waha_client(WAHA_BASE_URL)
+# Longest an API send waits for a rate-limit token before answering 429
+RATE_LIMIT_API_MAX_WAIT = float(os.getenv("RATE_LIMIT_API_MAX_WAIT_SECONDS", "10"))
 
 # Initialize Phase 2 components if available
 if PHASE_2_ENABLED:
@@ -332,7 +346,7 @@ async def get_sessions(user_id: Optional[str] = Query(None)):
     """Get sessions for a specific user"""
     try:
         # Get all sessions from WAHA
-        all_sessions = waha.get_sessions()
+        all_sessions = await waha.get_sessions()
         
         # If no user_id provided, return all (admin mode)
         if not user_id:
@@ -472,11 +486,11 @@ async def create_session(session_data: SessionCreate, user_id: Optional[str] = Q
                 logger.info(f"Creating WAHA session with UUID name: {waha_session_name} (display name: {session_data.name})")
                 
                 # Create session in WAHA with generated name
-                result = waha.create_session(waha_session_name, session_data.config)
+                result = await waha.create_session(waha_session_name, session_data.config)
                 
                 # Start the session immediately so it appears in the list
                 try:
-                    waha.start_session(waha_session_name)
+                    await waha.start_session(waha_session_name)
                     logger.info(f"Started session {waha_session_name} after creation")
                 except Exception as e:
                     logger.warning(f"Could not auto-start session {waha_session_name}: {e}")
@@ -519,7 +533,7 @@ async def get_session_info(session_name: str, user_id: Optional[str] = Query(Non
         # Get the actual WAHA session name
         actual_session_name = get_waha_session_name(session_name, user_id)
         
-        info = waha.get_session_info(actual_session_name)
+        info = await waha.get_session_info(actual_session_name)
         # Add display name to response
         info['display_name'] = session_name
         return {"success": True, "data": info}
@@ -532,7 +546,7 @@ async def start_session(session_name: str, user_id: Optional[str] = Query(None))
     """Start session"""
     try:
         actual_session_name = get_waha_session_name(session_name, user_id)
-        result = waha.start_session(actual_session_name)
+        result = await waha.start_session(actual_session_name)
         return {"success": True, "data": result}
     except Exception as e:
         logger.error(f"Error starting session: {str(e)}")
@@ -543,7 +557,7 @@ async def stop_session(session_name: str, user_id: Optional[str] = Query(None)):
     """Stop session"""
     try:
         actual_session_name = get_waha_session_name(session_name, user_id)
-        result = waha.stop_session(actual_session_name)
+        result = await waha.stop_session(actual_session_name)
         return {"success": True, "data": result}
     except Exception as e:
         logger.error(f"Error stopping session: {str(e)}")
@@ -554,7 +568,7 @@ async def restart_session(session_name: str, user_id: Optional[str] = Query(None
     """Restart session"""
     try:
         actual_session_name = get_waha_session_name(session_name, user_id)
-        result = waha.restart_session(actual_session_name)
+        result = await waha.restart_session(actual_session_name)
         return {"success": True, "data": result}
     except Exception as e:
         logger.error(f"Error restarting session: {str(e)}")
@@ -568,7 +582,7 @@ async def delete_session(session_name: str, user_id: Optional[str] = Query(None)
         actual_session_name = get_waha_session_name(session_name, user_id)
         
         # Delete from WAHA
-        result = waha.delete_session(actual_session_name)
+        result = await waha.delete_session(actual_session_name)
         
         # Update user's session counter if user_id provided
         if user_id:
@@ -644,7 +658,7 @@ async def get_qr_code(session_name: str, user_id: Optional[str] = Query(None)):
     """Get QR code image"""
     try:
         actual_session_name = get_waha_session_name(session_name, user_id)
-        qr_image = waha.get_qr_code(actual_session_name)
+        qr_image = await waha.get_qr_code(actual_session_name)
         return Response(content=qr_image, media_type="image/png")
     except Exception as e:
         logger.error(f"Error getting QR code: {str(e)}")
@@ -657,7 +671,7 @@ async def get_screenshot(session_name: str, user_id: Optional[str] = Query(None)
         # Get the actual WAHA session name from display name
         actual_session_name = get_waha_session_name(session_name, user_id)
         logger.info(f"Screenshot request - Display: {session_name}, UUID: {actual_session_name}, User: {user_id}")
-        screenshot = waha.get_screenshot(actual_session_name)
+        screenshot = await waha.get_screenshot(actual_session_name)
         return Response(content=screenshot, media_type="image/png")
     except Exception as e:
         logger.error(f"Error getting screenshot: {str(e)}")
@@ -669,8 +683,17 @@ async def get_screenshot(session_name: str, user_id: Optional[str] = Query(None)
 async def send_text_message(message: MessageSend):
     """Send text message"""
     try:
-        result = waha.send_text(message.session, message.chatId, message.text)
+        # Same per-number buckets as campaigns and warmers; don't hold the request for long
+        await send_rate_limiter.acquire(message.session, WAHA_BASE_URL, max_wait=RATE_LIMIT_API_MAX_WAIT)
+        try:
+            result = await waha.send_text(message.session, message.chatId, message.text)
+        except Exception:
+            send_rate_limiter.refund(message.session)
+            raise
         return {"success": True, "data": result}
+    except RateLimitExceeded as e:
+        headers = {"Retry-After": str(int(e.retry_after) + 1)} if e.retry_after else None
+        raise HTTPException(status_code=429, detail=str(e), headers=headers)
     except Exception as e:
         logger.error(f"Error sending text message: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -694,13 +717,13 @@ async def send_file_message(
         
         # Determine file type and send accordingly
         if file.content_type.startswith('image/'):
-            result = waha.send_image(session, chatId, file_data, caption)
+            result = await waha.send_image(session, chatId, file_data, caption)
         elif file.content_type.startswith('video/'):
-            result = waha.send_video(session, chatId, file_data, caption)
+            result = await waha.send_video(session, chatId, file_data, caption)
         elif file.content_type.startswith('audio/'):
-            result = waha.send_voice(session, chatId, file_data)
+            result = await waha.send_voice(session, chatId, file_data)
         else:
-            result = waha.send_file(session, chatId, file_data)
+            result = await waha.send_file(session, chatId, file_data)
         
         return {"success": True, "data": result}
     except Exception as e:
@@ -711,7 +734,7 @@ async def send_file_message(
 async def send_location_message(location: LocationMessage):
     """Send location message"""
     try:
-        result = waha.send_location(
+        result = await waha.send_location(
             location.session, 
             location.chatId, 
             location.latitude, 
@@ -727,7 +750,7 @@ async def send_location_message(location: LocationMessage):
 async def start_typing(session: str, chat_id: str):
     """Start typing indicator"""
     try:
-        result = waha.start_typing(session, chat_id)
+        result = await waha.start_typing(session, chat_id)
         return {"success": True, "data": result}
     except Exception as e:
         logger.error(f"Error starting typing: {str(e)}")
@@ -737,7 +760,7 @@ async def start_typing(session: str, chat_id: str):
 async def stop_typing(session: str, chat_id: str):
     """Stop typing indicator"""
     try:
-        result = waha.stop_typing(session, chat_id)
+        result = await waha.stop_typing(session, chat_id)
         return {"success": True, "data": result}
     except Exception as e:
         logger.error(f"Error stopping typing: {str(e)}")
@@ -745,12 +768,19 @@ async def stop_typing(session: str, chat_id: str):
 
 # ==================== CHATS ====================
 
+def _directory_response(request: Request, snapshot: Dict, body: Dict):
+    """Return body with the snapshot's ETag, or 304 if the client already has it"""
+    headers = {"ETag": snapshot["etag"], "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == snapshot["etag"]:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=body, headers=headers)
+
 @app.get("/api/chats/{session}")
-async def get_chats(session: str):
+async def get_chats(request: Request, session: str, refresh: bool = False):
     """Get all chats"""
     try:
-        chats = waha.get_chats(session)
-        return {"success": True, "data": chats}
+        snapshot = await session_directory_cache.get_snapshot("chats", session, refresh=refresh)
+        return _directory_response(request, snapshot, {"success": True, "data": snapshot["data"]})
     except Exception as e:
         logger.error(f"Error getting chats: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -759,7 +789,7 @@ async def get_chats(session: str):
 async def get_chat_messages(session: str, chat_id: str, limit: int = 50):
     """Get chat messages"""
     try:
-        messages = waha.get_chat_messages(session, chat_id, limit)
+        messages = await waha.get_chat_messages(session, chat_id, limit)
         return {"success": True, "data": messages}
     except Exception as e:
         logger.error(f"Error getting chat messages: {str(e)}")
@@ -769,7 +799,7 @@ async def get_chat_messages(session: str, chat_id: str, limit: int = 50):
 async def mark_chat_as_read(session: str, chat_id: str):
     """Mark chat as read"""
     try:
-        result = waha.mark_chat_as_read(session, chat_id)
+        result = await waha.mark_chat_as_read(session, chat_id)
         return {"success": True, "data": result}
     except Exception as e:
         logger.error(f"Error marking chat as read: {str(e)}")
@@ -779,7 +809,8 @@ async def mark_chat_as_read(session: str, chat_id: str):
 async def delete_chat(session: str, chat_id: str):
     """Delete chat"""
     try:
-        result = waha.delete_chat(session, chat_id)
+        result = await waha.delete_chat(session, chat_id)
+        session_directory_cache.invalidate(session, ("chats",))
         return {"success": True, "data": result}
     except Exception as e:
         logger.error(f"Error deleting chat: {str(e)}")
@@ -789,7 +820,8 @@ async def delete_chat(session: str, chat_id: str):
 async def archive_chat(session: str, chat_id: str):
     """Archive chat"""
     try:
-        result = waha.archive_chat(session, chat_id)
+        result = await waha.archive_chat(session, chat_id)
+        session_directory_cache.invalidate(session, ("chats",))
         return {"success": True, "data": result}
     except Exception as e:
         logger.error(f"Error archiving chat: {str(e)}")
@@ -798,113 +830,206 @@ async def archive_chat(session: str, chat_id: str):
 # ==================== CONTACTS ====================
 
 @app.get("/api/contacts/{session}")
-async def get_all_contacts(session: str, user_id: Optional[str] = Query(None)):
+async def get_all_contacts(request: Request, session: str, user_id: Optional[str] = Query(None), refresh: bool = False):
     """Get all contacts"""
     try:
         # Get the actual WAHA session name from display name
         actual_session_name = get_waha_session_name(session, user_id)
-        contacts = waha.get_all_contacts(actual_session_name)
-        return {"success": True, "data": contacts}
+        snapshot = await session_directory_cache.get_snapshot("contacts", actual_session_name, refresh=refresh)
+        return _directory_response(request, snapshot, {"success": True, "data": snapshot["data"]})
     except Exception as e:
         logger.error(f"Error getting contacts: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/contacts/{session}/export")
-async def export_contacts(session: str, user_id: Optional[str] = Query(None)):  # TODO: Get user_id from auth
-    """Export all contacts with same 16-column format as group exports"""
+def _export_formats(export_format: Optional[str], stream: bool = False) -> List[str]:
+    """Requested export formats (default json, excel, csv); streaming takes exactly one"""
+    from utils.export_writers import normalize_formats
     try:
-        # Get the actual WAHA session name from display name
-        actual_session_name = get_waha_session_name(session, user_id)
-        # Get user subscription to check limits
-        from database.subscription_models import UserSubscription, PlanType
-        from database.connection import get_db
-        
-        # Store subscription data we need before closing session
-        user_plan = None
-        max_contacts_export = -1
-        contacts_exported_this_month = 0
+        if stream:
+            return normalize_formats([export_format or "csv"])
+        return normalize_formats(export_format.split(",") if export_format else None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _export_stream_response(body, media_type: str, filename: str, prepared: Dict) -> StreamingResponse:
+    """Send an export as a download without writing it to static/exports"""
+    headers = {
+        "X-Export-Limited": "true" if prepared["limited"] else "false",
+        "X-Export-Original-Count": str(prepared["original_count"]),
+        "Content-Disposition": f'attachment; filename="{filename}"'
+    }
+    return StreamingResponse(_release_quota_on_failure(body, prepared), media_type=media_type, headers=headers)
+
+def _release_quota_on_failure(body, prepared: Dict):
+    """Pass an export stream through, giving its reserved quota back if writing it fails"""
+    try:
+        yield from body
+    except Exception as e:
+        logger.error(f"Export stream failed: {str(e)}")
+        _release_export_quota(prepared)
+        raise
+
+def _add_export_limit_info(export_result: Dict, prepared: Dict):
+    """Add plan limit info to an export result"""
+    export_result['limited'] = prepared["limited"]
+    export_result['original_count'] = prepared["original_count"]
+    if prepared["limited"]:
+        export_result['limit_message'] = prepared["limit_message"]
+
+def _release_export_quota(prepared: Dict):
+    """Give back the export quota a failed export reserved"""
+    if prepared["reserved"]:
+        quota_ledger.release(prepared["user_id"], "contacts_export", prepared["reserved"])
+        logger.info(f"Released {prepared['reserved']} contacts of export quota for user {prepared['user_id']}")
+
+async def _write_export_files(write, formats: List[str], report=None) -> Dict:
+    """Write each format in a worker thread and merge the results (download URL per format)"""
+    import asyncio
+    loop = asyncio.get_running_loop()
+    export_result = None
+    for i, fmt in enumerate(formats):
+        if report:
+            report("writing", i, len(formats))
+        result = await loop.run_in_executor(None, write, [fmt])
+        if export_result is None:
+            export_result = result
+        else:
+            export_result[f"{fmt}_url"] = result[f"{fmt}_url"]
+    export_result["formats"] = formats
+    if report:
+        report("writing", len(formats), len(formats))
+    return export_result
+
+async def _prepare_contacts_export(session: str, user_id: Optional[str], report=None) -> Dict:
+    """Fetch a session's contacts and apply the plan's monthly export limit"""
+    # Get the actual WAHA session name from display name
+    actual_session_name = get_waha_session_name(session, user_id)
+    # Get user subscription to check limits
+    from database.subscription_models import PlanType
+    
+    # Subscription plan and export limit (from the in-memory quota ledger)
+    user_plan = None
+    max_contacts_export = -1
+    
+    if user_id:
+        usage = await quota_ledger.get_usage(user_id, "contacts_export")
+        if usage:
+            user_plan = usage["plan_type"]
+            max_contacts_export = usage["limit"]
+    
+    # Get all contacts (session directory snapshot)
+    if report:
+        report("fetching")
+    contacts = await session_directory_cache.get_contacts(actual_session_name)
+    original_count = len(contacts)
+    limited = False
+    limit_message = ""
+    reserved = 0
+    if report:
+        report("fetching", original_count, original_count)
+    
+    # Apply export limits if user has subscription
+    if user_plan:
+        # Check the monthly limit and count this export in one step (as much as is left)
+        granted = await quota_ledger.reserve(user_id, "contacts_export", len(contacts), partial=True)
+        reserved = granted
         
-        if user_id:
-            with get_db() as db:
-                user_subscription = db.query(UserSubscription).filter(
-                    UserSubscription.user_id == user_id
-                ).first()
-                
-                if user_subscription:
-                    user_plan = user_subscription.plan_type
-                    max_contacts_export = user_subscription.max_contacts_export
-                    contacts_exported_this_month = user_subscription.contacts_exported_this_month
+        if contacts and granted == 0:
+            raise HTTPException(
+                status_code=403, 
+                detail=f"Monthly export limit reached ({max_contacts_export} contacts). Please upgrade your plan to export more."
+            )
         
-        # Get all contacts from WAHA API
-        contacts = waha.get_all_contacts(actual_session_name)
-        original_count = len(contacts)
-        limited = False
-        limit_message = ""
+        # Limit contacts to the quota granted
+        if granted < len(contacts):
+            limited = True
+            excluded_count = len(contacts) - granted
+            contacts = contacts[:granted]
+            limit_message = f"Export limited to {granted} contacts. {excluded_count} contacts excluded due to plan limit."
+            
+            # For free users, show upgrade prompt in the exported file
+            if user_plan == PlanType.FREE:
+                # Add a placeholder contact to show upgrade message
+                contacts.append({
+                    'id': 'upgrade_prompt',
+                    'number': '000000000',
+                    'name': f'⚠️ UPGRADE REQUIRED: {excluded_count} more contacts available',
+                    'pushname': 'Upgrade to STARTER plan or higher to export all contacts',
+                    'isMyContact': False,
+                    'isGroup': False
+                })
         
-        # Apply export limits if user has subscription
-        if user_plan:
-            # Check if user has reached monthly limit
-            remaining = max_contacts_export - contacts_exported_this_month if max_contacts_export > 0 else float('inf')
-            
-            if max_contacts_export > 0:  # Has a limit (not unlimited)
-                if remaining <= 0:
-                    raise HTTPException(
-                        status_code=403, 
-                        detail=f"Monthly export limit reached ({max_contacts_export} contacts). Please upgrade your plan to export more."
-                    )
-                
-                # Limit contacts if exceeds remaining quota
-                if len(contacts) > remaining:
-                    limited = True
-                    excluded_count = len(contacts) - int(remaining)
-                    contacts = contacts[:int(remaining)]
-                    limit_message = f"Export limited to {int(remaining)} contacts. {excluded_count} contacts excluded due to plan limit."
-                    
-                    # For free users, show upgrade prompt in the exported file
-                    if user_plan == PlanType.FREE:
-                        # Add a placeholder contact to show upgrade message
-                        contacts.append({
-                            'id': 'upgrade_prompt',
-                            'number': '000000000',
-                            'name': f'⚠️ UPGRADE REQUIRED: {excluded_count} more contacts available',
-                            'pushname': 'Upgrade to STARTER plan or higher to export all contacts',
-                            'isMyContact': False,
-                            'isGroup': False
-                        })
-            
-            # Update usage counter in a new database session
-            if user_id:
-                with get_db() as db:
-                    user_sub = db.query(UserSubscription).filter(
-                        UserSubscription.user_id == user_id
-                    ).first()
-                    
-                    if user_sub:
-                        export_count = len(contacts) - (1 if limited and user_plan == PlanType.FREE else 0)
-                        user_sub.contacts_exported_this_month += export_count
-                        db.commit()
-                        logger.info(f"User {user_id} exported {export_count} contacts. Monthly total: {user_sub.contacts_exported_this_month}")
+        logger.info(f"User {user_id} exported {granted} contacts")
+    
+    return {
+        "contacts": contacts,
+        "original_count": original_count,
+        "limited": limited,
+        "limit_message": limit_message,
+        "user_id": user_id,
+        "reserved": reserved
+    }
+
+async def _run_contacts_export_job(job: Dict, report) -> Dict:
+    """Export job body: fetch contacts, then write each requested format"""
+    from utils.contact_export_handler import ContactExportHandler
+    params = job["params"]
+    prepared = await _prepare_contacts_export(params["session"], params["user_id"], report)
+    export_handler = ContactExportHandler()
+    try:
+        export_result = await _write_export_files(
+            lambda formats: export_handler.export_contacts(prepared["contacts"], params["session"], formats),
+            params["formats"], report
+        )
+    except BaseException:
+        # Failed or cancelled: nothing was exported
+        _release_export_quota(prepared)
+        raise
+    _add_export_limit_info(export_result, prepared)
+    return export_result
+
+@app.get("/api/contacts/{session}/export")
+async def export_contacts(
+    session: str,
+    user_id: Optional[str] = Query(None),  # TODO: Get user_id from auth
+    export_format: Optional[str] = Query(None, alias="format", description="json, excel, csv or ndjson (comma-separated); default json,excel,csv"),
+    stream: bool = Query(False, description="Stream a single format as the response body instead of writing files")
+):
+    """Export all contacts with same 16-column format as group exports"""
+    try:
+        formats = _export_formats(export_format, stream)
+        prepared = await _prepare_contacts_export(session, user_id)
         
         # Import contact export handler
         from utils.contact_export_handler import ContactExportHandler
         export_handler = ContactExportHandler()
         
-        # Export to all formats (JSON, Excel, CSV)
-        export_result = export_handler.export_contacts(
-            contacts=contacts,
-            session_name=session
-        )
+        if stream:
+            try:
+                body, media_type, filename = export_handler.stream_contacts(prepared["contacts"], session, formats[0])
+            except Exception:
+                _release_export_quota(prepared)
+                raise
+            return _export_stream_response(body, media_type, filename, prepared)
+        
+        # Export to the requested formats (default JSON, Excel, CSV)
+        try:
+            export_result = export_handler.export_contacts(
+                contacts=prepared["contacts"],
+                session_name=session,
+                formats=formats
+            )
+        except Exception:
+            _release_export_quota(prepared)
+            raise
         
         # Add limit info to response
-        export_result['limited'] = limited
-        export_result['original_count'] = original_count
-        if limited:
-            export_result['limit_message'] = limit_message
+        _add_export_limit_info(export_result, prepared)
         
         return {
             "success": True,
             "data": export_result,
-            "message": f"Exported {export_result['contact_count']} contacts" + (f" (Limited from {original_count})" if limited else "")
+            "message": f"Exported {export_result['contact_count']} contacts" + (f" (Limited from {prepared['original_count']})" if prepared["limited"] else "")
         }
         
     except HTTPException:
@@ -919,7 +1044,7 @@ async def check_number_exists(session: str, phone: str, user_id: Optional[str] =
     try:
         # Get the actual WAHA session name from display name
         actual_session_name = get_waha_session_name(session, user_id)
-        result = waha.check_number_exists(actual_session_name, phone)
+        result = await waha.check_number_exists(actual_session_name, phone)
         return {"success": True, "data": result}
     except Exception as e:
         logger.error(f"Error checking number: {str(e)}")
@@ -931,7 +1056,7 @@ async def block_contact(contact_action: ContactAction):
     try:
         # Get the actual WAHA session name from display name
         actual_session_name = get_waha_session_name(contact_action.session, contact_action.user_id)
-        result = waha.block_contact(actual_session_name, contact_action.contactId)
+        result = await waha.block_contact(actual_session_name, contact_action.contactId)
         return {"success": True, "data": result}
     except Exception as e:
         logger.error(f"Error blocking contact: {str(e)}")
@@ -943,7 +1068,7 @@ async def unblock_contact(contact_action: ContactAction):
     try:
         # Get the actual WAHA session name from display name
         actual_session_name = get_waha_session_name(contact_action.session, contact_action.user_id)
-        result = waha.unblock_contact(actual_session_name, contact_action.contactId)
+        result = await waha.unblock_contact(actual_session_name, contact_action.contactId)
         return {"success": True, "data": result}
     except Exception as e:
         logger.error(f"Error unblocking contact: {str(e)}")
@@ -952,12 +1077,13 @@ async def unblock_contact(contact_action: ContactAction):
 # ==================== GROUPS ====================
 
 @app.get("/api/groups/{session}")
-async def get_groups(session: str, user_id: Optional[str] = Query(None), lightweight: bool = True):
+async def get_groups(request: Request, session: str, user_id: Optional[str] = Query(None), lightweight: bool = True, refresh: bool = False):
     """Get all groups - lightweight by default (no participants)"""
     try:
         # Get the actual WAHA session name from display name
         actual_session_name = get_waha_session_name(session, user_id)
-        groups = waha.get_groups(actual_session_name)
+        snapshot = await session_directory_cache.get_snapshot("groups", actual_session_name, refresh=refresh)
+        groups = snapshot["data"]
         
         if lightweight:
             # Return only essential group info without participants
@@ -970,21 +1096,22 @@ async def get_groups(session: str, user_id: Optional[str] = Query(None), lightwe
                     "timestamp": group.get("timestamp"),
                     # Don't include participants or other heavy metadata
                 })
-            return {"success": True, "data": lightweight_groups, "lightweight": True}
+            return _directory_response(request, snapshot, {"success": True, "data": lightweight_groups, "lightweight": True})
         else:
             # Return full group data (old behavior)
-            return {"success": True, "data": groups, "lightweight": False}
+            return _directory_response(request, snapshot, {"success": True, "data": groups, "lightweight": False})
     except Exception as e:
         logger.error(f"Error getting groups: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/groups/{session}/for-campaign")
-async def get_groups_for_campaign(session: str, user_id: Optional[str] = Query(None)):
+async def get_groups_for_campaign(request: Request, session: str, user_id: Optional[str] = Query(None), refresh: bool = False):
     """Get groups formatted for campaign source selection"""
     try:
         # Get the actual WAHA session name from display name
         actual_session_name = get_waha_session_name(session, user_id)
-        groups = waha.get_groups(actual_session_name)
+        snapshot = await session_directory_cache.get_snapshot("groups", actual_session_name, refresh=refresh)
+        groups = snapshot["data"]
         
         # Format for campaign selection UI
         campaign_groups = []
@@ -1011,18 +1138,19 @@ async def get_groups_for_campaign(session: str, user_id: Optional[str] = Query(N
                 "display_name": f"{group_name} ({participant_count} members)" if participant_count else group_name
             })
         
-        return {"success": True, "groups": campaign_groups}
+        return _directory_response(request, snapshot, {"success": True, "groups": campaign_groups})
     except Exception as e:
         logger.error(f"Error getting groups for campaign: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/contacts/{session}/for-campaign")
-async def get_contacts_for_campaign(session: str, user_id: Optional[str] = Query(None)):
+async def get_contacts_for_campaign(request: Request, session: str, user_id: Optional[str] = Query(None), refresh: bool = False):
     """Get contacts for campaign source selection with checkboxes"""
     try:
         # Get the actual WAHA session name from display name
         actual_session_name = get_waha_session_name(session, user_id)
-        contacts = waha.get_all_contacts(actual_session_name)
+        snapshot = await session_directory_cache.get_snapshot("contacts", actual_session_name, refresh=refresh)
+        contacts = snapshot["data"]
         
         # Filter and format contacts
         campaign_contacts = []
@@ -1056,7 +1184,7 @@ async def get_contacts_for_campaign(session: str, user_id: Optional[str] = Query
                 "isBusiness": contact.get('isBusiness', False)
             })
         
-        return {
+        return _directory_response(request, snapshot, {
             "success": True,
             "contacts": campaign_contacts,
             "summary": {
@@ -1064,7 +1192,7 @@ async def get_contacts_for_campaign(session: str, user_id: Optional[str] = Query
                 "my_contacts_count": my_contacts_count,
                 "other_contacts_count": len(campaign_contacts) - my_contacts_count
             }
-        }
+        })
     except Exception as e:
         logger.error(f"Error getting contacts for campaign: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -1075,7 +1203,8 @@ async def create_group(session: str, group_data: GroupCreate, user_id: Optional[
     try:
         # Get the actual WAHA session name from display name
         actual_session_name = get_waha_session_name(session, user_id)
-        result = waha.create_group(actual_session_name, group_data.name, group_data.participants)
+        result = await waha.create_group(actual_session_name, group_data.name, group_data.participants)
+        session_directory_cache.invalidate(actual_session_name, ("groups", "chats"))
         return {"success": True, "data": result}
     except Exception as e:
         logger.error(f"Error creating group: {str(e)}")
@@ -1087,7 +1216,7 @@ async def get_group_info(session: str, group_id: str, user_id: Optional[str] = Q
     try:
         # Get the actual WAHA session name from display name
         actual_session_name = get_waha_session_name(session, user_id)
-        info = waha.get_group_info(actual_session_name, group_id)
+        info = await waha.get_group_info(actual_session_name, group_id)
         return {"success": True, "data": info}
     except Exception as e:
         logger.error(f"Error getting group info: {str(e)}")
@@ -1099,128 +1228,174 @@ async def leave_group(session: str, group_id: str, user_id: Optional[str] = Quer
     try:
         # Get the actual WAHA session name from display name
         actual_session_name = get_waha_session_name(session, user_id)
-        result = waha.leave_group(actual_session_name, group_id)
+        result = await waha.leave_group(actual_session_name, group_id)
+        session_directory_cache.invalidate(actual_session_name, ("groups", "chats"))
         return {"success": True, "data": result}
     except Exception as e:
         logger.error(f"Error leaving group: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/groups/{session}/{group_id}/export")
-async def export_group_participants(session: str, group_id: str, user_id: Optional[str] = Query(None)):  # TODO: Get user_id from auth
-    """Export group participants with detailed contact information"""
-    try:
-        # Get the actual WAHA session name from display name
-        actual_session_name = get_waha_session_name(session, user_id)
-        
-        # Handle URL encoding - group_id might come URL encoded
-        import urllib.parse
-        group_id = urllib.parse.unquote(group_id)
-        
-        # Get user subscription to check limits
-        from database.subscription_models import UserSubscription, PlanType
-        from database.connection import get_db
-        
-        # Store subscription data we need before closing session
-        user_plan = None
-        max_contacts_export = -1
-        contacts_exported_this_month = 0
-        
-        if user_id:
-            with get_db() as db:
-                user_subscription = db.query(UserSubscription).filter(
-                    UserSubscription.user_id == user_id
-                ).first()
-                
-                if user_subscription:
-                    user_plan = user_subscription.plan_type
-                    max_contacts_export = user_subscription.max_contacts_export
-                    contacts_exported_this_month = user_subscription.contacts_exported_this_month
-        
-        # Get group info first
-        group_info = waha.get_group_info(actual_session_name, group_id)
-        
-        # Extract group name from the correct location in WAHA response
-        if isinstance(group_info, dict):
-            if 'groupMetadata' in group_info and 'subject' in group_info['groupMetadata']:
-                group_name = group_info['groupMetadata']['subject']
-            elif 'name' in group_info:
-                group_name = group_info['name']
-            else:
-                group_name = 'Unknown Group'
+async def _prepare_group_export(session: str, group_id: str, user_id: Optional[str],
+                                include_last_message: bool = True, report=None) -> Dict:
+    """Fetch a group's detailed participants and apply the plan's monthly export limit"""
+    # Get the actual WAHA session name from display name
+    actual_session_name = get_waha_session_name(session, user_id)
+    
+    # Handle URL encoding - group_id might come URL encoded
+    import urllib.parse
+    group_id = urllib.parse.unquote(group_id)
+    
+    # Get user subscription to check limits
+    from database.subscription_models import PlanType
+    
+    # Subscription plan and export limit (from the in-memory quota ledger)
+    user_plan = None
+    max_contacts_export = -1
+    
+    if user_id:
+        usage = await quota_ledger.get_usage(user_id, "contacts_export")
+        if usage:
+            user_plan = usage["plan_type"]
+            max_contacts_export = usage["limit"]
+    
+    # Get group info first
+    if report:
+        report("fetching")
+    group_info = await waha.get_group_info(actual_session_name, group_id)
+    
+    # Extract group name from the correct location in WAHA response
+    if isinstance(group_info, dict):
+        if 'groupMetadata' in group_info and 'subject' in group_info['groupMetadata']:
+            group_name = group_info['groupMetadata']['subject']
+        elif 'name' in group_info:
+            group_name = group_info['name']
         else:
             group_name = 'Unknown Group'
+    else:
+        group_name = 'Unknown Group'
+    
+    # Get detailed participant information
+    participants = await waha.get_group_participants_details(
+        actual_session_name, group_id, include_last_message=include_last_message,
+        progress=(lambda done, total: report("enriching", done, total)) if report else None
+    )
+    original_count = len(participants)
+    limited = False
+    limit_message = ""
+    reserved = 0
+    
+    # Apply export limits if user has subscription
+    if user_plan:
+        # Check the monthly limit and count this export in one step (as much as is left)
+        granted = await quota_ledger.reserve(user_id, "contacts_export", len(participants), partial=True)
+        reserved = granted
         
-        # Get detailed participant information
-        participants = waha.get_group_participants_details(actual_session_name, group_id)
-        original_count = len(participants)
-        limited = False
-        limit_message = ""
+        if participants and granted == 0:
+            raise HTTPException(
+                status_code=403, 
+                detail=f"Monthly export limit reached ({max_contacts_export} contacts). Please upgrade your plan to export more."
+            )
         
-        # Apply export limits if user has subscription
-        if user_plan:
-            # Check if user has reached monthly limit
-            remaining = max_contacts_export - contacts_exported_this_month if max_contacts_export > 0 else float('inf')
-            
-            if max_contacts_export > 0:  # Has a limit (not unlimited)
-                if remaining <= 0:
-                    raise HTTPException(
-                        status_code=403, 
-                        detail=f"Monthly export limit reached ({max_contacts_export} contacts). Please upgrade your plan to export more."
-                    )
-                
-                # Limit participants if exceeds remaining quota
-                if len(participants) > remaining:
-                    limited = True
-                    excluded_count = len(participants) - int(remaining)
-                    participants = participants[:int(remaining)]
-                    limit_message = f"Export limited to {int(remaining)} participants. {excluded_count} participants excluded due to plan limit."
-                    
-                    # For free users, show upgrade prompt
-                    if user_plan == PlanType.FREE:
-                        # Add a placeholder participant to show upgrade message
-                        participants.append({
-                            'id': '000000000@c.us',
-                            'number': '000000000',
-                            'name': f'⚠️ UPGRADE REQUIRED: {excluded_count} more participants available',
-                            'pushname': 'Upgrade to STARTER plan or higher to export all participants',
-                            'isAdmin': False,
-                            'isSuperAdmin': False
-                        })
-            
-            # Update usage counter in a new database session
-            if user_id:
-                with get_db() as db:
-                    user_sub = db.query(UserSubscription).filter(
-                        UserSubscription.user_id == user_id
-                    ).first()
-                    
-                    if user_sub:
-                        export_count = len(participants) - (1 if limited and user_plan == PlanType.FREE else 0)
-                        user_sub.contacts_exported_this_month += export_count
-                        db.commit()
-                        logger.info(f"User {user_id} exported {export_count} group participants. Monthly total: {user_sub.contacts_exported_this_month}")
+        # Limit participants to the quota granted
+        if granted < len(participants):
+            limited = True
+            excluded_count = len(participants) - granted
+            participants = participants[:granted]
+            limit_message = f"Export limited to {granted} participants. {excluded_count} participants excluded due to plan limit."
+            
+            # For free users, show upgrade prompt
+            if user_plan == PlanType.FREE:
+                # Add a placeholder participant to show upgrade message
+                participants.append({
+                    'id': '000000000@c.us',
+                    'number': '000000000',
+                    'name': f'⚠️ UPGRADE REQUIRED: {excluded_count} more participants available',
+                    'pushname': 'Upgrade to STARTER plan or higher to export all participants',
+                    'isAdmin': False,
+                    'isSuperAdmin': False
+                })
+        
+        logger.info(f"User {user_id} exported {granted} group participants")
+    
+    return {
+        "participants": participants,
+        "group_name": group_name,
+        "original_count": original_count,
+        "limited": limited,
+        "limit_message": limit_message,
+        "user_id": user_id,
+        "reserved": reserved
+    }
+
+async def _run_group_export_job(job: Dict, report) -> Dict:
+    """Export job body: fetch and enrich participants, then write each requested format"""
+    from utils.export_handler import GroupExportHandler
+    params = job["params"]
+    prepared = await _prepare_group_export(
+        params["session"], params["group_id"], params["user_id"], params["include_last_message"], report
+    )
+    export_handler = GroupExportHandler()
+    try:
+        export_result = await _write_export_files(
+            lambda formats: export_handler.export_group_participants(
+                prepared["participants"], prepared["group_name"], params["session"], formats
+            ),
+            params["formats"], report
+        )
+    except BaseException:
+        # Failed or cancelled: nothing was exported
+        _release_export_quota(prepared)
+        raise
+    _add_export_limit_info(export_result, prepared)
+    return export_result
+
+@app.get("/api/groups/{session}/{group_id}/export")
+async def export_group_participants(
+    session: str,
+    group_id: str,
+    user_id: Optional[str] = Query(None),  # TODO: Get user_id from auth
+    include_last_message: bool = Query(True, description="Look up each participant's last message (slower for large groups)"),
+    export_format: Optional[str] = Query(None, alias="format", description="json, excel, csv or ndjson (comma-separated); default json,excel,csv"),
+    stream: bool = Query(False, description="Stream a single format as the response body instead of writing files")
+):
+    """Export group participants with detailed contact information"""
+    try:
+        formats = _export_formats(export_format, stream)
+        prepared = await _prepare_group_export(session, group_id, user_id, include_last_message)
         
         # Import export handler
         from utils.export_handler import GroupExportHandler
         export_handler = GroupExportHandler()
         
-        # Export to both formats
-        export_result = export_handler.export_group_participants(
-            participants=participants,
-            group_name=group_name,
-            session_name=session
-        )
+        if stream:
+            try:
+                body, media_type, filename = export_handler.stream_group_participants(
+                    prepared["participants"], prepared["group_name"], formats[0]
+                )
+            except Exception:
+                _release_export_quota(prepared)
+                raise
+            return _export_stream_response(body, media_type, filename, prepared)
+        
+        # Export to the requested formats (default JSON, Excel, CSV)
+        try:
+            export_result = export_handler.export_group_participants(
+                participants=prepared["participants"],
+                group_name=prepared["group_name"],
+                session_name=session,
+                formats=formats
+            )
+        except Exception:
+            _release_export_quota(prepared)
+            raise
         
         # Add limit info to response
-        export_result['limited'] = limited
-        export_result['original_count'] = original_count
-        if limited:
-            export_result['limit_message'] = limit_message
+        _add_export_limit_info(export_result, prepared)
         
         return {
             "success": True,
             "data": export_result,
-            "message": f"Exported {export_result['participant_count']} participants" + (f" (Limited from {original_count})" if limited else "")
+            "message": f"Exported {export_result['participant_count']} participants" + (f" (Limited from {prepared['original_count']})" if prepared["limited"] else "")
         }
         
     except HTTPException:
@@ -1229,14 +1404,136 @@ async def export_group_participants(session: str, group_id: str, user_id: Option
         logger.error(f"Error exporting group participants: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# ==================== EXPORT JOBS ====================
+
+def _range_file_response(request: Request, path: str, media_type: str, filename: str):
+    """Serve a file, honouring a single-range Range header (resumable downloads)"""
+    import re
+    file_size = os.path.getsize(path)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f'attachment; filename="{filename}"'
+    }
+    
+    match = re.match(r"^bytes=(\d*)-(\d*)$", (request.headers.get("range") or "").strip())
+    if not match or not (match.group(1) or match.group(2)):
+        # No (or a multi-part) range: send the whole file
+        return FileResponse(path, media_type=media_type, headers=headers)
+    
+    if match.group(1):
+        start = int(match.group(1))
+        end = min(int(match.group(2)), file_size - 1) if match.group(2) else file_size - 1
+    else:
+        # Suffix range: the last N bytes
+        start = max(0, file_size - int(match.group(2)))
+        end = file_size - 1
+    
+    if start >= file_size or start > end:
+        return Response(status_code=416, headers={"Content-Range": f"bytes */{file_size}"})
+    
+    def body(chunk_size: int = 65536):
+        with open(path, 'rb') as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+    
+    headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(body(), status_code=206, media_type=media_type, headers=headers)
+
+def _caller_user_id(request: Request) -> str:
+    """The authenticated user set by SessionMiddleware; export jobs belong to it"""
+    user_id = getattr(request.state, "user_id", None)
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    return user_id
+
+@app.post("/api/exports/contacts/{session}")
+async def submit_contacts_export(
+    request: Request,
+    session: str,
+    export_format: Optional[str] = Query(None, alias="format", description="json, excel, csv or ndjson (comma-separated); default json,excel,csv")
+):
+    """Queue a contacts export job; subscribe to its job_id over /ws for progress"""
+    try:
+        user_id = _caller_user_id(request)
+        params = {"session": session, "user_id": user_id, "formats": _export_formats(export_format)}
+        job, reused = export_job_manager.submit(
+            "contacts", params, _run_contacts_export_job, owner=user_id
+        )
+        return {"success": True, "data": export_job_manager.to_dict(job), "reused": reused}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error submitting contacts export: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/exports/groups/{session}/{group_id}")
+async def submit_group_export(
+    request: Request,
+    session: str,
+    group_id: str,
+    include_last_message: bool = Query(True, description="Look up each participant's last message (slower for large groups)"),
+    export_format: Optional[str] = Query(None, alias="format", description="json, excel, csv or ndjson (comma-separated); default json,excel,csv")
+):
+    """Queue a group participants export job; subscribe to its job_id over /ws for progress"""
+    try:
+        user_id = _caller_user_id(request)
+        params = {
+            "session": session,
+            "group_id": group_id,
+            "user_id": user_id,
+            "include_last_message": include_last_message,
+            "formats": _export_formats(export_format)
+        }
+        job, reused = export_job_manager.submit(
+            "group", params, _run_group_export_job, owner=user_id
+        )
+        return {"success": True, "data": export_job_manager.to_dict(job), "reused": reused}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error submitting group export: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/exports/jobs/{job_id}")
+async def get_export_job(request: Request, job_id: str):
+    """Get an export job's status, progress and result (only the user who submitted it sees it)"""
+    job = export_job_manager.get_owned(job_id, _caller_user_id(request))
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    return {"success": True, "data": export_job_manager.to_dict(job)}
+
+@app.get("/api/exports/jobs/{job_id}/download")
+async def download_export_job(request: Request, job_id: str, export_format: str = Query("csv", alias="format")):
+    """Download a finished export file (supports Range requests for resuming)"""
+    from utils.export_writers import EXPORT_FORMATS
+    job = export_job_manager.get_owned(job_id, _caller_user_id(request))
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    if job["status"] != "completed":
+        raise HTTPException(status_code=409, detail=f"Export job is {job['status']}")
+    
+    fmt = "excel" if export_format == "xlsx" else export_format
+    path = export_job_manager.artifact_path(job, fmt)
+    if not path:
+        raise HTTPException(status_code=404, detail=f"No {export_format} file for this export")
+    
+    return _range_file_response(request, path, EXPORT_FORMATS[fmt][1], os.path.basename(path))
+
 # ==================== SERVER INFO ====================
 
 @app.get("/api/server/info")
 async def get_server_info():
     """Get server information"""
     try:
-        version = waha.get_server_version()
-        status = waha.get_server_status()
+        version = await waha.get_server_version()
+        status = await waha.get_server_status()
         return {
             "success": True, 
             "data": {
@@ -1252,12 +1549,38 @@ async def get_server_info():
 async def ping_server():
     """Ping WAHA server"""
     try:
-        result = waha.ping_server()
+        result = await waha.ping_server()
         return {"success": True, "data": {"message": result}}
     except Exception as e:
         logger.error(f"Error pinging server: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/webhooks/waha")
+async def waha_webhook(request: Request, instance_url: Optional[str] = Query(None)):
+    """Receive WAHA webhook events (session health and session directory caches)"""
+    body = await request.body()
+    if not verify_webhook_signature(body, request.headers.get(WEBHOOK_SIGNATURE_HEADER)):
+        raise HTTPException(status_code=401, detail="Invalid webhook signature")
+    
+    instance_url = known_waha_instances.resolve(instance_url)
+    if not instance_url:
+        raise HTTPException(status_code=403, detail="Unknown WAHA instance")
+    
+    try:
+        event = json.loads(body)
+        applied = session_health_cache.apply_webhook(event, instance_url)
+        applied = session_directory_cache.apply_webhook(event, instance_url) or applied
+        if event.get("event") == "session.status" and event.get("session"):
+            # Reaches WebSocket subscribers on every worker
+            await notify_session_status(event["session"], {
+                "status": (event.get("payload") or {}).get("status"),
+                "instance_url": instance_url
+            })
+        return {"success": True, "applied": applied}
+    except Exception as e:
+        logger.error(f"Error handling WAHA webhook: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
 # ==================== PHASE 2: CAMPAIGN MANAGEMENT ====================
 
 if PHASE_2_ENABLED:
@@ -1462,7 +1785,7 @@ Generate exactly {count} variations, one per line:"""
                         # Fetch phone number if not already saved and session is WORKING
                         if not user_session.phone_number:
                             try:
-                                session_info = waha.get_session_info(actual_session_name)
+                                session_info = await waha.get_session_info(actual_session_name)
                                 if session_info.get('status') == 'WORKING' and session_info.get('me'):
                                     # Extract phone number from me.id field
                                     me_id = session_info['me'].get('id', '')
@@ -1496,7 +1819,7 @@ Generate exactly {count} variations, one per line:"""
                         
                         if user_session and not user_session.phone_number:
                             try:
-                                session_info = waha.get_session_info(actual_session_name)
+                                session_info = await waha.get_session_info(actual_session_name)
                                 if session_info.get('status') == 'WORKING' and session_info.get('me'):
                                     # Extract phone number from me.id field
                                     me_id = session_info['me'].get('id', '')
@@ -1513,6 +1836,15 @@ Generate exactly {count} variations, one per line:"""
             campaign_data.waha_session_name = actual_session_name
             campaign_data.session_name = display_name
             
+            # Multi-session campaigns: resolve the extra sessions to WAHA names, primary first
+            if campaign_data.fanout_sessions:
+                fanout_sessions = [actual_session_name]
+                for session_name in campaign_data.fanout_sessions:
+                    waha_name = session_name if session_name.startswith('uuser_') else get_waha_session_name(session_name, user_id)
+                    if waha_name not in fanout_sessions:
+                        fanout_sessions.append(waha_name)
+                campaign_data.fanout_sessions = fanout_sessions if len(fanout_sessions) > 1 else []
+            
             campaign = campaign_manager.create_campaign(campaign_data)
             return {"success": True, "data": campaign.dict()}
         except Exception as e:
@@ -1565,7 +1897,7 @@ Generate exactly {count} variations, one per line:"""
                     if user_session and not user_session.phone_number:
                         try:
                             # Check session status first
-                            session_info = waha.get_session_info(actual_session_name)
+                            session_info = await waha.get_session_info(actual_session_name)
                             if session_info.get('status') == 'WORKING' and session_info.get('me'):
                                 # Extract phone number from me.id field
                                 me_id = session_info['me'].get('id', '')
@@ -1782,7 +2114,7 @@ Generate exactly {count} variations, one per line:"""
             success = campaign_manager.start_campaign(campaign_id)
             if not success:
                 raise HTTPException(status_code=404, detail="Campaign not found")
-            return {"success": True, "message": "Campaign started"}
+            return {"success": True, "message": "Campaign queued to start", "status": "queued"}
         except HTTPException:
             raise
         except Exception as e:
@@ -1877,6 +2209,8 @@ Generate exactly {count} variations, one per line:"""
             new_campaign_data = CampaignCreate(
                 name=f"{original.name} (Restarted)",
                 session_name=original.session_name,
+                waha_session_name=original.fanout_sessions[0] if original.fanout_sessions else None,
+                fanout_sessions=original.fanout_sessions,  # Keep the multi-session setup
                 user_id=original.user_id,  # Copy user_id from original campaign
                 file_path=original.file_path,
                 message_mode=original.message_mode,
@@ -1895,7 +2229,7 @@ Generate exactly {count} variations, one per line:"""
             
             # If skip_processed is True, copy processed rows from original campaign
             if skip_processed and hasattr(campaign_manager, 'copy_processed_rows'):
-                campaign_manager.copy_processed_rows(campaign_id, new_campaign.id)
+                await campaign_manager.copy_processed_rows(campaign_id, new_campaign.id)
             
             return {
                 "success": True, 
@@ -2362,15 +2696,13 @@ Generate exactly {count} variations, one per line:"""
                 # Extract filename from path
                 filename = os.path.basename(db_campaign.file_path) if db_campaign.file_path else "Unknown"
                 
-                # Get actual file row count using the same FileHandler used during upload
+                # Get actual file row count from the profile built at upload time
                 file_total_rows = db_campaign.total_rows  # Default to stored value
                 if db_campaign.file_path and os.path.exists(db_campaign.file_path):
                     try:
                         from utils.file_handler import FileHandler
                         file_handler = FileHandler()
-                        validation_result = file_handler.validate_file(db_campaign.file_path)
-                        if validation_result.get("valid") and validation_result.get("file_info"):
-                            file_total_rows = validation_result["file_info"]["total_rows"]
+                        file_total_rows = file_handler.get_profile(db_campaign.file_path)["total_rows"]
                     except Exception as e:
                         logger.warning(f"Could not get accurate row count for {db_campaign.file_path}: {e}")
                 
@@ -2378,15 +2710,17 @@ Generate exactly {count} variations, one per line:"""
                 session_phone = None
                 session_phone_name = None
                 try:
-                    session_info = waha.get_session_info(db_campaign.session_name)
+                    session_info = await waha.get_session_info(db_campaign.session_name)
                     if session_info and session_info.get("me"):
                         session_phone = session_info["me"].get("id", "").replace("@c.us", "")
                         session_phone_name = session_info["me"].get("pushName", "")
                 except Exception as e:
                     logger.warning(f"Could not get session info for {db_campaign.session_name}: {e}")
                 
-                # Get deliveries for this campaign
+                # Get deliveries for this campaign (write out buffered ones first)
                 from database.models import Delivery
+                from jobs.delivery_journal import delivery_journal
+                await delivery_journal.flush_async()
                 deliveries = db.query(Delivery).filter(Delivery.campaign_id == campaign_id).all()
                 
                 # Parse source information from column_mapping if available
@@ -2593,8 +2927,8 @@ async def create_waha_session(request: SessionCreateRequest):
         )
         
         # Create the actual WAHA session
-        waha_client = WAHAClient(base_url=instance_url)
-        result = waha_client.create_session(request.session_name)
+        waha_client = get_async_waha_client(instance_url)
+        result = await waha_client.create_session(request.session_name)
         
         return {
             "success": True,
@@ -2642,6 +2976,21 @@ async def startup_event():
     except Exception as e:
         logger.warning(f"Could not start session cleanup task: {str(e)}")
     
+    # Share WebSocket updates with the other API workers
+    await event_bus.start()
+    
+    # Keep WAHA session statuses fresh for campaigns and warmers
+    session_health_cache.start()
+    
+    # Write subscription usage counters back periodically (the ledger is per worker process)
+    quota_ledger.start()
+    
+    # Write per-session daily send counts back periodically
+    send_rate_limiter.start()
+    
+    # Run queued contact/group exports in the background (jobs are kept in this worker's memory)
+    export_job_manager.start()
+    
     # Initialize Phase 2 database if available
     if PHASE_2_ENABLED:
         try:
@@ -2675,6 +3024,39 @@ async def shutdown_event():
             logger.info("✅ Campaign scheduler stopped")
         except Exception as e:
             logger.error(f"❌ Error stopping scheduler: {str(e)}")
+        
+        try:
+            # Write out buffered delivery records
+            from jobs.delivery_journal import delivery_journal
+            await delivery_journal.stop()
+        except Exception as e:
+            logger.error(f"❌ Error flushing delivery journal: {str(e)}")
+    
+    await session_health_cache.stop()
+    await export_job_manager.stop()
+    
+    try:
+        # Write out buffered subscription usage
+        await quota_ledger.stop()
+    except Exception as e:
+        logger.error(f"❌ Error flushing quota ledger: {str(e)}")
+    
+    try:
+        # Write out buffered daily send counts
+        await send_rate_limiter.stop()
+    except Exception as e:
+        logger.error(f"❌ Error flushing send counts: {str(e)}")
+    
+    # Disconnect from the pub/sub backend
+    await event_bus.stop()
+    
+    # Close pooled WAHA connections
+    await close_async_waha_clients()
+    
+    # Stop the phone validation worker processes
+    import asyncio
+    from utils.validation import shutdown_phone_pool
+    await asyncio.get_running_loop().run_in_executor(None, shutdown_phone_pool)
     
     logger.info("WhatsApp Agent API Server shutdown complete!")
 
@@ -9,6 +9,7 @@ from typing import Dict, Any
 from database.subscription_models import UserSubscription, Payment, WebhookEvent, PaymentStatus, SubscriptionStatus, PlanType
 from database.connection import get_db
 from payments.config import PaymentConfig
+from quota_ledger import quota_ledger
 
 logger = logging.getLogger(__name__)
 
@@ -56,6 +57,11 @@ class WebhookHandler:
         except Exception as e:
             logger.error(f"Error processing webhook: {str(e)}")
             raise
+        finally:
+            # Plan or status may have changed; reload the user's quota on next use
+            metadata = (event_data.get("data") or {}).get("metadata") or {}
+            if metadata.get("user_id"):
+                quota_ledger.invalidate(metadata["user_id"])
     
     def handle_payment_success(self, db, event_data: Dict[str, Any]) -> Dict[str, Any]:
         """Handle successful payment"""
@@ -0,0 +1,352 @@
+"""
+Phone Prefixes - shared calling-code lookup for phone numbers
+A digit trie over the ITU calling-code table (plus NANP area codes and the
+Kazakhstan ranges of +7), built once at import; lookups walk at most a few
+digits and return the calling code, ISO region and country name. Shared
+calling codes keep one name for the whole code in exports (+1 is
+'United States/Canada'); the region tells the countries apart
+"""
+
+from typing import Dict, NamedTuple, Optional
+
+
+class PhonePrefix(NamedTuple):
+    """Result of a prefix lookup"""
+    calling_code: str  # e.g. "1" for both +1 242 (Bahamas) and +1 416 (Canada)
+    region: str        # ISO 3166-1 alpha-2 ("001" for non-geographic codes)
+    name: str
+
+
+# prefix -> (calling code, region, name); prefixes longer than the calling code refine the region
+PHONE_PREFIXES = {
+    # North American Numbering Plan (+1)
+    '1': ('1', 'US', 'United States/Canada'),
+    '1204': ('1', 'CA', 'Canada'), '1226': ('1', 'CA', 'Canada'), '1236': ('1', 'CA', 'Canada'),
+    '1249': ('1', 'CA', 'Canada'), '1250': ('1', 'CA', 'Canada'), '1263': ('1', 'CA', 'Canada'),
+    '1289': ('1', 'CA', 'Canada'), '1306': ('1', 'CA', 'Canada'), '1343': ('1', 'CA', 'Canada'),
+    '1354': ('1', 'CA', 'Canada'), '1365': ('1', 'CA', 'Canada'), '1367': ('1', 'CA', 'Canada'),
+    '1368': ('1', 'CA', 'Canada'), '1382': ('1', 'CA', 'Canada'), '1387': ('1', 'CA', 'Canada'),
+    '1403': ('1', 'CA', 'Canada'), '1416': ('1', 'CA', 'Canada'), '1418': ('1', 'CA', 'Canada'),
+    '1428': ('1', 'CA', 'Canada'), '1431': ('1', 'CA', 'Canada'), '1437': ('1', 'CA', 'Canada'),
+    '1438': ('1', 'CA', 'Canada'), '1450': ('1', 'CA', 'Canada'), '1468': ('1', 'CA', 'Canada'),
+    '1474': ('1', 'CA', 'Canada'), '1506': ('1', 'CA', 'Canada'), '1514': ('1', 'CA', 'Canada'),
+    '1519': ('1', 'CA', 'Canada'), '1548': ('1', 'CA', 'Canada'), '1579': ('1', 'CA', 'Canada'),
+    '1581': ('1', 'CA', 'Canada'), '1584': ('1', 'CA', 'Canada'), '1587': ('1', 'CA', 'Canada'),
+    '1604': ('1', 'CA', 'Canada'), '1613': ('1', 'CA', 'Canada'), '1639': ('1', 'CA', 'Canada'),
+    '1647': ('1', 'CA', 'Canada'), '1672': ('1', 'CA', 'Canada'), '1683': ('1', 'CA', 'Canada'),
+    '1705': ('1', 'CA', 'Canada'), '1709': ('1', 'CA', 'Canada'), '1742': ('1', 'CA', 'Canada'),
+    '1753': ('1', 'CA', 'Canada'), '1778': ('1', 'CA', 'Canada'), '1780': ('1', 'CA', 'Canada'),
+    '1782': ('1', 'CA', 'Canada'), '1807': ('1', 'CA', 'Canada'), '1819': ('1', 'CA', 'Canada'),
+    '1825': ('1', 'CA', 'Canada'), '1867': ('1', 'CA', 'Canada'), '1873': ('1', 'CA', 'Canada'),
+    '1879': ('1', 'CA', 'Canada'), '1902': ('1', 'CA', 'Canada'), '1905': ('1', 'CA', 'Canada'),
+    '1242': ('1', 'BS', 'Bahamas'),
+    '1246': ('1', 'BB', 'Barbados'),
+    '1264': ('1', 'AI', 'Anguilla'),
+    '1268': ('1', 'AG', 'Antigua and Barbuda'),
+    '1284': ('1', 'VG', 'British Virgin Islands'),
+    '1340': ('1', 'VI', 'US Virgin Islands'),
+    '1345': ('1', 'KY', 'Cayman Islands'),
+    '1441': ('1', 'BM', 'Bermuda'),
+    '1473': ('1', 'GD', 'Grenada'),
+    '1649': ('1', 'TC', 'Turks and Caicos Islands'),
+    '1658': ('1', 'JM', 'Jamaica'),
+    '1664': ('1', 'MS', 'Montserrat'),
+    '1670': ('1', 'MP', 'Northern Mariana Islands'),
+    '1671': ('1', 'GU', 'Guam'),
+    '1684': ('1', 'AS', 'American Samoa'),
+    '1721': ('1', 'SX', 'Sint Maarten'),
+    '1758': ('1', 'LC', 'Saint Lucia'),
+    '1767': ('1', 'DM', 'Dominica'),
+    '1784': ('1', 'VC', 'Saint Vincent and the Grenadines'),
+    '1787': ('1', 'PR', 'Puerto Rico'),
+    '1809': ('1', 'DO', 'Dominican Republic'),
+    '1829': ('1', 'DO', 'Dominican Republic'),
+    '1849': ('1', 'DO', 'Dominican Republic'),
+    '1868': ('1', 'TT', 'Trinidad and Tobago'),
+    '1869': ('1', 'KN', 'Saint Kitts and Nevis'),
+    '1876': ('1', 'JM', 'Jamaica'),
+    '1939': ('1', 'PR', 'Puerto Rico'),
+
+    # Zone 2 - Africa and North Atlantic
+    '20': ('20', 'EG', 'Egypt'),
+    '211': ('211', 'SS', 'South Sudan'),
+    '212': ('212', 'MA', 'Morocco'),
+    '213': ('213', 'DZ', 'Algeria'),
+    '216': ('216', 'TN', 'Tunisia'),
+    '218': ('218', 'LY', 'Libya'),
+    '220': ('220', 'GM', 'Gambia'),
+    '221': ('221', 'SN', 'Senegal'),
+    '222': ('222', 'MR', 'Mauritania'),
+    '223': ('223', 'ML', 'Mali'),
+    '224': ('224', 'GN', 'Guinea'),
+    '225': ('225', 'CI', 'Ivory Coast'),
+    '226': ('226', 'BF', 'Burkina Faso'),
+    '227': ('227', 'NE', 'Niger'),
+    '228': ('228', 'TG', 'Togo'),
+    '229': ('229', 'BJ', 'Benin'),
+    '230': ('230', 'MU', 'Mauritius'),
+    '231': ('231', 'LR', 'Liberia'),
+    '232': ('232', 'SL', 'Sierra Leone'),
+    '233': ('233', 'GH', 'Ghana'),
+    '234': ('234', 'NG', 'Nigeria'),
+    '235': ('235', 'TD', 'Chad'),
+    '236': ('236', 'CF', 'Central African Republic'),
+    '237': ('237', 'CM', 'Cameroon'),
+    '238': ('238', 'CV', 'Cape Verde'),
+    '239': ('239', 'ST', 'São Tomé and Príncipe'),
+    '240': ('240', 'GQ', 'Equatorial Guinea'),
+    '241': ('241', 'GA', 'Gabon'),
+    '242': ('242', 'CG', 'Republic of the Congo'),
+    '243': ('243', 'CD', 'Democratic Republic of the Congo'),
+    '244': ('244', 'AO', 'Angola'),
+    '245': ('245', 'GW', 'Guinea-Bissau'),
+    '246': ('246', 'IO', 'British Indian Ocean Territory'),
+    '247': ('247', 'AC', 'Ascension Island'),
+    '248': ('248', 'SC', 'Seychelles'),
+    '249': ('249', 'SD', 'Sudan'),
+    '250': ('250', 'RW', 'Rwanda'),
+    '251': ('251', 'ET', 'Ethiopia'),
+    '252': ('252', 'SO', 'Somalia'),
+    '253': ('253', 'DJ', 'Djibouti'),
+    '254': ('254', 'KE', 'Kenya'),
+    '255': ('255', 'TZ', 'Tanzania'),
+    '256': ('256', 'UG', 'Uganda'),
+    '257': ('257', 'BI', 'Burundi'),
+    '258': ('258', 'MZ', 'Mozambique'),
+    '260': ('260', 'ZM', 'Zambia'),
+    '261': ('261', 'MG', 'Madagascar'),
+    '262': ('262', 'RE', 'Réunion'),
+    '263': ('263', 'ZW', 'Zimbabwe'),
+    '264': ('264', 'NA', 'Namibia'),
+    '265': ('265', 'MW', 'Malawi'),
+    '266': ('266', 'LS', 'Lesotho'),
+    '267': ('267', 'BW', 'Botswana'),
+    '268': ('268', 'SZ', 'Eswatini'),
+    '269': ('269', 'KM', 'Comoros'),
+    '27': ('27', 'ZA', 'South Africa'),
+    '290': ('290', 'SH', 'Saint Helena'),
+    '291': ('291', 'ER', 'Eritrea'),
+    '297': ('297', 'AW', 'Aruba'),
+    '298': ('298', 'FO', 'Faroe Islands'),
+    '299': ('299', 'GL', 'Greenland'),
+
+    # Zones 3 and 4 - Europe
+    '30': ('30', 'GR', 'Greece'),
+    '31': ('31', 'NL', 'Netherlands'),
+    '32': ('32', 'BE', 'Belgium'),
+    '33': ('33', 'FR', 'France'),
+    '34': ('34', 'ES', 'Spain'),
+    '350': ('350', 'GI', 'Gibraltar'),
+    '351': ('351', 'PT', 'Portugal'),
+    '352': ('352', 'LU', 'Luxembourg'),
+    '353': ('353', 'IE', 'Ireland'),
+    '354': ('354', 'IS', 'Iceland'),
+    '355': ('355', 'AL', 'Albania'),
+    '356': ('356', 'MT', 'Malta'),
+    '357': ('357', 'CY', 'Cyprus'),
+    '358': ('358', 'FI', 'Finland'),
+    '359': ('359', 'BG', 'Bulgaria'),
+    '36': ('36', 'HU', 'Hungary'),
+    '370': ('370', 'LT', 'Lithuania'),
+    '371': ('371', 'LV', 'Latvia'),
+    '372': ('372', 'EE', 'Estonia'),
+    '373': ('373', 'MD', 'Moldova'),
+    '374': ('374', 'AM', 'Armenia'),
+    '375': ('375', 'BY', 'Belarus'),
+    '376': ('376', 'AD', 'Andorra'),
+    '377': ('377', 'MC', 'Monaco'),
+    '378': ('378', 'SM', 'San Marino'),
+    '380': ('380', 'UA', 'Ukraine'),
+    '381': ('381', 'RS', 'Serbia'),
+    '382': ('382', 'ME', 'Montenegro'),
+    '383': ('383', 'XK', 'Kosovo'),
+    '385': ('385', 'HR', 'Croatia'),
+    '386': ('386', 'SI', 'Slovenia'),
+    '387': ('387', 'BA', 'Bosnia and Herzegovina'),
+    '389': ('389', 'MK', 'North Macedonia'),
+    '39': ('39', 'IT', 'Italy'),
+    '40': ('40', 'RO', 'Romania'),
+    '41': ('41', 'CH', 'Switzerland'),
+    '420': ('420', 'CZ', 'Czech Republic'),
+    '421': ('421', 'SK', 'Slovakia'),
+    '423': ('423', 'LI', 'Liechtenstein'),
+    '43': ('43', 'AT', 'Austria'),
+    '44': ('44', 'GB', 'United Kingdom'),
+    '45': ('45', 'DK', 'Denmark'),
+    '46': ('46', 'SE', 'Sweden'),
+    '47': ('47', 'NO', 'Norway'),
+    '48': ('48', 'PL', 'Poland'),
+    '49': ('49', 'DE', 'Germany'),
+
+    # Zone 5 - South and Central America
+    '500': ('500', 'FK', 'Falkland Islands'),
+    '501': ('501', 'BZ', 'Belize'),
+    '502': ('502', 'GT', 'Guatemala'),
+    '503': ('503', 'SV', 'El Salvador'),
+    '504': ('504', 'HN', 'Honduras'),
+    '505': ('505', 'NI', 'Nicaragua'),
+    '506': ('506', 'CR', 'Costa Rica'),
+    '507': ('507', 'PA', 'Panama'),
+    '508': ('508', 'PM', 'Saint Pierre and Miquelon'),
+    '509': ('509', 'HT', 'Haiti'),
+    '51': ('51', 'PE', 'Peru'),
+    '52': ('52', 'MX', 'Mexico'),
+    '53': ('53', 'CU', 'Cuba'),
+    '54': ('54', 'AR', 'Argentina'),
+    '55': ('55', 'BR', 'Brazil'),
+    '56': ('56', 'CL', 'Chile'),
+    '57': ('57', 'CO', 'Colombia'),
+    '58': ('58', 'VE', 'Venezuela'),
+    '590': ('590', 'GP', 'Guadeloupe'),
+    '591': ('591', 'BO', 'Bolivia'),
+    '592': ('592', 'GY', 'Guyana'),
+    '593': ('593', 'EC', 'Ecuador'),
+    '594': ('594', 'GF', 'French Guiana'),
+    '595': ('595', 'PY', 'Paraguay'),
+    '596': ('596', 'MQ', 'Martinique'),
+    '597': ('597', 'SR', 'Suriname'),
+    '598': ('598', 'UY', 'Uruguay'),
+    '599': ('599', 'CW', 'Curaçao'),
+
+    # Zone 6 - Southeast Asia and Oceania
+    '60': ('60', 'MY', 'Malaysia'),
+    '61': ('61', 'AU', 'Australia'),
+    '62': ('62', 'ID', 'Indonesia'),
+    '63': ('63', 'PH', 'Philippines'),
+    '64': ('64', 'NZ', 'New Zealand'),
+    '65': ('65', 'SG', 'Singapore'),
+    '66': ('66', 'TH', 'Thailand'),
+    '670': ('670', 'TL', 'Timor-Leste'),
+    '672': ('672', 'NF', 'Norfolk Island'),
+    '673': ('673', 'BN', 'Brunei'),
+    '674': ('674', 'NR', 'Nauru'),
+    '675': ('675', 'PG', 'Papua New Guinea'),
+    '676': ('676', 'TO', 'Tonga'),
+    '677': ('677', 'SB', 'Solomon Islands'),
+    '678': ('678', 'VU', 'Vanuatu'),
+    '679': ('679', 'FJ', 'Fiji'),
+    '680': ('680', 'PW', 'Palau'),
+    '681': ('681', 'WF', 'Wallis and Futuna'),
+    '682': ('682', 'CK', 'Cook Islands'),
+    '683': ('683', 'NU', 'Niue'),
+    '685': ('685', 'WS', 'Samoa'),
+    '686': ('686', 'KI', 'Kiribati'),
+    '687': ('687', 'NC', 'New Caledonia'),
+    '688': ('688', 'TV', 'Tuvalu'),
+    '689': ('689', 'PF', 'French Polynesia'),
+    '690': ('690', 'TK', 'Tokelau'),
+    '691': ('691', 'FM', 'Micronesia'),
+    '692': ('692', 'MH', 'Marshall Islands'),
+
+    # Zone 7 - Russia and Kazakhstan
+    '7': ('7', 'RU', 'Russia/Kazakhstan'),
+    '76': ('7', 'KZ', 'Kazakhstan'),
+    '77': ('7', 'KZ', 'Kazakhstan'),
+
+    # Zone 8 - East Asia and international services
+    '800': ('800', '001', 'International Freephone'),
+    '808': ('808', '001', 'International Shared Cost Service'),
+    '81': ('81', 'JP', 'Japan'),
+    '82': ('82', 'KR', 'South Korea'),
+    '84': ('84', 'VN', 'Vietnam'),
+    '850': ('850', 'KP', 'North Korea'),
+    '852': ('852', 'HK', 'Hong Kong'),
+    '853': ('853', 'MO', 'Macau'),
+    '855': ('855', 'KH', 'Cambodia'),
+    '856': ('856', 'LA', 'Laos'),
+    '86': ('86', 'CN', 'China'),
+    '870': ('870', '001', 'Inmarsat'),
+    '878': ('878', '001', 'Universal Personal Telecommunications'),
+    '880': ('880', 'BD', 'Bangladesh'),
+    '881': ('881', '001', 'Global Mobile Satellite System'),
+    '882': ('882', '001', 'International Networks'),
+    '883': ('883', '001', 'International Networks'),
+    '886': ('886', 'TW', 'Taiwan'),
+    '888': ('888', '001', 'Telecommunications for Disaster Relief'),
+
+    # Zone 9 - West, Central and South Asia
+    '90': ('90', 'TR', 'Turkey'),
+    '91': ('91', 'IN', 'India'),
+    '92': ('92', 'PK', 'Pakistan'),
+    '93': ('93', 'AF', 'Afghanistan'),
+    '94': ('94', 'LK', 'Sri Lanka'),
+    '95': ('95', 'MM', 'Myanmar'),
+    '960': ('960', 'MV', 'Maldives'),
+    '961': ('961', 'LB', 'Lebanon'),
+    '962': ('962', 'JO', 'Jordan'),
+    '963': ('963', 'SY', 'Syria'),
+    '964': ('964', 'IQ', 'Iraq'),
+    '965': ('965', 'KW', 'Kuwait'),
+    '966': ('966', 'SA', 'Saudi Arabia'),
+    '967': ('967', 'YE', 'Yemen'),
+    '968': ('968', 'OM', 'Oman'),
+    '970': ('970', 'PS', 'Palestine'),
+    '971': ('971', 'AE', 'UAE'),
+    '972': ('972', 'IL', 'Israel'),
+    '973': ('973', 'BH', 'Bahrain'),
+    '974': ('974', 'QA', 'Qatar'),
+    '975': ('975', 'BT', 'Bhutan'),
+    '976': ('976', 'MN', 'Mongolia'),
+    '977': ('977', 'NP', 'Nepal'),
+    '979': ('979', '001', 'International Premium Rate Service'),
+    '98': ('98', 'IR', 'Iran'),
+    '992': ('992', 'TJ', 'Tajikistan'),
+    '993': ('993', 'TM', 'Turkmenistan'),
+    '994': ('994', 'AZ', 'Azerbaijan'),
+    '995': ('995', 'GE', 'Georgia'),
+    '996': ('996', 'KG', 'Kyrgyzstan'),
+    '998': ('998', 'UZ', 'Uzbekistan'),
+}
+
+_ENTRY = None  # trie key holding a node's PhonePrefix
+
+
+class PhonePrefixIndex:
+    """Digit trie for longest-prefix lookups of calling codes"""
+
+    def __init__(self, prefixes: Dict[str, tuple]):
+        self._root: Dict = {}
+        self._code_names: Dict[str, str] = {}  # calling code -> name of the whole code
+        for prefix, (calling_code, region, name) in prefixes.items():
+            node = self._root
+            for digit in prefix:
+                node = node.setdefault(digit, {})
+            node[_ENTRY] = PhonePrefix(calling_code, region, name)
+            if prefix == calling_code:
+                self._code_names[calling_code] = name
+
+    def lookup(self, phone_number: str) -> Optional[PhonePrefix]:
+        """Longest matching prefix of an international number (digits, optional leading +)"""
+        if not phone_number:
+            return None
+
+        node = self._root
+        match = None
+        for digit in phone_number.lstrip('+'):
+            node = node.get(digit)
+            if node is None:
+                break
+            match = node.get(_ENTRY, match)
+        return match
+
+    def country_code(self, phone_number: str) -> str:
+        """Calling code of a number ('' if unknown)"""
+        match = self.lookup(phone_number)
+        return match.calling_code if match else ''
+
+    def country_name(self, phone_number: str) -> str:
+        """Country name of a number's calling code, e.g. 'United States/Canada' for +1 ('Unknown' if unknown)"""
+        match = self.lookup(phone_number)
+        return self._code_names[match.calling_code] if match else 'Unknown'
+
+    def format_phone(self, phone_number: str) -> str:
+        """'+<code> <rest>' for a number with a known calling code, otherwise the number unchanged"""
+        match = self.lookup(phone_number)
+        digits = phone_number.lstrip('+') if phone_number else phone_number
+        if match and len(digits) > len(match.calling_code):
+            return f"+{match.calling_code} {digits[len(match.calling_code):]}"
+        return phone_number
+
+
+# Global phone prefix index
+phone_prefix_index = PhonePrefixIndex(PHONE_PREFIXES)
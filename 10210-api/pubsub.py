@@ -0,0 +1,209 @@
+"""
+Pub/Sub - carries WebSocket updates between API workers
+Every worker publishes events (campaign progress, export jobs, warmers,
+session status) to the bus and delivers what arrives from the bus to its own
+WebSocket subscribers, so a client sees updates from work running anywhere.
+
+Backends (PUBSUB_BACKEND):
+    memory  - in-process only (single worker, the default)
+    redis   - Redis pub/sub on PUBSUB_REDIS_URL, shared by every worker/container
+"""
+
+import asyncio
+import json
+import logging
+import os
+import uuid
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+PUBSUB_BACKEND = os.getenv("PUBSUB_BACKEND", "memory").lower()
+PUBSUB_REDIS_URL = os.getenv(
+    "PUBSUB_REDIS_URL",
+    os.getenv("REDIS_URL", f"redis://{os.getenv('REDIS_HOST', 'localhost')}:{os.getenv('REDIS_PORT', '6379')}/0")
+)
+PUBSUB_CHANNEL = os.getenv("PUBSUB_CHANNEL", "cuwapp:ws")
+# Messages a worker may have waiting for Redis before new ones are dropped
+PUBSUB_OUTBOX_SIZE = int(os.getenv("PUBSUB_OUTBOX_SIZE", "10000"))
+
+# handler(topic, key, message) - message is the serialized WebSocket payload
+Handler = Callable[[str, Any, str], None]
+
+
+class InProcessPubSub:
+    """Delivers published messages to this worker only"""
+
+    name = "memory"
+
+    def __init__(self):
+        self._handler: Optional[Handler] = None
+
+    async def start(self, handler: Handler):
+        self._handler = handler
+
+    async def stop(self):
+        self._handler = None
+
+    def publish(self, topic: str, key: Any, message: str):
+        if self._handler:
+            self._handler(topic, key, message)
+
+
+class RedisPubSub:
+    """Redis pub/sub shared by all workers
+
+    The publishing worker delivers to its own subscribers at once and skips its
+    own echo from Redis; publishes go through an outbox so callers never wait
+    on the network. Both directions reconnect after a Redis outage.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str = PUBSUB_REDIS_URL, channel: str = PUBSUB_CHANNEL):
+        self.url = url
+        self.channel = channel
+        self.origin = uuid.uuid4().hex
+        self._handler: Optional[Handler] = None
+        self._client = None
+        self._outbox: Optional[asyncio.Queue] = None
+        self._tasks = []
+        self._dropped = 0
+
+    async def start(self, handler: Handler):
+        import redis.asyncio as aioredis
+
+        self._handler = handler
+        self._client = aioredis.from_url(self.url, decode_responses=True)
+        self._outbox = asyncio.Queue(maxsize=PUBSUB_OUTBOX_SIZE)
+        self._tasks = [asyncio.create_task(self._publisher()), asyncio.create_task(self._listener())]
+        logger.info(f"📡 Redis pub/sub started on channel {self.channel}")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        if self._client:
+            await self._client.close()
+            self._client = None
+        self._handler = None
+
+    def publish(self, topic: str, key: Any, message: str):
+        if self._handler:
+            self._handler(topic, key, message)
+        if self._outbox is None:
+            return
+        envelope = json.dumps({"origin": self.origin, "topic": topic, "key": key, "message": message})
+        try:
+            self._outbox.put_nowait(envelope)
+        except asyncio.QueueFull:
+            # Redis is down or too slow: progress updates are superseded by later ones anyway
+            self._dropped += 1
+            if self._dropped % 1000 == 1:
+                logger.warning(f"Pub/sub outbox full, {self._dropped} messages dropped so far")
+
+    async def _publisher(self):
+        while True:
+            envelope = await self._outbox.get()
+            while True:
+                try:
+                    await self._client.publish(self.channel, envelope)
+                    break
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Pub/sub publish failed: {str(e)}")
+                    await asyncio.sleep(1)
+
+    async def _listener(self):
+        while True:
+            pubsub = self._client.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                async for item in pubsub.listen():
+                    if item.get("type") != "message":
+                        continue
+                    self._deliver(item["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Pub/sub listener error, reconnecting: {str(e)}")
+                await asyncio.sleep(1)
+            finally:
+                try:
+                    await pubsub.close()
+                except Exception:
+                    pass
+
+    def _deliver(self, data: str):
+        try:
+            envelope = json.loads(data)
+            if envelope.get("origin") == self.origin or not self._handler:
+                return
+            self._handler(envelope["topic"], envelope["key"], envelope["message"])
+        except Exception as e:
+            logger.error(f"Bad pub/sub message: {str(e)}")
+
+
+class EventBus:
+    """Front end for the configured pub/sub backend"""
+
+    def __init__(self, backend: Optional[str] = None):
+        self.backend_name = backend or PUBSUB_BACKEND
+        self._backend = InProcessPubSub()
+        self._handler: Optional[Handler] = None
+        self._started = False
+
+    def set_handler(self, handler: Handler):
+        """Where messages for this worker's subscribers are delivered"""
+        self._handler = handler
+
+    def _dispatch(self, topic: str, key: Any, message: str):
+        if self._handler:
+            try:
+                self._handler(topic, key, message)
+            except Exception as e:
+                logger.error(f"Pub/sub handler failed ({topic}, {key}): {str(e)}")
+
+    async def start(self):
+        """Connect the backend (idempotent); falls back to in-process if Redis is unavailable"""
+        if self._started:
+            return
+        if self.backend_name == "redis":
+            try:
+                backend = RedisPubSub()
+                await backend.start(self._dispatch)
+                self._backend = backend
+            except ImportError:
+                logger.error("PUBSUB_BACKEND=redis but the redis package is not installed, using in-process pub/sub")
+            except Exception as e:
+                logger.error(f"Could not start Redis pub/sub, using in-process pub/sub: {str(e)}")
+        if self._backend.name == "memory":
+            await self._backend.start(self._dispatch)
+        self._started = True
+
+    async def stop(self):
+        """Disconnect the backend"""
+        await self._backend.stop()
+        self._backend = InProcessPubSub()
+        self._started = False
+
+    def publish(self, topic: str, key: Any, message: str):
+        """Publish a serialized message to subscribers of topic/key on every worker (never blocks)"""
+        if not self._started:
+            # Before startup (or in scripts): deliver locally
+            self._dispatch(topic, key, message)
+            return
+        self._backend.publish(topic, key, message)
+
+    def get_status(self):
+        return {"backend": self._backend.name, "configured": self.backend_name, "started": self._started}
+
+
+# Global event bus
+event_bus = EventBus()
@@ -0,0 +1,295 @@
+"""
+Quota Ledger - in-memory subscription usage counters
+Holds each user's plan limits and monthly usage so quota checks and
+reservations need no DB read while an entry is cached; entries are read and
+increments written back in batches on a writer thread, off the event loop.
+
+The ledger lives in this process: with several API workers each one admits
+against the same stored usage, so a user can overshoot a limit by up to
+(workers - 1) x the unwritten increments. Run a single worker (or route each
+user to one worker) where limits must be exact.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Any
+
+from database.connection import get_db
+from database.subscription_models import UserSubscription, SubscriptionStatus
+
+logger = logging.getLogger(__name__)
+
+# resource -> (limit column, usage column) on UserSubscription
+QUOTA_RESOURCES = {
+    "messages": ("max_messages_per_month", "messages_sent_this_month"),
+    "contacts_export": ("max_contacts_export", "contacts_exported_this_month"),
+}
+
+
+class QuotaLedger:
+    """Per-user quota counters with reserve/release and write-behind increments"""
+
+    def __init__(self, ttl_seconds: Optional[float] = None, flush_interval: Optional[float] = None):
+        self.ttl_seconds = ttl_seconds or float(os.getenv("QUOTA_LEDGER_TTL_SECONDS", "300"))
+        self.flush_interval = flush_interval or float(os.getenv("QUOTA_LEDGER_FLUSH_SECONDS", "5"))
+
+        self._entries: Dict[str, Dict[str, Any]] = {}   # user_id -> limits, flushed usage, plan
+        self._pending: Dict[str, Dict[str, int]] = {}   # user_id -> resource -> increments not yet written
+        self._periods: Dict[str, Optional[datetime]] = {}  # user_id -> reset date the outstanding reservations belong to
+        self._loading: Dict[str, asyncio.Future] = {}     # user_id -> read in progress
+        self._flush_task = None
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="quota-ledger")
+
+    # ==================== LOADING ====================
+
+    def _read(self, user_id: str) -> Dict[str, Any]:
+        """Read a user's subscription limits and usage (runs on the writer thread)"""
+        entry = {"exists": False, "loaded_at": time.monotonic(), "stale": False}
+        try:
+            with get_db() as db:
+                subscription = db.query(UserSubscription).filter(
+                    UserSubscription.user_id == user_id
+                ).first()
+
+                if subscription:
+                    # Applies the monthly counter reset if it is due (committed on exit)
+                    subscription.is_within_limits("messages")
+
+                    entry.update({
+                        "exists": True,
+                        "plan_type": subscription.plan_type,
+                        "suspended": subscription.status == SubscriptionStatus.SUSPENDED,
+                        "reset_date": subscription.messages_reset_date,
+                        "limits": {r: getattr(subscription, cols[0]) for r, cols in QUOTA_RESOURCES.items()},
+                        "used": {r: getattr(subscription, cols[1]) or 0 for r, cols in QUOTA_RESOURCES.items()},
+                    })
+        except Exception as e:
+            logger.error(f"Failed to load quota for user {user_id}: {str(e)}")
+            # Don't cache a failed read
+            entry["loaded_at"] = 0
+        return entry
+
+    def _apply(self, user_id: str, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """Cache a freshly read entry"""
+        if entry["exists"] and user_id in self._periods and self._periods[user_id] != entry["reset_date"]:
+            # Reserved before the monthly reset; the new month starts from zero
+            dropped = self._pending.pop(user_id, {})
+            del self._periods[user_id]
+            logger.info(f"Quota ledger: dropped {dropped} unwritten increments of user {user_id} from before the monthly reset")
+
+        self._entries[user_id] = entry
+        return entry
+
+    def _expired(self, entry: Optional[Dict[str, Any]]) -> bool:
+        return (entry is None or entry["stale"] or
+                time.monotonic() - entry["loaded_at"] > self.ttl_seconds or
+                bool(entry.get("reset_date") and datetime.utcnow() > entry["reset_date"]))
+
+    async def load(self, user_id: str) -> Dict[str, Any]:
+        """A user's cached entry, read on the writer thread when missing or expired"""
+        entry = self._entries.get(user_id)
+        if not self._expired(entry):
+            return entry
+
+        loading = self._loading.get(user_id)
+        if loading is None:
+            # One read per user at a time; concurrent callers share it
+            loading = asyncio.get_running_loop().run_in_executor(self._writer, self._read, user_id)
+            self._loading[user_id] = loading
+            loading.add_done_callback(
+                lambda done: self._loading.pop(user_id) if self._loading.get(user_id) is done else None
+            )
+        read = await asyncio.shield(loading)
+        if self._entries.get(user_id) is read:
+            return read  # applied by another caller of the same read
+        return self._apply(user_id, read)
+
+    def invalidate(self, user_id: Optional[str]):
+        """Reload a user's limits on next use (plan change, payment webhook)"""
+        entry = self._entries.get(user_id) if user_id else None
+        if entry:
+            entry["stale"] = True
+
+    # ==================== QUOTA ====================
+
+    def _pending_count(self, user_id: str, resource: str) -> int:
+        return self._pending.get(user_id, {}).get(resource, 0)
+
+    def cached_usage(self, user_id: str, resource: str) -> Optional[Dict[str, Any]]:
+        """Usage from the cached entry only (no DB read); None if not loaded or the user has no subscription"""
+        entry = self._entries.get(user_id)
+        if not entry or not entry["exists"]:
+            return None
+
+        limit = entry["limits"][resource]
+        used = entry["used"][resource] + self._pending_count(user_id, resource)
+        return {
+            "plan_type": entry["plan_type"],
+            "limit": limit,
+            "used": used,
+            "remaining": None if limit == -1 else max(0, limit - used),
+            "suspended": entry["suspended"]
+        }
+
+    async def get_usage(self, user_id: str, resource: str) -> Optional[Dict[str, Any]]:
+        """Current usage (including unwritten increments) and limit; None if the user has no subscription"""
+        await self.load(user_id)
+        return self.cached_usage(user_id, resource)
+
+    async def reserve(self, user_id: str, resource: str, amount: int = 1, partial: bool = False) -> int:
+        """Check and take quota in one step. Returns the amount granted (0 if over the limit).
+
+        With partial=True as much as is left is granted; otherwise all or nothing.
+        Users without a subscription are not metered.
+        """
+        entry = await self.load(user_id)
+        if not entry["exists"]:
+            return amount
+        if entry["suspended"]:
+            return 0
+
+        limit = entry["limits"][resource]
+        if limit == -1:
+            granted = amount
+        else:
+            left = max(0, limit - entry["used"][resource] - self._pending_count(user_id, resource))
+            granted = min(amount, left) if partial else (amount if amount <= left else 0)
+
+        if granted:
+            self._periods.setdefault(user_id, entry["reset_date"])
+            pending = self._pending.setdefault(user_id, {})
+            pending[resource] = pending.get(resource, 0) + granted
+        return granted
+
+    def release(self, user_id: str, resource: str, amount: int = 1):
+        """Give back reserved quota that was not used (e.g. the send failed)"""
+        entry = self._entries.get(user_id)
+        if not entry or not entry["exists"] or user_id not in self._periods:
+            # Nothing outstanding in this period (never reserved, or dropped at the reset)
+            return
+        pending = self._pending.setdefault(user_id, {})
+        pending[resource] = pending.get(resource, 0) - amount
+
+    # ==================== WRITE-BACK ====================
+
+    def _take_batch(self) -> Optional[Dict[str, Any]]:
+        """Take every pending increment, with the period it belongs to"""
+        batch = {
+            user_id: (self._periods.get(user_id), deltas)
+            for user_id, deltas in self._pending.items() if any(deltas.values())
+        }
+        self._pending = {}
+        # Periods stay: reservations written by this batch may still be released (as negative increments)
+        return batch or None
+
+    def _write_batch(self, batch: Dict[str, Any]) -> List[str]:
+        """Add the increments to the subscriptions in one transaction (runs on the writer thread).
+
+        Returns the users whose counters were written; a subscription reset since the
+        increments were reserved has moved on to a new period and is left alone.
+        """
+        written = []
+        with get_db() as db:
+            for user_id, (period, deltas) in batch.items():
+                values = {}
+                for resource, count in deltas.items():
+                    if count:
+                        column = getattr(UserSubscription, QUOTA_RESOURCES[resource][1])
+                        values[column] = column + count
+                updated = db.query(UserSubscription).filter(
+                    UserSubscription.user_id == user_id,
+                    UserSubscription.messages_reset_date == period if period else UserSubscription.messages_reset_date.is_(None)
+                ).update(values, synchronize_session=False)
+                if updated:
+                    written.append(user_id)
+            db.commit()
+        return written
+
+    def _finish_batch(self, batch: Dict[str, Any], written: Optional[List[str]], error: Optional[Exception] = None) -> bool:
+        """Fold a written batch into the loaded usage, or put a failed one back"""
+        if error is not None:
+            logger.error(f"Quota ledger flush failed: {str(error)}")
+            for user_id, (period, deltas) in batch.items():
+                self._periods.setdefault(user_id, period)
+                if self._periods[user_id] != period:
+                    continue  # a newer period was reserved since; the old increments no longer count
+                pending = self._pending.setdefault(user_id, {})
+                for resource, count in deltas.items():
+                    pending[resource] = pending.get(resource, 0) + count
+            return False
+
+        # Written increments are now part of the loaded usage (unless it was reloaded for a new period)
+        for user_id in written:
+            period, deltas = batch[user_id]
+            entry = self._entries.get(user_id)
+            if entry and entry["exists"] and entry["reset_date"] == period:
+                for resource, count in deltas.items():
+                    entry["used"][resource] += count
+        dropped = set(batch) - set(written)
+        if dropped:
+            logger.info(f"Quota ledger: dropped increments of {len(dropped)} users whose monthly usage was reset")
+        return True
+
+    def flush(self) -> bool:
+        """Write all pending increments and wait for it (blocking; for sync callers)"""
+        batch = self._take_batch()
+        if batch is None:
+            return False
+        try:
+            written = self._writer.submit(self._write_batch, batch).result()
+        except Exception as e:
+            return self._finish_batch(batch, None, e)
+        return self._finish_batch(batch, written)
+
+    async def flush_async(self) -> bool:
+        """Write all pending increments on the writer thread without blocking the event loop"""
+        batch = self._take_batch()
+        if batch is None:
+            return False
+        future = asyncio.get_running_loop().run_in_executor(self._writer, self._write_batch, batch)
+        try:
+            await asyncio.wait([future])
+        except asyncio.CancelledError:
+            # Settle the batch before letting the cancellation through, so no increment is lost
+            await asyncio.wait([future])
+            self._settle(batch, future)
+            raise
+        return self._settle(batch, future)
+
+    def _settle(self, batch: Dict[str, Any], future: asyncio.Future) -> bool:
+        if future.exception() is not None:
+            return self._finish_batch(batch, None, future.exception())
+        return self._finish_batch(batch, future.result())
+
+    def start(self):
+        """Start the periodic write-back (idempotent)"""
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Stop the periodic write-back and write whatever is left"""
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+        self._flush_task = None
+        await self.flush_async()
+
+    async def _flush_loop(self):
+        """Flush every flush_interval seconds"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush_async()
+            except Exception as e:
+                logger.error(f"Quota ledger flusher error: {str(e)}")
+
+
+# Global quota ledger (one per process; see the module docstring before running several workers)
+quota_ledger = QuotaLedger()
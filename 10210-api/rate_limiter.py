@@ -0,0 +1,285 @@
+"""
+Send Rate Limiter - shared token buckets for outgoing WhatsApp messages
+One bucket per WAHA session (phone number) and one per WAHA instance, plus a
+daily cap per session, drawn from by campaign senders, warmers and the API.
+Daily counts are written behind to session_send_counts so they survive a restart
+"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import func
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a send would exceed a daily cap or wait longer than allowed"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Token bucket that hands out reservations (a send may borrow a future token and wait for it)"""
+
+    def __init__(self, rate_per_second: float, burst: int):
+        self.rate = rate_per_second
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self) -> float:
+        """Take a token; returns how long to wait before it may be used"""
+        self._refill()
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def cancel(self):
+        """Give back a reserved token"""
+        self.tokens = min(self.burst, self.tokens + 1)
+
+
+class SendRateLimiter:
+    """Per-session and per-instance token buckets with jitter and per-session daily caps"""
+
+    def __init__(self):
+        self.session_rate = float(os.getenv("RATE_LIMIT_SESSION_PER_MINUTE", "20")) / 60
+        self.session_burst = int(os.getenv("RATE_LIMIT_SESSION_BURST", "3"))
+        self.instance_rate = float(os.getenv("RATE_LIMIT_INSTANCE_PER_SECOND", "20"))
+        self.instance_burst = int(os.getenv("RATE_LIMIT_INSTANCE_BURST", "40"))
+        self.jitter = float(os.getenv("RATE_LIMIT_JITTER_SECONDS", "0.5"))
+        self.default_daily_cap = int(os.getenv("RATE_LIMIT_SESSION_DAILY_CAP", "0"))  # 0 = no cap
+        self.default_base_url = os.getenv("WAHA_BASE_URL", "http://localhost:4500").rstrip('/')
+        self.flush_interval = float(os.getenv("RATE_LIMIT_FLUSH_SECONDS", "5"))
+
+        self._session_buckets: Dict[str, TokenBucket] = {}
+        self._instance_buckets: Dict[str, TokenBucket] = {}
+        self._sent_today: Dict[str, int] = {}  # session -> sends counted today
+        self._day = None
+        self._unsaved: Dict[Tuple[str, str], int] = {}  # (session, day) -> count changes not yet written
+        self._flush_task = None
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="send-counts")
+
+    @property
+    def session_interval(self) -> float:
+        """Seconds between sends a session's bucket allows once its burst is spent"""
+        return 1 / self.session_rate if self.session_rate > 0 else 0.0
+
+    def _session_bucket(self, session: str) -> TokenBucket:
+        bucket = self._session_buckets.get(session)
+        if bucket is None:
+            bucket = self._session_buckets[session] = TokenBucket(self.session_rate, self.session_burst)
+        return bucket
+
+    def _instance_bucket(self, base_url: Optional[str]) -> TokenBucket:
+        key = (base_url or self.default_base_url).rstrip('/')
+        bucket = self._instance_buckets.get(key)
+        if bucket is None:
+            bucket = self._instance_buckets[key] = TokenBucket(self.instance_rate, self.instance_burst)
+        return bucket
+
+    # ==================== DAILY CAPS ====================
+
+    def _today_start(self) -> datetime:
+        return datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def _roll_day(self) -> datetime:
+        """Start today's counts afresh after midnight"""
+        today = self._today_start()
+        if self._day != today:
+            self._day = today
+            self._sent_today = {}
+        return today
+
+    def sent_today(self, session: str) -> int:
+        """Messages sent on a session today (in memory; seeded from the stored count by load_sent_today)"""
+        self._roll_day()
+        return self._sent_today.get(session, 0)
+
+    async def load_sent_today(self, session: str) -> int:
+        """Seed a session's count from the stored one on first use today, on the writer thread"""
+        today = self._roll_day()
+        if session not in self._sent_today:
+            stored = await asyncio.get_running_loop().run_in_executor(
+                self._writer, self._load_sent_today, session, today
+            )
+            if self._day == today:
+                # Another caller may have seeded (and counted) while this one was loading
+                self._sent_today.setdefault(session, stored)
+        return self.sent_today(session)
+
+    def _load_sent_today(self, session: str, today: datetime) -> int:
+        """Today's stored send count of a session (campaign, warmer and API sends).
+
+        Campaign deliveries are counted too, so sends made before the counts were
+        stored (or not yet flushed when the process stopped) are not lost.
+        """
+        try:
+            from database.connection import get_db
+            from database.models import Delivery, SessionSendCount
+            from jobs.models import DeliveryStatus
+
+            with get_db() as db:
+                stored = db.query(SessionSendCount.sent).filter(
+                    SessionSendCount.session_name == session,
+                    SessionSendCount.day == today.date().isoformat()
+                ).scalar() or 0
+                delivered = db.query(func.count(Delivery.id)).filter(
+                    Delivery.session_name == session,
+                    Delivery.status.in_([DeliveryStatus.SENT.value, DeliveryStatus.DELIVERED.value]),
+                    Delivery.sent_at >= today
+                ).scalar() or 0
+                return max(stored, delivered)
+        except Exception as e:
+            logger.error(f"Failed to load today's sends for session {session}: {str(e)}")
+            return 0
+
+    def _count(self, session: str, change: int):
+        """Apply a change to today's count of a session and queue it for writing"""
+        self._sent_today[session] = self.sent_today(session) + change
+        key = (session, self._day.date().isoformat())
+        self._unsaved[key] = self._unsaved.get(key, 0) + change
+
+    def refund(self, session: str):
+        """Give back a send counted by acquire that did not go out (failed, dropped or handed back)"""
+        # A send counted before midnight stays on yesterday's count
+        if self._day == self._today_start() and self._sent_today.get(session, 0) > 0:
+            self._count(session, -1)
+
+    def remaining_today(self, session: str, daily_cap: Optional[int] = None) -> Optional[int]:
+        """Sends left today under the cap (None if uncapped)"""
+        cap = daily_cap or self.default_daily_cap
+        if not cap:
+            return None
+        return max(0, cap - self.sent_today(session))
+
+    # ==================== ACQUIRE ====================
+
+    async def acquire(
+        self,
+        session: str,
+        base_url: Optional[str] = None,
+        daily_cap: Optional[int] = None,
+        max_wait: Optional[float] = None
+    ) -> float:
+        """Wait until a message may be sent on a session. Returns the time waited.
+
+        Raises RateLimitExceeded if the session's daily cap is used up, or if the
+        wait would be longer than max_wait (nothing is consumed in that case).
+        """
+        await self.load_sent_today(session)
+        remaining = self.remaining_today(session, daily_cap)
+        if remaining == 0:
+            raise RateLimitExceeded(f"Daily message cap reached for session '{session}'")
+
+        session_bucket = self._session_bucket(session)
+        instance_bucket = self._instance_bucket(base_url)
+        wait = max(session_bucket.reserve(), instance_bucket.reserve())
+        if wait > 0:
+            wait += random.uniform(0, self.jitter)
+
+        if max_wait is not None and wait > max_wait:
+            session_bucket.cancel()
+            instance_bucket.cancel()
+            raise RateLimitExceeded(f"Send rate limit reached for session '{session}'", retry_after=wait)
+
+        # Count the send now so concurrent callers see it against the cap (refund() if it fails)
+        self._count(session, 1)
+
+        if wait > 0:
+            logger.debug(f"Rate limiter: session '{session}' waits {wait:.1f}s")
+            await asyncio.sleep(wait)
+        return wait
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        """Current bucket levels and daily counts"""
+        for bucket in list(self._session_buckets.values()) + list(self._instance_buckets.values()):
+            bucket._refill()
+        return {
+            "sessions": {
+                session: {"tokens": round(bucket.tokens, 2), "sent_today": self._sent_today.get(session, 0)}
+                for session, bucket in self._session_buckets.items()
+            },
+            "instances": {
+                base_url: {"tokens": round(bucket.tokens, 2)}
+                for base_url, bucket in self._instance_buckets.items()
+            }
+        }
+
+    # ==================== WRITE-BACK ====================
+
+    def _write_batch(self, batch: Dict[Tuple[str, str], int]):
+        """Add a batch of count changes to session_send_counts (runs on the writer thread)"""
+        from database.connection import get_db
+        from database.models import SessionSendCount
+
+        with get_db() as db:
+            for (session, day), change in batch.items():
+                row = db.query(SessionSendCount).filter(
+                    SessionSendCount.session_name == session,
+                    SessionSendCount.day == day
+                ).first()
+                if row:
+                    row.sent = max(0, (row.sent or 0) + change)
+                    row.updated_at = datetime.utcnow()
+                else:
+                    db.add(SessionSendCount(session_name=session, day=day, sent=max(0, change)))
+            db.commit()
+
+    async def flush_async(self) -> bool:
+        """Write pending count changes on the writer thread without blocking the event loop"""
+        batch = {key: change for key, change in self._unsaved.items() if change}
+        if not batch:
+            return False
+        self._unsaved = {}
+
+        try:
+            await asyncio.get_running_loop().run_in_executor(self._writer, self._write_batch, batch)
+            return True
+        except Exception as e:
+            logger.error(f"Send count flush failed: {str(e)}")
+            for key, change in batch.items():
+                self._unsaved[key] = self._unsaved.get(key, 0) + change
+            return False
+
+    def start(self):
+        """Start the periodic write-back (idempotent)"""
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Stop the periodic write-back and write whatever is left"""
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+        self._flush_task = None
+        await self.flush_async()
+
+    async def _flush_loop(self):
+        """Flush every flush_interval seconds"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush_async()
+            except Exception as e:
+                logger.error(f"Send count flusher error: {str(e)}")
+
+
+# Global rate limiter
+send_rate_limiter = SendRateLimiter()
@@ -0,0 +1,163 @@
+"""
+Session Directory Cache - per-session snapshots of contacts, groups and chats
+Each snapshot is fetched from WAHA once per TTL (concurrent callers share the
+fetch), carries an ETag for conditional requests, and is dropped early by
+WAHA webhooks that change it (group.*, contact.*, session.status)
+
+Snapshot lists are shared by every caller until the next fetch: read them,
+and copy before changing them
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Any, Tuple
+
+from async_waha_client import get_async_waha_client
+
+logger = logging.getLogger(__name__)
+
+DIRECTORY_KINDS = ("contacts", "groups", "chats")
+
+# Webhook event prefix -> snapshots it makes stale
+WEBHOOK_INVALIDATIONS = (
+    ("group.", ("groups", "chats")),
+    ("contact.", ("contacts",)),
+    ("chat.", ("chats",)),
+    ("session.status", DIRECTORY_KINDS),
+)
+
+
+class SessionDirectoryCache:
+    """(instance, session, kind) -> snapshot of the WAHA listing with TTL and ETag"""
+
+    def __init__(self, ttl_seconds: Optional[float] = None):
+        self.ttl_seconds = ttl_seconds or float(os.getenv("SESSION_DIRECTORY_TTL_SECONDS", "120"))
+        self.default_base_url = os.getenv("WAHA_BASE_URL", "http://localhost:4500").rstrip('/')
+        self.max_snapshots = int(os.getenv("SESSION_DIRECTORY_MAX_SNAPSHOTS", "1000"))
+
+        self._snapshots: "OrderedDict[Tuple[str, str, str], Dict[str, Any]]" = OrderedDict()  # key -> data, etag, fetched_at (LRU order)
+        self._generations: Dict[Tuple[str, str, str], int] = {}            # key -> bumped on invalidation
+        self._locks: Dict[Tuple[str, str, str], asyncio.Lock] = {}         # key -> single-flight fetch lock
+
+    def _key(self, session: str, kind: str, base_url: Optional[str]) -> Tuple[str, str, str]:
+        if kind not in DIRECTORY_KINDS:
+            raise ValueError(f"Unknown directory kind: {kind}")
+        return ((base_url or self.default_base_url).rstrip('/'), session, kind)
+
+    def _is_fresh(self, key: Tuple[str, str, str]) -> bool:
+        snapshot = self._snapshots.get(key)
+        return (snapshot is not None and
+                snapshot["generation"] == self._generations.get(key, 0) and
+                time.monotonic() - snapshot["fetched_at"] < self.ttl_seconds)
+
+    def _forget(self, key: Tuple[str, str, str]):
+        """Drop a key's snapshot, and its generation and lock unless a fetch is in flight"""
+        self._snapshots.pop(key, None)
+        lock = self._locks.get(key)
+        if lock is None or not lock.locked():
+            self._generations.pop(key, None)
+            self._locks.pop(key, None)
+
+    def _evict(self):
+        """Drop expired snapshots, then the least recently used ones over max_snapshots"""
+        now = time.monotonic()
+        for key in [key for key, snapshot in self._snapshots.items()
+                    if now - snapshot["fetched_at"] >= self.ttl_seconds]:
+            self._forget(key)
+        while len(self._snapshots) > self.max_snapshots:
+            self._forget(next(iter(self._snapshots)))
+
+    async def _fetch(self, kind: str, session: str, base_url: str) -> List[Dict]:
+        client = get_async_waha_client(base_url)
+        if kind == "contacts":
+            return await client.get_all_contacts(session)
+        if kind == "groups":
+            return await client.get_groups(session)
+        return await client.get_chats(session)
+
+    # ==================== SNAPSHOTS ====================
+
+    async def get_snapshot(self, kind: str, session: str, base_url: Optional[str] = None,
+                           refresh: bool = False) -> Dict[str, Any]:
+        """Get a snapshot {data, etag, fetched_at}, fetching it if it is stale or refresh is set.
+        The snapshot is shared with other callers and must not be modified"""
+        key = self._key(session, kind, base_url)
+        if not refresh and self._is_fresh(key):
+            self._snapshots.move_to_end(key)
+            return self._snapshots[key]
+
+        requested_at = time.monotonic()
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            # Another caller fetched while we waited
+            snapshot = self._snapshots.get(key)
+            if self._is_fresh(key) and (not refresh or snapshot["fetched_at"] >= requested_at):
+                return snapshot
+
+            generation = self._generations.get(key, 0)
+            data = await self._fetch(kind, session, key[0])
+            etag = hashlib.sha1(json.dumps(data, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:20]
+
+            snapshot = {
+                "data": data,
+                "etag": f'"{kind}-{etag}"',
+                "fetched_at": time.monotonic(),
+                "generation": generation  # an invalidation during the fetch makes this stale at once
+            }
+            self._snapshots[key] = snapshot
+            self._snapshots.move_to_end(key)
+            self._evict()
+            logger.debug(f"Session '{session}' {kind} snapshot fetched: {len(data)} records")
+            return snapshot
+
+    async def get_contacts(self, session: str, base_url: Optional[str] = None, refresh: bool = False) -> List[Dict]:
+        """Get a session's contacts"""
+        return (await self.get_snapshot("contacts", session, base_url, refresh))["data"]
+
+    async def get_groups(self, session: str, base_url: Optional[str] = None, refresh: bool = False) -> List[Dict]:
+        """Get a session's groups"""
+        return (await self.get_snapshot("groups", session, base_url, refresh))["data"]
+
+    async def get_chats(self, session: str, base_url: Optional[str] = None, refresh: bool = False) -> List[Dict]:
+        """Get a session's chats"""
+        return (await self.get_snapshot("chats", session, base_url, refresh))["data"]
+
+    # ==================== INVALIDATION ====================
+
+    def invalidate(self, session: str, kinds: Optional[Tuple[str, ...]] = None, base_url: Optional[str] = None):
+        """Force the next lookup of a session's snapshots (all kinds by default) to fetch again"""
+        for kind in kinds or DIRECTORY_KINDS:
+            key = self._key(session, kind, base_url)
+            lock = self._locks.get(key)
+            if lock is not None and lock.locked():
+                # Keep the snapshot being fetched from counting as fresh
+                self._generations[key] = self._generations.get(key, 0) + 1
+            self._forget(key)
+
+    def apply_webhook(self, event: Dict[str, Any], base_url: Optional[str] = None) -> bool:
+        """Drop the snapshots a WAHA webhook event changes. Returns True if the event was used"""
+        event_name = event.get("event") or ""
+        session_name = event.get("session")
+        if not session_name:
+            return False
+
+        for prefix, kinds in WEBHOOK_INVALIDATIONS:
+            if event_name.startswith(prefix):
+                self.invalidate(session_name, kinds, base_url)
+                logger.debug(f"Session '{session_name}' {', '.join(kinds)} invalidated by {event_name}")
+                return True
+        return False
+
+    def clear(self):
+        """Drop every snapshot"""
+        self._snapshots.clear()
+        self._generations.clear()
+
+
+# Global session directory cache
+session_directory_cache = SessionDirectoryCache()
@@ -0,0 +1,125 @@
+"""
+Session Health Cache - shared view of WAHA session statuses
+Polls each WAHA instance's /api/sessions once per interval and accepts
+session.status webhook pushes, so callers get O(1) status lookups
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Optional, Any
+
+from async_waha_client import get_async_waha_client
+
+logger = logging.getLogger(__name__)
+
+
+class SessionHealthCache:
+    """Name -> session map per WAHA instance, refreshed by polling and webhooks"""
+
+    def __init__(self, poll_interval: Optional[float] = None):
+        self.poll_interval = poll_interval or float(os.getenv("SESSION_HEALTH_POLL_SECONDS", "15"))
+        self.default_base_url = os.getenv("WAHA_BASE_URL", "http://localhost:4500").rstrip('/')
+
+        self._sessions: Dict[str, Dict[str, Dict[str, Any]]] = {}  # base_url -> session name -> session
+        self._fetched_at: Dict[str, float] = {}                    # base_url -> monotonic time of last listing
+        self._locks: Dict[str, asyncio.Lock] = {}                   # base_url -> single-flight refresh lock
+        self._instances = set()                                     # base_urls the poller keeps fresh
+        self._poll_task = None
+
+    def _key(self, base_url: Optional[str]) -> str:
+        return (base_url or self.default_base_url).rstrip('/')
+
+    def _is_fresh(self, key: str) -> bool:
+        fetched_at = self._fetched_at.get(key)
+        return fetched_at is not None and time.monotonic() - fetched_at < self.poll_interval
+
+    async def refresh(self, base_url: Optional[str] = None) -> bool:
+        """List sessions on a WAHA instance and replace the cached map"""
+        key = self._key(base_url)
+        self._instances.add(key)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+
+        async with lock:
+            # Another caller refreshed while we waited
+            if self._is_fresh(key):
+                return True
+
+            try:
+                sessions = await get_async_waha_client(key).get_sessions()
+                self._sessions[key] = {s.get("name"): s for s in sessions if s.get("name")}
+                self._fetched_at[key] = time.monotonic()
+                return True
+            except Exception as e:
+                logger.error(f"Session health refresh failed for {key}: {str(e)}")
+                return False
+
+    async def get_session(self, session_name: str, base_url: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Get the cached session entry, refreshing the instance listing if it is stale"""
+        key = self._key(base_url)
+        if not self._is_fresh(key):
+            await self.refresh(key)
+        return self._sessions.get(key, {}).get(session_name)
+
+    async def get_status(self, session_name: str, base_url: Optional[str] = None) -> Optional[str]:
+        """Get a session's status (None if the session is unknown)"""
+        session = await self.get_session(session_name, base_url)
+        return session.get("status") if session else None
+
+    async def is_working(self, session_name: str, base_url: Optional[str] = None) -> bool:
+        """Check whether a session is in WORKING state"""
+        return await self.get_status(session_name, base_url) == "WORKING"
+
+    def peek_session(self, session_name: str, base_url: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Get the cached session entry without refreshing (for sync callers)"""
+        return self._sessions.get(self._key(base_url), {}).get(session_name)
+
+    def apply_webhook(self, event: Dict[str, Any], base_url: Optional[str] = None) -> bool:
+        """Apply a WAHA session.status webhook event. Returns True if the event was used"""
+        if event.get("event") != "session.status":
+            return False
+
+        session_name = event.get("session")
+        status = (event.get("payload") or {}).get("status")
+        if not session_name or not status:
+            return False
+
+        sessions = self._sessions.setdefault(self._key(base_url), {})
+        session = sessions.setdefault(session_name, {"name": session_name})
+        session["status"] = status
+        logger.debug(f"Session '{session_name}' status pushed: {status}")
+        return True
+
+    def invalidate(self, base_url: Optional[str] = None):
+        """Force the next lookup on an instance to list sessions again"""
+        self._fetched_at.pop(self._key(base_url), None)
+
+    # ==================== BACKGROUND POLLER ====================
+
+    def start(self):
+        """Start polling known WAHA instances (idempotent)"""
+        if self._poll_task is None or self._poll_task.done():
+            self._poll_task = asyncio.create_task(self._poll_loop())
+
+    async def stop(self):
+        """Stop polling"""
+        if self._poll_task and not self._poll_task.done():
+            self._poll_task.cancel()
+            try:
+                await self._poll_task
+            except asyncio.CancelledError:
+                pass
+        self._poll_task = None
+
+    async def _poll_loop(self):
+        """Refresh every instance that has been looked up at least once"""
+        while True:
+            for key in list(self._instances) or [self.default_base_url]:
+                self.invalidate(key)
+                await self.refresh(key)
+            await asyncio.sleep(self.poll_interval)
+
+
+# Global session health cache
+session_health_cache = SessionHealthCache()
@@ -0,0 +1,127 @@
+"""
+Tests for campaign admission control: slot limits per session, user and WAHA
+instance, and weighted fair-share ordering of waiting campaigns
+"""
+
+import pytest
+
+from database.models import Campaign
+from jobs.admission import AdmissionController, _parse_weights
+
+INSTANCE = "http://localhost:4500"
+
+
+@pytest.fixture
+def plans(monkeypatch):
+    """user_id -> plan type, served in place of the quota ledger"""
+    user_plans = {}
+
+    def cached_usage(user_id, resource):
+        plan = user_plans.get(user_id)
+        return {"plan_type": plan} if plan else None
+
+    monkeypatch.setattr("jobs.admission.quota_ledger.cached_usage", cached_usage)
+    return user_plans
+
+
+def make_campaign(campaign_id, user_id="u1", session="s1", fanout=None, queue_position=None):
+    campaign = Campaign(id=campaign_id, user_id=user_id, session_name=session, queue_position=queue_position)
+    if fanout:
+        campaign.fanout_sessions = fanout
+    return campaign
+
+
+def ids(campaigns):
+    return [campaign.id for campaign in campaigns]
+
+
+def test_one_campaign_per_session(plans):
+    controller = AdmissionController(per_session=1, per_user=10, per_instance=10)
+    waiting = [make_campaign(1, session="s1"), make_campaign(2, session="s1"), make_campaign(3, session="s2")]
+
+    admitted, still_waiting = controller.plan([], waiting, INSTANCE)
+
+    assert ids(admitted) == [1, 3]
+    assert ids(still_waiting) == [2]
+    assert controller.get_status()["last_pass"] == {"admitted": 2, "waiting": 1, "blocked": {"session": 1}}
+
+
+def test_running_campaigns_hold_their_slots(plans):
+    controller = AdmissionController(per_session=1, per_user=2, per_instance=10)
+    running = [make_campaign(1, session="s1")]
+    waiting = [make_campaign(2, session="s1"), make_campaign(3, session="s2"), make_campaign(4, session="s3")]
+
+    admitted, still_waiting = controller.plan(running, waiting, INSTANCE)
+
+    # s1 is busy, and u1 has one of its two slots left
+    assert ids(admitted) == [3]
+    assert controller.get_status()["last_pass"]["blocked"] == {"session": 1, "user": 1}
+
+
+def test_fanout_campaign_needs_every_session(plans):
+    controller = AdmissionController(per_session=1, per_user=10, per_instance=10)
+    running = [make_campaign(1, user_id="u2", session="s2")]
+    waiting = [make_campaign(2, fanout=["s1", "s2"]), make_campaign(3, session="s1")]
+
+    admitted, _ = controller.plan(running, waiting, INSTANCE)
+
+    assert ids(admitted) == [3]
+
+
+def test_instance_limit(plans):
+    controller = AdmissionController(per_session=1, per_user=10, per_instance=3)
+    running = [make_campaign(1, user_id="u1", session="s1")]
+    waiting = [make_campaign(i, user_id=f"u{i}", session=f"s{i}") for i in range(2, 6)]
+
+    admitted, still_waiting = controller.plan(running, waiting, INSTANCE)
+
+    assert len(admitted) == 2
+    assert len(still_waiting) == 2
+    assert controller.get_status()["last_pass"]["blocked"] == {"instance": 2}
+
+
+def test_users_take_turns(plans):
+    controller = AdmissionController()
+    waiting = [make_campaign(i, user_id="u1", session=f"a{i}") for i in range(1, 5)]
+    waiting += [make_campaign(i, user_id="u2", session=f"b{i}") for i in range(5, 7)]
+
+    order = controller.fair_order([], waiting)
+
+    # u1 queued first, but u2 is not starved behind its whole backlog
+    assert ids(order) == [1, 5, 2, 6, 3, 4]
+
+
+def test_heavier_plans_get_more_turns(plans):
+    plans.update({"pro": "pro", "free": "free"})
+    controller = AdmissionController(plan_weights={"free": 1, "pro": 5})
+    waiting = [make_campaign(i, user_id="free", session=f"f{i}") for i in range(1, 4)]
+    waiting += [make_campaign(i, user_id="pro", session=f"p{i}") for i in range(10, 16)]
+
+    order = [campaign.user_id for campaign in controller.fair_order([], waiting)]
+
+    # Five pro turns per free turn (ties go to the older campaign)
+    assert order == ["pro"] * 4 + ["free"] + ["pro"] * 2 + ["free"] * 2
+
+
+def test_running_campaigns_count_against_a_users_share(plans):
+    controller = AdmissionController()
+    running = [make_campaign(1, user_id="u1"), make_campaign(2, user_id="u1")]
+    waiting = [make_campaign(3, user_id="u1", session="s3"), make_campaign(4, user_id="u2", session="s4")]
+
+    assert ids(controller.fair_order(running, waiting)) == [4, 3]
+
+
+def test_queue_position_orders_a_users_campaigns(plans):
+    controller = AdmissionController()
+    waiting = [
+        make_campaign(1, session="s1"),
+        make_campaign(2, session="s2", queue_position=2),
+        make_campaign(3, session="s3", queue_position=1),
+    ]
+
+    # Queued campaigns first, by position; unqueued ones after, by id
+    assert ids(controller.fair_order([], waiting)) == [3, 2, 1]
+
+
+def test_parse_weights_skips_invalid_entries():
+    assert _parse_weights("free=1, Pro=5,bad=x,tiny=0") == {"free": 1.0, "pro": 5.0, "tiny": 0.1}
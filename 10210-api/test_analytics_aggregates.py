@@ -0,0 +1,158 @@
+"""
+Tests for the SQL analytics aggregates: delivery status counts, read and
+response sums and the rates derived from them, campaign counts per status, and
+the per-user campaign analytics, checked against seeded campaigns and deliveries
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from analytics.api import get_campaign_detailed, get_campaign_overview
+from analytics.user_analytics import UserAnalytics
+from api.user_metrics_api import get_campaign_metrics
+from database import connection
+from database.models import Campaign, Delivery
+from database.user_metrics import UserMetrics
+
+
+@pytest.fixture(autouse=True)
+def database(tmp_path, monkeypatch):
+    """Fresh SQLite database in a temporary directory"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(connection, "engine", None)
+    monkeypatch.setattr(connection, "SessionLocal", None)
+    assert connection.init_database()
+    yield
+    connection.engine.dispose()
+
+
+NOW = datetime.utcnow()
+
+
+def add_campaign(db, user_id, status="completed", success_count=0, total_rows=0, created_at=NOW,
+                 deliveries=(), name="Campaign") -> int:
+    """A campaign with deliveries given as (status, read, responded) tuples"""
+    campaign = Campaign(name=name, session_name="s1", file_path="contacts.csv", user_id=user_id, status=status,
+                        success_count=success_count, total_rows=total_rows, created_at=created_at)
+    db.add(campaign)
+    db.flush()
+    for row, (delivery_status, read, responded) in enumerate(deliveries, start=1):
+        db.add(Delivery(campaign_id=campaign.id, row_number=row, phone_number=f"1555000{campaign.id:02d}{row:02d}",
+                        recipient_name=f"Recipient {row}", status=delivery_status,
+                        read_at=NOW if read else None, response_received=responded))
+    return campaign.id
+
+
+@pytest.fixture
+def seeded():
+    with connection.get_db() as db:
+        add_campaign(db, "u1", "completed", success_count=9, total_rows=10, deliveries=[
+            ("sent", True, True), ("sent", True, False), ("sent", False, False), ("failed", False, False)
+        ], name="Spring sale")
+        add_campaign(db, "u1", "completed", success_count=2, total_rows=10, deliveries=[
+            ("sent", True, True), ("pending", False, False)
+        ])
+        add_campaign(db, "u1", "running", success_count=4, created_at=NOW - timedelta(days=3))
+        add_campaign(db, "u1", "completed", success_count=50, total_rows=50, created_at=NOW - timedelta(days=90))
+        add_campaign(db, "u2", "completed", deliveries=[("sent", True, True)] * 5)
+
+
+def overview(**filters):
+    params = {"start_date": None, "end_date": None, "user_id": None, **filters}
+    return asyncio.run(get_campaign_overview(**params))["overview"]
+
+
+# ==================== CAMPAIGN OVERVIEW ====================
+
+def test_overview_counts_statuses_reads_and_responses(seeded):
+    result = overview(user_id="u1")
+
+    assert result == {
+        "total_campaigns": 4,
+        "total_sent": 6,
+        "total_delivered": 4,
+        "total_failed": 1,
+        "total_read": 3,
+        "total_responded": 2,
+        "average_delivery_rate": 66.67,
+        "average_read_rate": 75.0,
+        "average_response_rate": 50.0
+    }
+
+
+def test_overview_across_users_and_periods(seeded):
+    assert overview()["total_sent"] == 11
+    assert overview()["total_responded"] == 7
+
+    recent = overview(user_id="u1", start_date=NOW - timedelta(days=30))
+    assert recent["total_campaigns"] == 3
+    assert recent["total_sent"] == 6
+
+
+def test_overview_without_deliveries_has_zero_rates():
+    with connection.get_db() as db:
+        add_campaign(db, "u1")
+
+    result = overview(user_id="u1")
+
+    assert (result["total_campaigns"], result["total_sent"]) == (1, 0)
+    assert result["average_delivery_rate"] == result["average_read_rate"] == result["average_response_rate"] == 0
+
+
+def test_overview_uses_lifetime_metrics_when_recorded(seeded):
+    with connection.get_db() as db:
+        db.add(UserMetrics(user_id="u1", total_campaigns_created=7, total_messages_sent=200,
+                           total_messages_delivered=150, total_messages_read=100, total_messages_responded=20))
+
+    result = overview(user_id="u1")
+
+    assert result["lifetime_stats"]
+    assert (result["total_campaigns"], result["total_sent"]) == (7, 200)
+    assert (result["average_delivery_rate"], result["average_read_rate"], result["average_response_rate"]) == (75.0, 50.0, 10.0)
+
+
+def test_detailed_search_runs_in_sql(seeded, monkeypatch):
+    async def no_rate(session_name, phone_number, campaign_id):
+        return {"response_rate": 0}
+
+    from analytics.api import response_tracker
+    monkeypatch.setattr(response_tracker, "calculate_response_rate", no_rate)
+
+    result = asyncio.run(get_campaign_detailed(page=1, page_size=50, campaign_id=None, search="Spring", user_id=None))
+
+    assert result["pagination"]["total_items"] == 4
+
+
+# ==================== METRICS API ====================
+
+def test_campaign_metrics_count_campaigns_per_status(seeded):
+    with connection.get_db() as db:
+        db.add(UserMetrics(user_id="u1", total_messages_sent=10, total_messages_delivered=8, total_messages_responded=4))
+        db.add(UserMetrics(user_id="u2", total_messages_sent=30, total_messages_delivered=22, total_messages_responded=1))
+
+    user = asyncio.run(get_campaign_metrics(user_id="u1"))["metrics"]
+    admin = asyncio.run(get_campaign_metrics(user_id="admin"))["metrics"]
+
+    assert (user["total_campaigns_created"], user["total_active_campaigns"]) == (4, 1)
+    assert (user["avg_response_rate"], user["delivery_rate"]) == (40.0, 80.0)
+    assert (admin["total_campaigns_created"], admin["total_messages_sent"]) == (5, 40)
+    assert (admin["avg_response_rate"], admin["delivery_rate"]) == (12.5, 75.0)
+
+
+# ==================== USER ANALYTICS ====================
+
+def test_user_campaign_analytics(seeded):
+    with connection.get_db() as db:
+        analytics = UserAnalytics(db)
+        result = analytics.get_user_campaign_analytics("u1", "month")
+        success_rate = analytics._calculate_success_rate("u1")
+
+    assert result["total_campaigns"] == 3
+    assert result["campaigns_by_status"] == {"completed": 2, "running": 1}
+    assert [c["messages_sent"] for c in result["top_campaigns"]] == [9, 4, 2]
+    assert result["average_messages_per_campaign"] == 5.0
+    assert sum(day["count"] for day in result["daily_distribution"]) == 3
+    # Completed campaigns that sent at least 80% of their rows: 2 of 3
+    assert success_rate == 66.67
@@ -0,0 +1,219 @@
+"""
+Tests for the async WAHA client: one shared client and keep-alive pool per WAHA
+base URL, representative calls against a local WAHA stand-in, timeouts and
+HTTP errors surfaced as the requests exceptions callers already handle
+"""
+
+import asyncio
+
+import pytest
+import requests
+from aiohttp import web
+
+import async_waha_client
+from async_waha_client import AsyncWAHAClient, close_async_waha_clients, get_async_waha_client
+
+
+class FakeWaha:
+    """A local aiohttp server answering a few WAHA endpoints; records each request's client port"""
+
+    def __init__(self):
+        self.requests = []
+        self.delay = 0.0
+        app = web.Application()
+        app.router.add_get("/api/sessions", self.sessions)
+        app.router.add_post("/api/sendText", self.send_text)
+        app.router.add_get("/api/{session}/groups", self.groups)
+        app.router.add_get("/api/sessions/{name}", self.session_info)
+        app.router.add_get("/api/server/status", self.server_error)
+        self.runner = web.AppRunner(app)
+        self.base_url = None
+
+    async def start(self):
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}"
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+    def record(self, request):
+        self.requests.append((request.method, request.path, request.transport.get_extra_info("peername")[1],
+                              request.headers.get("X-API-KEY")))
+
+    async def sessions(self, request):
+        self.record(request)
+        await asyncio.sleep(self.delay)
+        return web.json_response([{"name": "s1", "status": "WORKING"}])
+
+    async def send_text(self, request):
+        self.record(request)
+        payload = await request.json()
+        return web.json_response({"id": "msg-1", "echo": payload})
+
+    async def groups(self, request):
+        self.record(request)
+        return web.json_response([{"id": "g1@g.us", "session": request.match_info["session"]}])
+
+    async def session_info(self, request):
+        self.record(request)
+        return web.json_response({"error": "not found"}, status=404)
+
+    async def server_error(self, request):
+        self.record(request)
+        return web.Response(status=500, text="boom")
+
+
+def with_waha(scenario):
+    """Run scenario(waha) on a fresh event loop with the stand-in server up"""
+    async def run():
+        waha = FakeWaha()
+        await waha.start()
+        try:
+            return await scenario(waha)
+        finally:
+            await close_async_waha_clients()
+            await waha.stop()
+    return asyncio.run(run())
+
+
+@pytest.fixture(autouse=True)
+def shared_clients(monkeypatch):
+    """Start every test with no shared clients"""
+    monkeypatch.setattr(async_waha_client, "_async_waha_clients", {})
+
+
+# ==================== SHARED CLIENTS ====================
+
+def test_one_client_per_base_url():
+    first = get_async_waha_client("http://waha-1:4500/")
+
+    assert get_async_waha_client("http://waha-1:4500") is first
+    assert get_async_waha_client("http://waha-2:4500") is not first
+    assert first.base_url == "http://waha-1:4500"
+
+
+def test_default_base_url_and_api_key_come_from_the_environment(monkeypatch):
+    monkeypatch.setenv("WAHA_BASE_URL", "http://waha-env:4500")
+    monkeypatch.setenv("WAHA_API_KEY", "secret")
+
+    client = get_async_waha_client()
+
+    assert client is get_async_waha_client("http://waha-env:4500")
+    assert client.headers["X-API-KEY"] == "secret"
+
+
+def test_keep_alive_connection_is_shared_across_calls():
+    async def scenario(waha):
+        client = get_async_waha_client(waha.base_url)
+        await client.get_sessions()
+        await client.send_text("s1", "1@c.us", "hi")
+        await get_async_waha_client(waha.base_url).get_groups("s1")
+        return waha.requests
+
+    requests_seen = with_waha(scenario)
+
+    assert [path for _, path, _, _ in requests_seen] == ["/api/sessions", "/api/sendText", "/api/s1/groups"]
+    assert len({port for _, _, port, _ in requests_seen}) == 1
+
+
+def test_concurrent_calls_are_capped_per_host(monkeypatch):
+    monkeypatch.setattr(async_waha_client, "WAHA_MAX_CONNECTIONS_PER_HOST", 2)
+
+    async def scenario(waha):
+        waha.delay = 0.05
+        client = get_async_waha_client(waha.base_url)
+        await asyncio.gather(*(client.get_sessions() for _ in range(6)))
+        return waha.requests
+
+    assert len({port for _, _, port, _ in with_waha(scenario)}) == 2
+
+
+def test_close_clears_the_shared_clients():
+    async def scenario(waha):
+        client = get_async_waha_client(waha.base_url)
+        await client.get_sessions()
+        await close_async_waha_clients()
+        return client, get_async_waha_client(waha.base_url)
+
+    closed, fresh = with_waha(scenario)
+
+    assert closed._session is None
+    assert fresh is not closed
+
+
+def test_client_opens_a_new_pool_on_a_new_event_loop():
+    async def scenario(waha):
+        client = AsyncWAHAClient(waha.base_url)
+        await client.get_sessions()
+        return client, client._session
+
+    async def reuse(client):
+        await client._get_session()
+        return client._session
+
+    client, first = with_waha(scenario)
+    second = asyncio.run(reuse(client))
+
+    assert second is not first
+    asyncio.run(second.close())
+
+
+# ==================== CALLS ====================
+
+def test_representative_calls():
+    async def scenario(waha):
+        client = AsyncWAHAClient(waha.base_url, api_key="secret")
+        try:
+            return (await client.get_sessions(), await client.send_text("s1", "1@c.us", "hi"),
+                    await client.get_groups("s1"), waha.requests)
+        finally:
+            await client.close()
+
+    sessions, sent, groups, requests_seen = with_waha(scenario)
+
+    assert sessions == [{"name": "s1", "status": "WORKING"}]
+    assert sent["echo"] == {"chatId": "1@c.us", "text": "hi", "session": "s1"}
+    assert groups == [{"id": "g1@g.us", "session": "s1"}]
+    assert {api_key for _, _, _, api_key in requests_seen} == {"secret"}
+
+
+# ==================== ERRORS ====================
+
+def test_client_errors_raise_http_error_with_the_status():
+    async def scenario(waha):
+        client = get_async_waha_client(waha.base_url)
+        with pytest.raises(requests.exceptions.HTTPError) as not_found:
+            await client.get_session_info("missing")
+        with pytest.raises(requests.exceptions.HTTPError) as server_error:
+            await client.get_server_status()
+        return str(not_found.value), str(server_error.value)
+
+    not_found, server_error = with_waha(scenario)
+
+    assert not_found.startswith("404 Client Error")
+    assert server_error.startswith("500 Server Error")
+
+
+def test_slow_responses_raise_timeout(monkeypatch):
+    monkeypatch.setattr(async_waha_client, "WAHA_TIMEOUT", 0.05)
+
+    async def scenario(waha):
+        waha.delay = 0.5
+        with pytest.raises(requests.exceptions.Timeout):
+            await get_async_waha_client(waha.base_url).get_sessions()
+
+    with_waha(scenario)
+
+
+def test_unreachable_waha_raises_connection_error():
+    async def scenario(waha):
+        base_url = waha.base_url
+        await waha.stop()
+        client = get_async_waha_client(base_url)
+        with pytest.raises(requests.exceptions.ConnectionError):
+            await client.get_sessions()
+
+    with_waha(scenario)
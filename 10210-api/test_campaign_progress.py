@@ -0,0 +1,98 @@
+"""
+Tests for campaign progress counters: kept in memory as outcomes are known,
+persisted without counting deliveries, and rebuilt from deliveries after a crash
+"""
+
+import asyncio
+
+import pytest
+
+from database import connection
+from database.models import Campaign, Delivery
+from jobs.models import DeliveryStatus
+from jobs.processor import message_processor
+
+
+@pytest.fixture(autouse=True)
+def database(tmp_path, monkeypatch):
+    """Fresh SQLite database in a temporary directory"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(connection, "engine", None)
+    monkeypatch.setattr(connection, "SessionLocal", None)
+    assert connection.init_database()
+    yield
+    message_processor.progress_counters.clear()
+    connection.engine.dispose()
+
+
+def create_campaign(**values) -> int:
+    values.setdefault("name", "Test")
+    values.setdefault("session_name", "default")
+    values.setdefault("file_path", "contacts.csv")
+    values.setdefault("status", "running")
+    with connection.get_db() as db:
+        campaign = Campaign(**values)
+        db.add(campaign)
+        db.commit()
+        return campaign.id
+
+
+def add_deliveries(campaign_id: int, statuses: dict):
+    with connection.get_db() as db:
+        for row_number, status in statuses.items():
+            db.add(Delivery(campaign_id=campaign_id, row_number=row_number, phone_number=f"1555000{row_number:04d}", status=status))
+        db.commit()
+
+
+def stored_progress(campaign_id: int) -> tuple:
+    with connection.get_db() as db:
+        campaign = db.query(Campaign).filter(Campaign.id == campaign_id).one()
+        return campaign.processed_rows, campaign.success_count, campaign.error_count
+
+
+def test_reconcile_rebuilds_counters_from_deliveries():
+    # Stored counters are stale, as after a crash
+    campaign_id = create_campaign(processed_rows=1, success_count=1, error_count=0)
+    add_deliveries(campaign_id, {1: "sent", 2: "delivered", 3: "failed", 4: "pending", 5: "sent"})
+
+    counters = asyncio.run(message_processor.reconcile_campaign_progress(campaign_id))
+
+    # The pending row is prepared but not sent yet
+    assert counters == {"processed": 4, "success": 3, "error": 1}
+    assert stored_progress(campaign_id) == (4, 3, 1)
+
+
+def test_outcomes_update_the_counters():
+    campaign_id = create_campaign()
+    asyncio.run(message_processor.reconcile_campaign_progress(campaign_id))
+
+    message_processor._count_outcome(campaign_id, success=True)
+    message_processor._count_outcome(campaign_id, success=True)
+    message_processor._count_outcome(campaign_id, success=False)
+
+    assert message_processor.progress_counters[campaign_id] == {"processed": 3, "success": 2, "error": 1}
+
+
+def test_progress_is_persisted_from_the_counters(monkeypatch):
+    campaign_id = create_campaign()
+    add_deliveries(campaign_id, {1: "sent"})
+    asyncio.run(message_processor.reconcile_campaign_progress(campaign_id))
+    message_processor._count_outcome(campaign_id, success=False)
+
+    async def no_counting(campaign_id):
+        raise AssertionError("persisting progress must not count deliveries")
+
+    monkeypatch.setattr(message_processor, "reconcile_campaign_progress", no_counting)
+    asyncio.run(message_processor._update_campaign_progress(campaign_id))
+
+    assert stored_progress(campaign_id) == (2, 1, 1)
+
+
+def test_progress_without_counters_is_reconciled():
+    campaign_id = create_campaign()
+    add_deliveries(campaign_id, {1: DeliveryStatus.SENT.value, 2: DeliveryStatus.FAILED.value})
+
+    asyncio.run(message_processor._update_campaign_progress(campaign_id))
+
+    assert stored_progress(campaign_id) == (2, 1, 1)
+    assert message_processor.progress_counters[campaign_id] == {"processed": 2, "success": 1, "error": 1}
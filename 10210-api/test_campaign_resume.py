@@ -0,0 +1,139 @@
+"""
+Tests for resumable campaigns: the journal's row cursor, cursor recovery after a
+crash and carrying finished rows over to a restarted campaign
+"""
+
+import asyncio
+
+import pytest
+
+from database import connection
+from database.models import Campaign, Delivery
+from jobs.delivery_journal import DeliveryJournal
+from jobs.manager import CampaignManager
+from jobs.models import DeliveryStatus
+from jobs.processor import message_processor, INTERRUPTED_SEND_ERROR
+
+
+@pytest.fixture(autouse=True)
+def database(tmp_path, monkeypatch):
+    """Fresh SQLite database in a temporary directory"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(connection, "engine", None)
+    monkeypatch.setattr(connection, "SessionLocal", None)
+    assert connection.init_database()
+    yield
+    connection.engine.dispose()
+
+
+def create_campaign(**values) -> int:
+    values.setdefault("name", "Test")
+    values.setdefault("session_name", "default")
+    values.setdefault("file_path", "contacts.csv")
+    values.setdefault("status", "paused")
+    with connection.get_db() as db:
+        campaign = Campaign(**values)
+        db.add(campaign)
+        db.commit()
+        return campaign.id
+
+
+def add_deliveries(campaign_id: int, statuses: dict):
+    with connection.get_db() as db:
+        for row_number, status in statuses.items():
+            db.add(Delivery(campaign_id=campaign_id, row_number=row_number, phone_number=f"1555000{row_number:04d}", status=status))
+        db.commit()
+
+
+def deliveries(campaign_id: int) -> dict:
+    with connection.get_db() as db:
+        return dict(db.query(Delivery.row_number, Delivery.status).filter(Delivery.campaign_id == campaign_id).all())
+
+
+def stored_cursor(campaign_id: int):
+    with connection.get_db() as db:
+        campaign = db.query(Campaign).filter(Campaign.id == campaign_id).first()
+        return campaign.cursor_row, campaign.cursor_in_flight_rows
+
+
+def test_journal_cursor_stops_at_first_unfinished_row():
+    campaign_id = create_campaign()
+    journal = DeliveryJournal(flush_rows=100)
+    journal.open_cursor(campaign_id, 0)
+
+    entries = {
+        row: journal.add_delivery(campaign_id=campaign_id, row_number=row, phone_number="15550000000",
+                                  status=DeliveryStatus.PENDING.value)
+        for row in range(1, 6)
+    }
+    for row in (1, 2, 4):
+        journal.update_status(entries[row], DeliveryStatus.SENT)
+    assert journal.flush()
+
+    # Row 3 and 5 are in flight; row 4 is done but not contiguous
+    assert stored_cursor(campaign_id) == (2, [3, 5])
+
+    journal.update_status(entries[3], DeliveryStatus.FAILED, "error")
+    journal.discard([entries[5]])
+    assert journal.flush()
+    assert stored_cursor(campaign_id) == (4, [])
+    assert deliveries(campaign_id) == {1: "sent", 2: "sent", 3: "failed", 4: "sent"}
+
+
+def test_recover_settles_in_flight_rows_and_skips_finished_ones():
+    campaign_id = create_campaign(cursor_row=2, cursor_in_flight="[3]")
+    add_deliveries(campaign_id, {1: "sent", 2: "sent", 3: "pending", 5: "failed", 7: "sent"})
+
+    cursor = asyncio.run(message_processor.recover_campaign_cursor(campaign_id))
+
+    # Row 3 may have reached WhatsApp: failed, never resent
+    assert cursor["cursor_row"] == 3
+    assert cursor["resume_row"] == 4
+    assert cursor["skip_rows"] == {5, 7}
+    assert stored_cursor(campaign_id) == (3, [])
+    with connection.get_db() as db:
+        settled = db.query(Delivery).filter(Delivery.campaign_id == campaign_id, Delivery.row_number == 3).one()
+        assert settled.status == "failed"
+        assert settled.error_message == INTERRUPTED_SEND_ERROR
+
+
+def test_recover_starts_before_start_row():
+    campaign_id = create_campaign(start_row=10)
+
+    cursor = asyncio.run(message_processor.recover_campaign_cursor(campaign_id))
+
+    assert cursor["resume_row"] == 10
+    assert cursor["skip_rows"] == set()
+
+
+def test_restart_carries_finished_rows_over():
+    source_id = create_campaign(cursor_row=3, cursor_in_flight="[4]")
+    add_deliveries(source_id, {1: "sent", 2: "failed", 3: "delivered", 4: "pending", 6: "sent", 9: "sent"})
+    # Row 2 was retried later and went through: the latest outcome wins
+    add_deliveries(source_id, {2: "sent"})
+    target_id = create_campaign(start_row=2, end_row=8, status="created")
+
+    assert asyncio.run(CampaignManager().copy_processed_rows(source_id, target_id))
+
+    # Row 1 and 9 are outside the new range; row 4 was settled as failed first
+    assert deliveries(target_id) == {2: "sent", 3: "delivered", 4: "failed", 6: "sent"}
+    with connection.get_db() as db:
+        target = db.query(Campaign).filter(Campaign.id == target_id).one()
+        assert (target.processed_rows, target.success_count, target.error_count) == (4, 3, 1)
+
+    cursor = asyncio.run(message_processor.recover_campaign_cursor(target_id))
+    assert cursor["resume_row"] == 5
+    assert cursor["skip_rows"] == {6}
+
+
+def test_restart_copy_is_idempotent():
+    source_id = create_campaign()
+    add_deliveries(source_id, {1: "sent", 2: "sent"})
+    target_id = create_campaign(status="created")
+
+    manager = CampaignManager()
+    asyncio.run(manager.copy_processed_rows(source_id, target_id))
+    asyncio.run(manager.copy_processed_rows(source_id, target_id))
+
+    with connection.get_db() as db:
+        assert db.query(Delivery).filter(Delivery.campaign_id == target_id).count() == 2
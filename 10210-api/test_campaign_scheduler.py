@@ -0,0 +1,146 @@
+"""
+Tests for the event-driven campaign scheduler: lifecycle events start, admit and
+resume campaigns at once, and scheduled starts fire from the timer heap
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from database import connection
+from database.models import Campaign
+from jobs.campaign_events import campaign_events, CAMPAIGN_CREATED, CAMPAIGN_FINISHED
+from jobs.manager import CampaignManager
+from jobs.processor import message_processor
+from jobs.scheduler import CampaignScheduler
+
+
+@pytest.fixture(autouse=True)
+def database(tmp_path, monkeypatch):
+    """Fresh SQLite database in a temporary directory"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(connection, "engine", None)
+    monkeypatch.setattr(connection, "SessionLocal", None)
+    assert connection.init_database()
+    yield
+    connection.engine.dispose()
+
+
+@pytest.fixture
+def started(monkeypatch):
+    """Campaign ids the scheduler handed to the processor (no campaign is really sent)"""
+    ids = []
+
+    async def start_campaign_processing(campaign_id):
+        ids.append(campaign_id)
+        return True
+
+    monkeypatch.setattr(message_processor, "active_campaigns", {})
+    monkeypatch.setattr(message_processor, "start_campaign_processing", start_campaign_processing)
+    return ids
+
+
+def create_campaign(**values) -> int:
+    values.setdefault("name", "Test")
+    values.setdefault("session_name", "s1")
+    values.setdefault("file_path", "contacts.csv")
+    values.setdefault("status", "created")
+    with connection.get_db() as db:
+        campaign = Campaign(**values)
+        db.add(campaign)
+        db.commit()
+        return campaign.id
+
+
+def campaign_state(campaign_id: int) -> tuple:
+    with connection.get_db() as db:
+        campaign = db.query(Campaign).filter(Campaign.id == campaign_id).one()
+        return campaign.status, campaign.queue_position
+
+
+async def settle(seconds=0.1):
+    """Give the scheduler loop time to handle what was emitted"""
+    await asyncio.sleep(seconds)
+
+
+def run_with_scheduler(scenario):
+    """Run scenario(scheduler) with a started scheduler whose safety net stays out of the way"""
+    async def run():
+        scheduler = CampaignScheduler()
+        scheduler.check_interval = 3600
+        await scheduler.start()
+        try:
+            await settle()
+            return await scenario(scheduler)
+        finally:
+            await scheduler.stop()
+    return asyncio.run(run())
+
+
+def test_finished_task_lets_a_resumed_campaign_start(started):
+    campaign_id = create_campaign(status="running")
+    # The campaign was resumed while its previous task was still stopping
+    message_processor.active_campaigns[campaign_id] = object()
+
+    async def scenario(scheduler):
+        assert started == []
+
+        del message_processor.active_campaigns[campaign_id]
+        campaign_events.emit(CAMPAIGN_FINISHED, campaign_id)
+        await settle()
+        return started
+
+    assert run_with_scheduler(scenario) == [campaign_id]
+
+
+def test_manual_start_waits_for_a_free_session_slot(started):
+    first = create_campaign()
+    second = create_campaign()
+    manager = CampaignManager()
+
+    async def scenario(scheduler):
+        manager.start_campaign(first)
+        manager.start_campaign(second)
+        await settle()
+
+        # One campaign per session: the second waits in the queue
+        assert started == [first]
+        assert campaign_state(first) == ("running", None)
+        assert campaign_state(second) == ("queued", 1)
+
+        manager.complete_campaign(first)
+        await settle()
+        return started
+
+    assert run_with_scheduler(scenario) == [first, second]
+    assert campaign_state(second) == ("running", None)
+
+
+def test_manual_start_does_not_run_a_campaign_directly(started):
+    campaign_id = create_campaign()
+
+    # No scheduler: nothing admits the campaign
+    assert CampaignManager().start_campaign(campaign_id)
+
+    assert campaign_state(campaign_id) == ("queued", None)
+    assert started == []
+
+
+def test_scheduled_campaign_starts_when_its_timer_fires(started):
+    campaign_id = create_campaign(
+        status="scheduled", is_scheduled=True,
+        scheduled_start_time=datetime.utcnow() + timedelta(seconds=0.3)
+    )
+
+    async def scenario(scheduler):
+        campaign_events.emit(CAMPAIGN_CREATED, campaign_id)
+        await settle()
+        assert started == []
+
+        await settle(0.5)
+        return started
+
+    assert run_with_scheduler(scenario) == [campaign_id]
+    assert campaign_state(campaign_id) == ("running", None)
+
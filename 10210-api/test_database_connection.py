@@ -0,0 +1,135 @@
+"""
+Tests for the SQLite connection setup: WAL journaling, busy timeout and
+synchronous level on ORM and raw connections, raw connections borrowed from the
+engine's pool, and the raw-SQL managers working against that database
+"""
+
+import pytest
+from sqlalchemy import text
+
+from database import connection
+from free_session_manager import FreeUserSessionManager
+from waha_pool_manager import WAHAPoolManager
+from waha_session_manager import WAHASessionManager
+
+SYNCHRONOUS_LEVELS = {"OFF": 0, "NORMAL": 1, "FULL": 2, "EXTRA": 3}
+
+
+@pytest.fixture(autouse=True)
+def database(tmp_path, monkeypatch):
+    """Fresh SQLite database in a temporary directory"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(connection, "engine", None)
+    monkeypatch.setattr(connection, "SessionLocal", None)
+    assert connection.init_database()
+    yield
+    connection.engine.dispose()
+
+
+def pragmas(cursor) -> tuple:
+    return tuple(cursor.execute(f"PRAGMA {name}").fetchone()[0] for name in ("journal_mode", "busy_timeout", "synchronous"))
+
+
+EXPECTED = ("wal", connection.SQLITE_BUSY_TIMEOUT_MS, SYNCHRONOUS_LEVELS[connection.SQLITE_SYNCHRONOUS.upper()])
+
+
+# ==================== PRAGMAS ====================
+
+def test_orm_connections_are_tuned():
+    with connection.get_db() as db:
+        values = tuple(db.execute(text(f"PRAGMA {name}")).scalar()
+                       for name in ("journal_mode", "busy_timeout", "synchronous"))
+
+    assert values == EXPECTED
+
+
+def test_raw_connections_are_tuned_and_pooled():
+    raw = connection.get_raw_connection("data/wagent.db")
+    try:
+        assert pragmas(raw.cursor()) == EXPECTED
+        assert connection.engine.pool.checkedout() == 1
+    finally:
+        raw.close()
+
+    # close() handed it back to the pool
+    assert connection.engine.pool.checkedout() == 0
+
+
+def test_other_database_files_get_a_standalone_tuned_connection(tmp_path):
+    raw = connection.get_raw_connection(str(tmp_path / "other.db"))
+    try:
+        assert pragmas(raw.cursor()) == EXPECTED
+        assert connection.engine.pool.checkedout() == 0
+    finally:
+        raw.close()
+
+
+def test_engine_stays_on_its_database_after_a_directory_change(tmp_path, monkeypatch):
+    elsewhere = tmp_path / "elsewhere"
+    elsewhere.mkdir()
+    monkeypatch.chdir(elsewhere)
+
+    with connection.get_db() as db:
+        db.execute(text("SELECT 1"))
+
+    assert not (elsewhere / "data").exists()
+
+
+# ==================== RAW MANAGERS ====================
+
+@pytest.fixture
+def waha_sessions():
+    """The waha_sessions table the raw managers use (it has no ORM model)"""
+    raw = connection.get_raw_connection()
+    try:
+        raw.cursor().execute("""
+            CREATE TABLE waha_sessions (
+                id INTEGER PRIMARY KEY, user_id TEXT, session_name TEXT, waha_instance_url TEXT,
+                waha_instance_id INTEGER, is_active INTEGER, created_at TEXT, last_activity TEXT,
+                deletion_reason TEXT
+            )
+        """)
+        raw.commit()
+    finally:
+        raw.close()
+
+
+def add_subscription(user_id, plan_type, max_sessions):
+    raw = connection.get_raw_connection()
+    try:
+        raw.cursor().execute(
+            "INSERT INTO user_subscriptions (user_id, plan_type, status, max_sessions) VALUES (?, ?, 'active', ?)",
+            (user_id, plan_type, max_sessions)
+        )
+        raw.commit()
+    finally:
+        raw.close()
+
+
+def test_session_manager_round_trips_an_assignment(waha_sessions):
+    manager = WAHASessionManager()
+
+    manager.save_session_assignment("u1", "s1", "http://localhost:4502")
+    manager.track_activity("u1", "s1")
+
+    assert manager.get_session_instance_url("u1", "s1") == "http://localhost:4502"
+    assert manager.get_session_instance_url("u1", "s2") is None
+    assert connection.engine.pool.checkedout() == 0
+
+
+def test_free_session_manager_reads_plans_and_counts_sessions(waha_sessions):
+    manager = FreeUserSessionManager()
+    add_subscription("paid", "starter", 5)
+    WAHASessionManager().save_session_assignment("u1", "s1", manager.free_instance_url)
+
+    assert manager.is_free_user("u1")
+    assert not manager.is_free_user("paid")
+    assert manager.get_stats()["active_free_sessions"] == 1
+
+
+def test_pool_manager_reads_the_user_plan():
+    manager = WAHAPoolManager()
+    add_subscription("paid", "starter", 5)
+
+    assert manager.get_user_plan("paid") == ("starter", 5)
+    assert manager.get_user_plan("u1") == ("free", 1)
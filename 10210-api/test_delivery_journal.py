@@ -0,0 +1,131 @@
+"""
+Tests for the delivery journal's write-behind: a batch is written in one
+transaction, a failed batch is retried whole with the next flush, and a batch
+that keeps failing goes to the dead-letter log
+"""
+
+import json
+
+import pytest
+from sqlalchemy import text
+
+from database import connection
+from database.models import Campaign, Delivery
+from database.user_metrics import UserMetrics
+from jobs.delivery_journal import DeliveryJournal
+
+
+@pytest.fixture(autouse=True)
+def database(tmp_path, monkeypatch):
+    """Fresh SQLite database in a temporary directory"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(connection, "engine", None)
+    monkeypatch.setattr(connection, "SessionLocal", None)
+    assert connection.init_database()
+    yield
+    connection.engine.dispose()
+
+
+@pytest.fixture
+def campaign_id() -> int:
+    with connection.get_db() as db:
+        campaign = Campaign(name="Test", session_name="s1", file_path="contacts.csv", status="running")
+        db.add(campaign)
+        db.commit()
+        return campaign.id
+
+
+def failing_metrics(failing: bool):
+    """Make updates of user metrics fail (as the last write of a batch) or succeed again"""
+    with connection.engine.begin() as conn:
+        if failing:
+            conn.execute(text(
+                "CREATE TRIGGER metrics_locked BEFORE UPDATE ON user_metrics "
+                "BEGIN SELECT RAISE(ABORT, 'database is locked'); END"
+            ))
+        else:
+            conn.execute(text("DROP TRIGGER metrics_locked"))
+
+
+def stored() -> tuple:
+    with connection.get_db() as db:
+        rows = sorted(row for (row,) in db.query(Delivery.row_number).all())
+        metrics = {m.user_id: (m.total_messages_sent, m.total_messages_failed) for m in db.query(UserMetrics).all()}
+        return rows, metrics
+
+
+def record_rows(journal, campaign_id):
+    """One finished row, one in flight and a new user's metrics"""
+    journal.open_cursor(campaign_id, 0)
+    journal.add_delivery(campaign_id=campaign_id, row_number=1, phone_number="15550000001", status="sent")
+    journal.add_delivery(campaign_id=campaign_id, row_number=2, phone_number="15550000002", status="pending")
+    journal.record_user_messages("u1", sent=1)
+
+
+def test_failed_batch_writes_nothing_and_retries_whole(campaign_id):
+    journal = DeliveryJournal()
+    record_rows(journal, campaign_id)
+    failing_metrics(True)
+
+    # The metrics update fails after the deliveries and the metrics row were created
+    assert not journal.flush()
+    assert stored() == ([], {})
+
+    failing_metrics(False)
+    assert journal.flush()
+    assert stored() == ([1, 2], {"u1": (1, 0)})
+
+
+def test_batch_is_dead_lettered_after_max_attempts(campaign_id, monkeypatch, tmp_path):
+    journal = DeliveryJournal()
+    journal.max_attempts = 2
+    journal.dead_letter_path = str(tmp_path / "dead" / "journal.ndjson")
+    record_rows(journal, campaign_id)
+
+    write = journal._write_batch
+    failing = [True]
+
+    def write_batch(batch):
+        if failing[0]:
+            raise RuntimeError("disk I/O error")
+        return write(batch)
+
+    monkeypatch.setattr(journal, "_write_batch", write_batch)
+    assert not journal.flush()
+    assert journal.has_pending()
+    assert not journal.flush()
+
+    with open(journal.dead_letter_path) as f:
+        records = [json.loads(line) for line in f]
+    assert len(records) == 1
+    assert [values["row_number"] for values in records[0]["inserts"]] == [1, 2]
+    assert records[0]["metric_deltas"] == {"u1": {"sent": 1, "failed": 0}}
+
+    # Only the still-open cursor is written again; the dead-lettered rows are not retried
+    failing[0] = False
+    assert journal.flush()
+    assert stored() == ([], {})
+    with connection.get_db() as db:
+        assert db.query(Campaign.cursor_row).filter(Campaign.id == campaign_id).scalar() == 1
+
+
+def test_success_resets_the_attempt_count(campaign_id):
+    journal = DeliveryJournal()
+    journal.max_attempts = 2
+
+    record_rows(journal, campaign_id)
+    failing_metrics(True)
+    assert not journal.flush()
+    failing_metrics(False)
+    assert journal.flush()
+
+    journal.add_delivery(campaign_id=campaign_id, row_number=3, phone_number="15550000003", status="pending")
+    journal.record_user_messages("u1", failed=1)
+    failing_metrics(True)
+    assert not journal.flush()
+
+    # One failure since the last success: still queued for retry
+    assert journal.has_pending()
+    failing_metrics(False)
+    assert journal.flush()
+    assert stored() == ([1, 2, 3], {"u1": (1, 1)})
@@ -0,0 +1,187 @@
+"""
+Tests for dispatch plans: compiling a campaign's rows into a plan, one message per
+recipient, resuming a campaign from its stored plan via the row index, and sweeping
+plans of ended or deleted campaigns
+"""
+
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from database import connection
+from database.models import Campaign
+from jobs import dispatch_plan
+from jobs.dispatch_plan import DispatchPlanCompiler
+from jobs.manager import CampaignManager
+from jobs.processor import message_processor
+from jobs.scheduler import CampaignScheduler
+from utils.validation import DataValidator
+
+
+@pytest.fixture(autouse=True)
+def plan_dir(tmp_path, monkeypatch):
+    """Plans in a temporary directory, indexed every 2 accepted rows and compiled 3 rows per batch"""
+    monkeypatch.setattr(dispatch_plan, "DISPATCH_PLAN_DIR", str(tmp_path))
+    monkeypatch.setattr(dispatch_plan, "DISPATCH_PLAN_INDEX_INTERVAL", 2)
+    monkeypatch.setattr(dispatch_plan, "DISPATCH_PLAN_BATCH_ROWS", 3)
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """Fresh SQLite database in a temporary directory"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(connection, "engine", None)
+    monkeypatch.setattr(connection, "SessionLocal", None)
+    assert connection.init_database()
+    yield
+    connection.engine.dispose()
+
+
+@pytest.fixture
+def compiler():
+    return DispatchPlanCompiler(DataValidator(), lambda row_data, column_mapping: dict(row_data))
+
+
+def make_campaign(**values):
+    values.setdefault("id", 1)
+    values.setdefault("first_row", 1)
+    return values
+
+
+PROFILE = {"file_path": "contacts.csv", "file_size": 100, "mtime": 1}
+
+ROWS = [
+    {"phone_number": "+16176596898", "name": "Ann"},
+    {"phone_number": "+1 617 659 6898", "name": "Ann again"},
+    {"phone_number": "not a phone"},
+    {"phone_number": "+2348031234567", "name": "Bola"},
+    {"phone_number": "+447911123456", "name": "Cat"},
+    {"phone_number": "+234 803 123 4567", "name": "Bola again"},
+    {"phone_number": "+16175551234", "name": "Dan", "is_my_contact": "yes"},
+    {"phone_number": "+12025550143", "name": "Eve"},
+]
+
+
+def test_compile_accepts_rejects_and_dedupes(compiler):
+    meta = compiler.compile(make_campaign(), ROWS, PROFILE)
+
+    assert (meta["rows"], meta["accepted"], meta["rejected"], meta["duplicates"]) == (8, 5, 3, 2)
+    entries = list(compiler.iter_entries(1, meta, 1))
+    assert [entry["row"] for entry in entries] == [1, 4, 5, 7, 8]
+    assert entries[0]["chat_id"] == "16176596898@c.us"
+    assert entries[0]["name"] == "Ann"
+
+    rejected = dict(compiler.rejected_rows(1, 1))
+    assert sorted(rejected) == [2, 3, 6]
+    assert rejected[2] == "Skipped: Duplicate recipient (already sent from row 1)"
+    # Row 6 repeats a recipient from an earlier batch
+    assert rejected[6] == "Skipped: Duplicate recipient (already sent from row 4)"
+    assert rejected[3].startswith("Validation failed")
+
+
+def test_compile_applies_exclusion_filters(compiler):
+    meta = compiler.compile(make_campaign(exclude_my_contacts=True), ROWS, PROFILE)
+
+    assert [entry["row"] for entry in compiler.iter_entries(1, meta, 1)] == [1, 4, 5, 8]
+    assert dict(compiler.rejected_rows(1, 1))[7] == "Skipped: Contact is saved in phone"
+
+
+def test_rows_are_numbered_from_first_row(compiler):
+    meta = compiler.compile(make_campaign(first_row=10), ROWS[:2], PROFILE)
+
+    assert [entry["row"] for entry in compiler.iter_entries(1, meta, 10)] == [10]
+    assert compiler.rejected_rows(1, 10) == [(11, "Skipped: Duplicate recipient (already sent from row 10)")]
+
+
+def test_get_plan_reuses_stored_plan(compiler):
+    campaign = make_campaign()
+    compiler.get_plan(campaign, lambda: ROWS, PROFILE)
+
+    def fail():
+        raise AssertionError("a stored plan must not be compiled again")
+
+    meta = compiler.get_plan(campaign, fail, PROFILE)
+    assert meta["accepted"] == 5
+
+
+def test_get_plan_recompiles_when_campaign_or_file_changes(compiler):
+    compiler.get_plan(make_campaign(), lambda: ROWS, PROFILE)
+
+    meta = compiler.get_plan(make_campaign(end_row=4), lambda: ROWS[:4], PROFILE)
+    assert meta["rows"] == 4
+
+    meta = compiler.get_plan(make_campaign(end_row=4), lambda: ROWS, {**PROFILE, "mtime": 2})
+    assert meta["rows"] == 8
+
+
+def test_removed_plan_is_not_loaded(compiler):
+    campaign = make_campaign()
+    compiler.compile(campaign, ROWS, PROFILE)
+
+    compiler.remove(1)
+
+    assert compiler.load(campaign, PROFILE) is None
+
+
+def test_resume_seeks_via_index(compiler):
+    meta = compiler.compile(make_campaign(), ROWS, PROFILE)
+
+    # Every 2nd accepted row is indexed: rows 1, 5 and 8
+    assert [row for row, _ in meta["index"]] == [1, 5, 8]
+    assert [entry["row"] for entry in compiler.iter_entries(1, meta, 5)] == [5, 7, 8]
+    assert [entry["row"] for entry in compiler.iter_entries(1, meta, 6)] == [7, 8]
+    assert list(compiler.iter_entries(1, meta, 9)) == []
+
+
+def test_resume_skips_recorded_rejections(compiler):
+    compiler.compile(make_campaign(), ROWS, PROFILE)
+
+    assert [row for row, _ in compiler.rejected_rows(1, 3, skip_rows=[3])] == [6]
+
+
+def create_campaign(**values) -> int:
+    values.setdefault("name", "Test")
+    values.setdefault("session_name", "s1")
+    values.setdefault("file_path", "contacts.csv")
+    with connection.get_db() as db:
+        campaign = Campaign(**values)
+        db.add(campaign)
+        db.commit()
+        return campaign.id
+
+
+def write_plan(campaign_id: int):
+    plan_dir = os.path.join(dispatch_plan.DISPATCH_PLAN_DIR, str(campaign_id))
+    os.makedirs(plan_dir)
+    open(os.path.join(plan_dir, "plan.ndjson"), "w").close()
+
+
+def stored_plans() -> list:
+    return sorted(message_processor.plan_compiler.stored_campaign_ids())
+
+
+def test_sweep_removes_plans_of_ended_and_deleted_campaigns(database):
+    long_ago = datetime.utcnow() - timedelta(seconds=dispatch_plan.DISPATCH_PLAN_TTL_SECONDS + 60)
+    completed = create_campaign(status="completed", completed_at=long_ago)
+    failed = create_campaign(status="failed", completed_at=long_ago)
+    stopped = create_campaign(status="cancelled", completed_at=long_ago)
+    just_failed = create_campaign(status="failed", completed_at=datetime.utcnow())
+    paused = create_campaign(status="paused", completed_at=long_ago)
+    running = create_campaign(status="running")
+    for campaign_id in (completed, failed, stopped, just_failed, paused, running, 999):
+        write_plan(campaign_id)
+
+    CampaignScheduler()._sweep_dispatch_plans()
+
+    # Resumable campaigns and recently ended ones keep their plans
+    assert stored_plans() == sorted([just_failed, paused, running])
+
+
+def test_deleting_a_campaign_removes_its_plan(database):
+    campaign_id = create_campaign(status="cancelled")
+    write_plan(campaign_id)
+
+    assert CampaignManager().delete_campaign(campaign_id)
+
+    assert stored_plans() == []
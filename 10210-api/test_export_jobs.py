@@ -0,0 +1,188 @@
+"""
+Tests for export jobs: the job lifecycle, reuse of identical exports, jobs only
+visible to the user who submitted them, downloads, and quota given back when a
+streamed export fails
+"""
+
+import asyncio
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+import export_jobs
+from database import connection
+from export_jobs import ExportJobManager
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """Exports are written under a temporary directory"""
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(export_jobs.EXPORT_DIR, exist_ok=True)
+
+
+@pytest.fixture
+def main(workdir, tmp_path, monkeypatch):
+    """The API module on a database under tmp_path (importing it opens the database)"""
+    monkeypatch.setattr(connection, "DATABASE_PATH", str(tmp_path / "data" / "wagent.db"))
+    monkeypatch.setattr(connection, "engine", None)
+    monkeypatch.setattr(connection, "SessionLocal", None)
+    import main
+    if connection.engine is None:
+        # Already imported by an earlier test
+        assert connection.init_database()
+    yield main
+    connection.engine.dispose()
+
+
+@pytest.fixture
+def manager(main, monkeypatch):
+    manager = ExportJobManager(workers=1)
+    monkeypatch.setattr(main, "export_job_manager", manager)
+    return manager
+
+
+def signed_in(app):
+    """The app behind a stand-in for SessionMiddleware: the X-Test-User header becomes request.state.user_id"""
+    async def asgi(scope, receive, send):
+        user = dict(scope.get("headers", [])).get(b"x-test-user")
+        if user:
+            scope.setdefault("state", {})["user_id"] = user.decode()
+        await app(scope, receive, send)
+    return asgi
+
+
+@pytest.fixture
+def client(main):
+    return TestClient(signed_in(main.app))
+
+
+def as_user(user_id, **headers):
+    return {"X-Test-User": user_id, **headers}
+
+
+def write_export(name="contacts.csv", content="phone\n15550000001\n"):
+    """An export runner that writes one CSV file"""
+    async def run(job, report):
+        report("writing", 1, 1)
+        with open(os.path.join(export_jobs.EXPORT_DIR, name), "w") as f:
+            f.write(content)
+        return {"formats": ["csv"], "csv_url": f"/static/exports/{name}", "total": 1}
+    return run
+
+
+async def fail_export(job, report):
+    raise RuntimeError("WAHA unavailable")
+
+
+def run_jobs(manager, submissions):
+    """Submit (kind, params, run, owner) tuples and wait until every job is done"""
+    async def scenario():
+        results = [manager.submit(*submission) for submission in submissions]
+        await manager._queue.join()
+        await manager.stop()
+        return results
+    return asyncio.run(scenario())
+
+
+def test_job_runs_to_completion(manager):
+    [(job, reused)] = run_jobs(manager, [("contacts", {"session": "s1"}, write_export(), "u1")])
+
+    assert not reused
+    data = manager.to_dict(job)
+    assert data["status"] == "completed"
+    assert data["formats"] == ["csv"]
+    assert data["progress"] == {"stage": "completed", "processed": 1, "total": 1}
+    assert manager.artifact_path(job, "csv") == os.path.join(export_jobs.EXPORT_DIR, "contacts.csv")
+
+
+def test_failed_job_keeps_the_error(manager):
+    [(job, _)] = run_jobs(manager, [("contacts", {"session": "s1"}, fail_export, "u1")])
+
+    assert job["status"] == "failed"
+    assert job["error"] == "WAHA unavailable"
+    assert job["files"] == {}
+
+
+def test_identical_export_is_reused_only_for_the_same_user(manager):
+    run = write_export()
+    (first, _), (again, reused), (other, other_reused) = run_jobs(manager, [
+        ("contacts", {"session": "s1"}, run, "u1"),
+        ("contacts", {"session": "s1"}, run, "u1"),
+        ("contacts", {"session": "s1"}, run, "u2"),
+    ])
+
+    assert reused and again is first
+    assert not other_reused and other is not first
+
+
+def test_job_is_only_visible_to_its_owner(manager, client):
+    [(job, _)] = run_jobs(manager, [("contacts", {"session": "s1"}, write_export(), "u1")])
+    url = f"/api/exports/jobs/{job['id']}"
+
+    assert client.get(url, headers=as_user("u1")).json()["data"]["status"] == "completed"
+    assert client.get(url, headers=as_user("u2")).status_code == 404
+
+
+def test_user_id_parameter_does_not_grant_access(manager, client):
+    [(job, _)] = run_jobs(manager, [("contacts", {"session": "s1"}, write_export(), "u1")])
+
+    assert client.get(f"/api/exports/jobs/{job['id']}", params={"user_id": "u1"}).status_code == 401
+    assert client.get(f"/api/exports/jobs/{job['id']}/download", params={"user_id": "u1"}).status_code == 401
+    assert client.post("/api/exports/contacts/s1", params={"user_id": "u1"}).status_code == 401
+    assert client.get(f"/api/exports/jobs/{job['id']}", params={"user_id": "u1"}, headers=as_user("u2")).status_code == 404
+
+
+def test_download_finished_export(manager, client):
+    [(job, _)] = run_jobs(manager, [("contacts", {"session": "s1"}, write_export(), "u1")])
+    url = f"/api/exports/jobs/{job['id']}/download"
+
+    response = client.get(url, params={"format": "csv"}, headers=as_user("u1"))
+    assert response.status_code == 200
+    assert response.text == "phone\n15550000001\n"
+
+    # Resume from byte 6
+    response = client.get(url, params={"format": "csv"}, headers=as_user("u1", Range="bytes=6-"))
+    assert response.status_code == 206
+    assert response.text == "15550000001\n"
+
+    assert client.get(url, params={"format": "csv"}, headers=as_user("u2")).status_code == 404
+    assert client.get(url, params={"format": "excel"}, headers=as_user("u1")).status_code == 404
+
+
+def test_unfinished_export_cannot_be_downloaded(manager, client):
+    [(job, _)] = run_jobs(manager, [("contacts", {"session": "s1"}, fail_export, "u1")])
+
+    response = client.get(f"/api/exports/jobs/{job['id']}/download", headers=as_user("u1"))
+
+    assert response.status_code == 409
+
+
+@pytest.fixture
+def released(main, monkeypatch):
+    calls = []
+    monkeypatch.setattr(main.quota_ledger, "release", lambda user_id, resource, amount=1: calls.append((user_id, resource, amount)))
+    return calls
+
+
+def test_failed_stream_releases_its_quota(main, released):
+    prepared = {"user_id": "u1", "reserved": 40}
+
+    def body():
+        yield b"phone\n"
+        raise RuntimeError("WAHA went away")
+
+    stream = main._release_quota_on_failure(body(), prepared)
+    assert next(stream) == b"phone\n"
+    with pytest.raises(RuntimeError):
+        next(stream)
+
+    assert released == [("u1", "contacts_export", 40)]
+
+
+def test_finished_stream_keeps_its_quota(main, released):
+    stream = main._release_quota_on_failure(iter([b"phone\n", b"15550000001\n"]), {"user_id": "u1", "reserved": 2})
+
+    assert b"".join(stream) == b"phone\n15550000001\n"
+    assert released == []
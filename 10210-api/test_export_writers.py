@@ -0,0 +1,152 @@
+"""
+Tests for the streaming export writers: every format written row by row parses
+back to the same records, streamed bodies match the files byte for byte (CSV,
+NDJSON, JSON), records are pulled lazily in chunks, and requested formats are
+validated
+"""
+
+import csv
+import io
+import json
+
+import pytest
+from openpyxl import load_workbook
+
+from utils import export_writers
+from utils.export_writers import (
+    EXPORT_COLUMNS, iter_csv, iter_json, iter_ndjson, normalize_formats, stream_export, write_export
+)
+
+HEADER = {"session": "s1", "total": 3, "exported_at": "2026-01-01T00:00:00"}
+
+
+def record(n, **overrides):
+    values = {column: '' for column in EXPORT_COLUMNS}
+    values.update({
+        "phone_number": f"23480312345{n:02d}", "formatted_phone": f"+234 80312345{n:02d}", "country_code": "234",
+        "country_name": "Nigeria", "saved_name": f"Contact {n}, \"quoted\"", "is_admin": n % 2 == 0,
+        "labels": "vip", "last_msg_text": "hello\nthere ✓"
+    })
+    values.update(overrides)
+    return values
+
+
+RECORDS = [record(1), record(2, country_code="+44"), record(3, is_blocked=True)]
+
+
+@pytest.fixture
+def chunk_rows(monkeypatch):
+    monkeypatch.setattr(export_writers, "STREAM_CHUNK_ROWS", 2)
+
+
+def written(tmp_path, fmt, records=RECORDS):
+    path = tmp_path / f"export.{export_writers.EXPORT_FORMATS[fmt][0]}"
+    count = write_export(fmt, iter(records), str(path), HEADER, "contacts", "Contacts")
+    return count, path
+
+
+# ==================== FILES ====================
+
+def test_csv_file(tmp_path):
+    count, path = written(tmp_path, "csv")
+
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        rows = list(csv.DictReader(f))
+
+    assert count == 3
+    assert [row["phone_number"] for row in rows] == [r["formatted_phone"] for r in RECORDS]
+    assert [row["country_code"] for row in rows] == ["+234", "+44", "+234"]
+    assert [(row["is_admin"], row["is_blocked"]) for row in rows] == [("false", "false"), ("true", "false"), ("false", "true")]
+    assert rows[0]["saved_name"] == RECORDS[0]["saved_name"] and rows[0]["last_msg_text"] == "hello\nthere ✓"
+
+
+def test_ndjson_file(tmp_path):
+    count, path = written(tmp_path, "ndjson")
+
+    assert count == 3
+    assert [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()] == RECORDS
+
+
+@pytest.mark.parametrize("records", [RECORDS, []])
+def test_json_file(tmp_path, records):
+    count, path = written(tmp_path, "json", records)
+
+    document = json.loads(path.read_text(encoding="utf-8"))
+    assert count == len(records)
+    assert document == {**HEADER, "contacts": records}
+
+
+def test_excel_file(tmp_path):
+    count, path = written(tmp_path, "excel")
+
+    workbook = load_workbook(path, read_only=True)
+    sheet = workbook["Contacts"]
+    rows = list(sheet.iter_rows(values_only=True))
+    workbook.close()
+
+    assert count == 3
+    assert list(rows[0]) == EXPORT_COLUMNS
+    admin = EXPORT_COLUMNS.index("is_admin")
+    assert [row[admin] for row in rows[1:]] == ["No", "Yes", "No"]
+    assert [row[0] for row in rows[1:]] == [r["phone_number"] for r in RECORDS]
+
+
+# ==================== STREAMING ====================
+
+@pytest.mark.parametrize("fmt", ["csv", "ndjson", "json"])
+def test_stream_matches_the_file(tmp_path, chunk_rows, fmt):
+    _, path = written(tmp_path, fmt)
+    body, media_type, extension = stream_export(fmt, iter(RECORDS), HEADER, "contacts", "Contacts")
+
+    assert b"".join(body) == path.read_bytes()
+    assert path.suffix == f".{extension}"
+    assert media_type == export_writers.EXPORT_FORMATS[fmt][1]
+
+
+def test_excel_stream_is_a_workbook(tmp_path):
+    body, _, extension = stream_export("excel", iter(RECORDS), HEADER, "contacts", "Contacts")
+    path = tmp_path / f"streamed.{extension}"
+    path.write_bytes(b"".join(body))
+
+    workbook = load_workbook(path, read_only=True)
+    assert len(list(workbook["Contacts"].iter_rows())) == 4
+    workbook.close()
+
+
+def test_csv_stream_is_chunked_and_lazy(chunk_rows):
+    pulled = []
+
+    def records():
+        for r in RECORDS + [record(4), record(5)]:
+            pulled.append(r["phone_number"])
+            yield r
+
+    body = iter_csv(records())
+    first = next(body)
+
+    # Header plus two rows, and only two records pulled so far
+    assert len(list(csv.reader(io.StringIO(first.decode("utf-8"))))) >= 3
+    assert len(pulled) == 2
+    assert len(list(body)) == 2
+
+
+def test_ndjson_stream_is_chunked(chunk_rows):
+    chunks = list(iter_ndjson(iter(RECORDS)))
+
+    assert [chunk.count(b"\n") for chunk in chunks] == [2, 1]
+
+
+def test_json_stream_is_one_record_per_chunk():
+    chunks = list(iter_json(iter(RECORDS), HEADER, "contacts"))
+
+    assert len(chunks) == len(RECORDS) + 2
+    assert json.loads("".join(chunks))["contacts"] == RECORDS
+
+
+# ==================== FORMATS ====================
+
+def test_normalize_formats():
+    assert normalize_formats(None) == ["json", "excel", "csv"]
+    assert normalize_formats(["CSV", " xlsx", "excel", "ndjson"]) == ["csv", "excel", "ndjson"]
+    with pytest.raises(ValueError):
+        normalize_formats(["pdf"])
@@ -0,0 +1,99 @@
+"""
+Tests for upload-time file profiles: the sparse row-offset index lets CSV reads
+seek straight to a start row and yield what a parse from the top would, files
+with multi-line quoted fields fall back to parsing, and stored profiles are
+reused until the file changes
+"""
+
+import os
+
+import pytest
+
+from utils import file_handler
+from utils.file_handler import CSVProcessor, FileHandler
+
+
+@pytest.fixture(autouse=True)
+def profile_dir(tmp_path, monkeypatch):
+    """Profiles are stored under a temporary directory"""
+    monkeypatch.setattr(file_handler, "PROFILE_DIR", str(tmp_path / "profiles"))
+
+
+@pytest.fixture
+def handler(tmp_path):
+    return FileHandler(upload_dir=str(tmp_path / "uploads"))
+
+
+def write_csv(path, rows=25):
+    lines = ["phone_number,name,note"] + [f"1555000{row:04d},Name {row},note {row}" for row in range(1, rows + 1)]
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+@pytest.fixture
+def csv_file(tmp_path):
+    return write_csv(tmp_path / "contacts.csv")
+
+
+def test_index_records_every_nth_row_offset(csv_file):
+    profile = CSVProcessor().profile_file(csv_file, index_interval=10)
+
+    assert (profile["total_rows"], profile["seekable"]) == (25, True)
+    assert len(profile["row_offsets"]) == 3
+    with open(csv_file, "rb") as f:
+        lines = f.readlines()
+    for slot, offset in enumerate(profile["row_offsets"]):
+        assert offset == sum(len(line) for line in lines[:1 + slot * 10])
+
+
+@pytest.mark.parametrize("start_row, end_row", [
+    (1, None), (1, 4), (4, 4), (9, 12), (10, None), (11, 20), (21, None), (25, None), (26, None), (3, 100)
+])
+@pytest.mark.parametrize("chunk_size", [2, 1000])
+def test_seek_matches_parsing_from_the_top(csv_file, start_row, end_row, chunk_size):
+    processor = CSVProcessor()
+    profile = processor.profile_file(csv_file, index_interval=4)
+
+    seeked = list(processor.iter_rows(csv_file, start_row, end_row, chunk_size=chunk_size, profile=profile))
+
+    assert seeked == list(processor.iter_rows(csv_file, start_row, end_row, chunk_size=chunk_size))
+    assert seeked == processor.read_data(csv_file, start_row, end_row, profile=profile)
+
+
+def test_multiline_quoted_fields_are_not_seekable(tmp_path):
+    path = tmp_path / "quoted.csv"
+    path.write_text('phone_number,note\n15550000001,"line one\nline two"\n15550000002,plain\n15550000003,"x"\n')
+    processor = CSVProcessor()
+
+    profile = processor.profile_file(str(path), index_interval=1)
+
+    assert not profile["seekable"] and profile["row_offsets"] == []
+    rows = list(processor.iter_rows(str(path), 2, None, profile=profile))
+    assert [row["phone_number"] for row in rows] == [15550000002, 15550000003]
+
+
+def test_profile_is_stored_and_reused(handler, csv_file, monkeypatch):
+    first = handler.get_profile(csv_file)
+
+    def no_rebuild(file_path):
+        raise AssertionError("profile rebuilt")
+
+    monkeypatch.setattr(handler, "build_profile", no_rebuild)
+    assert handler.get_profile(csv_file) == first
+    assert os.listdir(file_handler.PROFILE_DIR) == [os.path.basename(handler._profile_path(csv_file))]
+
+
+def test_changed_file_gets_a_new_profile(handler, tmp_path, csv_file):
+    assert handler.get_profile(csv_file)["total_rows"] == 25
+
+    write_csv(tmp_path / "contacts.csv", rows=30)
+    os.utime(csv_file, (1, 1))
+
+    assert handler.get_profile(csv_file)["total_rows"] == 30
+
+
+def test_profile_row_count_drives_counting(handler, csv_file):
+    profile = handler.get_profile(csv_file)
+
+    assert CSVProcessor().count_data_rows(csv_file, 20, None, profile=profile) == 6
+    assert profile["file_info"]["headers"] == ["phone_number", "name", "note"]
@@ -0,0 +1,108 @@
+"""
+Tests for streaming campaign rows from CSV and Excel files: iter_rows yields the
+same rows as the pandas read_data for any row range and chunk size, Excel
+headers and short rows come out as pandas gives them, and row counts are taken
+without loading the data
+"""
+
+import pytest
+from openpyxl import Workbook
+
+from utils.file_handler import CSVProcessor, ExcelProcessor
+
+
+@pytest.fixture
+def csv_file(tmp_path):
+    path = tmp_path / "contacts.csv"
+    lines = ["phone_number, name ,city"] + [f"1555000{row:04d},Name {row},{'' if row % 3 else 'Lagos'}"
+                                            for row in range(1, 24)]
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+def write_workbook(path, rows):
+    workbook = Workbook()
+    sheet = workbook.active
+    for row in rows:
+        sheet.append(row)
+    workbook.save(path)
+    return str(path)
+
+
+@pytest.fixture
+def xlsx_file(tmp_path):
+    rows = [["phone_number", "name", "city"]]
+    rows += [[15550000000 + row, f"Name {row}", None if row % 3 else "Lagos"] for row in range(1, 12)]
+    return write_workbook(tmp_path / "contacts.xlsx", rows)
+
+
+RANGES = [(1, None), (1, 5), (4, 9), (10, None), (23, None), (21, 40)]
+
+
+# ==================== CSV ====================
+
+@pytest.mark.parametrize("start_row, end_row", RANGES)
+@pytest.mark.parametrize("chunk_size", [1, 4, 1000])
+def test_csv_rows_match_read_data(csv_file, start_row, end_row, chunk_size):
+    processor = CSVProcessor()
+
+    streamed = list(processor.iter_rows(csv_file, start_row, end_row, chunk_size=chunk_size))
+
+    assert streamed == processor.read_data(csv_file, start_row, end_row)
+
+
+def test_csv_headers_are_stripped_and_blanks_are_empty(csv_file):
+    first, second, third = list(CSVProcessor().iter_rows(csv_file, 1, 3))
+
+    assert list(first) == ["phone_number", "name", "city"]
+    assert (first["name"], first["city"], third["city"]) == ("Name 1", "", "Lagos")
+
+
+@pytest.mark.parametrize("start_row, end_row, expected", [(1, None, 23), (4, 9, 6), (21, 40, 3), (30, None, 0)])
+def test_csv_row_count(csv_file, start_row, end_row, expected):
+    assert CSVProcessor().count_data_rows(csv_file, start_row, end_row) == expected
+
+
+def test_csv_stream_is_lazy(csv_file):
+    rows = CSVProcessor().iter_rows(csv_file, chunk_size=2)
+
+    assert next(rows)["phone_number"] == 15550000001
+    rows.close()
+
+
+# ==================== EXCEL ====================
+
+@pytest.mark.parametrize("start_row, end_row", [(1, None), (1, 5), (4, 9), (10, None), (11, 40)])
+def test_xlsx_rows_match_read_data(xlsx_file, start_row, end_row):
+    processor = ExcelProcessor()
+
+    streamed = list(processor.iter_rows(xlsx_file, start_row, end_row))
+
+    assert streamed == processor.read_data(xlsx_file, start_row, end_row)
+
+
+def test_xlsx_duplicate_and_blank_headers_match_pandas(tmp_path):
+    path = write_workbook(tmp_path / "headers.xlsx", [
+        ["phone", "name", None, "name", "name.1", None],
+        [15550000001, "Ada", "x", "Lovelace", "Countess", "y"],
+        [15550000002, "Alan"],
+    ])
+    processor = ExcelProcessor()
+
+    streamed = list(processor.iter_rows(path))
+
+    assert streamed == processor.read_data(path)
+    assert list(streamed[0]) == list(processor.read_data(path)[0])
+    assert streamed[1]["name.1"] == ""
+
+
+def test_xlsx_row_count_skips_trailing_blank_rows(tmp_path):
+    path = write_workbook(tmp_path / "blank_tail.xlsx", [["phone"], [15550000001], [None], [15550000002], [None], [None]])
+    processor = ExcelProcessor()
+
+    assert processor.count_data_rows(path) == len(processor.read_data(path)) == 3
+    assert processor.count_data_rows(path, 2) == 2
+
+
+def test_profile_row_count_is_used_when_given(xlsx_file):
+    assert ExcelProcessor().count_data_rows(xlsx_file, 3, None, profile={"total_rows": 100}) == 98
@@ -0,0 +1,144 @@
+"""
+Tests for group participant enrichment: last-message lookups run concurrently up
+to the per-instance limit, results keep the group's order, a slow lookup only
+blanks its own participant, and the streaming variant stops its lookups when
+the consumer does
+"""
+
+import asyncio
+
+import pytest
+
+import async_waha_client
+import session_directory_cache as directory_module
+from async_waha_client import AsyncWAHAClient
+
+PARTICIPANTS = [{"id": f"23480312345{n:02d}@c.us", "isAdmin": n == 0} for n in range(8)]
+CONTACTS = [{"id": "2348031234501@c.us", "name": "Ada", "isMyContact": True, "labels": ["vip"]}]
+
+
+class FakeWaha:
+    """Group info, contacts and per-chat last messages with a configurable delay"""
+
+    def __init__(self, participants=PARTICIPANTS):
+        self.participants = participants
+        self.delays = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lookups = []
+        self.cancelled = 0
+
+    async def get_group_info(self, session, group_id):
+        return {"id": group_id, "groupMetadata": {"participants": self.participants}}
+
+    async def get_contacts(self, session, base_url=None):
+        return CONTACTS
+
+    async def get_chat_messages(self, session, chat_id, limit=50):
+        self.lookups.append(chat_id)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delays.get(chat_id, 0.01))
+            return [{"body": f"hi from {chat_id}", "timestamp": 1700000000, "type": "chat", "fromMe": False}]
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+
+@pytest.fixture
+def waha(monkeypatch):
+    waha = FakeWaha()
+    monkeypatch.setattr(directory_module.session_directory_cache, "get_contacts", waha.get_contacts)
+    return waha
+
+
+@pytest.fixture
+def client(waha, monkeypatch):
+    client = AsyncWAHAClient("http://waha-1")
+    monkeypatch.setattr(client, "get_group_info", waha.get_group_info)
+    monkeypatch.setattr(client, "get_chat_messages", waha.get_chat_messages)
+    return client
+
+
+def test_lookups_are_concurrent_up_to_the_limit(client, waha, monkeypatch):
+    monkeypatch.setattr(async_waha_client, "WAHA_ENRICH_CONCURRENCY", 3)
+
+    details = asyncio.run(client.get_group_participants_details("s1", "123"))
+
+    assert waha.max_in_flight == 3
+    assert len(details) == len(PARTICIPANTS)
+
+
+def test_details_keep_the_group_order_and_report_progress(client, waha):
+    # Later participants answer first
+    for n, participant in enumerate(PARTICIPANTS):
+        waha.delays[participant["id"]] = 0.01 * (len(PARTICIPANTS) - n)
+    progress = []
+
+    details = asyncio.run(client.get_group_participants_details("s1", "123@g.us",
+                                                                progress=lambda done, total: progress.append((done, total))))
+
+    assert [d["phone_number"] for d in details] == [p["id"].replace("@c.us", "") for p in PARTICIPANTS]
+    assert progress == [(done, 8) for done in range(1, 9)]
+    assert (details[1]["saved_name"], details[1]["labels"], details[1]["is_my_contact"]) == ("Ada", "vip", True)
+    assert details[0]["is_admin"] and details[0]["last_msg_status"] == "received"
+
+
+def test_slow_lookup_blanks_only_its_participant(client, waha, monkeypatch):
+    monkeypatch.setattr(async_waha_client, "WAHA_ENRICH_TIMEOUT", 0.05)
+    slow = PARTICIPANTS[2]["id"]
+    waha.delays[slow] = 1.0
+
+    details = asyncio.run(client.get_group_participants_details("s1", "123"))
+
+    assert details[2]["last_msg_text"] == ""
+    assert all(d["last_msg_text"] for i, d in enumerate(details) if i != 2)
+
+
+def test_without_last_messages_nothing_is_looked_up(client, waha):
+    details = asyncio.run(client.get_group_participants_details("s1", "123", include_last_message=False))
+
+    assert waha.lookups == []
+    assert len(details) == len(PARTICIPANTS)
+
+
+def test_participants_without_an_id_are_skipped(waha, client):
+    waha.participants = [{"id": ""}, {"pushname": "nobody"}, {"id": {"_serialized": "2348031234599@c.us", "user": "2348031234599"}}]
+
+    details = asyncio.run(client.get_group_participants_details("s1", "123"))
+
+    assert [d["phone_number"] for d in details] == ["2348031234599"]
+
+
+def test_stream_yields_in_completion_order(client, waha):
+    waha.delays[PARTICIPANTS[0]["id"]] = 0.2
+
+    async def scenario():
+        return [d["phone_number"] async for d in client.iter_group_participants_details("s1", "123")]
+
+    streamed = asyncio.run(scenario())
+
+    assert streamed[-1] == PARTICIPANTS[0]["id"].replace("@c.us", "")
+    assert sorted(streamed) == sorted(p["id"].replace("@c.us", "") for p in PARTICIPANTS)
+
+
+def test_stopping_the_stream_cancels_pending_lookups(client, waha, monkeypatch):
+    monkeypatch.setattr(async_waha_client, "WAHA_ENRICH_CONCURRENCY", 2)
+    for participant in PARTICIPANTS[1:]:
+        waha.delays[participant["id"]] = 1.0
+
+    async def scenario():
+        stream = client.iter_group_participants_details("s1", "123")
+        first = await stream.__anext__()
+        await stream.aclose()
+        await asyncio.sleep(0)
+        return first
+
+    first = asyncio.run(scenario())
+
+    assert first["phone_number"] == PARTICIPANTS[0]["id"].replace("@c.us", "")
+    assert waha.cancelled >= 1
+    assert len(waha.lookups) < len(PARTICIPANTS)
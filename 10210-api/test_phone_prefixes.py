@@ -0,0 +1,73 @@
+"""
+Tests for the calling-code prefix trie: longest-prefix matches agree with a
+linear scan of the prefix table, overlapping prefixes pick the longest one, and
+numbers without a known prefix are left alone
+"""
+
+import random
+
+import pytest
+
+from phone_prefixes import PHONE_PREFIXES, PhonePrefix, phone_prefix_index
+
+MAX_PREFIX_LENGTH = max(len(prefix) for prefix in PHONE_PREFIXES)
+
+
+def linear_lookup(phone_number):
+    """The lookup the trie replaced: try every prefix length, longest first"""
+    digits = (phone_number or '').lstrip('+')
+    for length in range(MAX_PREFIX_LENGTH, 0, -1):
+        if len(digits) >= length and digits[:length] in PHONE_PREFIXES:
+            return PhonePrefix(*PHONE_PREFIXES[digits[:length]])
+    return None
+
+
+def test_every_prefix_matches_the_linear_lookup():
+    rng = random.Random(7)
+    numbers = []
+    for prefix in PHONE_PREFIXES:
+        numbers.append(prefix)
+        numbers.append(prefix + ''.join(rng.choice('0123456789') for _ in range(8)))
+        numbers.append('+' + prefix + '5550100')
+
+    for number in numbers:
+        assert phone_prefix_index.lookup(number) == linear_lookup(number), number
+
+
+def test_random_numbers_match_the_linear_lookup():
+    rng = random.Random(42)
+    for _ in range(5000):
+        number = ''.join(rng.choice('0123456789') for _ in range(rng.randint(1, 15)))
+        assert phone_prefix_index.lookup(number) == linear_lookup(number), number
+
+
+@pytest.mark.parametrize("number, calling_code, region", [
+    ("12125551234", "1", "US"),      # +1 alone
+    ("12425551234", "1", "BS"),      # +1 242 refines the region
+    ("+14165551234", "1", "CA"),
+    ("74951234567", "7", "RU"),      # +7 alone
+    ("77012345678", "7", "KZ"),      # +7 7 refines the region
+    ("76012345678", "7", "KZ"),
+    ("2348031234567", "234", "NG"),  # not +23 or +2
+    ("447911123456", "44", "GB"),
+])
+def test_overlapping_prefixes_pick_the_longest(number, calling_code, region):
+    match = phone_prefix_index.lookup(number)
+
+    assert (match.calling_code, match.region) == (calling_code, region)
+
+
+def test_shared_calling_codes_keep_one_name():
+    assert phone_prefix_index.country_name("12425551234") == "United States/Canada"
+    assert phone_prefix_index.country_name("77012345678") == "Russia/Kazakhstan"
+    assert phone_prefix_index.format_phone("12425551234") == "+1 2425551234"
+    assert phone_prefix_index.format_phone("+77012345678") == "+7 7012345678"
+
+
+@pytest.mark.parametrize("number", ["", None, "+", "0123456789", "+0044123", "abc"])
+def test_numbers_without_a_prefix(number):
+    assert phone_prefix_index.lookup(number) is None
+    assert linear_lookup(number) is None
+    assert phone_prefix_index.country_code(number) == ""
+    assert phone_prefix_index.country_name(number) == "Unknown"
+    assert phone_prefix_index.format_phone(number) == number
@@ -0,0 +1,163 @@
+"""
+Tests for phone validation: parse results memoised per (number, region) with a
+TTL and size cap, batches parsing each distinct number once, and large batches
+spread over the shared process pool with an in-process fallback
+"""
+
+from collections import OrderedDict
+
+import pytest
+
+from utils import validation
+from utils.validation import PhoneValidator, shutdown_phone_pool
+
+
+@pytest.fixture(autouse=True)
+def parse_cache(monkeypatch):
+    """An empty parse cache for each test"""
+    monkeypatch.setattr(PhoneValidator, "_cache", OrderedDict())
+    monkeypatch.setattr(PhoneValidator, "_cache_stats", {"hits": 0, "misses": 0})
+
+
+@pytest.fixture
+def parses(monkeypatch):
+    """Numbers handed to the parser, in order"""
+    seen = []
+    parse_phone = PhoneValidator._parse_phone
+
+    def counting(self, cleaned_phone, region):
+        seen.append((cleaned_phone, region))
+        return parse_phone(self, cleaned_phone, region)
+
+    monkeypatch.setattr(PhoneValidator, "_parse_phone", counting)
+    return seen
+
+
+# ==================== MEMO ====================
+
+def test_repeated_numbers_are_parsed_once(parses):
+    validator = PhoneValidator()
+
+    first = validator.validate_phone("+234 803 123 4567")
+    second = PhoneValidator().validate_phone("+234-803-123-4567")
+
+    assert first == second
+    assert first["formatted"] == "2348031234567"
+    assert parses == [("+2348031234567", "NG")]
+    assert PhoneValidator.get_cache_stats()["hits"] == 1
+
+
+def test_cached_results_are_copies():
+    validator = PhoneValidator()
+    validator.validate_phone("+2348031234567")["formatted"] = "changed"
+
+    assert validator.validate_phone("+2348031234567")["formatted"] == "2348031234567"
+
+
+def test_region_is_part_of_the_key(parses):
+    validator = PhoneValidator()
+
+    nigerian = validator.validate_phone("08031234567")
+    british = validator.validate_phone("08031234567", "GB")
+
+    assert nigerian["valid"] and nigerian["country_code"] == 234
+    assert british["formatted"] != nigerian["formatted"]
+    assert len(parses) == 2
+
+
+def test_expired_results_are_parsed_again(parses, monkeypatch):
+    monkeypatch.setattr(validation, "PHONE_CACHE_TTL_SECONDS", 0)
+    validator = PhoneValidator()
+
+    validator.validate_phone("+2348031234567")
+    validator.validate_phone("+2348031234567")
+
+    assert len(parses) == 2
+    assert len(PhoneValidator._cache) == 1
+
+
+def test_cache_keeps_the_most_recent_numbers(monkeypatch):
+    monkeypatch.setattr(validation, "PHONE_CACHE_SIZE", 2)
+    validator = PhoneValidator()
+
+    for phone in ("+2348031234567", "+2348031234568", "+2348031234567", "+2348031234569"):
+        validator.validate_phone(phone)
+
+    assert [phone for phone, _ in PhoneValidator._cache] == ["+2348031234567", "+2348031234569"]
+
+
+def test_unexpected_errors_are_not_cached(monkeypatch):
+    def broken(number, region):
+        raise RuntimeError("metadata unavailable")
+
+    monkeypatch.setattr(validation, "parse", broken)
+    result = PhoneValidator().validate_phone("+2348031234567")
+
+    assert not result["valid"] and "metadata unavailable" in result["error"]
+    assert len(PhoneValidator._cache) == 0
+
+
+# ==================== BATCH ====================
+
+PHONES = ["+234 803 123 4567", "", "(+234)8031234567", "not a number", "08031234568", "+2348031234567", None]
+
+
+def test_batch_parses_each_distinct_number_once(parses):
+    results = PhoneValidator().batch_validate_phones(PHONES)
+
+    assert sorted(parses) == sorted([("+2348031234567", "NG"), ("notanumber", "NG"), ("08031234568", "NG")])
+    assert [result["index"] for result in results] == list(range(len(PHONES)))
+    assert [result["original"] for result in results] == PHONES
+
+
+def test_batch_matches_one_by_one_validation():
+    validator = PhoneValidator()
+    batch = validator.batch_validate_phones(PHONES, "NG")
+
+    for phone, result in zip(PHONES, batch):
+        expected = PhoneValidator().validate_phone(phone, "NG")
+        assert {key: value for key, value in result.items() if key not in ("index", "original")} == expected
+
+
+def test_batch_uses_cached_numbers(parses):
+    validator = PhoneValidator()
+    validator.validate_phone("+2348031234567")
+
+    validator.batch_validate_phones(["+2348031234567", "+2348031234568"])
+
+    assert parses == [("+2348031234567", "NG"), ("+2348031234568", "NG")]
+
+
+def test_large_batch_uses_the_process_pool(monkeypatch):
+    monkeypatch.setattr(validation, "PHONE_POOL_MIN_BATCH", 4)
+    monkeypatch.setattr(validation, "PHONE_POOL_WORKERS", 2)
+    phones = [f"+23480312345{n:02d}" for n in range(10)]
+    try:
+        pooled = PhoneValidator().batch_validate_phones(phones)
+        assert validation._phone_pool is not None
+    finally:
+        shutdown_phone_pool()
+
+    assert validation._phone_pool is None
+    monkeypatch.setattr(PhoneValidator, "_cache", OrderedDict())
+    monkeypatch.setattr(validation, "PHONE_POOL_MIN_BATCH", 10 ** 6)
+    assert pooled == PhoneValidator().batch_validate_phones(phones)
+
+
+def test_broken_pool_falls_back_to_in_process(monkeypatch):
+    class BrokenPool:
+        def map(self, *args):
+            raise RuntimeError("A process in the process pool was terminated abruptly")
+
+        def shutdown(self, **kwargs):
+            pass
+
+    monkeypatch.setattr(validation, "PHONE_POOL_MIN_BATCH", 2)
+    monkeypatch.setattr(validation, "PHONE_POOL_WORKERS", 2)
+    monkeypatch.setattr(validation, "_phone_pool", BrokenPool())
+
+    results = PhoneValidator().batch_validate_phones(["+2348031234567", "+2348031234568"])
+
+    assert [result["formatted"] for result in results] == ["2348031234567", "2348031234568"]
+    # The broken pool was dropped so the next large batch starts a new one
+    assert validation._phone_pool is None
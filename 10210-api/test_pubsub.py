@@ -0,0 +1,259 @@
+"""
+Tests for the WebSocket pub/sub: in-process delivery, the event bus falling back
+to it when Redis is missing or down, and the Redis backend skipping its own
+echo, dropping publishes when its outbox is full and reconnecting its listener
+"""
+
+import asyncio
+import json
+import sys
+
+import pytest
+import redis.asyncio as aioredis
+
+from pubsub import EventBus, InProcessPubSub, RedisPubSub
+
+
+class Received:
+    """A handler that records (topic, key, message)"""
+
+    def __init__(self):
+        self.messages = []
+
+    def __call__(self, topic, key, message):
+        self.messages.append((topic, key, message))
+
+
+class FakeRedis:
+    """Stands in for a Redis server's pub/sub; fails the first fail_subscribes subscribes"""
+
+    def __init__(self, fail_subscribes=0):
+        self.fail_subscribes = fail_subscribes
+        self.subscribers = []
+        self.published = []
+        self.clients_closed = 0
+
+    def client(self, url, **kwargs):
+        return FakeRedisClient(self)
+
+
+class FakeRedisClient:
+    def __init__(self, server):
+        self.server = server
+
+    async def publish(self, channel, data):
+        self.server.published.append((channel, data))
+        for queue in self.server.subscribers:
+            queue.put_nowait(data)
+
+    def pubsub(self):
+        return FakePubSub(self.server)
+
+    async def close(self):
+        self.server.clients_closed += 1
+
+
+class FakePubSub:
+    def __init__(self, server):
+        self.server = server
+        self.queue = asyncio.Queue()
+
+    async def subscribe(self, channel):
+        if self.server.fail_subscribes:
+            self.server.fail_subscribes -= 1
+            raise ConnectionError("Connection refused")
+        self.server.subscribers.append(self.queue)
+
+    async def listen(self):
+        yield {"type": "subscribe", "data": 1}
+        while True:
+            yield {"type": "message", "data": await self.queue.get()}
+
+    async def close(self):
+        if self.queue in self.server.subscribers:
+            self.server.subscribers.remove(self.queue)
+
+
+@pytest.fixture
+def redis_server(monkeypatch):
+    server = FakeRedis()
+    monkeypatch.setattr(aioredis, "from_url", server.client)
+    return server
+
+
+async def settle(condition, timeout=3.0):
+    """Wait until condition() holds"""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+# ==================== IN-PROCESS ====================
+
+def test_in_process_delivers_until_stopped():
+    async def scenario():
+        received = Received()
+        bus = InProcessPubSub()
+        await bus.start(received)
+        bus.publish("campaign", 1, "a")
+        await bus.stop()
+        bus.publish("campaign", 1, "b")
+        return received.messages
+
+    assert asyncio.run(scenario()) == [("campaign", 1, "a")]
+
+
+def test_event_bus_delivers_locally_before_start():
+    received = Received()
+    bus = EventBus("memory")
+    bus.set_handler(received)
+
+    bus.publish("export_job", "j1", "{}")
+
+    assert received.messages == [("export_job", "j1", "{}")]
+    assert not bus.get_status()["started"]
+
+
+def test_event_bus_survives_a_failing_handler():
+    bus = EventBus("memory")
+    bus.set_handler(lambda topic, key, message: 1 / 0)
+
+    async def scenario():
+        await bus.start()
+        bus.publish("campaign", 1, "a")
+        return bus.get_status()
+
+    assert asyncio.run(scenario()) == {"backend": "memory", "configured": "memory", "started": True}
+
+
+def test_event_bus_falls_back_when_redis_is_not_installed(monkeypatch):
+    monkeypatch.setitem(sys.modules, "redis.asyncio", None)
+    received = Received()
+    bus = EventBus("redis")
+    bus.set_handler(received)
+
+    async def scenario():
+        await bus.start()
+        bus.publish("campaign", 1, "a")
+        return bus.get_status()
+
+    assert asyncio.run(scenario())["backend"] == "memory"
+    assert received.messages == [("campaign", 1, "a")]
+
+
+def test_event_bus_falls_back_when_redis_fails_to_start(monkeypatch):
+    def unreachable(url, **kwargs):
+        raise ConnectionError("Connection refused")
+
+    monkeypatch.setattr(aioredis, "from_url", unreachable)
+    received = Received()
+    bus = EventBus("redis")
+    bus.set_handler(received)
+
+    async def scenario():
+        await bus.start()
+        bus.publish("campaign", 1, "a")
+        return bus.get_status()
+
+    assert asyncio.run(scenario()) == {"backend": "memory", "configured": "redis", "started": True}
+    assert received.messages == [("campaign", 1, "a")]
+
+
+# ==================== REDIS ====================
+
+def envelope(origin, message="m"):
+    return json.dumps({"origin": origin, "topic": "campaign", "key": 1, "message": message})
+
+
+def test_deliver_skips_its_own_echo():
+    received = Received()
+    bus = RedisPubSub()
+    bus._handler = received
+
+    bus._deliver(envelope(bus.origin, "own"))
+    bus._deliver(envelope("other-worker", "theirs"))
+    bus._deliver("not json")
+
+    assert received.messages == [("campaign", 1, "theirs")]
+
+
+def test_deliver_without_a_handler_is_ignored():
+    bus = RedisPubSub()
+
+    bus._deliver(envelope("other-worker"))
+
+
+def test_full_outbox_drops_publishes_but_delivers_locally():
+    async def scenario():
+        received = Received()
+        bus = RedisPubSub()
+        bus._handler = received
+        bus._outbox = asyncio.Queue(maxsize=2)
+        for message in ("a", "b", "c"):
+            bus.publish("campaign", 1, message)
+        return received.messages, bus._outbox.qsize(), bus._dropped
+
+    messages, queued, dropped = asyncio.run(scenario())
+
+    assert [message for _, _, message in messages] == ["a", "b", "c"]
+    assert (queued, dropped) == (2, 1)
+
+
+def test_workers_see_each_others_messages_once(redis_server):
+    async def scenario():
+        first, second = Received(), Received()
+        worker_1, worker_2 = RedisPubSub(), RedisPubSub()
+        await worker_1.start(first)
+        await worker_2.start(second)
+        try:
+            await settle(lambda: len(redis_server.subscribers) == 2)
+            worker_1.publish("campaign", 1, "from-1")
+            await settle(lambda: second.messages)
+            await asyncio.sleep(0.05)
+        finally:
+            await worker_1.stop()
+            await worker_2.stop()
+        return first.messages, second.messages
+
+    first, second = asyncio.run(scenario())
+
+    assert first == [("campaign", 1, "from-1")]
+    assert second == [("campaign", 1, "from-1")]
+    assert redis_server.clients_closed == 2
+
+
+def test_listener_reconnects_after_a_failed_subscribe(redis_server):
+    redis_server.fail_subscribes = 1
+
+    async def scenario():
+        received = Received()
+        worker = RedisPubSub()
+        await worker.start(received)
+        try:
+            await settle(lambda: redis_server.subscribers)
+            await redis_server.client(worker.url).publish(worker.channel, envelope("other-worker"))
+            await settle(lambda: received.messages)
+        finally:
+            await worker.stop()
+        return received.messages
+
+    assert asyncio.run(scenario()) == [("campaign", 1, "m")]
+    assert redis_server.fail_subscribes == 0
+
+
+def test_event_bus_uses_redis_when_it_starts(redis_server):
+    bus = EventBus("redis")
+    bus.set_handler(Received())
+
+    async def scenario():
+        await bus.start()
+        try:
+            bus.publish("campaign", 1, "a")
+            await settle(lambda: redis_server.published)
+            return bus.get_status()["backend"]
+        finally:
+            await bus.stop()
+
+    assert asyncio.run(scenario()) == "redis"
+    assert json.loads(redis_server.published[0][1])["message"] == "a"
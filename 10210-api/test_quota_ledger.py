@@ -0,0 +1,184 @@
+"""
+Tests for the quota ledger: reserving and releasing quota, write-behind of the
+increments, dropping increments that predate a monthly reset, and reading
+subscriptions off the event loop
+"""
+
+import asyncio
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from database import connection
+from database.subscription_models import UserSubscription, PlanType
+from quota_ledger import QuotaLedger
+
+
+@pytest.fixture(autouse=True)
+def database(tmp_path, monkeypatch):
+    """Fresh SQLite database in a temporary directory"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(connection, "engine", None)
+    monkeypatch.setattr(connection, "SessionLocal", None)
+    assert connection.init_database()
+    yield
+    connection.engine.dispose()
+
+
+def create_subscription(user_id="u1", messages=10, used=0, exports=5):
+    with connection.get_db() as db:
+        db.add(UserSubscription(
+            user_id=user_id, plan_type=PlanType.FREE,
+            max_messages_per_month=messages, messages_sent_this_month=used,
+            max_contacts_export=exports, contacts_exported_this_month=0,
+            messages_reset_date=datetime.utcnow() + timedelta(days=10)
+        ))
+        db.commit()
+
+
+def stored_usage(user_id="u1") -> tuple:
+    with connection.get_db() as db:
+        subscription = db.query(UserSubscription).filter(UserSubscription.user_id == user_id).one()
+        return subscription.messages_sent_this_month, subscription.contacts_exported_this_month
+
+
+def reset_month(user_id="u1", due=False):
+    """Reset the stored counters, as is_within_limits does when the month is over"""
+    with connection.get_db() as db:
+        subscription = db.query(UserSubscription).filter(UserSubscription.user_id == user_id).one()
+        subscription.messages_sent_this_month = 0
+        subscription.messages_reset_date = datetime.utcnow() + (timedelta(seconds=-1) if due else timedelta(days=30))
+        db.commit()
+
+
+def test_reserve_is_all_or_nothing():
+    create_subscription(messages=10, used=8)
+    ledger = QuotaLedger()
+
+    assert asyncio.run(ledger.reserve("u1", "messages", 3)) == 0
+    assert asyncio.run(ledger.reserve("u1", "messages", 2)) == 2
+    assert asyncio.run(ledger.get_usage("u1", "messages"))["remaining"] == 0
+
+
+def test_partial_reserve_grants_what_is_left():
+    create_subscription(exports=5)
+    ledger = QuotaLedger()
+
+    assert asyncio.run(ledger.reserve("u1", "contacts_export", 8, partial=True)) == 5
+    assert asyncio.run(ledger.reserve("u1", "contacts_export", 1, partial=True)) == 0
+
+
+def test_release_gives_quota_back():
+    create_subscription(messages=2)
+    ledger = QuotaLedger()
+    asyncio.run(ledger.reserve("u1", "messages", 2))
+
+    ledger.release("u1", "messages")
+
+    assert asyncio.run(ledger.reserve("u1", "messages")) == 1
+    asyncio.run(ledger.flush_async())
+    assert stored_usage() == (2, 0)
+
+
+def test_release_after_a_flush_is_written_back():
+    create_subscription(messages=2)
+    ledger = QuotaLedger()
+    asyncio.run(ledger.reserve("u1", "messages", 2))
+    asyncio.run(ledger.flush_async())
+
+    # The send failed after its reservation was already written
+    ledger.release("u1", "messages")
+    assert asyncio.run(ledger.flush_async())
+
+    assert stored_usage() == (1, 0)
+    assert asyncio.run(ledger.reserve("u1", "messages")) == 1
+
+
+def test_users_without_a_subscription_are_not_metered():
+    ledger = QuotaLedger()
+
+    assert asyncio.run(ledger.get_usage("nobody", "messages")) is None
+    assert asyncio.run(ledger.reserve("nobody", "messages", 1000)) == 1000
+    assert not asyncio.run(ledger.flush_async())
+
+
+def test_flush_writes_pending_increments():
+    create_subscription(used=1)
+    ledger = QuotaLedger()
+    asyncio.run(ledger.reserve("u1", "messages", 3))
+    asyncio.run(ledger.reserve("u1", "contacts_export", 2))
+
+    assert stored_usage() == (1, 0)
+    assert asyncio.run(ledger.flush_async())
+
+    assert stored_usage() == (4, 2)
+    assert asyncio.run(ledger.get_usage("u1", "messages"))["used"] == 4
+
+
+def test_failed_flush_keeps_the_increments(monkeypatch):
+    create_subscription()
+    ledger = QuotaLedger()
+    asyncio.run(ledger.reserve("u1", "messages", 3))
+
+    write = ledger._write_batch
+    locked = [True]
+
+    def write_batch(batch):
+        if locked[0]:
+            raise RuntimeError("database is locked")
+        return write(batch)
+
+    monkeypatch.setattr(ledger, "_write_batch", write_batch)
+    assert not asyncio.run(ledger.flush_async())
+    assert asyncio.run(ledger.get_usage("u1", "messages"))["used"] == 3
+
+    locked[0] = False
+    assert asyncio.run(ledger.flush_async())
+    assert stored_usage() == (3, 0)
+
+
+def test_increments_from_before_a_monthly_reset_are_dropped():
+    create_subscription(used=4)
+    ledger = QuotaLedger()
+    asyncio.run(ledger.reserve("u1", "messages", 3))
+
+    # The month ends before the increments are written
+    reset_month(due=True)
+    ledger._entries["u1"]["reset_date"] = datetime.utcnow() - timedelta(seconds=1)
+
+    assert asyncio.run(ledger.get_usage("u1", "messages"))["used"] == 0
+    asyncio.run(ledger.stop())
+    assert stored_usage() == (0, 0)
+
+
+def test_flush_does_not_write_onto_a_reset_made_elsewhere():
+    create_subscription(used=4)
+    ledger = QuotaLedger()
+    asyncio.run(ledger.reserve("u1", "messages", 3))
+
+    # Another worker reset the month; this ledger has not reloaded yet
+    reset_month()
+    asyncio.run(ledger.flush_async())
+
+    assert stored_usage() == (0, 0)
+
+
+def test_subscription_is_read_once_on_the_writer_thread(monkeypatch):
+    create_subscription(messages=10)
+    ledger = QuotaLedger()
+    read = ledger._read
+    read_on = []
+
+    def read_subscription(user_id):
+        read_on.append(threading.current_thread().name)
+        return read(user_id)
+
+    monkeypatch.setattr(ledger, "_read", read_subscription)
+
+    async def concurrent_sends():
+        return await asyncio.gather(*(ledger.reserve("u1", "messages") for _ in range(4)))
+
+    assert asyncio.run(concurrent_sends()) == [1, 1, 1, 1]
+    assert len(read_on) == 1 and read_on[0].startswith("quota-ledger")
+    assert ledger.cached_usage("u1", "messages")["remaining"] == 6
@@ -0,0 +1,160 @@
+"""
+Tests for the send rate limiter: token bucket accounting, daily caps, refunds of
+sends that never went out, and daily counts that survive a restart and are
+loaded off the event loop
+"""
+
+import asyncio
+import threading
+from datetime import datetime
+
+import pytest
+
+import rate_limiter
+from database import connection
+from database.models import Delivery
+from rate_limiter import RateLimitExceeded, SendRateLimiter, TokenBucket
+
+
+@pytest.fixture(autouse=True)
+def database(tmp_path, monkeypatch):
+    """Fresh SQLite database in a temporary directory"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(connection, "engine", None)
+    monkeypatch.setattr(connection, "SessionLocal", None)
+    assert connection.init_database()
+    yield
+    connection.engine.dispose()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A monotonic clock the test moves by hand (bucket tests only; asyncio needs the real one)"""
+    now = [1000.0]
+    monkeypatch.setattr(rate_limiter.time, "monotonic", lambda: now[0])
+    return now
+
+
+def make_limiter(daily_cap=0) -> SendRateLimiter:
+    limiter = SendRateLimiter()
+    limiter.session_rate = limiter.instance_rate = 1000.0
+    limiter.session_burst = limiter.instance_burst = 1000
+    limiter.default_daily_cap = daily_cap
+    return limiter
+
+
+def test_bucket_spends_its_burst_then_spaces_sends(clock):
+    bucket = TokenBucket(rate_per_second=2, burst=2)
+
+    assert [bucket.reserve() for _ in range(4)] == [0.0, 0.0, 0.5, 1.0]
+
+    # One second refills two tokens, both already borrowed
+    clock[0] += 1
+    assert bucket.reserve() == 0.5
+
+
+def test_bucket_cancel_gives_the_token_back(clock):
+    bucket = TokenBucket(rate_per_second=1, burst=1)
+    bucket.reserve()
+    assert bucket.reserve() == 1.0
+
+    bucket.cancel()
+    bucket.cancel()
+
+    assert bucket.reserve() == 0.0
+
+
+def test_acquire_over_max_wait_consumes_nothing():
+    limiter = make_limiter()
+    limiter.session_rate = 0.001
+    limiter.session_burst = 1
+    asyncio.run(limiter.acquire("s1"))
+
+    with pytest.raises(RateLimitExceeded) as error:
+        asyncio.run(limiter.acquire("s1", max_wait=1))
+
+    assert error.value.retry_after >= 900
+    assert limiter.sent_today("s1") == 1
+    assert limiter._session_buckets["s1"].tokens == pytest.approx(0, abs=0.01)
+
+
+def test_daily_cap_stops_sends():
+    limiter = make_limiter(daily_cap=2)
+    asyncio.run(limiter.acquire("s1"))
+    asyncio.run(limiter.acquire("s1"))
+
+    with pytest.raises(RateLimitExceeded):
+        asyncio.run(limiter.acquire("s1"))
+
+    # Other sessions have their own cap
+    asyncio.run(limiter.acquire("s2"))
+    assert limiter.remaining_today("s2") == 1
+
+
+def test_refund_gives_back_a_send_that_did_not_go_out():
+    limiter = make_limiter(daily_cap=2)
+    asyncio.run(limiter.acquire("s1"))
+    asyncio.run(limiter.acquire("s1"))
+
+    limiter.refund("s1")
+
+    assert limiter.remaining_today("s1") == 1
+    asyncio.run(limiter.acquire("s1"))
+
+
+def test_refund_never_goes_below_zero():
+    limiter = make_limiter()
+
+    limiter.refund("s1")
+    asyncio.run(limiter.acquire("s1"))
+    limiter.refund("s1")
+    limiter.refund("s1")
+
+    assert limiter.sent_today("s1") == 0
+
+
+def test_daily_counts_survive_a_restart():
+    # Warmer and API sends leave no delivery records; only the stored count has them
+    limiter = make_limiter()
+    for _ in range(3):
+        asyncio.run(limiter.acquire("s1"))
+    limiter.refund("s1")
+    asyncio.run(limiter.flush_async())
+
+    assert asyncio.run(make_limiter().load_sent_today("s1")) == 2
+
+
+def test_daily_count_includes_unstored_campaign_sends():
+    with connection.get_db() as db:
+        for row in range(1, 5):
+            db.add(Delivery(campaign_id=1, row_number=row, phone_number="15550000000",
+                            status="sent", session_name="s1", sent_at=datetime.utcnow()))
+        db.commit()
+    limiter = make_limiter()
+    asyncio.run(limiter.acquire("s1"))
+    asyncio.run(limiter.flush_async())
+
+    # The stored count (1) is behind the campaign's deliveries (4)
+    assert asyncio.run(make_limiter().load_sent_today("s1")) == 4
+
+
+def test_stored_count_is_loaded_on_the_writer_thread(monkeypatch):
+    limiter = make_limiter(daily_cap=5)
+    loaded_on = []
+
+    def load_sent_today(session, today):
+        loaded_on.append(threading.current_thread().name)
+        return 3
+
+    monkeypatch.setattr(limiter, "_load_sent_today", load_sent_today)
+
+    # Not loaded yet: reads stay in memory
+    assert limiter.sent_today("s1") == 0
+    assert loaded_on == []
+
+    asyncio.run(limiter.acquire("s1"))
+    asyncio.run(limiter.acquire("s1"))
+
+    # Seeded once, off the event loop
+    assert len(loaded_on) == 1 and loaded_on[0].startswith("send-counts")
+    assert limiter.remaining_today("s1") == 0
@@ -0,0 +1,267 @@
+"""
+Tests for the campaign send pipeline: the producer preparing rows ahead of the
+sender through a bounded queue, and the sender sending them in order on one session
+"""
+
+import asyncio
+
+import pytest
+
+from database import connection
+from database.models import Campaign, Delivery
+from jobs import processor
+from jobs.delivery_journal import DeliveryJournal
+from jobs.processor import message_processor
+from rate_limiter import SendRateLimiter
+
+
+@pytest.fixture(autouse=True)
+def database(tmp_path, monkeypatch):
+    """Fresh SQLite database in a temporary directory"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(connection, "engine", None)
+    monkeypatch.setattr(connection, "SessionLocal", None)
+    assert connection.init_database()
+    yield
+    connection.engine.dispose()
+
+
+class FakeWaha:
+    """Records sends; a send can be held on a gate or made to fail"""
+
+    base_url = "http://waha.test"
+
+    def __init__(self):
+        self.sent = []
+        self.fail_rows = set()
+        self.gate = None
+        self.on_send = None
+
+    async def send_text(self, session, chat_id, text):
+        if self.gate:
+            await self.gate.wait()
+        row = int(text.rsplit(" ", 1)[1])
+        if self.on_send:
+            self.on_send(row)
+        if row in self.fail_rows:
+            raise RuntimeError("WAHA refused the message")
+        self.sent.append((session, chat_id, text))
+        return {"id": f"msg-{row}"}
+
+
+@pytest.fixture
+def waha(monkeypatch):
+    fake = FakeWaha()
+    monkeypatch.setattr(message_processor, "waha", fake)
+
+    async def healthy(session_name, campaign_id=None):
+        return True
+
+    monkeypatch.setattr(message_processor, "_check_session_health", healthy)
+    return fake
+
+
+@pytest.fixture
+def journal(monkeypatch):
+    journal = DeliveryJournal(flush_rows=1000)
+    monkeypatch.setattr(processor, "delivery_journal", journal)
+    return journal
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    """A rate limiter that never makes the sender wait"""
+    limiter = SendRateLimiter()
+    limiter.session_rate = limiter.instance_rate = 1000.0
+    limiter.session_burst = limiter.instance_burst = 1000
+    monkeypatch.setattr(processor, "send_rate_limiter", limiter)
+    return limiter
+
+
+def create_campaign() -> dict:
+    with connection.get_db() as db:
+        campaign = Campaign(name="Test", session_name="s1", file_path="contacts.csv", status="running")
+        db.add(campaign)
+        db.commit()
+        campaign_id = campaign.id
+
+    return {
+        "id": campaign_id,
+        "user_id": None,
+        "session_name": "s1",
+        "waha_session_name": "s1",
+        "message_samples": ["Hello {{ name }} {{ row }}"],
+        "use_csv_samples": False,
+        "delay_seconds": 0,
+        "max_daily_messages": None,
+        "save_contact_before_message": False,
+        "fanout_sessions": ["s1"],
+        "skip_rows": set(),
+    }
+
+
+def entries(rows):
+    return [
+        {
+            "row": row,
+            "data": {"name": f"Contact{row}", "row": row},
+            "phone_number": f"1555000{row:04d}",
+            "name": f"Contact{row}",
+            "chat_id": f"1555000{row:04d}@c.us",
+        }
+        for row in rows
+    ]
+
+
+async def run_pipeline(campaign, journal, rows, depth=20):
+    """Run the producer and sender stages like _process_campaign does"""
+    journal.open_cursor(campaign["id"], 0)
+    await message_processor.reconcile_campaign_progress(campaign["id"])
+    queue = asyncio.Queue(maxsize=depth)
+    producer = asyncio.create_task(message_processor._produce_rows(campaign, entries(rows), queue))
+    try:
+        await message_processor._session_sender(campaign, queue)
+    finally:
+        if not producer.done():
+            producer.cancel()
+        try:
+            await producer
+        except asyncio.CancelledError:
+            pass
+        await message_processor._discard_unsent_rows(campaign["id"], queue)
+        await journal.flush_async()
+        journal.close_cursor(campaign["id"])
+        message_processor.stop_flags.pop(campaign["id"], None)
+    return message_processor.progress_counters.pop(campaign["id"])
+
+
+def deliveries(campaign_id: int) -> dict:
+    with connection.get_db() as db:
+        return dict(db.query(Delivery.row_number, Delivery.status).filter(Delivery.campaign_id == campaign_id).all())
+
+
+def test_rows_are_sent_in_order(waha, journal, limiter):
+    campaign = create_campaign()
+
+    counters = asyncio.run(run_pipeline(campaign, journal, range(1, 11)))
+
+    assert [chat_id for _, chat_id, _ in waha.sent] == [f"1555000{row:04d}@c.us" for row in range(1, 11)]
+    assert waha.sent[0] == ("s1", "15550000001@c.us", "Hello Contact1 1")
+    assert deliveries(campaign["id"]) == {row: "sent" for row in range(1, 11)}
+    assert counters == {"processed": 10, "success": 10, "error": 0}
+
+
+def test_producer_runs_ahead_of_the_sender_up_to_the_queue_depth(waha, journal, limiter, monkeypatch):
+    campaign = create_campaign()
+    waha.gate = asyncio.Event()
+    prepared = []
+    prepare = message_processor._prepare_row
+
+    async def prepare_row(campaign, entry):
+        prepared.append(entry["row"])
+        return await prepare(campaign, entry)
+
+    monkeypatch.setattr(message_processor, "_prepare_row", prepare_row)
+
+    async def scenario():
+        pipeline = asyncio.create_task(run_pipeline(campaign, journal, range(1, 11), depth=3))
+        for _ in range(200):
+            await asyncio.sleep(0.001)
+
+        # Row 1 is held in the send; rows 2-4 wait in the queue, row 5 waits to get in
+        assert prepared == [1, 2, 3, 4, 5]
+        assert waha.sent == []
+
+        waha.gate.set()
+        return await pipeline
+
+    counters = asyncio.run(scenario())
+
+    assert prepared == list(range(1, 11))
+    assert len(waha.sent) == 10
+    assert counters["success"] == 10
+
+
+def test_rows_the_producer_cannot_render_do_not_stop_the_sender(waha, journal, limiter, monkeypatch):
+    campaign = create_campaign()
+    render = message_processor._generate_message_content
+
+    async def generate(campaign, row_data):
+        if row_data["row"] == 2:
+            return {"success": False, "error": "Template error", "sample_index": None, "sample_text": None, "final_message": None}
+        return await render(campaign, row_data)
+
+    monkeypatch.setattr(message_processor, "_generate_message_content", generate)
+
+    counters = asyncio.run(run_pipeline(campaign, journal, range(1, 4)))
+
+    assert len(waha.sent) == 2
+    assert deliveries(campaign["id"]) == {1: "sent", 2: "failed", 3: "sent"}
+    assert counters == {"processed": 3, "success": 2, "error": 1}
+
+
+def test_failed_sends_are_recorded(waha, journal, limiter):
+    campaign = create_campaign()
+    waha.fail_rows = {2, 4}
+
+    counters = asyncio.run(run_pipeline(campaign, journal, range(1, 6)))
+
+    assert counters == {"processed": 5, "success": 3, "error": 2}
+    assert deliveries(campaign["id"]) == {1: "sent", 2: "failed", 3: "sent", 4: "failed", 5: "sent"}
+
+
+def test_stopped_campaign_sends_nothing_more(waha, journal, limiter):
+    campaign = create_campaign()
+    waha.on_send = lambda row: message_processor.stop_flags.__setitem__(campaign["id"], row == 3)
+
+    asyncio.run(run_pipeline(campaign, journal, range(1, 11)))
+
+    assert len(waha.sent) == 3
+    # Rows prepared after the stop are dropped, so a restart picks them up again
+    assert deliveries(campaign["id"]) == {1: "sent", 2: "sent", 3: "sent"}
+
+
+def test_failed_sends_are_refunded(waha, journal, limiter):
+    campaign = create_campaign()
+    waha.fail_rows = {2, 4}
+
+    counters = asyncio.run(run_pipeline(campaign, journal, range(1, 6)))
+
+    assert counters == {"processed": 5, "success": 3, "error": 2}
+    # Only sends that went out count against the session's daily cap
+    assert limiter.sent_today("s1") == 3
+
+
+def test_row_dropped_after_acquire_is_refunded(waha, journal, limiter):
+    campaign = create_campaign()
+    waha.on_send = lambda row: message_processor.stop_flags.__setitem__(campaign["id"], row == 2)
+
+    asyncio.run(run_pipeline(campaign, journal, range(1, 6)))
+
+    # Row 3 drew from the limiter before the sender saw the stop
+    assert len(waha.sent) == 2
+    assert limiter.sent_today("s1") == 2
+
+
+def test_producer_failure_pauses_the_campaign_with_its_cursor(waha, journal, limiter, monkeypatch):
+    campaign = create_campaign()
+    campaign.update({"first_row": 1, "resume_row": 1, "total_rows": 5, "end_row": None})
+
+    def rows_then_read_error():
+        yield from entries([1, 2])
+        raise OSError("plan file truncated")
+
+    async def load_campaign_data(campaign_id, cursor):
+        return {"campaign": campaign, "file_data": rows_then_read_error(), "plan": {"rows": 5, "accepted": 5}}
+
+    monkeypatch.setattr(message_processor, "_load_campaign_data", load_campaign_data)
+    monkeypatch.setattr(message_processor.plan_compiler, "rejected_rows", lambda *args: [])
+
+    asyncio.run(message_processor._process_campaign(campaign["id"]))
+
+    assert deliveries(campaign["id"]) == {1: "sent", 2: "sent"}
+    with connection.get_db() as db:
+        stored = db.query(Campaign).filter(Campaign.id == campaign["id"]).one()
+        assert stored.status == "paused"
+        assert "plan file truncated" in stored.error_details
+        assert stored.cursor_row == 2
@@ -0,0 +1,211 @@
+"""
+Tests for the session directory cache: snapshots served from memory within their
+TTL, conditional requests answered with 304 on a matching ETag, and WAHA webhooks
+forcing the next lookup to fetch again
+"""
+
+import asyncio
+import hashlib
+import hmac
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import session_directory_cache as directory_module
+from database import connection
+import waha_webhooks
+from session_directory_cache import SessionDirectoryCache
+
+
+class FakeWaha:
+    """Stands in for WAHA's listings; counts fetches per (session, kind)"""
+
+    def __init__(self):
+        self.listings = {"contacts": [{"id": "1@c.us"}], "groups": [{"id": "g1@g.us"}], "chats": [{"id": "1@c.us"}]}
+        self.fetches = []
+
+    async def fetch(self, kind, session, base_url):
+        self.fetches.append((session, kind))
+        return list(self.listings[kind])
+
+
+@pytest.fixture
+def waha():
+    return FakeWaha()
+
+
+@pytest.fixture
+def cache(waha, monkeypatch):
+    cache = SessionDirectoryCache(ttl_seconds=60)
+    monkeypatch.setattr(cache, "_fetch", waha.fetch)
+    return cache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A monotonic clock the test moves by hand"""
+    now = [1000.0]
+    monkeypatch.setattr(directory_module.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_snapshot_is_served_from_memory_within_its_ttl(cache, waha, clock):
+    first = asyncio.run(cache.get_snapshot("groups", "s1"))
+    clock[0] += 59
+    second = asyncio.run(cache.get_snapshot("groups", "s1"))
+
+    assert second is first
+    assert waha.fetches == [("s1", "groups")]
+
+
+def test_snapshot_expires_after_its_ttl(cache, waha, clock):
+    asyncio.run(cache.get_groups("s1"))
+    waha.listings["groups"].append({"id": "g2@g.us"})
+
+    clock[0] += 61
+    groups = asyncio.run(cache.get_groups("s1"))
+
+    assert [group["id"] for group in groups] == ["g1@g.us", "g2@g.us"]
+    assert waha.fetches == [("s1", "groups"), ("s1", "groups")]
+
+
+def test_etag_changes_only_with_the_listing(cache, waha):
+    first = asyncio.run(cache.get_snapshot("contacts", "s1"))
+    same = asyncio.run(cache.get_snapshot("contacts", "s1", refresh=True))
+    waha.listings["contacts"].append({"id": "2@c.us"})
+    changed = asyncio.run(cache.get_snapshot("contacts", "s1", refresh=True))
+
+    assert same["etag"] == first["etag"]
+    assert changed["etag"] != first["etag"]
+
+
+def test_webhook_invalidates_only_the_snapshots_it_changes(cache, waha):
+    for kind in ("contacts", "groups", "chats"):
+        asyncio.run(cache.get_snapshot(kind, "s1"))
+    asyncio.run(cache.get_snapshot("groups", "s2"))
+
+    assert cache.apply_webhook({"event": "group.v2.join", "session": "s1"})
+    for kind in ("contacts", "groups", "chats"):
+        asyncio.run(cache.get_snapshot(kind, "s1"))
+    asyncio.run(cache.get_snapshot("groups", "s2"))
+
+    # Groups and chats of s1 were fetched again; contacts and the other session were not
+    assert waha.fetches[4:] == [("s1", "groups"), ("s1", "chats")]
+
+
+def test_invalidate_drops_the_snapshot(cache):
+    asyncio.run(cache.get_snapshot("groups", "s1"))
+    asyncio.run(cache.get_snapshot("groups", "s2"))
+
+    cache.invalidate("s1")
+
+    assert [key[1:] for key in cache._snapshots] == [("s2", "groups")]
+    assert not any(key[1] == "s1" for key in cache._generations)
+    assert not any(key[1] == "s1" for key in cache._locks)
+
+
+def test_invalidation_during_a_fetch_is_not_lost(cache, waha):
+    fetch = waha.fetch
+
+    async def invalidated_mid_fetch(kind, session, base_url):
+        data = await fetch(kind, session, base_url)
+        cache.invalidate(session, (kind,))
+        return data
+
+    cache._fetch = invalidated_mid_fetch
+    asyncio.run(cache.get_snapshot("groups", "s1"))
+    cache._fetch = fetch
+    asyncio.run(cache.get_snapshot("groups", "s1"))
+
+    assert waha.fetches == [("s1", "groups"), ("s1", "groups")]
+
+
+def test_expired_snapshots_are_evicted(cache, clock):
+    asyncio.run(cache.get_snapshot("groups", "s1"))
+    clock[0] += 61
+    asyncio.run(cache.get_snapshot("groups", "s2"))
+
+    assert [key[1:] for key in cache._snapshots] == [("s2", "groups")]
+
+
+def test_least_recently_used_snapshot_is_evicted_over_the_cap(cache, waha):
+    cache.max_snapshots = 2
+    asyncio.run(cache.get_snapshot("groups", "s1"))
+    asyncio.run(cache.get_snapshot("groups", "s2"))
+    asyncio.run(cache.get_snapshot("groups", "s1"))
+    asyncio.run(cache.get_snapshot("groups", "s3"))
+
+    assert [key[1:] for key in cache._snapshots] == [("s1", "groups"), ("s3", "groups")]
+    assert set(cache._locks) == set(cache._snapshots)
+
+
+def test_unrelated_webhooks_are_ignored(cache):
+    assert not cache.apply_webhook({"event": "message", "session": "s1"})
+    assert not cache.apply_webhook({"event": "group.join"})
+
+
+# ==================== API ====================
+
+@pytest.fixture
+def main(tmp_path, monkeypatch):
+    """The API module on a database under tmp_path (importing it opens the database)"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(connection, "DATABASE_PATH", str(tmp_path / "data" / "wagent.db"))
+    monkeypatch.setattr(connection, "engine", None)
+    monkeypatch.setattr(connection, "SessionLocal", None)
+    import main
+    if connection.engine is None:
+        # Already imported by an earlier test
+        assert connection.init_database()
+    yield main
+    connection.engine.dispose()
+
+
+@pytest.fixture
+def client(main, waha, monkeypatch):
+    cache = SessionDirectoryCache(ttl_seconds=60)
+    monkeypatch.setattr(cache, "_fetch", waha.fetch)
+    monkeypatch.setattr(main, "session_directory_cache", cache)
+    monkeypatch.setattr(waha_webhooks, "WAHA_WEBHOOK_SECRET", "secret")
+    return TestClient(main.app)
+
+
+def post_webhook(client, event):
+    body = json.dumps(event).encode()
+    signature = hmac.new(b"secret", body, hashlib.sha512).hexdigest()
+    return client.post("/api/webhooks/waha", content=body, headers={waha_webhooks.SIGNATURE_HEADER: signature})
+
+
+def test_matching_etag_gets_304_from_the_cached_snapshot(client, waha):
+    first = client.get("/api/chats/s1")
+    assert first.status_code == 200
+    assert first.json()["data"] == [{"id": "1@c.us"}]
+
+    cached = client.get("/api/chats/s1", headers={"If-None-Match": first.headers["etag"]})
+
+    assert cached.status_code == 304
+    assert cached.headers["etag"] == first.headers["etag"]
+    assert waha.fetches == [("s1", "chats")]
+
+
+def test_webhook_forces_a_refetch(client, waha):
+    etag = client.get("/api/chats/s1").headers["etag"]
+    waha.listings["chats"].append({"id": "g1@g.us"})
+
+    assert post_webhook(client, {"event": "group.v2.join", "session": "s1"}).json()["applied"]
+    refetched = client.get("/api/chats/s1", headers={"If-None-Match": etag})
+
+    assert refetched.status_code == 200
+    assert refetched.headers["etag"] != etag
+    assert len(refetched.json()["data"]) == 2
+    assert waha.fetches == [("s1", "chats"), ("s1", "chats")]
+
+
+def test_unsigned_webhook_leaves_the_snapshot_alone(client, waha):
+    etag = client.get("/api/chats/s1").headers["etag"]
+
+    response = client.post("/api/webhooks/waha", content=json.dumps({"event": "group.v2.join", "session": "s1"}))
+
+    assert response.status_code == 401
+    assert client.get("/api/chats/s1", headers={"If-None-Match": etag}).status_code == 304
@@ -0,0 +1,157 @@
+"""
+Tests for multi-session fan-out: weighted session picking, rows handed back by
+sessions that go down or run out of quota, and rebalancing onto the others
+"""
+
+import asyncio
+
+import pytest
+
+from jobs import session_fanout
+from jobs.session_fanout import SessionFanout
+from rate_limiter import RateLimitExceeded
+
+
+class FakeSessions:
+    """Stands in for the rate limiter's daily quota and the session health cache"""
+
+    def __init__(self, remaining: dict):
+        self.remaining = dict(remaining)
+        self.down = set()
+
+    def remaining_today(self, session, daily_cap=None):
+        return self.remaining[session]
+
+    async def load_sent_today(self, session):
+        return 0
+
+    async def is_working(self, session, base_url=None):
+        return session not in self.down
+
+
+@pytest.fixture
+def sessions(monkeypatch):
+    fake = FakeSessions({"a": 100, "b": 100, "c": 100})
+    monkeypatch.setattr(session_fanout.send_rate_limiter, "remaining_today", fake.remaining_today)
+    monkeypatch.setattr(session_fanout.send_rate_limiter, "load_sent_today", fake.load_sent_today)
+    monkeypatch.setattr(session_fanout.session_health_cache, "is_working", fake.is_working)
+    return fake
+
+
+def make_fanout(names):
+    fanout = SessionFanout({"id": 1, "max_daily_messages": 100}, names)
+    fanout.recheck_interval = 0.01
+    fanout.unavailable_timeout = 0.05
+    return fanout
+
+
+async def run_campaign(fanout, rows, before_send=None):
+    """Dispatch rows and run one sender per lane like the processor does; returns session -> rows sent"""
+    queue = asyncio.Queue()
+    for row in rows:
+        queue.put_nowait({"row_number": row})
+    queue.put_nowait(None)
+    sent = {session: [] for session in fanout.sessions}
+
+    async def sender(session):
+        while True:
+            prepared = await fanout.lanes[session].get()
+            if prepared is None:
+                return
+            fanout.start_row(session)
+            if before_send:
+                before_send(session, prepared["row_number"])
+            if not await fanout.is_available(session):
+                fanout.hand_back(session, prepared)
+                continue
+            sent[session].append(prepared["row_number"])
+            fanout.finish_row(session)
+            await asyncio.sleep(0)
+
+    await asyncio.gather(fanout.dispatch(queue), *[sender(session) for session in fanout.sessions])
+    return sent
+
+
+def all_rows(sent):
+    return sorted(row for rows in sent.values() for row in rows)
+
+
+def test_pick_follows_remaining_quota(sessions):
+    sessions.remaining.update({"a": 30, "b": 10})
+    fanout = make_fanout(["a", "b"])
+
+    picks = [fanout._pick(["a", "b"]) for _ in range(8)]
+
+    assert picks.count("a") == 6
+    assert picks.count("b") == 2
+    # Smooth: the lighter session is not starved until the end
+    assert "b" in picks[:4]
+
+
+def test_duplicate_sessions_get_one_lane(sessions):
+    fanout = make_fanout(["a", "b", "a"])
+
+    assert fanout.sessions == ["a", "b"]
+
+
+def test_rows_are_spread_over_sessions(sessions):
+    fanout = make_fanout(["a", "b", "c"])
+
+    sent = asyncio.run(run_campaign(fanout, range(1, 31)))
+
+    assert all_rows(sent) == list(range(1, 31))
+    assert all(len(rows) == 10 for rows in sent.values())
+
+
+def test_session_without_quota_is_skipped(sessions):
+    sessions.remaining["b"] = 0
+    fanout = make_fanout(["a", "b"])
+
+    sent = asyncio.run(run_campaign(fanout, range(1, 11)))
+
+    assert sent == {"a": list(range(1, 11)), "b": []}
+
+
+def test_rows_of_a_session_that_goes_down_are_rebalanced(sessions):
+    fanout = make_fanout(["a", "b", "c"])
+
+    def before_send(session, row):
+        # The session that gets row 5 first drops out while it holds it
+        if row == 5 and not sessions.down:
+            sessions.down.add(session)
+
+    sent = asyncio.run(run_campaign(fanout, range(1, 21), before_send))
+
+    # Every row is sent exactly once, and the session that left WORKING sends nothing more
+    assert all_rows(sent) == list(range(1, 21))
+    down = next(iter(sessions.down))
+    assert 5 not in sent[down]
+    assert all(row < 5 for row in sent[down])
+    assert down not in fanout.available
+
+
+def test_dispatch_fails_when_every_session_is_out_of_quota(sessions):
+    sessions.remaining.update({"a": 0, "b": 0})
+    fanout = make_fanout(["a", "b"])
+    queue = asyncio.Queue()
+    queue.put_nowait({"row_number": 1})
+
+    with pytest.raises(RateLimitExceeded):
+        asyncio.run(fanout.dispatch(queue))
+
+    # The row is kept for the caller to discard, and every lane is ended
+    assert [prepared["row_number"] for prepared in fanout.drain()] == [1]
+    assert fanout.finished
+
+
+def test_dispatch_gives_up_when_no_session_comes_back(sessions):
+    sessions.down.update({"a", "b"})
+    fanout = make_fanout(["a", "b"])
+    fanout.available.clear()
+    queue = asyncio.Queue()
+    queue.put_nowait({"row_number": 7})
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(fanout.dispatch(queue))
+
+    assert [prepared["row_number"] for prepared in fanout.drain()] == [7]
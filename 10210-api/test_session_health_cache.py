@@ -0,0 +1,133 @@
+"""
+Tests for the session health cache: concurrent lookups share one WAHA listing,
+listings are reused within the poll interval, a failed refresh keeps the last
+known statuses, and session.status webhooks update the cached entry in place
+"""
+
+import asyncio
+
+import pytest
+
+import session_health_cache as health_module
+from session_health_cache import SessionHealthCache
+
+
+class FakeWaha:
+    """Stands in for WAHA's /api/sessions per base URL; counts listings"""
+
+    def __init__(self):
+        self.sessions = {"http://waha-1": [{"name": "s1", "status": "WORKING"}, {"name": "s2", "status": "STOPPED"}],
+                         "http://waha-2": [{"name": "s1", "status": "SCAN_QR_CODE"}]}
+        self.listings = []
+        self.failing = False
+
+    def client(self, base_url):
+        waha = self
+
+        class Client:
+            async def get_sessions(self):
+                waha.listings.append(base_url)
+                await asyncio.sleep(0)  # yield only; some tests freeze the monotonic clock
+                if waha.failing:
+                    raise ConnectionError("WAHA unavailable")
+                return [dict(session) for session in waha.sessions[base_url]]
+
+        return Client()
+
+
+@pytest.fixture
+def waha(monkeypatch):
+    waha = FakeWaha()
+    monkeypatch.setattr(health_module, "get_async_waha_client", waha.client)
+    return waha
+
+
+@pytest.fixture
+def cache():
+    cache = SessionHealthCache(poll_interval=60)
+    cache.default_base_url = "http://waha-1"
+    return cache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A monotonic clock the test moves by hand"""
+    now = [1000.0]
+    monkeypatch.setattr(health_module.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_concurrent_lookups_share_one_listing(cache, waha):
+    async def scenario():
+        return await asyncio.gather(*(cache.get_status(name) for name in ("s1", "s2", "s1", "missing") * 5))
+
+    statuses = asyncio.run(scenario())
+
+    assert statuses[:4] == ["WORKING", "STOPPED", "WORKING", None]
+    assert waha.listings == ["http://waha-1"]
+
+
+def test_listing_is_reused_within_the_poll_interval(cache, waha, clock):
+    asyncio.run(cache.is_working("s1"))
+    clock[0] += 59
+    asyncio.run(cache.is_working("s2"))
+    assert waha.listings == ["http://waha-1"]
+
+    clock[0] += 2
+    waha.sessions["http://waha-1"][0]["status"] = "FAILED"
+
+    assert not asyncio.run(cache.is_working("s1"))
+    assert waha.listings == ["http://waha-1", "http://waha-1"]
+
+
+def test_instances_are_cached_separately(cache, waha):
+    assert asyncio.run(cache.get_status("s1")) == "WORKING"
+    assert asyncio.run(cache.get_status("s1", "http://waha-2/")) == "SCAN_QR_CODE"
+    assert waha.listings == ["http://waha-1", "http://waha-2"]
+
+
+def test_failed_refresh_keeps_the_last_known_statuses(cache, waha):
+    asyncio.run(cache.get_status("s1"))
+    cache.invalidate()
+    waha.failing = True
+
+    assert not asyncio.run(cache.refresh())
+    assert asyncio.run(cache.get_status("s1")) == "WORKING"
+    # Still stale, so the next lookup tries again
+    assert len(waha.listings) == 3
+
+
+def test_webhook_updates_the_cached_status(cache, waha):
+    asyncio.run(cache.get_status("s1"))
+
+    assert cache.apply_webhook({"event": "session.status", "session": "s1", "payload": {"status": "FAILED"}})
+    assert cache.apply_webhook({"event": "session.status", "session": "s3", "payload": {"status": "STARTING"}})
+
+    assert asyncio.run(cache.get_status("s1")) == "FAILED"
+    assert cache.peek_session("s3") == {"name": "s3", "status": "STARTING"}
+    assert cache.peek_session("s1", "http://waha-2") is None
+    assert waha.listings == ["http://waha-1"]
+
+
+@pytest.mark.parametrize("event", [
+    {"event": "message", "session": "s1", "payload": {"status": "FAILED"}},
+    {"event": "session.status", "payload": {"status": "FAILED"}},
+    {"event": "session.status", "session": "s1", "payload": {}},
+])
+def test_unusable_webhooks_are_ignored(cache, event):
+    assert not cache.apply_webhook(event)
+    assert cache.peek_session("s1") is None
+
+
+def test_poller_refreshes_known_instances(cache, waha):
+    async def scenario():
+        await cache.get_status("s1", "http://waha-2")
+        cache.poll_interval = 0.01
+        cache.start()
+        await asyncio.sleep(0.1)
+        await cache.stop()
+
+    asyncio.run(scenario())
+
+    assert waha.listings.count("http://waha-2") > 2
+    assert cache._poll_task is None
@@ -0,0 +1,86 @@
+"""
+Tests for the compiled template cache: the simple-placeholder fast path renders
+exactly as Jinja does, Jinja literals and globals stay on the Jinja path,
+templates are compiled once and evicted least recently used first, and an
+edited template never renders from its old compiled form
+"""
+
+import pytest
+from jinja2 import Environment, BaseLoader
+
+from utils.templates import MessageTemplateEngine
+
+ROW = {"name": "Ada", "city": "Lagos", "amount": 12.5, "count": 0, "empty": ""}
+
+
+def jinja_render(template, variables):
+    return Environment(loader=BaseLoader()).from_string(template).render(**variables).strip()
+
+
+@pytest.fixture
+def engine():
+    return MessageTemplateEngine(cache_size=3)
+
+
+@pytest.mark.parametrize("template", [
+    "Hello {{ name }}!",
+    "{{name}} from {{ city }} owes {{amount}}",
+    "  Count: {{ count }} {{ empty }}  ",
+    "Hi {{ missing }}, plain text",
+    "No placeholders at all",
+    "{ name } and {{ name }}",
+])
+def test_fast_path_renders_like_jinja(engine, template):
+    assert engine._compile(template)[0] == "simple"
+    assert engine.render_template(template, ROW) == jinja_render(template, ROW)
+
+
+@pytest.mark.parametrize("template", [
+    "{{ true }} {{ none }}",
+    "{{ range }}",
+    "{% if name %}Hi {{ name }}{% endif %}",
+    "{{ name | upper }}",
+    "{# note #}{{ name }}",
+])
+def test_jinja_features_use_jinja(engine, template):
+    assert engine._compile(template)[0] == "jinja"
+    assert engine.render_template(template, ROW) == jinja_render(template, ROW)
+
+
+def test_templates_are_compiled_once(engine):
+    for _ in range(5):
+        engine.render_template("Hello {{ name }}", ROW)
+
+    stats = engine.get_cache_stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (4, 1, 1)
+    assert stats["hit_rate"] == 80.0
+
+
+def test_least_recently_used_template_is_evicted(engine):
+    for template in ("a {{ name }}", "b {{ name }}", "c {{ name }}"):
+        engine.render_template(template, ROW)
+    engine.render_template("a {{ name }}", ROW)
+    engine.render_template("d {{ name }}", ROW)
+
+    assert list(engine._compiled) == ["c {{ name }}", "a {{ name }}", "d {{ name }}"]
+
+
+def test_edited_template_renders_its_new_text(engine):
+    assert engine.render_template("Hello {{ name }}", ROW) == "Hello Ada"
+    assert engine.render_template("Hello {{ name }} from {{ city }}", ROW) == "Hello Ada from Lagos"
+    assert engine.render_template("{% if city %}In {{ city }}{% endif %}", ROW) == "In Lagos"
+
+
+def test_precompile_fills_the_cache_and_skips_broken_templates(engine):
+    engine.precompile(["Hello {{ name }}", "{% if %}", "{{ name | upper }}"])
+
+    assert engine.get_cache_stats()["size"] == 2
+    engine.render_template("Hello {{ name }}", ROW)
+    assert engine.get_cache_stats()["hits"] == 1
+
+
+@pytest.mark.parametrize("template", ["{% if %}", "{{{ name }}}"])
+def test_broken_template_raises_value_error(engine, template):
+    # Triple braces are a Jinja syntax error, so the fast path must not render them
+    with pytest.raises(ValueError):
+        engine.render_template(template, ROW)
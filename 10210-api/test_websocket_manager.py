@@ -0,0 +1,210 @@
+"""
+Tests for WebSocket updates: coalesced campaign progress deltas without recipient
+data, authenticated connections that only see their own user's campaigns, and
+snapshots sent only to the connection that asked
+"""
+
+import asyncio
+import sys
+import types
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from database import connection
+from database.models import Campaign
+from jobs import processor
+from jobs.models import DeliveryStatus
+from jobs.processor import message_processor
+from websocket_manager import CampaignProgressHub, campaign_progress, websocket_endpoint
+
+
+class FakeConnections:
+    """Records what the hub publishes"""
+
+    def __init__(self):
+        self.published = []
+
+    def publish(self, topic, key, payload):
+        self.published.append(payload)
+
+
+def run_hub(scenario, max_per_second=20):
+    """Run scenario(hub) on an event loop and return the published messages"""
+    connections = FakeConnections()
+
+    async def run():
+        await scenario(CampaignProgressHub(connections, max_per_second=max_per_second, recent_rows=3))
+
+    asyncio.run(run())
+    return connections.published
+
+
+def test_burst_of_updates_is_coalesced_into_one_delta():
+    async def scenario(hub):
+        for row in range(1, 11):
+            hub.publish(1, {"processed": row, "success": row, "status": "running"}, row={"row": row, "status": "sent"})
+        await asyncio.sleep(0.01)
+
+    [message] = run_hub(scenario)
+
+    assert message["seq"] == 1
+    assert message["delta"] == {"processed": 10, "success": 10, "status": "running"}
+    # Only the most recent rows are carried
+    assert [row["row"] for row in message["rows"]] == [8, 9, 10]
+
+
+def test_deltas_carry_only_changed_fields_in_order():
+    async def scenario(hub):
+        hub.publish(1, {"processed": 1, "success": 1, "error": 0})
+        await asyncio.sleep(0.01)
+        hub.publish(1, {"processed": 2, "success": 1, "error": 1})
+        await asyncio.sleep(0.1)
+        hub.publish(1, {"processed": 2, "success": 1, "error": 1})
+        await asyncio.sleep(0.1)
+
+    messages = run_hub(scenario)
+
+    # The unchanged third update sends nothing
+    assert [message["seq"] for message in messages] == [1, 2]
+    assert messages[1]["delta"] == {"processed": 2, "error": 1}
+
+
+def test_updates_are_rate_limited():
+    async def scenario(hub):
+        hub.publish(1, {"processed": 1})
+        await asyncio.sleep(0.01)
+        hub.publish(1, {"processed": 2})
+        await asyncio.sleep(0.05)
+        # Still within the interval since the first delta
+        assert len(hub.connections.published) == 1
+        await asyncio.sleep(0.3)
+
+    messages = run_hub(scenario, max_per_second=4)
+
+    assert [message["delta"] for message in messages] == [{"processed": 1}, {"processed": 2}]
+
+
+def test_close_sends_what_is_pending():
+    async def scenario(hub):
+        hub.publish(1, {"processed": 1})
+        await asyncio.sleep(0.01)
+        hub.publish(1, {"processed": 2, "status": "completed"})
+        hub.close(1)
+        assert hub.snapshot(1) is None
+
+    messages = run_hub(scenario, max_per_second=1)
+
+    assert messages[-1]["delta"] == {"processed": 2, "status": "completed"}
+
+
+def test_progress_rows_carry_no_recipient_data(monkeypatch):
+    published = []
+    monkeypatch.setattr(processor.campaign_progress, "publish", lambda campaign_id, fields, row=None: published.append(row))
+    monkeypatch.setattr(processor, "delivery_journal", types.SimpleNamespace(update_status=lambda *args: None))
+    monkeypatch.setitem(message_processor.progress_counters, 7, {"processed": 0, "success": 0, "error": 0})
+    delivery = {"values": {"campaign_id": 7, "row_number": 12, "phone_number": "15550000012", "recipient_name": "Ann"}}
+
+    asyncio.run(message_processor._update_delivery_status(delivery, DeliveryStatus.FAILED, "15550000012 is not on WhatsApp"))
+
+    assert published == [{"row": 12, "status": "failed"}]
+
+
+# ==================== ENDPOINT ====================
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """Fresh SQLite database in a temporary directory"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(connection, "engine", None)
+    monkeypatch.setattr(connection, "SessionLocal", None)
+    assert connection.init_database()
+    yield
+    connection.engine.dispose()
+
+
+@pytest.fixture
+def sessions(monkeypatch):
+    """Session tokens accepted at the handshake: token -> user id"""
+    tokens = {"token-u1": "u1", "token-u2": "u2"}
+
+    def validate_session(token):
+        return {"valid": token in tokens, "user_id": tokens.get(token)}
+
+    module = types.ModuleType("auth.session_manager")
+    module.session_manager = types.SimpleNamespace(validate_session=validate_session)
+    monkeypatch.setitem(sys.modules, "auth.session_manager", module)
+    return tokens
+
+
+@pytest.fixture
+def client(database, sessions):
+    app = FastAPI()
+    app.add_api_websocket_route("/ws", websocket_endpoint)
+    return TestClient(app)
+
+
+@pytest.fixture
+def campaign_id(database):
+    with connection.get_db() as db:
+        campaign = Campaign(name="Test", session_name="s1", file_path="contacts.csv", status="running", user_id="u1")
+        db.add(campaign)
+        db.commit()
+        campaign_id = campaign.id
+    yield campaign_id
+    campaign_progress._channels.pop(campaign_id, None)
+
+
+def connect(client, token):
+    return client.websocket_connect(f"/ws?token={token}")
+
+
+def welcomed(websocket):
+    assert websocket.receive_json()["type"] == "connected"
+    return websocket
+
+
+def test_handshake_without_a_valid_token_is_rejected(client):
+    for url in ("/ws", "/ws?token=forged"):
+        with pytest.raises(WebSocketDisconnect) as error:
+            with client.websocket_connect(url) as websocket:
+                websocket.receive_json()
+        assert error.value.code == 1008
+
+
+def test_bearer_header_is_accepted(client):
+    with client.websocket_connect("/ws", headers={"Authorization": "Bearer token-u2"}) as websocket:
+        assert websocket.receive_json()["type"] == "connected"
+
+
+def test_other_users_campaign_cannot_be_subscribed(client, campaign_id):
+    with connect(client, "token-u2") as websocket:
+        welcomed(websocket)
+        websocket.send_json({"action": "subscribe", "campaign_id": campaign_id})
+        assert websocket.receive_json() == {"type": "error", "action": "subscribe", "key": campaign_id, "message": "Not found"}
+
+        websocket.send_json({"action": "get_status"})
+        assert websocket.receive_json()["subscribed_campaigns"] == []
+
+
+def test_snapshot_goes_only_to_the_connection_that_asked(client, campaign_id):
+    # The campaign runs on this worker and has progress to report
+    campaign_progress.publish(campaign_id, {"processed": 3, "success": 3})
+    with connect(client, "token-u1") as first, connect(client, "token-u1") as second:
+        welcomed(first)
+        welcomed(second)
+        first.send_json({"action": "subscribe", "campaign_id": campaign_id})
+        assert first.receive_json()["type"] == "subscribed"
+        snapshot = first.receive_json()
+        assert snapshot["type"] == "campaign_snapshot"
+        assert snapshot["data"] == {"processed": 3, "success": 3}
+
+        second.send_json({"action": "subscribe", "campaign_id": campaign_id})
+        assert second.receive_json()["type"] == "subscribed"
+        assert second.receive_json()["type"] == "campaign_snapshot"
+
+        # The first connection gets no copy of the second one's snapshot
+        first.send_json({"action": "ping"})
+        assert first.receive_json() == {"type": "pong"}
@@ -0,0 +1,267 @@
+"""
+Export Writers - row-by-row writers for the 16-column contact/participant exports
+CSV, NDJSON and JSON are written one record at a time and Excel goes through an
+openpyxl write-only workbook, so an export never holds a formatted copy of every
+row in memory. The same writers can feed a StreamingResponse
+"""
+
+import csv
+import io
+import json
+import logging
+import os
+import tempfile
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment
+from openpyxl.utils import get_column_letter
+
+logger = logging.getLogger(__name__)
+
+# Same 16 columns as the campaign processor expects
+EXPORT_COLUMNS = [
+    'phone_number', 'formatted_phone', 'country_code', 'country_name',
+    'saved_name', 'public_name', 'is_my_contact', 'is_business',
+    'is_blocked', 'is_admin', 'is_super_admin', 'labels',
+    'last_msg_text', 'last_msg_date', 'last_msg_type', 'last_msg_status'
+]
+
+BOOLEAN_COLUMNS = {'is_my_contact', 'is_business', 'is_blocked', 'is_admin', 'is_super_admin'}
+
+# Fixed Excel column widths (replaces scanning every cell for the longest value)
+EXCEL_COLUMN_WIDTHS = {
+    'phone_number': 18, 'formatted_phone': 18, 'country_code': 14, 'country_name': 22,
+    'saved_name': 28, 'public_name': 28, 'is_my_contact': 15, 'is_business': 13,
+    'is_blocked': 12, 'is_admin': 10, 'is_super_admin': 16, 'labels': 24,
+    'last_msg_text': 50, 'last_msg_date': 21, 'last_msg_type': 15, 'last_msg_status': 17
+}
+
+# format -> (file extension, media type)
+EXPORT_FORMATS = {
+    "json": ("json", "application/json"),
+    "csv": ("csv", "text/csv; charset=utf-8"),
+    "ndjson": ("ndjson", "application/x-ndjson"),
+    "excel": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+# Styles are built once and shared by every cell that uses them
+HEADER_FONT = Font(bold=True, color="FFFFFF")
+HEADER_FILL = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+HEADER_ALIGNMENT = Alignment(horizontal="center", vertical="center")
+STRIPE_FILL = PatternFill(start_color="F2F2F2", end_color="F2F2F2", fill_type="solid")
+
+STREAM_CHUNK_ROWS = int(os.getenv("EXPORT_STREAM_CHUNK_ROWS", "500"))
+
+
+def normalize_formats(formats: Optional[Iterable[str]]) -> List[str]:
+    """Validate requested export formats (default: json, excel and csv)"""
+    if not formats:
+        return ["json", "excel", "csv"]
+    normalized = []
+    for fmt in formats:
+        fmt = fmt.lower().strip()
+        if fmt == "xlsx":
+            fmt = "excel"
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unsupported export format: {fmt}")
+        if fmt not in normalized:
+            normalized.append(fmt)
+    return normalized
+
+
+# ==================== ROW FORMATTING ====================
+
+def csv_row(record: Dict[str, Any]) -> Dict[str, str]:
+    """Record as a CSV row - compatible with the campaign processor"""
+    country_code = str(record.get('country_code') or '')
+    row = {column: record.get(column, '') for column in EXPORT_COLUMNS}
+    # Use formatted_phone which has the + prefix
+    row['phone_number'] = record.get('formatted_phone', '')
+    row['country_code'] = country_code if not country_code or country_code.startswith('+') else f"+{country_code}"
+    for column in BOOLEAN_COLUMNS:
+        row[column] = 'true' if record.get(column) else 'false'
+    return row
+
+
+def excel_values(record: Dict[str, Any]) -> List[Any]:
+    """Record as an Excel row (Yes/No for flags)"""
+    return [
+        ('Yes' if record.get(column) else 'No') if column in BOOLEAN_COLUMNS else record.get(column, '')
+        for column in EXPORT_COLUMNS
+    ]
+
+
+# ==================== FILE WRITERS ====================
+
+def write_csv(records: Iterable[Dict[str, Any]], path: str) -> int:
+    """Write records to CSV one row at a time. Returns the row count"""
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8-sig') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=EXPORT_COLUMNS)
+        writer.writeheader()
+        for record in records:
+            writer.writerow(csv_row(record))
+            count += 1
+    logger.info(f"Exported to CSV: {path}")
+    return count
+
+
+def write_ndjson(records: Iterable[Dict[str, Any]], path: str) -> int:
+    """Write one JSON record per line. Returns the row count"""
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            count += 1
+    logger.info(f"Exported to NDJSON: {path}")
+    return count
+
+
+def write_json(records: Iterable[Dict[str, Any]], path: str, header: Dict[str, Any], list_key: str) -> int:
+    """Write {header..., list_key: [records]} without building the document in memory"""
+    counter = _Counter(records)
+    with open(path, 'w', encoding='utf-8') as f:
+        for chunk in iter_json(counter, header, list_key):
+            f.write(chunk)
+    logger.info(f"Exported to JSON: {path}")
+    return counter.count
+
+
+class _Counter:
+    """Iterate records while counting them"""
+
+    def __init__(self, records: Iterable[Dict[str, Any]]):
+        self.records = records
+        self.count = 0
+
+    def __iter__(self):
+        for record in self.records:
+            self.count += 1
+            yield record
+
+
+def write_excel(records: Iterable[Dict[str, Any]], path: str, sheet_title: str) -> int:
+    """Write records to a write-only workbook with a styled header and striped rows"""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=sheet_title)
+
+    # Column widths have to be set before the first row in write-only mode
+    for idx, column in enumerate(EXPORT_COLUMNS):
+        ws.column_dimensions[get_column_letter(idx + 1)].width = EXCEL_COLUMN_WIDTHS[column]
+
+    header = []
+    for column in EXPORT_COLUMNS:
+        cell = WriteOnlyCell(ws, value=column)
+        cell.font = HEADER_FONT
+        cell.fill = HEADER_FILL
+        cell.alignment = HEADER_ALIGNMENT
+        header.append(cell)
+    ws.append(header)
+
+    count = 0
+    for row_idx, record in enumerate(records, 2):
+        values = excel_values(record)
+        # Alternate row coloring (only striped rows need styled cells)
+        if row_idx % 2 == 0:
+            striped = []
+            for value in values:
+                cell = WriteOnlyCell(ws, value=value)
+                cell.fill = STRIPE_FILL
+                striped.append(cell)
+            ws.append(striped)
+        else:
+            ws.append(values)
+        count += 1
+
+    wb.save(path)
+    logger.info(f"Exported to Excel: {path}")
+    return count
+
+
+def write_export(fmt: str, records: Iterable[Dict[str, Any]], path: str,
+                 header: Dict[str, Any], list_key: str, sheet_title: str) -> int:
+    """Write records in one format"""
+    if fmt == "csv":
+        return write_csv(records, path)
+    if fmt == "ndjson":
+        return write_ndjson(records, path)
+    if fmt == "excel":
+        return write_excel(records, path, sheet_title)
+    return write_json(records, path, header, list_key)
+
+
+# ==================== STREAMING ====================
+
+def iter_json(records: Iterable[Dict[str, Any]], header: Dict[str, Any], list_key: str) -> Iterator[str]:
+    """JSON document text in chunks: the header fields, then the records array"""
+    head = json.dumps(header, indent=2, ensure_ascii=False, default=str)
+    # Reopen the header object and append the records array as its last field
+    yield head[:-2] + ',\n' + f'  "{list_key}": ['
+    first = True
+    for record in records:
+        yield ('\n    ' if first else ',\n    ') + json.dumps(record, ensure_ascii=False, default=str)
+        first = False
+    yield '\n  ]\n}\n' if not first else ']\n}\n'
+
+
+def iter_csv(records: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    """CSV bytes in chunks of STREAM_CHUNK_ROWS rows"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    buffer.write('\ufeff')  # BOM so Excel opens the file as UTF-8
+    writer.writeheader()
+    for i, record in enumerate(records, 1):
+        writer.writerow(csv_row(record))
+        if i % STREAM_CHUNK_ROWS == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def iter_ndjson(records: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    """NDJSON bytes in chunks of STREAM_CHUNK_ROWS rows"""
+    lines = []
+    for record in records:
+        lines.append(json.dumps(record, ensure_ascii=False, default=str))
+        if len(lines) >= STREAM_CHUNK_ROWS:
+            yield ("\n".join(lines) + "\n").encode('utf-8')
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode('utf-8')
+
+
+def iter_excel(records: Iterable[Dict[str, Any]], sheet_title: str, chunk_size: int = 65536) -> Iterator[bytes]:
+    """Excel bytes; the workbook is written to a temp file (xlsx is a zip) and read back in chunks"""
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        write_excel(records, path, sheet_title)
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def stream_export(fmt: str, records: Iterable[Dict[str, Any]], header: Dict[str, Any],
+                  list_key: str, sheet_title: str) -> Tuple[Iterator[bytes], str, str]:
+    """Body iterator, media type and file extension for a StreamingResponse"""
+    extension, media_type = EXPORT_FORMATS[fmt]
+    if fmt == "csv":
+        body = iter_csv(records)
+    elif fmt == "ndjson":
+        body = iter_ndjson(records)
+    elif fmt == "excel":
+        body = iter_excel(records, sheet_title)
+    else:
+        body = (chunk.encode('utf-8') for chunk in iter_json(records, header, list_key))
+    return body, media_type, extension
@@ -4,15 +4,27 @@ Supports file validation, column mapping, and data extraction
 """
 
 import os
+import io
+import json
+import hashlib
 import logging
+from collections import defaultdict
 import pandas as pd
-from typing import List, Dict, Optional, Any, Tuple
+from typing import List, Dict, Optional, Any, Tuple, Iterator
 from pathlib import Path
 # import magic  # For file type detection - commented out to avoid issues
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Rows parsed per chunk when streaming campaign files
+STREAM_CHUNK_SIZE = int(os.getenv("FILE_STREAM_CHUNK_SIZE", "1000"))
+
+# Upload-time file profiles (encoding, delimiter, headers, row count, byte-offset index)
+PROFILE_DIR = os.getenv("FILE_PROFILE_DIR", os.path.join("data", "file_profiles"))
+PROFILE_INDEX_INTERVAL = int(os.getenv("FILE_PROFILE_INDEX_INTERVAL", "1000"))
+PROFILE_VERSION = 1
+
 class FileHandler:
     """Main file handler for CSV/Excel processing"""
     
@@ -48,20 +60,15 @@ class FileHandler:
                     "error": f"File too large. Maximum size: {self.max_file_size // (1024*1024)}MB"
                 }
             
-            # Try to read file structure
+            # Try to read file structure (from the cached profile when the file is unchanged)
             try:
-                if file_path.suffix.lower() == '.csv':
-                    processor = CSVProcessor()
-                else:
-                    processor = ExcelProcessor()
-                
-                info = processor.get_file_info(str(file_path))
+                profile = self.get_profile(str(file_path))
                 
                 return {
                     "valid": True,
-                    "file_info": info,
+                    "file_info": profile["file_info"],
                     "file_size": file_size,
-                    "processor_type": type(processor).__name__
+                    "processor_type": profile["processor_type"]
                 }
                 
             except Exception as e:
@@ -92,6 +99,54 @@ class FileHandler:
             logger.error(f"Error saving file: {str(e)}")
             raise
     
+    def _profile_path(self, file_path: str) -> str:
+        """Location of a file's profile (kept out of the upload dirs so listings stay clean)"""
+        key = hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()
+        return os.path.join(PROFILE_DIR, f"{key}.json")
+    
+    def get_profile(self, file_path: str) -> Dict[str, Any]:
+        """Get the file's profile, building it if missing or stale"""
+        stat = os.stat(file_path)
+        profile_path = self._profile_path(file_path)
+        
+        try:
+            with open(profile_path, 'r', encoding='utf-8') as f:
+                profile = json.load(f)
+            if (profile.get("version") == PROFILE_VERSION and
+                    profile.get("file_size") == stat.st_size and
+                    profile.get("mtime") == stat.st_mtime):
+                return profile
+        except (OSError, ValueError):
+            pass
+        
+        return self.build_profile(file_path)
+    
+    def build_profile(self, file_path: str) -> Dict[str, Any]:
+        """Profile a file once (normally at upload time) and store the result"""
+        stat = os.stat(file_path)
+        processor = self.get_processor(file_path)
+        
+        profile = {
+            "version": PROFILE_VERSION,
+            "file_path": os.path.abspath(file_path),
+            "file_size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "processor_type": type(processor).__name__
+        }
+        profile.update(processor.profile_file(file_path))
+        
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            profile_path = self._profile_path(file_path)
+            tmp_path = f"{profile_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(profile, f, default=str)
+            os.replace(tmp_path, profile_path)
+        except Exception as e:
+            logger.warning(f"Could not store file profile for {file_path}: {str(e)}")
+        
+        return profile
+    
     def get_processor(self, file_path: str):
         """Get appropriate processor for file type"""
         file_path = Path(file_path)
@@ -179,6 +234,49 @@ class CSVProcessor:
             logger.error(f"CSV info extraction error: {str(e)}")
             raise
     
+    def profile_file(self, file_path: str, index_interval: int = PROFILE_INDEX_INTERVAL) -> Dict[str, Any]:
+        """Build a CSV profile: file info plus a sparse byte-offset index of data rows"""
+        encoding = self.detect_encoding(file_path)
+        delimiter = self.detect_delimiter(file_path, encoding)
+        
+        # Headers and sample rows in one read
+        sample_df = pd.read_csv(file_path, encoding=encoding, delimiter=delimiter, nrows=5)
+        headers = sample_df.columns.tolist()
+        
+        # One binary pass: count rows and record the offset of every index_interval-th row.
+        # Quoted fields spanning lines break the line == row assumption, so such files are not seekable.
+        row_offsets = []
+        total_rows = 0
+        seekable = True
+        with open(file_path, 'rb') as f:
+            f.readline()  # header
+            offset = f.tell()
+            for line in f:
+                if total_rows % index_interval == 0:
+                    row_offsets.append(offset)
+                if seekable and line.count(b'"') % 2:
+                    seekable = False
+                total_rows += 1
+                offset += len(line)
+        
+        return {
+            "encoding": encoding,
+            "delimiter": delimiter,
+            "headers": headers,
+            "total_rows": total_rows,
+            "index_interval": index_interval,
+            "row_offsets": row_offsets if seekable else [],
+            "seekable": seekable,
+            "file_info": {
+                "headers": headers,
+                "total_rows": total_rows,
+                "sample_data": sample_df.fillna('').to_dict('records'),
+                "encoding": encoding,
+                "delimiter": delimiter,
+                "column_count": len(headers)
+            }
+        }
+    
     def _count_rows(self, file_path: str, encoding: str, delimiter: str) -> int:
         """Count total rows in CSV file"""
         try:
@@ -194,11 +292,15 @@ class CSVProcessor:
             except Exception:
                 return 0
     
-    def read_data(self, file_path: str, start_row: int = 1, end_row: Optional[int] = None) -> List[Dict[str, Any]]:
+    def read_data(self, file_path: str, start_row: int = 1, end_row: Optional[int] = None,
+                  profile: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
         """Read CSV data within specified row range"""
+        if profile and profile.get("seekable"):
+            return list(self.iter_rows(file_path, start_row, end_row, profile=profile))
+        
         try:
-            encoding = self.detect_encoding(file_path)
-            delimiter = self.detect_delimiter(file_path, encoding)
+            encoding = profile["encoding"] if profile else self.detect_encoding(file_path)
+            delimiter = profile["delimiter"] if profile else self.detect_delimiter(file_path, encoding)
             
             # Calculate skiprows and nrows
             skiprows = max(0, start_row - 1)  # -1 because we don't skip header
@@ -225,6 +327,85 @@ class CSVProcessor:
         except Exception as e:
             logger.error(f"CSV data reading error: {str(e)} - File: {file_path}")
             raise ValueError(f"Failed to read CSV file: {str(e)}")
+    
+    def iter_rows(self, file_path: str, start_row: int = 1, end_row: Optional[int] = None,
+                  chunk_size: int = STREAM_CHUNK_SIZE, profile: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+        """Lazily yield CSV rows within the specified row range, one chunk in memory at a time"""
+        if profile and profile.get("seekable") and profile.get("row_offsets"):
+            yield from self._iter_rows_from_offset(file_path, start_row, end_row, chunk_size, profile)
+            return
+        
+        try:
+            encoding = profile["encoding"] if profile else self.detect_encoding(file_path)
+            delimiter = profile["delimiter"] if profile else self.detect_delimiter(file_path, encoding)
+            
+            skiprows = max(0, start_row - 1)
+            nrows = end_row - start_row + 1 if end_row else None
+            
+            reader = pd.read_csv(
+                file_path,
+                encoding=encoding,
+                delimiter=delimiter,
+                skiprows=range(1, skiprows + 1) if skiprows > 0 else None,
+                nrows=nrows,
+                chunksize=chunk_size
+            )
+            
+            with reader:
+                for chunk in reader:
+                    chunk = chunk.fillna('')
+                    chunk.columns = chunk.columns.str.strip()
+                    yield from chunk.to_dict('records')
+                    
+        except Exception as e:
+            logger.error(f"CSV data streaming error: {str(e)} - File: {file_path}")
+            raise ValueError(f"Failed to read CSV file: {str(e)}")
+    
+    def _iter_rows_from_offset(self, file_path: str, start_row: int, end_row: Optional[int],
+                               chunk_size: int, profile: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """Seek to the indexed row nearest start_row instead of parsing the file from the top"""
+        try:
+            start_row = max(1, start_row)
+            index_interval = profile["index_interval"]
+            row_offsets = profile["row_offsets"]
+            
+            slot = min((start_row - 1) // index_interval, len(row_offsets) - 1)
+            skip = (start_row - 1) - slot * index_interval
+            nrows = end_row - start_row + 1 if end_row else None
+            
+            with open(file_path, 'rb') as raw:
+                raw.seek(row_offsets[slot])
+                handle = io.TextIOWrapper(raw, encoding=profile["encoding"], newline='')
+                reader = pd.read_csv(
+                    handle,
+                    delimiter=profile["delimiter"],
+                    header=None,
+                    names=profile["headers"],
+                    skiprows=skip if skip > 0 else None,
+                    nrows=nrows,
+                    chunksize=chunk_size
+                )
+                
+                with reader:
+                    for chunk in reader:
+                        chunk = chunk.fillna('')
+                        chunk.columns = chunk.columns.str.strip()
+                        yield from chunk.to_dict('records')
+                        
+        except Exception as e:
+            logger.error(f"CSV data streaming error: {str(e)} - File: {file_path}")
+            raise ValueError(f"Failed to read CSV file: {str(e)}")
+    
+    def count_data_rows(self, file_path: str, start_row: int = 1, end_row: Optional[int] = None,
+                        profile: Optional[Dict[str, Any]] = None) -> int:
+        """Count rows within the specified row range without loading the file"""
+        if profile:
+            total = profile["total_rows"]
+        else:
+            encoding = self.detect_encoding(file_path)
+            total = self._count_rows(file_path, encoding, self.detect_delimiter(file_path, encoding))
+        last_row = min(end_row, total) if end_row else total
+        return max(0, last_row - max(1, start_row) + 1)
 
 class ExcelProcessor:
     """Excel file processor"""
@@ -264,6 +445,16 @@ class ExcelProcessor:
             logger.error(f"Excel info extraction error: {str(e)}")
             raise
     
+    def profile_file(self, file_path: str, index_interval: int = PROFILE_INDEX_INTERVAL) -> Dict[str, Any]:
+        """Build an Excel profile (workbooks are not byte-seekable, so there is no row index)"""
+        info = self.get_file_info(file_path)
+        return {
+            "headers": info["headers"],
+            "total_rows": info["total_rows"],
+            "seekable": False,
+            "file_info": info
+        }
+    
     def read_data(self, file_path: str, start_row: int = 1, end_row: Optional[int] = None, sheet_name: Optional[str] = None) -> List[Dict[str, Any]]:
         """Read Excel data within specified row range"""
         try:
@@ -309,6 +500,92 @@ class ExcelProcessor:
         except Exception as e:
             logger.error(f"Excel data reading error: {str(e)} - File: {file_path}, Sheet: {sheet_name}")
             raise ValueError(f"Failed to read Excel file: {str(e)}")
+    
+    def iter_rows(self, file_path: str, start_row: int = 1, end_row: Optional[int] = None,
+                  sheet_name: Optional[str] = None, profile: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+        """Lazily yield Excel rows within the specified row range using openpyxl read-only mode"""
+        if Path(file_path).suffix.lower() != '.xlsx':
+            # openpyxl cannot stream legacy .xls workbooks
+            yield from self.read_data(file_path, start_row, end_row, sheet_name)
+            return
+        
+        try:
+            from openpyxl import load_workbook
+            
+            workbook = load_workbook(file_path, read_only=True, data_only=True)
+            try:
+                worksheet = workbook[sheet_name] if sheet_name else workbook.worksheets[0]
+                rows = worksheet.iter_rows(values_only=True)
+                
+                # Header row (same naming as read_data: blank and duplicate headers as pandas names them)
+                header_row = next(rows, None)
+                if header_row is None:
+                    return
+                headers = self._pandas_headers(header_row)
+                padding = ('',) * len(headers)
+                
+                for row_number, values in enumerate(rows, start=1):
+                    if row_number < start_row:
+                        continue
+                    if end_row and row_number > end_row:
+                        break
+                    # Short rows (trailing blank cells not stored) are padded like pandas' NaN -> ''
+                    values = tuple(values) + padding[len(values):]
+                    yield {
+                        header: (value if value is not None else '')
+                        for header, value in zip(headers, values)
+                    }
+            finally:
+                workbook.close()
+                
+        except Exception as e:
+            logger.error(f"Excel data streaming error: {str(e)} - File: {file_path}, Sheet: {sheet_name}")
+            raise ValueError(f"Failed to read Excel file: {str(e)}")
+    
+    @staticmethod
+    def _pandas_headers(header_row: Tuple[Any, ...]) -> List[str]:
+        """Column names as pandas gives them: 'Unnamed: i' for blanks, 'X', 'X.1', ... for duplicates"""
+        names = [str(value) if value is not None else f"Unnamed: {i}" for i, value in enumerate(header_row)]
+        taken = set(names)
+        counts = defaultdict(int)
+        # Named columns first, then blank ones; a suffixed name skips names already in the header
+        unnamed = [i for i, value in enumerate(header_row) if value is None]
+        for i in [i for i in range(len(names)) if header_row[i] is not None] + unnamed:
+            name = base = names[i]
+            count = counts[base]
+            while count > 0:
+                counts[base] = count + 1
+                name = f"{base}.{count}"
+                count = count + 1 if name in taken else counts[name]
+            names[i] = name
+            counts[name] = count + 1
+        return [name.strip() for name in names]
+    
+    def count_data_rows(self, file_path: str, start_row: int = 1, end_row: Optional[int] = None,
+                        profile: Optional[Dict[str, Any]] = None) -> int:
+        """Count rows within the specified row range without loading the sheet data"""
+        if profile:
+            total = profile["total_rows"]
+        elif Path(file_path).suffix.lower() == '.xlsx':
+            from openpyxl import load_workbook
+            
+            # Stream the rows: read-only sheets may have no (or a wrong) stored dimension
+            workbook = load_workbook(file_path, read_only=True)
+            try:
+                total = 0
+                rows = workbook.worksheets[0].iter_rows(values_only=True)
+                next(rows, None)  # header
+                for row_number, values in enumerate(rows, start=1):
+                    # Trailing blank rows are not data (pandas drops them too)
+                    if any(value is not None for value in values):
+                        total = row_number
+            finally:
+                workbook.close()
+        else:
+            total = self.get_file_info(file_path)["total_rows"]
+        
+        last_row = min(end_row, total) if end_row else total
+        return max(0, last_row - max(1, start_row) + 1)
 
 class DataPreprocessor:
     """Data preprocessing and validation"""
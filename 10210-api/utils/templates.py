@@ -3,20 +3,82 @@ Message Template Engine with Multiple Random Samples Support
 Handles variable substitution and random sample selection
 """
 
+import os
 import re
 import random
 import logging
+from collections import OrderedDict
 from typing import List, Dict, Tuple, Optional, Any
 from jinja2 import Template, Environment, BaseLoader, TemplateError
 
 logger = logging.getLogger(__name__)
 
+# Simple "{{ name }}" placeholders that can be substituted without Jinja
+SIMPLE_PLACEHOLDER_PATTERN = re.compile(r'\{\{\s*([A-Za-z_][A-Za-z0-9_]*)\s*\}\}')
+JINJA_SYNTAX_PATTERN = re.compile(r'\{[{%#]')
+# Names Jinja reads as literals, never as variables
+JINJA_LITERAL_NAMES = frozenset({"true", "false", "none", "True", "False", "None"})
+
 class MessageTemplateEngine:
     """Template engine for processing message samples with variable substitution"""
     
-    def __init__(self):
+    def __init__(self, cache_size: Optional[int] = None):
         self.env = Environment(loader=BaseLoader())
         self.variable_pattern = re.compile(r'\{([^}]+)\}')
+        
+        # LRU cache of compiled templates: template text -> ("simple", segments) or ("jinja", Template)
+        self.cache_size = cache_size or int(os.getenv("TEMPLATE_CACHE_SIZE", "256"))
+        self._compiled: "OrderedDict[str, Tuple[str, Any]]" = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+    
+    def _compile(self, template: str) -> Tuple[str, Any]:
+        """Get the compiled form of a template from the LRU cache, compiling on a miss"""
+        compiled = self._compiled.get(template)
+        if compiled is not None:
+            self._compiled.move_to_end(template)
+            self.cache_hits += 1
+            return compiled
+        
+        self.cache_misses += 1
+        
+        # Fast path: literal text and simple {{ var }} placeholders only (not literals or Jinja globals)
+        if ('{{{' not in template and '}}}' not in template and
+                not JINJA_SYNTAX_PATTERN.search(SIMPLE_PLACEHOLDER_PATTERN.sub('', template)) and
+                not any(self._is_reserved(name) for name in SIMPLE_PLACEHOLDER_PATTERN.findall(template))):
+            # Alternating literal / variable-name segments
+            compiled = ("simple", SIMPLE_PLACEHOLDER_PATTERN.split(template))
+        else:
+            compiled = ("jinja", self.env.from_string(template))
+        
+        self._compiled[template] = compiled
+        if len(self._compiled) > self.cache_size:
+            self._compiled.popitem(last=False)
+        return compiled
+    
+    def _is_reserved(self, name: str) -> bool:
+        """Check whether Jinja would not read {{ name }} as a plain context variable"""
+        return name in JINJA_LITERAL_NAMES or name in self.env.globals
+    
+    def precompile(self, templates: List[str]):
+        """Compile a campaign's templates up front so rendering only hits the cache"""
+        for template in templates:
+            try:
+                self._compile(template)
+            except TemplateError as e:
+                logger.warning(f"Template precompile failed: {str(e)}")
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Get compiled template cache statistics"""
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            "size": len(self._compiled),
+            "max_size": self.cache_size,
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+            "hit_rate": round(self.cache_hits / lookups * 100, 2) if lookups else 0.0,
+            "simple_templates": sum(1 for kind, _ in self._compiled.values() if kind == "simple")
+        }
     
     def extract_variables(self, template: str) -> List[str]:
         """Extract variable names from template"""
@@ -29,8 +91,8 @@ class MessageTemplateEngine:
             # Extract variables
             variables_found = self.extract_variables(template)
             
-            # Test Jinja2 template compilation
-            jinja_template = self.env.from_string(template)
+            # Test template compilation
+            self._compile(template)
             
             validation_result = {
                 "is_valid": True,
@@ -50,7 +112,7 @@ class MessageTemplateEngine:
                 else:
                     try:
                         # Test render
-                        rendered = jinja_template.render(**sample_data)
+                        rendered = self.render_template(template, sample_data)
                         validation_result["test_render"] = rendered
                     except Exception as e:
                         validation_result["is_valid"] = False
@@ -76,8 +138,16 @@ class MessageTemplateEngine:
     def render_template(self, template: str, variables: Dict[str, Any]) -> str:
         """Render template with variables"""
         try:
-            jinja_template = self.env.from_string(template)
-            rendered = jinja_template.render(**variables)
+            kind, compiled = self._compile(template)
+            
+            if kind == "simple":
+                # Odd segments are variable names; undefined variables render empty like Jinja
+                rendered = "".join(
+                    segment if i % 2 == 0 else (str(variables[segment]) if segment in variables else "")
+                    for i, segment in enumerate(compiled)
+                )
+            else:
+                rendered = compiled.render(**variables)
             return rendered.strip()
         except Exception as e:
             logger.error(f"Template rendering error: {str(e)}")
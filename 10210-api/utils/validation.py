@@ -3,17 +3,61 @@ Data validation utilities for campaign management
 Phone number validation, data sanitization, and business rule checks
 """
 
+import os
 import re
+import time
 import logging
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from typing import List, Dict, Any, Optional, Tuple
 from phonenumbers import parse, is_valid_number, format_number, PhoneNumberFormat
 import phonenumbers
 
 logger = logging.getLogger(__name__)
 
+PHONE_CACHE_SIZE = int(os.getenv("PHONE_CACHE_SIZE", "100000"))
+PHONE_CACHE_TTL_SECONDS = float(os.getenv("PHONE_CACHE_TTL_SECONDS", "86400"))
+PHONE_POOL_MIN_BATCH = int(os.getenv("PHONE_POOL_MIN_BATCH", "5000"))
+PHONE_POOL_WORKERS = int(os.getenv("PHONE_POOL_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Worker processes shared by every large batch, started on first use and stopped with the app
+_phone_pool: Optional[ProcessPoolExecutor] = None
+_phone_pool_lock = threading.Lock()
+
+def _get_phone_pool() -> ProcessPoolExecutor:
+    """The shared phone parsing pool (spawned workers: forking a threaded server is unsafe)"""
+    global _phone_pool
+    with _phone_pool_lock:
+        if _phone_pool is None:
+            _phone_pool = ProcessPoolExecutor(
+                max_workers=PHONE_POOL_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _phone_pool
+
+def shutdown_phone_pool():
+    """Stop the shared phone parsing pool's workers"""
+    global _phone_pool
+    with _phone_pool_lock:
+        pool, _phone_pool = _phone_pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+def _validate_phone_chunk(phones: List[str], region: str) -> List[Tuple[Dict[str, Any], bool]]:
+    """Process pool worker: parse a chunk of cleaned phone numbers"""
+    validator = PhoneValidator(region)
+    return [validator._parse_phone(phone, region) for phone in phones]
+
 class PhoneValidator:
     """Phone number validation and formatting"""
     
+    # Parse results shared by every validator: (cleaned phone, region) -> (expires_at, result)
+    _cache: "OrderedDict[Tuple[str, str], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+    _cache_lock = threading.Lock()
+    _cache_stats = {"hits": 0, "misses": 0}
+    
     def __init__(self, default_region: str = "NG"):  # Nigeria as default
         self.default_region = default_region
         self.phone_pattern = re.compile(r'^[\d\+\-\s\(\)]+$')
@@ -28,12 +72,23 @@ class PhoneValidator:
                 "international": None
             }
         
+        # Clean phone number
+        cleaned_phone = self.clean_phone(phone)
+        region = region or self.default_region
+        
+        cached = self._cache_get((cleaned_phone, region))
+        if cached is not None:
+            return cached
+        
+        result, cacheable = self._parse_phone(cleaned_phone, region)
+        if cacheable:
+            self._cache_put((cleaned_phone, region), result)
+        return dict(result)
+    
+    def _parse_phone(self, cleaned_phone: str, region: str) -> Tuple[Dict[str, Any], bool]:
+        """Parse and format a cleaned phone number. Returns (result, whether the result may be cached)"""
         try:
-            # Clean phone number
-            cleaned_phone = self.clean_phone(phone)
-            
             # Parse phone number
-            region = region or self.default_region
             parsed = parse(cleaned_phone, region)
             
             # Validate
@@ -53,14 +108,14 @@ class PhoneValidator:
                     "national": national,
                     "country_code": parsed.country_code,
                     "region": region
-                }
+                }, True
             else:
                 return {
                     "valid": False,
                     "error": "Invalid phone number format",
                     "formatted": None,
                     "international": None
-                }
+                }, True
                 
         except phonenumbers.NumberParseException as e:
             return {
@@ -68,7 +123,7 @@ class PhoneValidator:
                 "error": f"Phone parsing error: {str(e)}",
                 "formatted": None,
                 "international": None
-            }
+            }, True
         except Exception as e:
             logger.error(f"Phone validation error: {str(e)}")
             return {
@@ -76,7 +131,7 @@ class PhoneValidator:
                 "error": f"Validation error: {str(e)}",
                 "formatted": None,
                 "international": None
-            }
+            }, False
     
     def clean_phone(self, phone: str) -> str:
         """Clean phone number string"""
@@ -91,17 +146,90 @@ class PhoneValidator:
         
         return phone
     
+    # ==================== PARSE CACHE ====================
+    
+    def _cache_get(self, key: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+        """Copy of a cached parse result (None on a miss or if it expired)"""
+        with self._cache_lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] > time.monotonic():
+                self._cache.move_to_end(key)
+                self._cache_stats["hits"] += 1
+                return dict(cached[1])
+            if cached is not None:
+                del self._cache[key]
+            self._cache_stats["misses"] += 1
+            return None
+    
+    def _cache_put(self, key: Tuple[str, str], result: Dict[str, Any]):
+        with self._cache_lock:
+            self._cache[key] = (time.monotonic() + PHONE_CACHE_TTL_SECONDS, dict(result))
+            self._cache.move_to_end(key)
+            while len(self._cache) > PHONE_CACHE_SIZE:
+                self._cache.popitem(last=False)
+    
+    @classmethod
+    def get_cache_stats(cls) -> Dict[str, Any]:
+        """Get phone parse cache statistics"""
+        lookups = cls._cache_stats["hits"] + cls._cache_stats["misses"]
+        return {
+            "size": len(cls._cache),
+            "max_size": PHONE_CACHE_SIZE,
+            "hits": cls._cache_stats["hits"],
+            "misses": cls._cache_stats["misses"],
+            "hit_rate": round(cls._cache_stats["hits"] / lookups * 100, 2) if lookups else 0.0
+        }
+    
+    # ==================== BATCH ====================
+    
     def batch_validate_phones(self, phones: List[str], region: Optional[str] = None) -> List[Dict[str, Any]]:
-        """Validate multiple phone numbers"""
-        results = []
+        """Validate multiple phone numbers, parsing each distinct number once"""
+        region = region or self.default_region
+        cleaned = [self.clean_phone(phone) for phone in phones]
         
+        # Distinct numbers that are not in the cache yet
+        parsed: Dict[str, Dict[str, Any]] = {}
+        misses = []
+        for phone in dict.fromkeys(cleaned):
+            if not phone:
+                continue
+            cached = self._cache_get((phone, region))
+            if cached is not None:
+                parsed[phone] = cached
+            else:
+                misses.append(phone)
+        
+        for phone, (result, cacheable) in zip(misses, self._parse_phones(misses, region)):
+            if cacheable:
+                self._cache_put((phone, region), result)
+            parsed[phone] = result
+        
+        results = []
         for i, phone in enumerate(phones):
-            result = self.validate_phone(phone, region)
+            result = dict(parsed[cleaned[i]]) if cleaned[i] else self.validate_phone(phone, region)
             result['index'] = i
             result['original'] = phone
             results.append(result)
         
         return results
+    
+    def _parse_phones(self, phones: List[str], region: str) -> List[Tuple[Dict[str, Any], bool]]:
+        """Parse cleaned numbers, across a process pool for very large lists"""
+        if len(phones) >= PHONE_POOL_MIN_BATCH and PHONE_POOL_WORKERS > 1:
+            try:
+                chunk_size = -(-len(phones) // (PHONE_POOL_WORKERS * 4))
+                chunks = [phones[i:i + chunk_size] for i in range(0, len(phones), chunk_size)]
+                
+                results = []
+                for chunk_results in _get_phone_pool().map(_validate_phone_chunk, chunks, [region] * len(chunks)):
+                    results.extend(chunk_results)
+                return results
+            except Exception as e:
+                logger.warning(f"Phone validation pool failed, validating in-process: {str(e)}")
+                # A broken pool (e.g. a killed worker) is replaced on the next large batch
+                shutdown_phone_pool()
+        
+        return [self._parse_phone(phone, region) for phone in phones]
 
 class DataValidator:
     """General data validation for campaign data"""
@@ -162,8 +290,26 @@ class DataValidator:
                 "validation_results": []
             }
     
-    def validate_row(self, row: Dict[str, Any], row_number: int) -> Dict[str, Any]:
-        """Validate individual data row"""
+    def is_group_recipient(self, row: Dict[str, Any]) -> bool:
+        """Check whether a row's phone_number is a WhatsApp group ID"""
+        phone_value = str(row.get('phone_number', ''))
+        
+        # Check if it's a WhatsApp group ID (contains @g.us or has group ID pattern)
+        is_group = '@g.us' in phone_value or (phone_value.count('-') >= 1 and len(phone_value) > 15)
+        
+        # Also check for is_group flag in the row
+        if 'is_group' in row and str(row.get('is_group', '')).lower() in ['true', '1', 'yes']:
+            is_group = True
+        
+        return is_group
+    
+    def validate_row(
+        self,
+        row: Dict[str, Any],
+        row_number: int,
+        phone_results: Optional[Dict[str, Dict[str, Any]]] = None
+    ) -> Dict[str, Any]:
+        """Validate individual data row (phone_results: phone -> validate_phone result, checked in a batch beforehand)"""
         errors = []
         warnings = []
         processed_data = {}
@@ -179,20 +325,15 @@ class DataValidator:
         if 'phone_number' in row and row['phone_number']:
             phone_value = str(row['phone_number'])
             
-            # Check if it's a WhatsApp group ID (contains @g.us or has group ID pattern)
-            is_group = '@g.us' in phone_value or (phone_value.count('-') >= 1 and len(phone_value) > 15)
-            
-            # Also check for is_group flag in the row
-            if 'is_group' in row and str(row.get('is_group', '')).lower() in ['true', '1', 'yes']:
-                is_group = True
-            
-            if is_group:
+            if self.is_group_recipient(row):
                 # For groups, just pass through the group ID
                 processed_data['phone_number'] = phone_value
                 processed_data['is_group'] = True
             else:
                 # For regular phone numbers, validate
-                phone_validation = self.phone_validator.validate_phone(phone_value)
+                phone_validation = (phone_results or {}).get(phone_value)
+                if phone_validation is None:
+                    phone_validation = self.phone_validator.validate_phone(phone_value)
                 
                 if phone_validation["valid"]:
                     processed_data['phone_number'] = phone_validation["formatted"]
@@ -6,6 +6,9 @@ import logging
 from datetime import datetime
 import os
 
+from phone_prefixes import phone_prefix_index
+from waha_webhooks import session_config
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -39,13 +42,7 @@ class WAHAClient:
     
     def create_session(self, session_name: str, config: Optional[Dict] = None) -> Dict:
         """Create new WhatsApp session"""
-        # Use provided config or default
-        if config is None:
-            config = {
-                "proxy": None,
-                "webhooks": [],
-                "debug": False
-            }
+        config = session_config(self.base_url, config)
         
         payload = {
             "name": session_name,
@@ -125,11 +122,7 @@ class WAHAClient:
             payload = {
                 "name": session_name,
                 "start": True,
-                "config": {
-                    "proxy": None,
-                    "webhooks": [],
-                    "debug": False
-                }
+                "config": session_config(self.base_url)
             }
             self._make_request("POST", "/api/sessions", json=payload)
             logger.info(f"Session {session_name} created and starting...")
@@ -761,421 +754,12 @@ class WAHAClient:
     
     def _extract_country_code(self, phone_number: str) -> str:
         """Extract country code from phone number"""
-        # Common country codes - expanded list
-        country_codes = {
-            '1': 'US/CA',
-            '7': 'RU/KZ',
-            '20': 'EG',
-            '27': 'ZA',
-            '30': 'GR',
-            '31': 'NL',
-            '32': 'BE',
-            '33': 'FR',
-            '34': 'ES',
-            '36': 'HU',
-            '39': 'IT',
-            '40': 'RO',
-            '41': 'CH',
-            '43': 'AT',
-            '44': 'GB',
-            '45': 'DK',
-            '46': 'SE',
-            '47': 'NO',
-            '48': 'PL',
-            '49': 'DE',
-            '51': 'PE',
-            '52': 'MX',
-            '53': 'CU',
-            '54': 'AR',
-            '55': 'BR',
-            '56': 'CL',
-            '57': 'CO',
-            '58': 'VE',
-            '60': 'MY',
-            '61': 'AU',
-            '62': 'ID',
-            '63': 'PH',
-            '64': 'NZ',
-            '65': 'SG',
-            '66': 'TH',
-            '81': 'JP',
-            '82': 'KR',
-            '84': 'VN',
-            '86': 'CN',
-            '90': 'TR',
-            '91': 'IN',
-            '92': 'PK',
-            '93': 'AF',
-            '94': 'LK',
-            '95': 'MM',
-            '98': 'IR',
-            '212': 'MA',
-            '213': 'DZ',
-            '216': 'TN',
-            '218': 'LY',
-            '220': 'GM',
-            '221': 'SN',
-            '222': 'MR',
-            '223': 'ML',
-            '224': 'GN',
-            '225': 'CI',
-            '226': 'BF',
-            '227': 'NE',
-            '228': 'TG',
-            '229': 'BJ',
-            '230': 'MU',
-            '231': 'LR',
-            '232': 'SL',
-            '233': 'GH',
-            '234': 'NG',
-            '235': 'TD',
-            '236': 'CF',
-            '237': 'CM',
-            '238': 'CV',
-            '239': 'ST',
-            '240': 'GQ',
-            '241': 'GA',
-            '242': 'CG',
-            '243': 'CD',
-            '244': 'AO',
-            '245': 'GW',
-            '246': 'IO',
-            '248': 'SC',
-            '249': 'SD',
-            '250': 'RW',
-            '251': 'ET',
-            '252': 'SO',
-            '253': 'DJ',
-            '254': 'KE',
-            '255': 'TZ',
-            '256': 'UG',
-            '257': 'BI',
-            '258': 'MZ',
-            '260': 'ZM',
-            '261': 'MG',
-            '262': 'RE',
-            '263': 'ZW',
-            '264': 'NA',
-            '265': 'MW',
-            '266': 'LS',
-            '267': 'BW',
-            '268': 'SZ',
-            '269': 'KM',
-            '351': 'PT',
-            '352': 'LU',
-            '353': 'IE',
-            '354': 'IS',
-            '355': 'AL',
-            '356': 'MT',
-            '357': 'CY',
-            '358': 'FI',
-            '359': 'BG',
-            '370': 'LT',
-            '371': 'LV',
-            '372': 'EE',
-            '373': 'MD',
-            '374': 'AM',
-            '375': 'BY',
-            '376': 'AD',
-            '377': 'MC',
-            '378': 'SM',
-            '380': 'UA',
-            '381': 'RS',
-            '382': 'ME',
-            '383': 'XK',
-            '385': 'HR',
-            '386': 'SI',
-            '387': 'BA',
-            '389': 'MK',
-            '420': 'CZ',
-            '421': 'SK',
-            '423': 'LI',
-            '501': 'BZ',
-            '502': 'GT',
-            '503': 'SV',
-            '504': 'HN',
-            '505': 'NI',
-            '506': 'CR',
-            '507': 'PA',
-            '509': 'HT',
-            '590': 'GP',
-            '591': 'BO',
-            '592': 'GY',
-            '593': 'EC',
-            '594': 'GF',
-            '595': 'PY',
-            '596': 'MQ',
-            '597': 'SR',
-            '598': 'UY',
-            '599': 'CW',
-            '670': 'TL',
-            '672': 'NF',
-            '673': 'BN',
-            '674': 'NR',
-            '675': 'PG',
-            '676': 'TO',
-            '677': 'SB',
-            '678': 'VU',
-            '679': 'FJ',
-            '680': 'PW',
-            '681': 'WF',
-            '682': 'CK',
-            '683': 'NU',
-            '685': 'WS',
-            '686': 'KI',
-            '687': 'NC',
-            '688': 'TV',
-            '689': 'PF',
-            '690': 'TK',
-            '691': 'FM',
-            '692': 'MH',
-            '850': 'KP',
-            '852': 'HK',
-            '853': 'MO',
-            '855': 'KH',
-            '856': 'LA',
-            '880': 'BD',
-            '886': 'TW',
-            '960': 'MV',
-            '961': 'LB',
-            '962': 'JO',
-            '963': 'SY',
-            '964': 'IQ',
-            '965': 'KW',
-            '966': 'SA',
-            '967': 'YE',
-            '968': 'OM',
-            '970': 'PS',
-            '971': 'AE',
-            '972': 'IL',
-            '973': 'BH',
-            '974': 'QA',
-            '975': 'BT',
-            '976': 'MN',
-            '977': 'NP',
-            '992': 'TJ',
-            '993': 'TM',
-            '994': 'AZ',
-            '995': 'GE',
-            '996': 'KG',
-            '998': 'UZ'
-        }
-        
-        # Try to match country code (check up to 4 digits for special cases)
-        for length in [4, 3, 2, 1]:
-            prefix = phone_number[:length]
-            if prefix in country_codes:
-                return prefix
-        
-        return ''
+        return phone_prefix_index.country_code(phone_number)
     
     def _get_country_name(self, phone_number: str) -> str:
         """Get country name from phone number"""
-        country_names = {
-            '1': 'United States/Canada',
-            '7': 'Russia/Kazakhstan', 
-            '20': 'Egypt',
-            '27': 'South Africa',
-            '30': 'Greece',
-            '31': 'Netherlands',
-            '32': 'Belgium',
-            '33': 'France',
-            '34': 'Spain',
-            '36': 'Hungary',
-            '39': 'Italy',
-            '40': 'Romania',
-            '41': 'Switzerland',
-            '43': 'Austria',
-            '44': 'United Kingdom',
-            '45': 'Denmark',
-            '46': 'Sweden',
-            '47': 'Norway',
-            '48': 'Poland',
-            '49': 'Germany',
-            '51': 'Peru',
-            '52': 'Mexico',
-            '53': 'Cuba',
-            '54': 'Argentina',
-            '55': 'Brazil',
-            '56': 'Chile',
-            '57': 'Colombia',
-            '58': 'Venezuela',
-            '60': 'Malaysia',
-            '61': 'Australia',
-            '62': 'Indonesia',
-            '63': 'Philippines',
-            '64': 'New Zealand',
-            '65': 'Singapore',
-            '66': 'Thailand',
-            '81': 'Japan',
-            '82': 'South Korea',
-            '84': 'Vietnam',
-            '86': 'China',
-            '90': 'Turkey',
-            '91': 'India',
-            '92': 'Pakistan',
-            '93': 'Afghanistan',
-            '94': 'Sri Lanka',
-            '95': 'Myanmar',
-            '98': 'Iran',
-            '212': 'Morocco',
-            '213': 'Algeria',
-            '216': 'Tunisia',
-            '218': 'Libya',
-            '220': 'Gambia',
-            '221': 'Senegal',
-            '222': 'Mauritania',
-            '223': 'Mali',
-            '224': 'Guinea',
-            '225': 'Ivory Coast',
-            '226': 'Burkina Faso',
-            '227': 'Niger',
-            '228': 'Togo',
-            '229': 'Benin',
-            '230': 'Mauritius',
-            '231': 'Liberia',
-            '232': 'Sierra Leone',
-            '233': 'Ghana',
-            '234': 'Nigeria',
-            '235': 'Chad',
-            '236': 'Central African Republic',
-            '237': 'Cameroon',
-            '238': 'Cape Verde',
-            '239': 'São Tomé and Príncipe',
-            '240': 'Equatorial Guinea',
-            '241': 'Gabon',
-            '242': 'Republic of the Congo',
-            '243': 'Democratic Republic of the Congo',
-            '244': 'Angola',
-            '245': 'Guinea-Bissau',
-            '246': 'British Indian Ocean Territory',
-            '248': 'Seychelles',
-            '249': 'Sudan',
-            '250': 'Rwanda',
-            '251': 'Ethiopia',
-            '252': 'Somalia',
-            '253': 'Djibouti',
-            '254': 'Kenya',
-            '255': 'Tanzania',
-            '256': 'Uganda',
-            '257': 'Burundi',
-            '258': 'Mozambique',
-            '260': 'Zambia',
-            '261': 'Madagascar',
-            '262': 'Réunion',
-            '263': 'Zimbabwe',
-            '264': 'Namibia',
-            '265': 'Malawi',
-            '266': 'Lesotho',
-            '267': 'Botswana',
-            '268': 'Eswatini',
-            '269': 'Comoros',
-            '351': 'Portugal',
-            '352': 'Luxembourg',
-            '353': 'Ireland',
-            '354': 'Iceland',
-            '355': 'Albania',
-            '356': 'Malta',
-            '357': 'Cyprus',
-            '358': 'Finland',
-            '359': 'Bulgaria',
-            '370': 'Lithuania',
-            '371': 'Latvia',
-            '372': 'Estonia',
-            '373': 'Moldova',
-            '374': 'Armenia',
-            '375': 'Belarus',
-            '376': 'Andorra',
-            '377': 'Monaco',
-            '378': 'San Marino',
-            '380': 'Ukraine',
-            '381': 'Serbia',
-            '382': 'Montenegro',
-            '383': 'Kosovo',
-            '385': 'Croatia',
-            '386': 'Slovenia',
-            '387': 'Bosnia and Herzegovina',
-            '389': 'North Macedonia',
-            '420': 'Czech Republic',
-            '421': 'Slovakia',
-            '423': 'Liechtenstein',
-            '501': 'Belize',
-            '502': 'Guatemala',
-            '503': 'El Salvador',
-            '504': 'Honduras',
-            '505': 'Nicaragua',
-            '506': 'Costa Rica',
-            '507': 'Panama',
-            '509': 'Haiti',
-            '590': 'Guadeloupe',
-            '591': 'Bolivia',
-            '592': 'Guyana',
-            '593': 'Ecuador',
-            '594': 'French Guiana',
-            '595': 'Paraguay',
-            '596': 'Martinique',
-            '597': 'Suriname',
-            '598': 'Uruguay',
-            '599': 'Curaçao',
-            '670': 'Timor-Leste',
-            '672': 'Norfolk Island',
-            '673': 'Brunei',
-            '674': 'Nauru',
-            '675': 'Papua New Guinea',
-            '676': 'Tonga',
-            '677': 'Solomon Islands',
-            '678': 'Vanuatu',
-            '679': 'Fiji',
-            '680': 'Palau',
-            '681': 'Wallis and Futuna',
-            '682': 'Cook Islands',
-            '683': 'Niue',
-            '685': 'Samoa',
-            '686': 'Kiribati',
-            '687': 'New Caledonia',
-            '688': 'Tuvalu',
-            '689': 'French Polynesia',
-            '690': 'Tokelau',
-            '691': 'Micronesia',
-            '692': 'Marshall Islands',
-            '850': 'North Korea',
-            '852': 'Hong Kong',
-            '853': 'Macau',
-            '855': 'Cambodia',
-            '856': 'Laos',
-            '880': 'Bangladesh',
-            '886': 'Taiwan',
-            '960': 'Maldives',
-            '961': 'Lebanon',
-            '962': 'Jordan',
-            '963': 'Syria',
-            '964': 'Iraq',
-            '965': 'Kuwait',
-            '966': 'Saudi Arabia',
-            '967': 'Yemen',
-            '968': 'Oman',
-            '970': 'Palestine',
-            '971': 'UAE',
-            '972': 'Israel',
-            '973': 'Bahrain',
-            '974': 'Qatar',
-            '975': 'Bhutan',
-            '976': 'Mongolia',
-            '977': 'Nepal',
-            '992': 'Tajikistan',
-            '993': 'Turkmenistan',
-            '994': 'Azerbaijan',
-            '995': 'Georgia',
-            '996': 'Kyrgyzstan',
-            '998': 'Uzbekistan'
-        }
-        
-        code = self._extract_country_code(phone_number)
-        return country_names.get(code, 'Unknown')
+        return phone_prefix_index.country_name(phone_number)
     
     def _format_phone_number(self, phone_number: str) -> str:
         """Format phone number with country code"""
-        code = self._extract_country_code(phone_number)
-        if code:
-            return f"+{code} {phone_number[len(code):]}"
-        return phone_number
\ No newline at end of file
+        return phone_prefix_index.format_phone(phone_number)
\ No newline at end of file
@@ -7,10 +7,10 @@ Manages multiple WAHA Docker containers with 100-session capacity each
 import docker
 import requests
 import logging
-import sqlite3
 import os
 from typing import Dict, Optional, Tuple
 from datetime import datetime
+from database.connection import get_raw_connection
 
 logger = logging.getLogger(__name__)
 
@@ -31,8 +31,8 @@ class WAHAPoolManager:
         self.free_instance_url = "http://localhost:4500"  # Instance 1 for free users
         
     def get_db_connection(self):
-        """Get database connection"""
-        return sqlite3.connect(self.db_path)
+        """Get database connection (pooled, WAL-tuned; close() returns it to the pool)"""
+        return get_raw_connection(self.db_path)
     
     def get_user_plan(self, user_id: str) -> Tuple[str, int]:
         """Get user's plan type and session limit"""
@@ -5,9 +5,10 @@ Central management for WAHA sessions with multi-instance support
 """
 
 import logging
-import sqlite3
 from typing import Optional
 from waha_functions import WAHAClient
+from async_waha_client import AsyncWAHAClient, get_async_waha_client
+from database.connection import get_raw_connection
 from waha_pool_manager import waha_pool
 from free_session_manager import free_session_manager
 
@@ -18,11 +19,19 @@ class WAHASessionManager:
         self.db_path = db_path
         
     def get_db_connection(self):
-        """Get database connection"""
-        return sqlite3.connect(self.db_path)
+        """Get database connection (pooled, WAL-tuned; close() returns it to the pool)"""
+        return get_raw_connection(self.db_path)
     
     def get_waha_client_for_session(self, user_id: str, session_name: str) -> WAHAClient:
         """Get WAHA client with correct instance URL for a session"""
+        return WAHAClient(base_url=self.get_instance_url_for_session(user_id, session_name))
+    
+    def get_async_client_for_session(self, user_id: str, session_name: str) -> AsyncWAHAClient:
+        """Get the shared async WAHA client for a session's instance"""
+        return get_async_waha_client(self.get_instance_url_for_session(user_id, session_name))
+    
+    def get_instance_url_for_session(self, user_id: str, session_name: str) -> str:
+        """Get the WAHA instance URL for a session, assigning one if it is new"""
         
         # Check if session exists and get its instance URL
         instance_url = self.get_session_instance_url(user_id, session_name)
@@ -30,7 +39,7 @@ class WAHASessionManager:
         if instance_url:
             # Session exists, use its assigned instance
             logger.debug(f"Using existing instance {instance_url} for session {session_name}")
-            return WAHAClient(base_url=instance_url)
+            return instance_url
         
         # Session doesn't exist yet, determine where it should go
         instance_url = waha_pool.get_or_create_instance_for_user(user_id, session_name)
@@ -39,7 +48,7 @@ class WAHASessionManager:
         self.save_session_assignment(user_id, session_name, instance_url)
         
         logger.info(f"Assigned new session {session_name} to instance {instance_url}")
-        return WAHAClient(base_url=instance_url)
+        return instance_url
     
     def get_session_instance_url(self, user_id: str, session_name: str) -> Optional[str]:
         """Get the WAHA instance URL for an existing session"""
@@ -125,62 +134,58 @@ class WAHASessionManager:
         finally:
             conn.close()
     
-    def create_session(self, user_id: str, session_name: str, config: dict = None) -> dict:
+    async def create_session(self, user_id: str, session_name: str, config: dict = None) -> dict:
         """Create a new WhatsApp session with instance assignment"""
         
         # Get the right WAHA client for this user
-        waha_client = self.get_waha_client_for_session(user_id, session_name)
+        waha_client = self.get_async_client_for_session(user_id, session_name)
         
         # Create the session
-        result = waha_client.create_session(session_name, config)
+        result = await waha_client.create_session(session_name, config)
         
         # Track activity for free users
         self.track_activity(user_id, session_name)
         
         return result
     
-    def send_text(self, user_id: str, session_name: str, chat_id: str, text: str) -> dict:
+    async def send_text(self, user_id: str, session_name: str, chat_id: str, text: str) -> dict:
         """Send text message using correct instance"""
         
         # Get the right WAHA client
-        waha_client = self.get_waha_client_for_session(user_id, session_name)
+        waha_client = self.get_async_client_for_session(user_id, session_name)
         
         # Send message
-        result = waha_client.send_text({
-            "session": session_name,
-            "chatId": chat_id,
-            "text": text
-        })
+        result = await waha_client.send_text(session_name, chat_id, text)
         
         # Track activity
         self.track_activity(user_id, session_name)
         
         return result
     
-    def get_session_info(self, user_id: str, session_name: str) -> dict:
+    async def get_session_info(self, user_id: str, session_name: str) -> dict:
         """Get session info from correct instance"""
         
         # Get the right WAHA client
-        waha_client = self.get_waha_client_for_session(user_id, session_name)
+        waha_client = self.get_async_client_for_session(user_id, session_name)
         
         # Get session info
-        result = waha_client.get_session(session_name)
+        result = await waha_client.get_session_info(session_name)
         
         # Track activity
         self.track_activity(user_id, session_name)
         
         return result
     
-    def delete_session(self, user_id: str, session_name: str):
+    async def delete_session(self, user_id: str, session_name: str):
         """Delete session from correct instance and database"""
         
         # Get the right WAHA client
-        waha_client = self.get_waha_client_for_session(user_id, session_name)
+        waha_client = self.get_async_client_for_session(user_id, session_name)
         
         # Delete from WAHA
         try:
-            waha_client.logout_session(session_name)
-            waha_client.delete_session(session_name)
+            await waha_client.logout_session(session_name)
+            await waha_client.delete_session(session_name)
         except Exception as e:
             logger.error(f"Error deleting session from WAHA: {e}")
         
@@ -0,0 +1,104 @@
+"""
+WAHA Webhooks - session webhook registration and verification of incoming events
+Sessions created by this API subscribe /api/webhooks/waha to their status and
+group events, so the session health and directory caches are pushed fresh
+instead of waiting for a poll. Events are signed by WAHA with HMAC-SHA512
+(WAHA_WEBHOOK_SECRET) and must name a WAHA instance this API knows.
+"""
+
+import hashlib
+import hmac
+import logging
+import os
+from typing import Dict, List, Optional
+from urllib.parse import quote
+
+logger = logging.getLogger(__name__)
+
+# URL of /api/webhooks/waha as the WAHA containers reach it (webhooks are off when unset)
+WAHA_WEBHOOK_URL = os.getenv("WAHA_WEBHOOK_URL", "")
+WAHA_WEBHOOK_SECRET = os.getenv("WAHA_WEBHOOK_SECRET", "")
+# WAHA has no contact events; contact listings are refreshed by session.status and their TTL
+DEFAULT_WEBHOOK_EVENTS = (
+    "session.status,group.join,group.leave,"
+    "group.v2.join,group.v2.leave,group.v2.update,group.v2.participants,chat.archive"
+)
+WAHA_WEBHOOK_EVENTS = [
+    event.strip() for event in os.getenv("WAHA_WEBHOOK_EVENTS", DEFAULT_WEBHOOK_EVENTS).split(",") if event.strip()
+]
+SIGNATURE_HEADER = "X-Webhook-Hmac"
+
+
+def _normalize(base_url: Optional[str]) -> str:
+    return (base_url or os.getenv("WAHA_BASE_URL", "http://localhost:4500")).rstrip('/')
+
+
+def session_webhooks(base_url: Optional[str] = None) -> List[Dict]:
+    """WAHA webhook config for a session on base_url ([] unless URL and secret are configured)"""
+    if not WAHA_WEBHOOK_URL or not WAHA_WEBHOOK_SECRET:
+        return []
+
+    separator = "&" if "?" in WAHA_WEBHOOK_URL else "?"
+    return [{
+        "url": f"{WAHA_WEBHOOK_URL}{separator}instance_url={quote(_normalize(base_url), safe='')}",
+        "events": WAHA_WEBHOOK_EVENTS,
+        "hmac": {"key": WAHA_WEBHOOK_SECRET}
+    }]
+
+
+def session_config(base_url: Optional[str] = None, config: Optional[Dict] = None) -> Dict:
+    """Config for a new WAHA session on base_url; a caller's config keeps its own webhooks if it has any"""
+    if config is None:
+        return {
+            "proxy": None,
+            "webhooks": session_webhooks(base_url),
+            "debug": False
+        }
+    if not config.get("webhooks"):
+        return {**config, "webhooks": session_webhooks(base_url)}
+    return config
+
+
+def verify_signature(body: bytes, signature: Optional[str]) -> bool:
+    """Check WAHA's HMAC-SHA512 signature of a webhook body"""
+    if not WAHA_WEBHOOK_SECRET or not signature:
+        return False
+    expected = hmac.new(WAHA_WEBHOOK_SECRET.encode(), body, hashlib.sha512).hexdigest()
+    return hmac.compare_digest(expected, signature.strip().lower())
+
+
+class KnownInstances:
+    """WAHA instances this API talks to (the default one, clients in use, assigned sessions)"""
+
+    def __init__(self):
+        self._known = set()
+
+    def resolve(self, instance_url: Optional[str]) -> Optional[str]:
+        """Normalized instance URL, or None if it is not a known WAHA instance"""
+        url = _normalize(instance_url)
+        if url in self._known:
+            return url
+
+        from async_waha_client import _async_waha_clients
+        if url == _normalize(None) or url in _async_waha_clients or self._assigned(url):
+            self._known.add(url)
+            return url
+        return None
+
+    def _assigned(self, url: str) -> bool:
+        """Check whether any session was assigned to the instance by the pool manager"""
+        from database.connection import get_raw_connection
+        conn = get_raw_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1 FROM waha_sessions WHERE waha_instance_url IN (?, ?) LIMIT 1", (url, url + "/"))
+            return cursor.fetchone() is not None
+        except Exception as e:
+            logger.debug(f"Could not look up WAHA instance {url}: {str(e)}")
+            return False
+        finally:
+            conn.close()
+
+
+# Global known-instance registry
+known_waha_instances = KnownInstances()
@@ -10,6 +10,7 @@ from sqlalchemy.orm import Session
 from database.connection import get_db
 from warmer.models import WarmerContact, WarmerSession
 from waha_functions import WAHAClient
+from async_waha_client import get_async_waha_client
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +20,7 @@ class ContactManager:
     
     def __init__(self, waha_client: WAHAClient = None):
         self.waha = waha_client or WAHAClient()
+        self.async_waha = get_async_waha_client(self.waha.base_url)
         self.logger = logger
     
     async def save_all_contacts(self, warmer_session_id: int) -> Dict[str, Any]:
@@ -143,7 +145,7 @@ class ContactManager:
                         waha_session_name = user_session.waha_session_name
                 
                 # Get session info from WAHA
-                info = self.waha.get_session_info(waha_session_name)
+                info = await self.async_waha.get_session_info(waha_session_name)
                 if info and info.get("me"):
                     phone = info["me"].get("id", "").replace("@c.us", "")
                     name = info["me"].get("pushName", session)
@@ -260,7 +262,7 @@ class ContactManager:
             
             # Use WAHA API to save contact (requires active chat)
             self.logger.info(f"Attempting to save contact {contact_name} ({chat_id}) in session {waha_session_name}")
-            result = self.waha.create_or_update_contact(
+            result = await self.async_waha.create_or_update_contact(
                 session=waha_session_name,
                 chat_id=chat_id,
                 name=contact_name
@@ -11,6 +11,8 @@ from sqlalchemy.orm import Session
 from database.connection import get_db
 from warmer.models import WarmerSession, WarmerGroup
 from waha_functions import WAHAClient
+from async_waha_client import get_async_waha_client
+from session_directory_cache import session_directory_cache
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +22,7 @@ class GroupManager:
     
     def __init__(self, waha_client: WAHAClient = None):
         self.waha = waha_client or WAHAClient()
+        self.async_waha = get_async_waha_client(self.waha.base_url)
         self.logger = logger
         self.target_group_count = 5  # Target number of common groups
     
@@ -159,7 +162,7 @@ class GroupManager:
                 try:
                     # Convert display name to WAHA session name
                     waha_session_name = self._get_waha_session_name(session, user_id)
-                    groups = self.waha.get_groups(waha_session_name)
+                    groups = await session_directory_cache.get_groups(waha_session_name, self.waha.base_url)
                     if isinstance(groups, list):
                         group_ids = set()
                         for g in groups:
@@ -208,7 +211,7 @@ class GroupManager:
                     try:
                         # Convert display name to WAHA session name
                         waha_session_name = self._get_waha_session_name(session, user_id)
-                        info = self.waha.get_session_info(waha_session_name)
+                        info = await self.async_waha.get_session_info(waha_session_name)
                         if info and info.get("me"):
                             phone = info["me"].get("id", "")
                             if phone:
@@ -228,7 +231,8 @@ class GroupManager:
             self.logger.info(f"Creating group {group_name} with participants: {participant_phones}")
             # Convert orchestrator display name to WAHA session name
             waha_orchestrator = self._get_waha_session_name(orchestrator, user_id)
-            result = self.waha.create_group(waha_orchestrator, group_name, participant_phones)
+            result = await self.async_waha.create_group(waha_orchestrator, group_name, participant_phones)
+            session_directory_cache.invalidate(waha_orchestrator, ("groups", "chats"), self.waha.base_url)
             
             if result and "id" in result:
                 self.logger.info(f"Created group {group_name} with ID {result['id']}")
@@ -392,7 +396,8 @@ class GroupManager:
                         self.logger.info(f"Session {session} joining group {link_index + 1}")
                         # Convert display name to WAHA session name
                         waha_session_name = self._get_waha_session_name(session, user_id)
-                        result = self.waha.join_group_by_link(waha_session_name, invite_link)
+                        result = await self.async_waha.join_group_by_link(waha_session_name, invite_link)
+                        session_directory_cache.invalidate(waha_session_name, ("groups", "chats"), self.waha.base_url)
                         
                         if result and "id" in result:
                             group_info["sessions_joined"].append(session)
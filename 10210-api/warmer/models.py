@@ -6,7 +6,7 @@ import json
 from datetime import datetime
 from enum import Enum
 from typing import List, Dict, Optional, Any
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, Float
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, Float, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.hybrid import hybrid_property
 from database.connection import Base
@@ -192,6 +192,10 @@ class WarmerGroup(Base):
 class WarmerConversation(Base):
     """Warmer conversation model for tracking messages"""
     __tablename__ = "warmer_conversations"
+    __table_args__ = (
+        # Message counts per warmer and type (migration 014)
+        Index("idx_warmer_conversations_session_type", "warmer_session_id", "message_type"),
+    )
     
     # Primary key
     id = Column(Integer, primary_key=True, index=True)
@@ -15,6 +15,10 @@ from warmer.contact_manager import ContactManager
 from warmer.group_manager import GroupManager
 from warmer.orchestrator import ConversationOrchestrator
 from waha_functions import WAHAClient
+from async_waha_client import get_async_waha_client
+from session_health_cache import session_health_cache
+from rate_limiter import send_rate_limiter, RateLimitExceeded
+from websocket_manager import notify_warmer_update
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +28,8 @@ class WarmerEngine:
     
     def __init__(self, waha_client: WAHAClient = None):
         self.waha = waha_client or WAHAClient()
+        # Shared pooled async client for the hot paths (sending, session checks)
+        self.async_waha = get_async_waha_client(self.waha.base_url)
         self.logger = logger
         self.contact_manager = ContactManager(waha_client)
         self.group_manager = GroupManager(waha_client)
@@ -130,6 +136,8 @@ class WarmerEngine:
                 warmer.stopped_at = None  # Clear stopped_at for new session
                 db.commit()
             
+            await notify_warmer_update(warmer_session_id, {"status": WarmerStatus.WARMING.value})
+            
             # Initialize warming
             self.logger.info(f"Initializing warmer session {warmer_session_id}")
             
@@ -204,6 +212,8 @@ class WarmerEngine:
                     
                     db.commit()
             
+            await notify_warmer_update(warmer_session_id, {"status": WarmerStatus.STOPPED.value})
+            
             # Clean up stop flag
             if warmer_session_id in self.stop_flags:
                 del self.stop_flags[warmer_session_id]
@@ -245,6 +255,11 @@ class WarmerEngine:
                                 # Store notification in database or status field
                                 db.commit()
                         
+                        await notify_warmer_update(warmer_session_id, {
+                            "status": WarmerStatus.INACTIVE.value,
+                            "reason": "time_limit_exceeded"
+                        })
+                        
                         await self.stop_warming(warmer_session_id)
                         break
                     last_limit_check = current_time
@@ -319,8 +334,19 @@ class WarmerEngine:
                 if user_session and user_session.waha_session_name:
                     waha_session_name = user_session.waha_session_name
             
+            # Share the number's send budget with any campaign running on it
+            try:
+                await send_rate_limiter.acquire(waha_session_name, self.async_waha.base_url)
+            except RateLimitExceeded as e:
+                self.logger.warning(f"Skipping group message from {speaker}: {str(e)}")
+                return
+            
             # Send message via WAHA
-            result = self.waha.send_text(waha_session_name, group_id, message)
+            try:
+                result = await self.async_waha.send_text(waha_session_name, group_id, message)
+            except Exception:
+                send_rate_limiter.refund(waha_session_name)
+                raise
             
             if result and "id" in result:
                 # Extract message ID from nested structure
@@ -352,6 +378,7 @@ class WarmerEngine:
                 
                 self.logger.info(f"Sent group message from {speaker} to {group_id[:10]}...")
             else:
+                send_rate_limiter.refund(waha_session_name)
                 self.logger.error(f"Failed to send group message: {result}")
                 
         except Exception as e:
@@ -400,9 +427,20 @@ class WarmerEngine:
                 if user_session and user_session.waha_session_name:
                     waha_session_name = user_session.waha_session_name
             
+            # Share the number's send budget with any campaign running on it
+            try:
+                await send_rate_limiter.acquire(waha_session_name, self.async_waha.base_url)
+            except RateLimitExceeded as e:
+                self.logger.warning(f"Skipping direct message from {sender}: {str(e)}")
+                return
+            
             # Send message via WAHA
             chat_id = f"{recipient_phone}@c.us"
-            result = self.waha.send_text(waha_session_name, chat_id, message)
+            try:
+                result = await self.async_waha.send_text(waha_session_name, chat_id, message)
+            except Exception:
+                send_rate_limiter.refund(waha_session_name)
+                raise
             
             if result and "id" in result:
                 # Extract message ID from nested structure
@@ -439,6 +477,7 @@ class WarmerEngine:
                 
                 self.logger.info(f"Sent direct message from {sender} to {recipient}")
             else:
+                send_rate_limiter.refund(waha_session_name)
                 self.logger.error(f"Failed to send direct message: {result}")
                 
         except Exception as e:
@@ -461,6 +500,12 @@ class WarmerEngine:
                     
                     db.commit()
                     
+                    await notify_warmer_update(warmer_session_id, {
+                        "total_messages_sent": warmer.total_messages_sent,
+                        "total_group_messages": warmer.total_group_messages,
+                        "total_direct_messages": warmer.total_direct_messages
+                    })
+                    
         except Exception as e:
             self.logger.error(f"Failed to update statistics: {str(e)}")
     
@@ -520,11 +565,7 @@ class WarmerEngine:
                 if user_session and user_session.waha_session_name:
                     waha_session_name = user_session.waha_session_name
             
-            sessions = self.waha.get_sessions()
-            for session in sessions:
-                if session.get("name") == waha_session_name:
-                    return session.get("status") == "WORKING"
-            return False
+            return await session_health_cache.is_working(waha_session_name, self.async_waha.base_url)
         except Exception as e:
             self.logger.error(f"Failed to verify session {session_name}: {str(e)}")
             return False
@@ -1,21 +1,93 @@
 """
 WebSocket endpoint for real-time campaign updates
+Each connection has a bounded outgoing queue drained by its own writer task, so a
+broadcast is serialized once and handed to every subscriber without waiting on
+any of them; a client that falls behind is dropped instead of slowing the rest.
+Campaign progress is coalesced per campaign and sent as deltas.
+
+Updates travel over the pub/sub event bus: they are published once and every
+API worker delivers them to its own subscribers, so a client connected to one
+worker sees campaigns, exports, warmers and sessions handled by any other
 """
 
 from fastapi import WebSocket, WebSocketDisconnect
-from typing import Dict, Set
+from collections import deque
+from typing import Dict, Set, Optional, Any, Iterable
 import json
 import logging
 import asyncio
+import os
+import time
+import uuid
+
+from pubsub import event_bus
 
 logger = logging.getLogger(__name__)
 
+# Messages a connection may have waiting before it counts as too slow
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "64"))
+# Longest a single send may take before the connection is dropped
+WS_SEND_TIMEOUT_SECONDS = float(os.getenv("WS_SEND_TIMEOUT_SECONDS", "10"))
+
+# Bus topic asking whichever worker runs a campaign to publish its full progress
+CAMPAIGN_SNAPSHOT_REQUEST = "campaign_snapshot_request"
+
+# Close code for a handshake without a valid session token (policy violation)
+WS_AUTH_FAILED_CODE = 1008
+
+
+class _ClientSender:
+    """Outgoing queue and writer task for one WebSocket connection"""
+    
+    def __init__(self, websocket: WebSocket, on_failure):
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=WS_SEND_QUEUE_SIZE)
+        self._on_failure = on_failure
+        self._task = asyncio.create_task(self._writer())
+    
+    def offer(self, message: str) -> bool:
+        """Queue a serialized message without waiting; False if the client is too far behind"""
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            return False
+    
+    async def _writer(self):
+        try:
+            while True:
+                message = await self.queue.get()
+                await asyncio.wait_for(self.websocket.send_text(message), WS_SEND_TIMEOUT_SECONDS)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            self._on_failure(self.websocket, f"send failed: {e!r}")
+    
+    def close(self):
+        self._task.cancel()
+
+
 class ConnectionManager:
     """Manages WebSocket connections for campaign updates"""
     
     def __init__(self):
         self.active_connections: Dict[str, Set[WebSocket]] = {}
         self.campaign_subscribers: Dict[int, Set[WebSocket]] = {}
+        self.export_subscribers: Dict[str, Set[WebSocket]] = {}
+        self.warmer_subscribers: Dict[int, Set[WebSocket]] = {}
+        self.session_subscribers: Dict[str, Set[WebSocket]] = {}
+        self.client_channels: Dict[str, Set[WebSocket]] = {}  # per-connection key for replies from other workers
+        self.senders: Dict[WebSocket, _ClientSender] = {}
+        self.channels: Dict[WebSocket, str] = {}
+        
+        # Bus topic -> subscribers by key
+        self.topics: Dict[str, Dict[Any, Set[WebSocket]]] = {
+            "campaign": self.campaign_subscribers,
+            "export": self.export_subscribers,
+            "warmer": self.warmer_subscribers,
+            "session": self.session_subscribers,
+            "client": self.client_channels
+        }
     
     async def connect(self, websocket: WebSocket, client_id: str):
         """Accept new WebSocket connection"""
@@ -23,6 +95,9 @@ class ConnectionManager:
         if client_id not in self.active_connections:
             self.active_connections[client_id] = set()
         self.active_connections[client_id].add(websocket)
+        self.senders[websocket] = _ClientSender(websocket, self._drop)
+        self.channels[websocket] = uuid.uuid4().hex
+        self.client_channels[self.channels[websocket]] = {websocket}
         logger.info(f"WebSocket connected: {client_id}")
     
     def disconnect(self, websocket: WebSocket, client_id: str):
@@ -32,69 +107,340 @@ class ConnectionManager:
             if not self.active_connections[client_id]:
                 del self.active_connections[client_id]
         
-        # Remove from campaign subscribers
-        for campaign_id, subscribers in list(self.campaign_subscribers.items()):
-            subscribers.discard(websocket)
-            if not subscribers:
-                del self.campaign_subscribers[campaign_id]
-        
+        self._forget(websocket)
         logger.info(f"WebSocket disconnected: {client_id}")
     
+    def _forget(self, websocket: WebSocket):
+        """Stop the connection's writer and remove it from every subscription"""
+        sender = self.senders.pop(websocket, None)
+        if sender:
+            sender.close()
+        self.channels.pop(websocket, None)
+        
+        # Remove from campaign, export job, warmer and session subscribers (and its own channel)
+        for subscriptions in self.topics.values():
+            for key, subscribers in list(subscriptions.items()):
+                subscribers.discard(websocket)
+                if not subscribers:
+                    del subscriptions[key]
+    
+    def _drop(self, websocket: WebSocket, reason: str):
+        """Disconnect a client that cannot keep up; it can reconnect and resubscribe"""
+        if websocket not in self.senders:
+            return
+        for client_id, connections in list(self.active_connections.items()):
+            if websocket in connections:
+                self.disconnect(websocket, client_id)
+                break
+        else:
+            self._forget(websocket)
+        logger.warning(f"Dropped slow WebSocket client ({reason})")
+        
+        async def close():
+            try:
+                await websocket.close(code=1013)  # Try again later
+            except Exception:
+                pass
+        
+        try:
+            asyncio.get_running_loop().create_task(close())
+        except RuntimeError:
+            pass
+    
+    def fanout(self, subscribers: Iterable[WebSocket], payload: Any) -> int:
+        """Serialize a message once (unless already a string) and queue it for every subscriber"""
+        message = payload if isinstance(payload, str) else json.dumps(payload, default=str)
+        delivered = 0
+        for websocket in list(subscribers):
+            sender = self.senders.get(websocket)
+            if sender and sender.offer(message):
+                delivered += 1
+            else:
+                self._drop(websocket, "send queue full")
+        return delivered
+    
+    def deliver(self, topic: str, key: Any, message: str) -> int:
+        """Hand a message from the bus to this worker's subscribers of topic/key"""
+        subscribers = self.topics.get(topic, {}).get(key)
+        return self.fanout(subscribers, message) if subscribers else 0
+    
+    def publish(self, topic: str, key: Any, payload: Dict[str, Any]):
+        """Send a message to subscribers of topic/key on every worker"""
+        event_bus.publish(topic, key, json.dumps(payload, default=str))
+    
+    def subscribe(self, topic: str, websocket: WebSocket, key: Any):
+        """Subscribe a connection to one key of a topic"""
+        self.topics[topic].setdefault(key, set()).add(websocket)
+        logger.info(f"Subscribed to {topic} {key}")
+    
+    def unsubscribe(self, topic: str, websocket: WebSocket, key: Any):
+        """Unsubscribe a connection from one key of a topic"""
+        subscriptions = self.topics[topic]
+        if key in subscriptions:
+            subscriptions[key].discard(websocket)
+            if not subscriptions[key]:
+                del subscriptions[key]
+    
     async def subscribe_to_campaign(self, websocket: WebSocket, campaign_id: int):
         """Subscribe to campaign updates"""
-        if campaign_id not in self.campaign_subscribers:
-            self.campaign_subscribers[campaign_id] = set()
-        self.campaign_subscribers[campaign_id].add(websocket)
-        logger.info(f"Subscribed to campaign {campaign_id}")
+        self.subscribe("campaign", websocket, campaign_id)
     
     async def unsubscribe_from_campaign(self, websocket: WebSocket, campaign_id: int):
         """Unsubscribe from campaign updates"""
-        if campaign_id in self.campaign_subscribers:
-            self.campaign_subscribers[campaign_id].discard(websocket)
-            if not self.campaign_subscribers[campaign_id]:
-                del self.campaign_subscribers[campaign_id]
+        self.unsubscribe("campaign", websocket, campaign_id)
+    
+    def reply(self, websocket: WebSocket, payload: Any) -> bool:
+        """Queue a message for one connection, in order with its updates"""
+        return self.fanout([websocket], payload) > 0
     
     async def send_personal_message(self, message: str, websocket: WebSocket):
         """Send message to specific connection"""
-        try:
-            await websocket.send_text(message)
-        except Exception as e:
-            logger.error(f"Error sending message: {e}")
+        self.reply(websocket, message)
     
     async def broadcast_campaign_update(self, campaign_id: int, data: dict):
         """Broadcast update to all subscribers of a campaign"""
-        if campaign_id in self.campaign_subscribers:
-            message = json.dumps({
-                "type": "campaign_update",
-                "campaign_id": campaign_id,
-                "data": data
-            })
-            
-            dead_connections = set()
-            for connection in self.campaign_subscribers[campaign_id]:
-                try:
-                    await connection.send_text(message)
-                except Exception as e:
-                    logger.error(f"Error broadcasting to connection: {e}")
-                    dead_connections.add(connection)
-            
-            # Remove dead connections
-            for conn in dead_connections:
-                self.campaign_subscribers[campaign_id].discard(conn)
+        self.publish("campaign", campaign_id, {
+            "type": "campaign_update",
+            "campaign_id": campaign_id,
+            "data": data
+        })
+
+    async def subscribe_to_export(self, websocket: WebSocket, job_id: str):
+        """Subscribe to export job progress"""
+        self.subscribe("export", websocket, job_id)
+    
+    async def unsubscribe_from_export(self, websocket: WebSocket, job_id: str):
+        """Unsubscribe from export job progress"""
+        self.unsubscribe("export", websocket, job_id)
+    
+    async def broadcast_export_update(self, job_id: str, data: dict):
+        """Broadcast progress to all subscribers of an export job"""
+        self.publish("export", job_id, {
+            "type": "export_update",
+            "job_id": job_id,
+            "data": data
+        })
+    
+    async def broadcast_warmer_update(self, warmer_id: int, data: dict):
+        """Broadcast a warmer status change to all subscribers of the warmer"""
+        self.publish("warmer", warmer_id, {
+            "type": "warmer_update",
+            "warmer_id": warmer_id,
+            "data": data
+        })
+    
+    async def broadcast_session_status(self, session_name: str, data: dict):
+        """Broadcast a WhatsApp session status change to all subscribers of the session"""
+        self.publish("session", session_name, {
+            "type": "session_status",
+            "session": session_name,
+            "data": data
+        })
+
+
+class CampaignProgressHub:
+    """Per-campaign progress channels that coalesce updates into rate-limited deltas
+    
+    The processor publishes every outcome; subscribers get at most
+    WS_PROGRESS_MAX_PER_SECOND messages per campaign, each carrying only the
+    fields that changed (absolute values) and the last few rows (row number and
+    status only - no recipient data). Channels live on the worker running the
+    campaign; deltas reach other workers over the bus.
+    """
+    
+    def __init__(self, connections: ConnectionManager, max_per_second: Optional[float] = None,
+                 recent_rows: Optional[int] = None):
+        self.connections = connections
+        self.min_interval = 1.0 / (max_per_second or float(os.getenv("WS_PROGRESS_MAX_PER_SECOND", "2")))
+        self.recent_rows = recent_rows or int(os.getenv("WS_PROGRESS_RECENT_ROWS", "5"))
+        self._channels: Dict[int, Dict[str, Any]] = {}
+    
+    def _channel(self, campaign_id: int) -> Dict[str, Any]:
+        channel = self._channels.get(campaign_id)
+        if channel is None:
+            channel = {
+                "state": {},      # latest value of every field
+                "sent": {},       # values as of the last broadcast
+                "rows": deque(maxlen=self.recent_rows),
+                "seq": 0,
+                "last_flush": 0.0,
+                "task": None
+            }
+            self._channels[campaign_id] = channel
+        return channel
+    
+    def publish(self, campaign_id: int, fields: Dict[str, Any], row: Optional[Dict[str, Any]] = None):
+        """Record new progress; a coalesced delta goes out within the rate limit (never blocks)"""
+        channel = self._channel(campaign_id)
+        channel["state"].update(fields)
+        if row:
+            channel["rows"].append(row)
+        
+        if channel["task"] is None or channel["task"].done():
+            delay = max(0.0, channel["last_flush"] + self.min_interval - time.monotonic())
+            try:
+                channel["task"] = asyncio.get_running_loop().create_task(self._flush_later(campaign_id, delay))
+            except RuntimeError:
+                # No running loop - subscribers catch up on the next publish
+                pass
+    
+    async def _flush_later(self, campaign_id: int, delay: float):
+        if delay:
+            await asyncio.sleep(delay)
+        self._flush(campaign_id)
+    
+    def _flush(self, campaign_id: int):
+        channel = self._channels.get(campaign_id)
+        if channel is None:
+            return
+        channel["last_flush"] = time.monotonic()
+        
+        delta = {key: value for key, value in channel["state"].items() if channel["sent"].get(key) != value}
+        rows = list(channel["rows"])
+        channel["rows"].clear()
+        if not delta and not rows:
+            return
+        
+        channel["seq"] += 1
+        channel["sent"].update(delta)
+        # Subscribers may be on any worker, so deltas always go to the bus
+        self.connections.publish("campaign", campaign_id, {
+            "type": "campaign_progress",
+            "campaign_id": campaign_id,
+            "seq": channel["seq"],
+            "delta": delta,
+            "rows": rows
+        })
+    
+    def snapshot(self, campaign_id: int) -> Optional[Dict[str, Any]]:
+        """Full current state, sent to a new subscriber before any delta"""
+        channel = self._channels.get(campaign_id)
+        if channel is None:
+            return None
+        return {
+            "type": "campaign_snapshot",
+            "campaign_id": campaign_id,
+            "seq": channel["seq"],
+            "data": dict(channel["state"])
+        }
+    
+    def request_snapshot(self, campaign_id: int, websocket: WebSocket):
+        """Ask the worker running the campaign to send its full state to one connection"""
+        channel = self.connections.channels.get(websocket)
+        if channel:
+            event_bus.publish(CAMPAIGN_SNAPSHOT_REQUEST, campaign_id, channel)
+    
+    def publish_snapshot(self, campaign_id: int, channel: str):
+        """Answer a snapshot request if this worker runs the campaign (only the asking connection gets it)"""
+        snapshot = self.snapshot(campaign_id)
+        if snapshot:
+            self.connections.publish("client", channel, snapshot)
+    
+    def close(self, campaign_id: int):
+        """Send whatever is pending at once and drop the channel (processing ended)"""
+        channel = self._channels.get(campaign_id)
+        if channel is None:
+            return
+        if channel["task"] and not channel["task"].done():
+            channel["task"].cancel()
+        self._flush(campaign_id)
+        del self._channels[campaign_id]
 
 # Global connection manager
 manager = ConnectionManager()
 
+# Global campaign progress channels
+campaign_progress = CampaignProgressHub(manager)
+
+
+def _on_bus_message(topic: str, key: Any, message: str):
+    """Messages arriving from the event bus (published by this or another worker)"""
+    if topic == CAMPAIGN_SNAPSHOT_REQUEST:
+        campaign_progress.publish_snapshot(key, message)
+    else:
+        manager.deliver(topic, key, message)
+
+
+event_bus.set_handler(_on_bus_message)
+
+# ==================== AUTHENTICATION ====================
+
+def _session_token(websocket: WebSocket) -> Optional[str]:
+    """Bearer token from the Authorization header, or the token query parameter (browsers cannot set headers)"""
+    auth_header = websocket.headers.get("authorization", "")
+    if auth_header.startswith("Bearer "):
+        return auth_header.replace("Bearer ", "")
+    return websocket.query_params.get("token")
+
+def authenticate(websocket: WebSocket) -> Optional[str]:
+    """User id of the handshake's session token (None if missing or invalid)"""
+    token = _session_token(websocket)
+    if not token:
+        return None
+    try:
+        from auth.session_manager import session_manager
+    except ImportError as e:
+        # Same requirement as SessionMiddleware; without it nobody can be authenticated
+        logger.error(f"WebSocket authentication not available: {e}")
+        return None
+    validation = session_manager.validate_session(token)
+    return validation["user_id"] if validation.get("valid") else None
+
+def owns(user_id: str, topic: str, key: Any) -> bool:
+    """Check that the campaign, export job, warmer or session behind a subscription belongs to user_id"""
+    try:
+        if topic == "export":
+            from export_jobs import export_job_manager
+            return export_job_manager.get_owned(key, user_id) is not None
+        
+        from database.connection import get_db
+        with get_db() as db:
+            if topic == "campaign":
+                from database.models import Campaign
+                query = db.query(Campaign.id).filter(Campaign.id == int(key), Campaign.user_id == user_id)
+            elif topic == "warmer":
+                from warmer.models import WarmerSession
+                query = db.query(WarmerSession.id).filter(WarmerSession.id == int(key), WarmerSession.user_id == user_id)
+            elif topic == "session":
+                from database.user_sessions import UserWhatsAppSession
+                query = db.query(UserWhatsAppSession.id).filter(
+                    UserWhatsAppSession.user_id == user_id,
+                    (UserWhatsAppSession.waha_session_name == key) | (UserWhatsAppSession.session_name == key)
+                )
+            else:
+                return False
+            return query.first() is not None
+    except (TypeError, ValueError):
+        return False
+    except Exception as e:
+        logger.error(f"Could not check {topic} {key} ownership: {str(e)}")
+        return False
+
 async def websocket_endpoint(websocket: WebSocket, client_id: str = None):
-    """WebSocket endpoint for real-time updates"""
+    """WebSocket endpoint for real-time updates
+
+    The handshake must carry a valid session token, and a connection may only
+    subscribe to its own user's campaigns, export jobs, warmers and sessions.
+    Replies go through the connection's send queue, so they reach the client in
+    order with the snapshots and deltas queued around them.
+    """
+    user_id = authenticate(websocket)
+    if not user_id:
+        # Closing before accept rejects the handshake
+        await websocket.close(code=WS_AUTH_FAILED_CODE)
+        return
+    
     if not client_id:
         client_id = str(id(websocket))
     
     await manager.connect(websocket, client_id)
     
+    def denied(action: str, key: Any):
+        manager.reply(websocket, {"type": "error", "action": action, "key": key, "message": "Not found"})
+    
     try:
         # Send welcome message
-        await websocket.send_json({
+        manager.reply(websocket, {
             "type": "connected",
             "message": "Connected to WhatsApp Agent WebSocket",
             "client_id": client_id
@@ -108,34 +454,107 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str = None):
             
             if action == "ping":
                 # Respond to ping
-                await websocket.send_json({"type": "pong"})
+                manager.reply(websocket, {"type": "pong"})
             
             elif action == "subscribe":
                 # Subscribe to campaign updates
                 campaign_id = data.get("campaign_id")
-                if campaign_id:
+                if campaign_id and not owns(user_id, "campaign", campaign_id):
+                    denied(action, campaign_id)
+                elif campaign_id:
                     await manager.subscribe_to_campaign(websocket, campaign_id)
-                    await websocket.send_json({
+                    manager.reply(websocket, {
                         "type": "subscribed",
                         "campaign_id": campaign_id
                     })
+                    # Current progress (from whichever worker runs it), so the deltas that follow apply to it
+                    campaign_progress.request_snapshot(campaign_id, websocket)
             
             elif action == "unsubscribe":
                 # Unsubscribe from campaign updates
                 campaign_id = data.get("campaign_id")
                 if campaign_id:
                     await manager.unsubscribe_from_campaign(websocket, campaign_id)
-                    await websocket.send_json({
+                    manager.reply(websocket, {
                         "type": "unsubscribed",
                         "campaign_id": campaign_id
                     })
             
+            elif action == "subscribe_export":
+                # Subscribe to export job progress
+                job_id = data.get("job_id")
+                if job_id and not owns(user_id, "export", job_id):
+                    denied(action, job_id)
+                elif job_id:
+                    await manager.subscribe_to_export(websocket, job_id)
+                    manager.reply(websocket, {
+                        "type": "subscribed_export",
+                        "job_id": job_id
+                    })
+            
+            elif action == "unsubscribe_export":
+                # Unsubscribe from export job progress
+                job_id = data.get("job_id")
+                if job_id:
+                    await manager.unsubscribe_from_export(websocket, job_id)
+                    manager.reply(websocket, {
+                        "type": "unsubscribed_export",
+                        "job_id": job_id
+                    })
+            
+            elif action == "subscribe_warmer":
+                # Subscribe to warmer status changes
+                warmer_id = data.get("warmer_id")
+                if warmer_id and not owns(user_id, "warmer", warmer_id):
+                    denied(action, warmer_id)
+                elif warmer_id:
+                    manager.subscribe("warmer", websocket, warmer_id)
+                    manager.reply(websocket, {
+                        "type": "subscribed_warmer",
+                        "warmer_id": warmer_id
+                    })
+            
+            elif action == "unsubscribe_warmer":
+                # Unsubscribe from warmer status changes
+                warmer_id = data.get("warmer_id")
+                if warmer_id:
+                    manager.unsubscribe("warmer", websocket, warmer_id)
+                    manager.reply(websocket, {
+                        "type": "unsubscribed_warmer",
+                        "warmer_id": warmer_id
+                    })
+            
+            elif action == "subscribe_session":
+                # Subscribe to WhatsApp session status changes
+                session_name = data.get("session")
+                if session_name and not owns(user_id, "session", session_name):
+                    denied(action, session_name)
+                elif session_name:
+                    manager.subscribe("session", websocket, session_name)
+                    manager.reply(websocket, {
+                        "type": "subscribed_session",
+                        "session": session_name
+                    })
+            
+            elif action == "unsubscribe_session":
+                # Unsubscribe from WhatsApp session status changes
+                session_name = data.get("session")
+                if session_name:
+                    manager.unsubscribe("session", websocket, session_name)
+                    manager.reply(websocket, {
+                        "type": "unsubscribed_session",
+                        "session": session_name
+                    })
+            
             elif action == "get_status":
-                # Get current connection status
-                await websocket.send_json({
+                # Get current connection status (this worker's connections, this client's campaigns)
+                manager.reply(websocket, {
                     "type": "status",
                     "connected_clients": len(manager.active_connections),
-                    "subscribed_campaigns": list(manager.campaign_subscribers.keys())
+                    "subscribed_campaigns": [
+                        key for key, subscribers in manager.campaign_subscribers.items() if websocket in subscribers
+                    ],
+                    "pubsub": event_bus.get_status()
                 })
     
     except WebSocketDisconnect:
@@ -149,11 +568,22 @@ async def notify_campaign_progress(campaign_id: int, progress_data: dict):
     """Send campaign progress update to all subscribers"""
     await manager.broadcast_campaign_update(campaign_id, progress_data)
 
-# Example usage in message processor:
-# await notify_campaign_progress(campaign_id, {
+async def notify_export_progress(job_id: str, progress_data: dict):
+    """Send export job progress to all subscribers"""
+    await manager.broadcast_export_update(job_id, progress_data)
+
+async def notify_warmer_update(warmer_id: int, data: dict):
+    """Send a warmer status change to all subscribers"""
+    await manager.broadcast_warmer_update(warmer_id, data)
+
+async def notify_session_status(session_name: str, data: dict):
+    """Send a WhatsApp session status change to all subscribers"""
+    await manager.broadcast_session_status(session_name, data)
+
+# Example usage in message processor (coalesced, never blocks the sender):
+# campaign_progress.publish(campaign_id, {
 #     "processed": 50,
 #     "total": 100,
 #     "success": 48,
-#     "failed": 2,
-#     "current_message": "Processing row 51..."
-# })
+#     "failed": 2
+# }, row={"row": 51, "status": "sent"})